@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Agendador único sobre o loop Tk, baseado em heap.
+
+Em vez de uma cadeia de ``root.after`` por timer, as tarefas ficam num heap
+ordenado pelo instante de execução e apenas um ``after`` fica armado, para a
+tarefa mais próxima. O tick do display e o checkpoint das sessões abertas são
+tarefas únicas, compartilhadas por todos os timers em andamento.
+"""
+
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Agendador:
+    """Executa callbacks em instantes absolutos (time.time()) usando um único after do Tk."""
+
+    def __init__(self, root):
+        self.root = root
+        self._heap = []
+        self._contador = itertools.count()
+        # ids ainda no heap e não cancelados; cancelados que ainda estão no heap
+        self._ativas = set()
+        self._canceladas = set()
+        self._after_id = None
+        self._instante_armado = None
+
+    def agendar(self, instante, callback):
+        """Agenda ``callback()`` para ``instante``. Retorna um id para cancelar."""
+        tarefa_id = next(self._contador)
+        heapq.heappush(self._heap, (instante, tarefa_id, callback))
+        self._ativas.add(tarefa_id)
+        self._armar()
+        return tarefa_id
+
+    def agendar_em(self, segundos, callback):
+        return self.agendar(time.time() + segundos, callback)
+
+    def cancelar(self, tarefa_id):
+        """Cancela a tarefa; ids já executados, já cancelados ou None são ignorados."""
+        if tarefa_id in self._ativas:
+            self._ativas.discard(tarefa_id)
+            self._canceladas.add(tarefa_id)
+
+    def pendentes(self):
+        return len(self._ativas)
+
+    def _armar(self):
+        while self._heap and self._heap[0][1] in self._canceladas:
+            self._canceladas.discard(heapq.heappop(self._heap)[1])
+        if not self._heap:
+            if self._after_id:
+                self.root.after_cancel(self._after_id)
+                self._after_id = None
+                self._instante_armado = None
+            return
+        proximo = self._heap[0][0]
+        if self._after_id and self._instante_armado is not None and self._instante_armado <= proximo:
+            return
+        if self._after_id:
+            self.root.after_cancel(self._after_id)
+        atraso_ms = max(0, int((proximo - time.time()) * 1000) + 1)
+        self._instante_armado = proximo
+        self._after_id = self.root.after(atraso_ms, self._disparar)
+
+    def _disparar(self):
+        self._after_id = None
+        self._instante_armado = None
+        agora = time.time()
+        while self._heap and self._heap[0][0] <= agora:
+            _, tarefa_id, callback = heapq.heappop(self._heap)
+            if tarefa_id in self._canceladas:
+                self._canceladas.discard(tarefa_id)
+                continue
+            self._ativas.discard(tarefa_id)
+            try:
+                callback()
+            except Exception as e:
+                logger.exception("Erro em tarefa agendada: %s", e)
+        self._armar()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Agregação de sessões por faixas de tempo (dia, semana, mês, dia da semana) e projeto.
+
+As sessões selecionadas (mesmo filtro de ``filtrar_sessoes_por_periodo``) são
+convertidas em colunas (início, fim, índice do projeto) e distribuídas nas
+faixas em lote: com NumPy via ``searchsorted``/``bincount``; sem NumPy com
+``array`` da stdlib e ``bisect``. Sessões que cruzam a meia-noite ou o limite
+de uma faixa são repartidas proporcionalmente entre as faixas.
+
+Os instantes são tratados em horário local "de parede" (como gravados no
+histórico), em segundos desde 1970-01-01 00:00 local. Dias compactados pela
+retenção (pseudo-sessões com ``agregado``) contam inteiros no dia da entrada.
+"""
+
+import bisect
+import math
+from array import array
+from datetime import date, datetime, timedelta
+
+from .historico import iterar_sessoes_periodo
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+AGRUPAMENTOS = {
+    "dia": "Dia",
+    "semana": "Semana",
+    "mes": "Mês",
+    "dia_semana": "Dia da semana",
+    "projeto": "Projeto",
+}
+
+NOMES_DIAS_SEMANA = ("Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo")
+
+_EPOCA = datetime(1970, 1, 1)
+_SEGUNDOS_DIA = 86400.0
+
+
+def _para_segundos(dt):
+    return (dt - _EPOCA).total_seconds()
+
+
+def _dia_de(segundos):
+    return _EPOCA.date() + timedelta(days=int(segundos // _SEGUNDOS_DIA))
+
+
+def _inicio_faixa(dia, agrupamento):
+    """Primeiro dia da faixa que contém ``dia`` (dia_semana usa faixas diárias)."""
+    if agrupamento == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if agrupamento == "mes":
+        return dia.replace(day=1)
+    return dia
+
+
+def _proxima_faixa(dia, agrupamento):
+    if agrupamento == "semana":
+        return dia + timedelta(days=7)
+    if agrupamento == "mes":
+        return date(dia.year + dia.month // 12, dia.month % 12 + 1, 1)
+    return dia + timedelta(days=1)
+
+
+def _limites_faixas(primeiro_dia, ultimo_dia, agrupamento):
+    """Retorna (dias iniciais, início em segundos) das faixas, com um limite final extra."""
+    dias = []
+    dia = _inicio_faixa(primeiro_dia, agrupamento)
+    while dia <= ultimo_dia:
+        dias.append(dia)
+        dia = _proxima_faixa(dia, agrupamento)
+    dias.append(dia)
+    return dias, [_para_segundos(datetime.combine(d, datetime.min.time())) for d in dias]
+
+
+class ColunasSessoes:
+    """Sessões selecionadas em formato colunar: início, fim e índice do projeto."""
+
+    def __init__(self, projetos):
+        self.projetos = list(projetos)
+        self.inicio = array("d")
+        self.fim = array("d")
+        self.projeto = array("l")
+
+    @classmethod
+    def de_historico(cls, historico, data_inicio, data_fim, projetos=None):
+        if projetos is None:
+            projetos = list(historico.keys())
+        projetos = [p for p in projetos if p in historico]
+        return cls.de_pares(projetos, iterar_sessoes_periodo(historico, data_inicio, data_fim, projetos))
+
+    @classmethod
+    def de_pares(cls, projetos, pares):
+        """Monta as colunas a partir de pares (projeto, sessao) já selecionados."""
+        colunas = cls(projetos)
+        indice = {p: i for i, p in enumerate(colunas.projetos)}
+        for projeto, sessao in pares:
+            inicio = _para_segundos(datetime.fromisoformat(sessao["data"]))
+            duracao = sessao["duracao_segundos"]
+            if "agregado" in sessao and duracao >= _SEGUNDOS_DIA:
+                # Dia compactado com mais de 24 h (timers sobrepostos): em partes que
+                # começam à meia-noite, para o total não transbordar para o dia seguinte.
+                partes = math.ceil(duracao / (_SEGUNDOS_DIA - 1))
+                for _ in range(partes):
+                    colunas.inicio.append(inicio)
+                    colunas.fim.append(inicio + duracao / partes)
+                    colunas.projeto.append(indice[projeto])
+                continue
+            colunas.inicio.append(inicio)
+            colunas.fim.append(inicio + duracao)
+            colunas.projeto.append(indice[projeto])
+        return colunas
+
+    def __len__(self):
+        return len(self.inicio)
+
+
+class ResultadoAgregacao:
+    """Totais em segundos por (faixa, projeto); faixas ordenadas cronologicamente."""
+
+    def __init__(self, agrupamento, chaves, projetos, valores):
+        self.agrupamento = agrupamento
+        self.chaves = chaves
+        self.projetos = projetos
+        self.valores = valores
+
+    def rotulo(self, chave):
+        if self.agrupamento == "dia":
+            return chave.strftime("%d/%m/%Y")
+        if self.agrupamento == "semana":
+            return f"Semana de {chave.strftime('%d/%m/%Y')}"
+        if self.agrupamento == "mes":
+            return chave.strftime("%m/%Y")
+        if self.agrupamento == "dia_semana":
+            return NOMES_DIAS_SEMANA[chave]
+        return "Total"
+
+    def linhas(self):
+        """Gera (chave, projeto, segundos) para as combinações com tempo registrado."""
+        for chave in self.chaves:
+            for projeto in self.projetos:
+                segundos = self.valores.get((chave, projeto), 0.0)
+                if segundos:
+                    yield chave, projeto, segundos
+
+    def total_por_chave(self):
+        totais = {}
+        for (chave, _), segundos in self.valores.items():
+            totais[chave] = totais.get(chave, 0.0) + segundos
+        return totais
+
+    def total_por_projeto(self):
+        totais = {}
+        for (_, projeto), segundos in self.valores.items():
+            totais[projeto] = totais.get(projeto, 0.0) + segundos
+        return totais
+
+    def total_geral(self):
+        return sum(self.valores.values())
+
+
+def _distribuir_numpy(colunas, limites, n_faixas):
+    n_proj = len(colunas.projetos)
+    inicio = np.frombuffer(colunas.inicio, dtype=np.float64)
+    fim = np.frombuffer(colunas.fim, dtype=np.float64)
+    proj = np.frombuffer(colunas.projeto, dtype=np.dtype(colunas.projeto.typecode))
+    b = np.asarray(limites, dtype=np.float64)
+    fi = np.searchsorted(b, inicio, side="right") - 1
+    ff = np.searchsorted(b, fim, side="left") - 1
+    ff = np.maximum(ff, fi)
+    simples = fi == ff
+    matriz = np.bincount(
+        fi[simples] * n_proj + proj[simples],
+        weights=(fim - inicio)[simples],
+        minlength=n_faixas * n_proj,
+    ).reshape(n_faixas, n_proj)
+    for k in np.nonzero(~simples)[0]:
+        a, z, p = inicio[k], fim[k], proj[k]
+        for faixa in range(fi[k], ff[k] + 1):
+            matriz[faixa, p] += min(z, b[faixa + 1]) - max(a, b[faixa])
+    return matriz.tolist()
+
+
+def _distribuir_stdlib(colunas, limites, n_faixas):
+    n_proj = len(colunas.projetos)
+    matriz = [[0.0] * n_proj for _ in range(n_faixas)]
+    for a, z, p in zip(colunas.inicio, colunas.fim, colunas.projeto):
+        fi = bisect.bisect_right(limites, a) - 1
+        ff = max(fi, bisect.bisect_left(limites, z) - 1)
+        if fi == ff:
+            matriz[fi][p] += z - a
+            continue
+        for faixa in range(fi, ff + 1):
+            matriz[faixa][p] += min(z, limites[faixa + 1]) - max(a, limites[faixa])
+    return matriz
+
+
+def agregar_colunas(colunas, agrupamento="dia"):
+    """Agrupa colunas de sessões na faixa de tempo pedida (ver AGRUPAMENTOS)."""
+    if agrupamento not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento desconhecido: {agrupamento}")
+    projetos = colunas.projetos
+    if not len(colunas):
+        return ResultadoAgregacao(agrupamento, [], projetos, {})
+
+    if agrupamento == "projeto":
+        valores = {}
+        for a, z, p in zip(colunas.inicio, colunas.fim, colunas.projeto):
+            chave = (None, projetos[p])
+            valores[chave] = valores.get(chave, 0.0) + (z - a)
+        return ResultadoAgregacao(agrupamento, [None], projetos, valores)
+
+    faixa_base = "dia" if agrupamento == "dia_semana" else agrupamento
+    primeiro = _dia_de(min(colunas.inicio))
+    ultimo = _dia_de(max(colunas.fim))
+    dias, limites = _limites_faixas(primeiro, ultimo, faixa_base)
+    n_faixas = len(dias) - 1
+    if NUMPY_AVAILABLE:
+        matriz = _distribuir_numpy(colunas, limites, n_faixas)
+    else:
+        matriz = _distribuir_stdlib(colunas, limites, n_faixas)
+
+    valores = {}
+    for faixa, linha in enumerate(matriz):
+        chave = dias[faixa].weekday() if agrupamento == "dia_semana" else dias[faixa]
+        for p, segundos in enumerate(linha):
+            if segundos:
+                k = (chave, projetos[p])
+                valores[k] = valores.get(k, 0.0) + segundos
+    chaves = sorted({k for k, _ in valores})
+    return ResultadoAgregacao(agrupamento, chaves, projetos, valores)
+
+
+def agregar(historico, data_inicio, data_fim, agrupamento="dia", projetos=None):
+    """Agrega as sessões do período (entrada em [data_inicio, data_fim]) por faixa e projeto."""
+    colunas = ColunasSessoes.de_historico(historico, data_inicio, data_fim, projetos)
+    return agregar_colunas(colunas, agrupamento)
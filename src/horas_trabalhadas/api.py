@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+"""
+API HTTP/JSON local (asyncio) para ponto de entrada/saída, totais e relatórios.
+
+Rotas:
+
+- ``GET  /timers``                          timers em andamento
+- ``POST /entrada`` ``{"projeto": "..."}``  abre o timer do projeto (409 se já aberto)
+- ``POST /saida``   ``{"projeto": "..."}``  fecha o timer e devolve a sessão (409 se não aberto)
+
+  As duas aceitam também ``"tags"`` (lista ou texto) e ``"nota"`` para a sessão.
+- ``GET  /projetos``                        projetos com total e total de hoje
+- ``GET  /totais?projeto=X``                total e total de hoje de um projeto
+- ``GET  /relatorio?de=AAAA-MM-DD&ate=AAAA-MM-DD[&projeto=X...][&tag=Y...][&agrupamento=semana][&sessoes=1]``
+
+As operações rodam sobre ``ServicoPonto`` (mesma semântica de ``ponto_entrada`` e
+``ponto_saida`` da janela). A gravação do histórico é feita em lote: as alterações
+marcam o serviço como pendente e ele é gravado no máximo a cada
+``intervalo_gravacao`` segundos (e ao encerrar, inclusive por SIGTERM); timers
+abertos e sessões encerradas ainda não gravadas ficam protegidos pelo checkpoint
+de ``sessao_aberta.json``.
+
+Sem interface gráfica (``horas-trabalhadas servir``), tudo roda na thread do loop
+asyncio e a gravação vai para uma thread auxiliar, com as alterações aguardando
+o fim dela. Junto da janela (``HORAS_TRABALHADAS_API_PORTA``), o loop asyncio roda
+numa thread própria e cada operação é entregue à thread do Tk por ``ExecutorTk``,
+que é quem detém o histórico (sem consulta periódica: a thread do Tk só é
+acordada quando há operação na fila).
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from .agregacao import AGRUPAMENTOS
+from .ponto import ErroPonto
+
+logger = logging.getLogger(__name__)
+
+VARIAVEL_PORTA = "HORAS_TRABALHADAS_API_PORTA"
+ENDERECO_PADRAO = "127.0.0.1"
+PORTA_PADRAO = 8765
+INTERVALO_GRAVACAO_PADRAO = 1.0
+TAMANHO_MAXIMO_CORPO = 64 * 1024
+
+MENSAGENS_STATUS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ErroRequisicao(Exception):
+    """Erro a ser devolvido ao cliente com o status indicado."""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def _parse_data(texto, campo):
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    raise ErroRequisicao(400, f"{campo} inválida: {texto!r} (use AAAA-MM-DD ou DD/MM/AAAA)")
+
+
+class ServicoPonto:
+    """
+    Operações de ponto, totais e relatórios sobre o repositório, sem interface.
+    Não é thread-safe: deve ser usado sempre da mesma thread (loop asyncio ou Tk).
+    """
+
+    def __init__(self, repositorio, ponto, relatorios, ao_alterar=None):
+        self.repositorio = repositorio
+        self.ponto = ponto
+        self.relatorios = relatorios
+        self.ao_alterar = ao_alterar
+        self.alteracoes_pendentes = 0
+
+    def _alterado(self):
+        self.alteracoes_pendentes += 1
+        if self.ao_alterar:
+            self.ao_alterar()
+
+    def timers(self, agora=None):
+        agora = agora or time.time()
+        return [
+            {
+                "projeto": projeto,
+                "entrada": datetime.fromtimestamp(inicio).isoformat(),
+                "decorrido_segundos": agora - inicio,
+            }
+            for projeto, inicio in self.ponto.timers.items()
+        ]
+
+    def entrada(self, projeto, tags=None, nota=None):
+        projeto = (projeto or "").strip()
+        try:
+            tempo_inicio = self.ponto.iniciar(projeto, tags=tags, nota=nota)
+        except ErroPonto as e:
+            raise ErroRequisicao(409 if projeto else 400, str(e))
+        if self.ao_alterar:
+            self.ao_alterar()
+        return {"projeto": projeto, "entrada": datetime.fromtimestamp(tempo_inicio).isoformat()}
+
+    def saida(self, projeto=None, tags=None, nota=None):
+        if not projeto:
+            if len(self.ponto.timers) != 1:
+                raise ErroRequisicao(
+                    409, "Informe o projeto: há mais de um timer em andamento."
+                    if self.ponto.timers else "Nenhum timer em andamento."
+                )
+            projeto = next(iter(self.ponto.timers))
+        try:
+            sessao = self.ponto.encerrar(projeto, tags=tags, nota=nota)
+        except ErroPonto as e:
+            raise ErroRequisicao(409, str(e))
+        self._alterado()
+        return {"projeto": projeto, **sessao}
+
+    def total_hoje(self, projeto, agora=None):
+        agora = datetime.fromtimestamp(agora or time.time())
+        inicio = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+        fim = inicio + timedelta(days=1) - timedelta(microseconds=1)
+        dados = self.relatorios.sessoes_periodo(inicio, fim, [projeto]).get(projeto)
+        return dados["total_segundos"] if dados else 0.0
+
+    def totais(self, projeto):
+        if projeto not in self.repositorio.dados and not self.ponto.em_andamento(projeto):
+            raise ErroRequisicao(404, f"Projeto não encontrado: {projeto!r}")
+        agora = time.time()
+        em_andamento = self.ponto.decorrido(projeto, agora) if self.ponto.em_andamento(projeto) else 0.0
+        dados = self.repositorio.dados.get(projeto, {})
+        return {
+            "projeto": projeto,
+            "total_segundos": dados.get("total_segundos", 0) + em_andamento,
+            "hoje_segundos": self.total_hoje(projeto, agora) + em_andamento,
+            "sessoes": len(dados.get("sessoes", [])),
+            "em_andamento": self.ponto.em_andamento(projeto),
+        }
+
+    def projetos(self):
+        nomes = sorted(set(self.repositorio.dados) | set(self.ponto.timers))
+        return [self.totais(projeto) for projeto in nomes]
+
+    def relatorio(self, data_inicio, data_fim, projetos=None, agrupamento=None, incluir_sessoes=False, tags=None):
+        if agrupamento and agrupamento not in AGRUPAMENTOS:
+            raise ErroRequisicao(400, f"Agrupamento inválido: {agrupamento!r} ({', '.join(AGRUPAMENTOS)})")
+        sessoes_periodo = self.relatorios.sessoes_periodo(data_inicio, data_fim, projetos, tags)
+        resposta = {
+            "de": data_inicio.isoformat(),
+            "ate": data_fim.isoformat(),
+            "total_segundos": sum(d["total_segundos"] for d in sessoes_periodo.values()),
+            "projetos": {
+                projeto: {
+                    "total_segundos": dados["total_segundos"],
+                    "quantidade_sessoes": sum(s.get("agregado", 1) for s in dados["sessoes"]),
+                    **({"sessoes": dados["sessoes"]} if incluir_sessoes else {}),
+                }
+                for projeto, dados in sorted(sessoes_periodo.items())
+            },
+        }
+        if agrupamento:
+            resultado = self.relatorios.agregacao(data_inicio, data_fim, agrupamento, projetos, tags)
+            resposta["agrupamento"] = agrupamento
+            resposta["resumo"] = [
+                {"periodo": resultado.rotulo(chave), "projeto": projeto, "segundos": segundos}
+                for chave, projeto, segundos in resultado.linhas()
+            ]
+        return resposta
+
+    def salvar_pendente(self):
+        """
+        Grava o histórico se houver alterações e tira do checkpoint as sessões
+        encerradas que a gravação incluiu. Exceções de escrita são propagadas.
+        """
+        if not self.alteracoes_pendentes:
+            return 0
+        pendentes = self.alteracoes_pendentes
+        encerradas = len(self.ponto.encerradas)
+        self.repositorio.salvar()
+        self.alteracoes_pendentes -= pendentes
+        self.ponto.confirmar_gravadas(encerradas)
+        return pendentes
+
+
+class ExecutorTk:
+    """
+    Executa funções na thread do Tk a pedido de outras threads. Não há consulta
+    periódica: ``submeter`` põe a função na fila e, se não há esvaziamento já
+    agendado, agenda um com ``after`` (o tkinter entrega a chamada à thread do Tk);
+    o esvaziamento só se desarma com a fila vazia, sob a mesma trava.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._fila = queue.SimpleQueue()
+        self._trava = threading.Lock()
+        self._agendado = False
+        self._ativo = False
+
+    def iniciar(self):
+        with self._trava:
+            self._ativo = True
+        self._acordar()
+
+    def parar(self):
+        with self._trava:
+            self._ativo = False
+
+    def submeter(self, funcao, *args):
+        futuro = concurrent.futures.Future()
+        self._fila.put((futuro, funcao, args))
+        self._acordar()
+        return futuro
+
+    def _acordar(self):
+        with self._trava:
+            if self._agendado or not self._ativo or self._fila.empty():
+                return
+            self._agendado = True
+        try:
+            self.root.after(0, self._processar)
+        except Exception as e:
+            # Janela encerrada (ou loop do Tk parado): ninguém vai esvaziar a fila.
+            logger.warning("API: operação não entregue à janela: %s", e)
+            with self._trava:
+                self._agendado = False
+            self._descartar(e)
+
+    def _descartar(self, erro):
+        while True:
+            try:
+                futuro, _, _ = self._fila.get_nowait()
+            except queue.Empty:
+                return
+            if futuro.set_running_or_notify_cancel():
+                futuro.set_exception(erro)
+
+    def _processar(self):
+        while True:
+            try:
+                futuro, funcao, args = self._fila.get_nowait()
+            except queue.Empty:
+                with self._trava:
+                    if self._fila.empty() or not self._ativo:
+                        self._agendado = False
+                        return
+                continue
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            try:
+                futuro.set_result(funcao(*args))
+            except BaseException as e:
+                futuro.set_exception(e)
+
+
+class ServidorApi:
+    """
+    Servidor HTTP/1.1 (keep-alive) sobre asyncio. Com ``executor`` (ex.: ExecutorTk),
+    as operações do serviço são delegadas a ele; sem, rodam no próprio loop.
+    """
+
+    def __init__(self, servico, endereco=ENDERECO_PADRAO, porta=PORTA_PADRAO,
+                 intervalo_gravacao=INTERVALO_GRAVACAO_PADRAO, executor=None):
+        self.servico = servico
+        self.endereco = endereco
+        self.porta = porta
+        self.intervalo_gravacao = intervalo_gravacao
+        self.executor = executor
+        self._servidor = None
+        self._tarefa_gravacao = None
+        self._trava_gravacao = None
+        self._loop = None
+        self._thread = None
+        self.requisicoes = 0
+
+    # --- execução das operações ---
+
+    async def _chamar(self, funcao, *args, altera=False):
+        if self.executor is not None:
+            return await asyncio.wrap_future(self.executor.submeter(funcao, *args))
+        if altera:
+            async with self._trava_gravacao:
+                return funcao(*args)
+        return funcao(*args)
+
+    async def _gravar(self):
+        if self.executor is not None:
+            return await asyncio.wrap_future(self.executor.submeter(self.servico.salvar_pendente))
+        if not self.servico.alteracoes_pendentes:
+            return 0
+        # Alterações esperam a trava; leituras seguem enquanto o JSON é gravado em outra thread.
+        async with self._trava_gravacao:
+            return await asyncio.get_running_loop().run_in_executor(None, self.servico.salvar_pendente)
+
+    async def _laco_gravacao(self):
+        while True:
+            await asyncio.sleep(self.intervalo_gravacao)
+            try:
+                gravadas = await self._gravar()
+                if gravadas:
+                    logger.debug("API: histórico gravado (%d alteração(ões) em lote)", gravadas)
+            except Exception as e:
+                logger.exception("API: erro ao gravar histórico: %s", e)
+
+    # --- HTTP ---
+
+    async def _atender(self, leitor, escritor):
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                try:
+                    metodo, alvo, versao = linha.decode("latin-1").split()
+                except ValueError:
+                    await self._responder(escritor, 400, {"erro": "Requisição inválida."}, False)
+                    break
+                cabecalhos = {}
+                while True:
+                    linha = await leitor.readline()
+                    if linha in (b"\r\n", b"\n", b""):
+                        break
+                    nome, _, valor = linha.decode("latin-1").partition(":")
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                manter = (
+                    cabecalhos.get("connection", "").lower() != "close"
+                    if versao == "HTTP/1.1" else cabecalhos.get("connection", "").lower() == "keep-alive"
+                )
+                valor = cabecalhos.get("content-length", "") or "0"
+                if not (valor.isascii() and valor.isdigit()):
+                    await self._responder(escritor, 400, {"erro": "Content-Length inválido."}, False)
+                    break
+                tamanho = int(valor)
+                if tamanho > TAMANHO_MAXIMO_CORPO:
+                    await self._responder(escritor, 413, {"erro": "Corpo muito grande."}, False)
+                    break
+                corpo = await leitor.readexactly(tamanho) if tamanho else b""
+                status, resposta = await self._despachar(metodo, alvo, corpo)
+                self.requisicoes += 1
+                await self._responder(escritor, status, resposta, manter)
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _responder(self, escritor, status, resposta, manter):
+        corpo = json.dumps(resposta, ensure_ascii=False).encode("utf-8")
+        cabecalho = (
+            f"HTTP/1.1 {status} {MENSAGENS_STATUS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n"
+        )
+        escritor.write(cabecalho.encode("latin-1") + corpo)
+        await escritor.drain()
+
+    async def _despachar(self, metodo, alvo, corpo):
+        partes = urlsplit(alvo)
+        caminho = partes.path.rstrip("/") or "/"
+        parametros = parse_qs(partes.query)
+        try:
+            if metodo == "POST" and caminho in ("/entrada", "/saida"):
+                try:
+                    dados = json.loads(corpo.decode("utf-8")) if corpo else {}
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    raise ErroRequisicao(400, "Corpo JSON inválido.")
+                if not isinstance(dados, dict):
+                    raise ErroRequisicao(400, "Corpo JSON deve ser um objeto.")
+                tags, nota = dados.get("tags"), dados.get("nota")
+                if not isinstance(tags, (str, list, type(None))) or not isinstance(nota, (str, type(None))):
+                    raise ErroRequisicao(400, "tags deve ser texto ou lista e nota deve ser texto.")
+                if isinstance(tags, list) and not all(isinstance(t, str) for t in tags):
+                    raise ErroRequisicao(400, "tags deve conter apenas textos.")
+                servico = self.servico.entrada if caminho == "/entrada" else self.servico.saida
+                status = 201 if caminho == "/entrada" else 200
+                return status, await self._chamar(servico, dados.get("projeto"), tags, nota, altera=True)
+            if metodo != "GET":
+                if caminho in ("/entrada", "/saida", "/timers", "/projetos", "/totais", "/relatorio"):
+                    raise ErroRequisicao(405, f"Método {metodo} não permitido em {caminho}.")
+                raise ErroRequisicao(404, f"Rota não encontrada: {caminho}")
+            if caminho == "/timers":
+                return 200, await self._chamar(self.servico.timers)
+            if caminho == "/projetos":
+                return 200, await self._chamar(self.servico.projetos)
+            if caminho == "/totais":
+                projeto = parametros.get("projeto", [""])[0]
+                if not projeto:
+                    raise ErroRequisicao(400, "Informe ?projeto=.")
+                return 200, await self._chamar(self.servico.totais, projeto)
+            if caminho == "/relatorio":
+                return 200, await self._relatorio(parametros)
+            raise ErroRequisicao(404, f"Rota não encontrada: {caminho}")
+        except ErroRequisicao as e:
+            return e.status, {"erro": e.mensagem}
+        except Exception as e:
+            logger.exception("API: erro em %s %s: %s", metodo, alvo, e)
+            return 500, {"erro": "Erro interno."}
+
+    async def _relatorio(self, parametros):
+        hoje = datetime.now()
+        de = parametros.get("de", [None])[0]
+        ate = parametros.get("ate", [None])[0]
+        data_inicio = _parse_data(de, "data inicial") if de else hoje - timedelta(days=7)
+        data_fim = _parse_data(ate, "data final") if ate else hoje
+        data_inicio = data_inicio.replace(hour=0, minute=0, second=0, microsecond=0)
+        data_fim = data_fim.replace(hour=23, minute=59, second=59, microsecond=999999)
+        projetos = parametros.get("projeto") or None
+        agrupamento = parametros.get("agrupamento", [None])[0]
+        incluir_sessoes = parametros.get("sessoes", ["0"])[0] in ("1", "true", "sim")
+        tags = parametros.get("tag") or None
+        return await self._chamar(
+            self.servico.relatorio, data_inicio, data_fim, projetos, agrupamento, incluir_sessoes, tags
+        )
+
+    # --- ciclo de vida ---
+
+    async def iniciar(self):
+        self._trava_gravacao = asyncio.Lock()
+        self._servidor = await asyncio.start_server(self._atender, self.endereco, self.porta)
+        self.porta = self._servidor.sockets[0].getsockname()[1]
+        self._tarefa_gravacao = asyncio.create_task(self._laco_gravacao())
+        logger.info("API em http://%s:%d", self.endereco, self.porta)
+
+    async def encerrar(self):
+        if self._tarefa_gravacao:
+            self._tarefa_gravacao.cancel()
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        await self._gravar()
+
+    async def servir(self):
+        """
+        Roda até ser cancelado, gravando as alterações pendentes ao sair. SIGINT
+        (Ctrl+C) e SIGTERM cancelam a tarefa, para a gravação final rodar também
+        quando o processo é encerrado por um gerenciador de serviços.
+        """
+        loop = asyncio.get_running_loop()
+        tarefa = asyncio.current_task()
+        sinais = []
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sinal, tarefa.cancel)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Windows, ou loop fora da thread principal: fica o tratamento padrão.
+                continue
+            sinais.append(sinal)
+        try:
+            await self.iniciar()
+            await asyncio.Event().wait()
+        finally:
+            for sinal in sinais:
+                loop.remove_signal_handler(sinal)
+            await self.encerrar()
+
+    def iniciar_em_thread(self):
+        """Roda o servidor num loop asyncio próprio, numa thread daemon (uso junto da janela)."""
+        pronto = threading.Event()
+
+        def _rodar():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self.iniciar())
+            except OSError as e:
+                logger.error("API: não foi possível escutar em %s:%s: %s", self.endereco, self.porta, e)
+                pronto.set()
+                return
+            pronto.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=_rodar, name="api-ponto", daemon=True)
+        self._thread.start()
+        pronto.wait()
+        return self
+
+    def parar_thread(self, tempo_limite=5.0):
+        """Encerra o servidor iniciado com iniciar_em_thread (sem gravar: a janela grava por conta própria)."""
+        if self._loop is None:
+            return
+
+        async def _parar():
+            if self._tarefa_gravacao:
+                self._tarefa_gravacao.cancel()
+            if self._servidor:
+                self._servidor.close()
+                await self._servidor.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(_parar(), self._loop).result(tempo_limite)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(tempo_limite)
+        self._loop = None
+
+
+def porta_pelo_ambiente():
+    """Porta de HORAS_TRABALHADAS_API_PORTA, ou None se não definida/inválida."""
+    valor = os.environ.get(VARIAVEL_PORTA, "").strip()
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        logger.error("Valor inválido em %s: %r", VARIAVEL_PORTA, valor)
+        return None
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+Backups incrementais do histórico, com blocos comprimidos e endereçados pelo conteúdo.
+
+A cada gravação do histórico é criado um instantâneo em ``backups/`` no diretório
+de dados:
+
+- cada projeto é dividido em blocos: o cabeçalho (total e demais campos), os dias
+  compactados e as sessões de cada mês (se os meses estiverem intercalados na
+  lista, a árvore guarda também a ordem original);
+- cada bloco é gravado em ``objetos/`` comprimido com zlib, com o nome igual ao
+  SHA-256 do conteúdo; blocos já existentes não são gravados de novo;
+- a lista de blocos de um projeto (árvore) também é um objeto, e o instantâneo
+  (``instantaneos/<data>.json``) só aponta a árvore de cada projeto.
+
+Projetos e meses que não mudaram geram os mesmos blocos e não custam nada: um
+instantâneo após uma saída de ponto grava o bloco do mês corrente, a árvore e o
+cabeçalho desse projeto, e o manifesto. Projetos cuja geração não mudou desde o
+último instantâneo nem são serializados de novo.
+
+``restaurar`` remonta o histórico de um instantâneo (ou do último até uma data)
+e ``podar`` remove instantâneos antigos e os objetos que ficaram sem uso; o
+instantâneo mais recente é sempre mantido. Como a poda pode rodar em outro
+processo (``horas-trabalhadas backup podar``), uma árvore memorizada só é
+reaproveitada se o objeto dela ainda existir.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+
+from .historico import CHAVE_AGREGADOS, ProjetosSobDemanda, RepositorioFragmentado
+
+logger = logging.getLogger(__name__)
+
+NOME_DIRETORIO_BACKUPS = "backups"
+VARIAVEL_BACKUP = "HORAS_TRABALHADAS_BACKUP"
+NIVEL_COMPRESSAO = 6
+# Poda automática a cada N instantâneos criados pelo processo.
+PODA_A_CADA = 50
+# Política padrão de poda: os últimos N, um por dia nos últimos D dias e um por mês nos últimos M meses.
+MANTER_ULTIMOS = 50
+MANTER_DIARIOS = 30
+MANTER_MENSAIS = 12
+
+
+def backup_habilitado():
+    """Backups ficam ligados, a menos que HORAS_TRABALHADAS_BACKUP=0."""
+    return os.environ.get(VARIAVEL_BACKUP, "1").strip().lower() not in ("0", "nao", "não", "false", "off")
+
+
+def _serializar(objeto):
+    return json.dumps(objeto, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def _blocos_sessoes(sessoes):
+    """
+    Sessões agrupadas pelo mês da entrada, na ordem em que cada mês aparece.
+    Retorna (blocos, ordem): ``ordem`` é o índice do bloco de cada sessão, ou None
+    se cada mês já forma um trecho contínuo (caso normal, sessões em ordem).
+    """
+    por_mes = {}
+    ordem = []
+    for sessao in sessoes:
+        bloco = por_mes.setdefault(sessao["data"][:7], (len(por_mes), []))
+        bloco[1].append(sessao)
+        ordem.append(bloco[0])
+    contiguo = all(a <= b for a, b in zip(ordem, ordem[1:]))
+    return [bloco for _, bloco in por_mes.values()], None if contiguo else ordem
+
+
+class ArmazemBackup:
+    """Objetos comprimidos e instantâneos num diretório ``backups/``."""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self.diretorio_objetos = os.path.join(diretorio, "objetos")
+        self.diretorio_instantaneos = os.path.join(diretorio, "instantaneos")
+
+    def _caminho_objeto(self, chave):
+        return os.path.join(self.diretorio_objetos, chave[:2], chave[2:])
+
+    def gravar_objeto(self, conteudo):
+        """Grava o objeto se ainda não existir. Retorna (chave, bytes gravados)."""
+        chave = hashlib.sha256(conteudo).hexdigest()
+        caminho = self._caminho_objeto(chave)
+        if os.path.exists(caminho):
+            return chave, 0
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        comprimido = zlib.compress(conteudo, NIVEL_COMPRESSAO)
+        temporario = caminho + ".tmp"
+        with open(temporario, "wb") as f:
+            f.write(comprimido)
+        os.replace(temporario, caminho)
+        return chave, len(comprimido)
+
+    def existe(self, chave):
+        return os.path.exists(self._caminho_objeto(chave))
+
+    def ler_objeto(self, chave):
+        with open(self._caminho_objeto(chave), "rb") as f:
+            conteudo = zlib.decompress(f.read())
+        if hashlib.sha256(conteudo).hexdigest() != chave:
+            raise ValueError(f"Objeto de backup corrompido: {chave}")
+        return json.loads(conteudo)
+
+    def listar(self):
+        """Nomes dos instantâneos, do mais antigo ao mais recente."""
+        if not os.path.isdir(self.diretorio_instantaneos):
+            return []
+        return sorted(n[:-5] for n in os.listdir(self.diretorio_instantaneos) if n.endswith(".json"))
+
+    def ler_instantaneo(self, nome):
+        with open(os.path.join(self.diretorio_instantaneos, nome + ".json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def gravar_instantaneo(self, manifesto, criado):
+        os.makedirs(self.diretorio_instantaneos, exist_ok=True)
+        nome = criado.strftime("%Y%m%dT%H%M%S_%f")
+        caminho = os.path.join(self.diretorio_instantaneos, nome + ".json")
+        temporario = caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+        return nome
+
+    def remover_instantaneo(self, nome):
+        os.remove(os.path.join(self.diretorio_instantaneos, nome + ".json"))
+
+    def objetos(self):
+        if not os.path.isdir(self.diretorio_objetos):
+            return
+        for prefixo in os.listdir(self.diretorio_objetos):
+            pasta = os.path.join(self.diretorio_objetos, prefixo)
+            for resto in os.listdir(pasta):
+                if not resto.endswith(".tmp"):
+                    yield prefixo + resto, os.path.join(pasta, resto)
+
+
+class Backup:
+    """
+    Cria um instantâneo a cada gravação do repositório (ouvinte de "salvar").
+    Falhas no backup são registradas no log e não interrompem a gravação.
+    """
+
+    def __init__(self, repositorio, diretorio=None):
+        self.repositorio = repositorio
+        diretorio = diretorio or os.path.join(os.path.dirname(repositorio.arquivo), NOME_DIRETORIO_BACKUPS)
+        self.armazem = ArmazemBackup(diretorio)
+        # projeto -> (geração do repositório quando a árvore foi montada, chave da árvore)
+        self._arvores = {}
+        self._ultimo = None
+        self._criados = 0
+        repositorio.adicionar_ouvinte(self._ao_alterar)
+
+    def _ao_alterar(self, operacao, projeto, anterior, sessao):
+        if operacao != "salvar":
+            return
+        try:
+            self.criar()
+        except (OSError, ValueError) as e:
+            logger.error("Erro ao criar backup do histórico: %s", e)
+
+    def _ultimo_manifesto(self):
+        if self._ultimo is None:
+            nomes = self.armazem.listar()
+            self._ultimo = self.armazem.ler_instantaneo(nomes[-1]) if nomes else {"projetos": {}}
+        return self._ultimo
+
+    def _assinatura_fragmento(self, projeto):
+        """(tamanho, mtime) do arquivo do projeto no histórico fragmentado, ou None."""
+        if not isinstance(self.repositorio, RepositorioFragmentado):
+            return None
+        entrada = self.repositorio.indice.get(projeto)
+        if entrada is None:
+            return None
+        estado = os.stat(os.path.join(self.repositorio.diretorio_projetos, entrada["arquivo"]))
+        return [estado.st_size, estado.st_mtime_ns]
+
+    def _arvore(self, projeto, anterior):
+        """Chave da árvore do projeto, reaproveitando a anterior quando o projeto não mudou."""
+        geracao = self.repositorio.geracao_de(projeto)
+        memorizada = self._arvores.get(projeto)
+        if memorizada is not None and memorizada[0] >= geracao and self.armazem.existe(memorizada[1]):
+            return memorizada[1], 0
+        dados = self.repositorio.dados
+        if isinstance(dados, ProjetosSobDemanda) and not dados.carregado(projeto):
+            # Projeto não lido nesta execução: igual ao arquivo; se o arquivo é o mesmo
+            # do último instantâneo, a árvore também é.
+            assinatura = self._assinatura_fragmento(projeto)
+            if (
+                assinatura is not None
+                and anterior.get("assinaturas", {}).get(projeto) == assinatura
+                and self.armazem.existe(anterior["projetos"][projeto])
+            ):
+                self._arvores[projeto] = (geracao, anterior["projetos"][projeto])
+                return anterior["projetos"][projeto], 0
+        projeto_dados = dados[projeto]
+        gravados = 0
+        cabecalho = {k: v for k, v in projeto_dados.items() if k not in ("sessoes", CHAVE_AGREGADOS)}
+        chave, n = self.armazem.gravar_objeto(_serializar(cabecalho))
+        arvore = {"cabecalho": chave, "sessoes": []}
+        gravados += n
+        if CHAVE_AGREGADOS in projeto_dados:
+            arvore["agregados"], n = self.armazem.gravar_objeto(_serializar(projeto_dados[CHAVE_AGREGADOS]))
+            gravados += n
+        blocos, ordem = _blocos_sessoes(projeto_dados.get("sessoes", []))
+        for bloco in blocos:
+            chave, n = self.armazem.gravar_objeto(_serializar(bloco))
+            arvore["sessoes"].append(chave)
+            gravados += n
+        if ordem is not None:
+            arvore["ordem"] = ordem
+        chave, n = self.armazem.gravar_objeto(_serializar(arvore))
+        self._arvores[projeto] = (geracao, chave)
+        return chave, gravados + n
+
+    def criar(self, agora=None):
+        """Cria um instantâneo do estado atual. Retorna (nome, bytes novos gravados)."""
+        agora = agora or datetime.now()
+        anterior = self._ultimo_manifesto()
+        projetos = {}
+        assinaturas = {}
+        gravados = 0
+        for projeto in list(self.repositorio.dados):
+            projetos[projeto], n = self._arvore(projeto, anterior)
+            gravados += n
+            assinatura = self._assinatura_fragmento(projeto)
+            if assinatura is not None:
+                assinaturas[projeto] = assinatura
+        manifesto = {"criado": agora.isoformat(), "projetos": projetos, "bytes_novos": gravados}
+        if assinaturas:
+            manifesto["assinaturas"] = assinaturas
+        nome = self.armazem.gravar_instantaneo(manifesto, agora)
+        self._ultimo = manifesto
+        self._criados += 1
+        logger.debug("Backup %s: %d projeto(s), %d byte(s) novos", nome, len(projetos), gravados)
+        if self._criados % PODA_A_CADA == 0:
+            podar(self.armazem)
+        return nome, gravados
+
+
+def montar_projeto(armazem, chave_arvore):
+    """Dados de um projeto a partir da sua árvore."""
+    arvore = armazem.ler_objeto(chave_arvore)
+    dados = armazem.ler_objeto(arvore["cabecalho"])
+    blocos = [armazem.ler_objeto(chave) for chave in arvore["sessoes"]]
+    if "ordem" in arvore:
+        iteradores = [iter(bloco) for bloco in blocos]
+        dados["sessoes"] = [next(iteradores[i]) for i in arvore["ordem"]]
+    else:
+        dados["sessoes"] = [s for bloco in blocos for s in bloco]
+    if "agregados" in arvore:
+        dados[CHAVE_AGREGADOS] = armazem.ler_objeto(arvore["agregados"])
+    return dados
+
+
+def montar_historico(armazem, nome):
+    """Histórico completo (dict projeto -> dados) de um instantâneo."""
+    manifesto = armazem.ler_instantaneo(nome)
+    return {
+        projeto: montar_projeto(armazem, chave_arvore)
+        for projeto, chave_arvore in manifesto["projetos"].items()
+    }
+
+
+def ultima_copia_projeto(armazem, projeto):
+    """(dados, nome do instantâneo) da cópia mais recente do projeto nos backups, ou (None, None)."""
+    for nome in reversed(armazem.listar()):
+        try:
+            chave_arvore = armazem.ler_instantaneo(nome)["projetos"].get(projeto)
+            if chave_arvore is not None:
+                return montar_projeto(armazem, chave_arvore), nome
+        except (OSError, ValueError) as e:
+            logger.warning("Backup %s ilegível: %s", nome, e)
+    return None, None
+
+
+def localizar_instantaneo(armazem, ate=None):
+    """Último instantâneo criado até ``ate`` (datetime; None = o mais recente), ou None."""
+    nomes = armazem.listar()
+    if ate is not None:
+        limite = ate.strftime("%Y%m%dT%H%M%S_%f")
+        nomes = [n for n in nomes if n <= limite]
+    return nomes[-1] if nomes else None
+
+
+def restaurar(repositorio, armazem, nome):
+    """Substitui o histórico do repositório pelo do instantâneo e grava."""
+    historico = montar_historico(armazem, nome)
+    repositorio.substituir_dados(historico)
+    repositorio.salvar()
+    logger.info("Histórico restaurado do backup %s (%d projeto(s))", nome, len(historico))
+    return historico
+
+
+def selecionar_para_manter(nomes, manter_ultimos=MANTER_ULTIMOS, manter_diarios=MANTER_DIARIOS,
+                           manter_mensais=MANTER_MENSAIS):
+    """
+    Instantâneos mantidos pela política: os últimos, o último de cada dia e o último
+    de cada mês. O mais recente é mantido sempre, mesmo com a política toda em zero.
+    """
+    manter = set(nomes[-max(manter_ultimos, 1):]) if nomes else set()
+    por_dia = {}
+    por_mes = {}
+    for nome in nomes:
+        por_dia[nome[:8]] = nome
+        por_mes[nome[:6]] = nome
+    manter.update(sorted(por_dia.values())[-manter_diarios:] if manter_diarios > 0 else [])
+    manter.update(sorted(por_mes.values())[-manter_mensais:] if manter_mensais > 0 else [])
+    return manter
+
+
+def podar(armazem, manter_ultimos=MANTER_ULTIMOS, manter_diarios=MANTER_DIARIOS, manter_mensais=MANTER_MENSAIS):
+    """Remove instantâneos fora da política e os objetos sem referência. Retorna (instantâneos, objetos) removidos."""
+    nomes = armazem.listar()
+    manter = selecionar_para_manter(nomes, manter_ultimos, manter_diarios, manter_mensais)
+    removidos = 0
+    for nome in nomes:
+        if nome not in manter:
+            armazem.remover_instantaneo(nome)
+            removidos += 1
+    if not removidos:
+        return 0, 0
+    alcancaveis = set()
+    for nome in manter:
+        for chave_arvore in armazem.ler_instantaneo(nome)["projetos"].values():
+            if chave_arvore in alcancaveis:
+                continue
+            alcancaveis.add(chave_arvore)
+            arvore = armazem.ler_objeto(chave_arvore)
+            alcancaveis.add(arvore["cabecalho"])
+            alcancaveis.update(arvore["sessoes"])
+            if "agregados" in arvore:
+                alcancaveis.add(arvore["agregados"])
+    objetos_removidos = 0
+    for chave, caminho in list(armazem.objetos()):
+        if chave not in alcancaveis:
+            os.remove(caminho)
+            objetos_removidos += 1
+    logger.info("Backup: %d instantâneo(s) e %d objeto(s) removidos", removidos, objetos_removidos)
+    return removidos, objetos_removidos
+
+
+def armazem_do_diretorio(data_dir):
+    return ArmazemBackup(os.path.join(data_dir, NOME_DIRETORIO_BACKUPS))
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Etiquetas (tags) e notas das sessões, e o índice invertido para buscá-las.
+
+Uma sessão pode ter ``"tags"`` (lista de etiquetas em minúsculas, sem ``#``) e
+``"nota"`` (texto livre); as duas chaves são opcionais e ficam fora da sessão
+quando vazias. Para a busca, cada sessão anotada vira um conjunto de termos:
+``#etiqueta`` para cada etiqueta e as palavras da nota e das etiquetas, sem
+acentos e em minúsculas.
+
+``IndiceSessoes`` guarda termo -> sessões que o contêm. O índice é montado do
+histórico na primeira busca (só as sessões anotadas entram) e, daí em diante,
+mantido pelas notificações do repositório: incluir, alterar ou remover uma
+sessão só mexe nos termos dela. Uma busca intersecta os conjuntos dos termos
+pedidos, a começar pelo menor, sem percorrer o histórico. Mudanças que não
+passam pelos métodos do repositório (só ``marcar_alterado``) são percebidas pela
+geração, e o índice é remontado na busca seguinte.
+
+As sessões são identificadas no índice pelo próprio objeto (``id()``), e não
+pelo ``id`` da sincronização: nem toda sessão tem um, e o id derivado de sessões
+antigas (projeto + entrada) pode repetir.
+"""
+
+import logging
+import re
+import unicodedata
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+PREFIXO_TAG = "#"
+_SEPARADORES_TAGS = re.compile(r"[\s,;]+")
+_PALAVRA = re.compile(r"\w+")
+_MARCAS_COMBINANTES = re.compile(r"[\u0300-\u036f]+")
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos (``Reunião`` -> ``reuniao``)."""
+    if texto.isascii():
+        return texto.lower()
+    return _MARCAS_COMBINANTES.sub("", unicodedata.normalize("NFKD", texto.casefold()))
+
+
+def normalizar_tags(texto):
+    """
+    Lista de etiquetas a partir do texto digitado (``"#cliente, Reunião"`` ->
+    ``["cliente", "reunião"]``): separadas por espaço, vírgula ou ponto e vírgula,
+    sem ``#``, em minúsculas e sem repetição. Aceita também uma lista.
+    """
+    if not texto:
+        return []
+    partes = texto if isinstance(texto, (list, tuple)) else _SEPARADORES_TAGS.split(texto)
+    tags = []
+    for parte in partes:
+        tag = parte.strip().lstrip(PREFIXO_TAG).casefold()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def anotar(sessao, tags=None, nota=None):
+    """Grava ``tags`` e ``nota`` na sessão, removendo as chaves quando ficam vazias. Retorna a sessão."""
+    tags = normalizar_tags(tags)
+    nota = (nota or "").strip()
+    if tags:
+        sessao["tags"] = tags
+    else:
+        sessao.pop("tags", None)
+    if nota:
+        sessao["nota"] = nota
+    else:
+        sessao.pop("nota", None)
+    return sessao
+
+
+def anotada(sessao):
+    return "tags" in sessao or "nota" in sessao
+
+
+def termos_texto(texto):
+    return _PALAVRA.findall(normalizar(texto))
+
+
+@lru_cache(maxsize=4096)
+def _termos_tag(tag):
+    # As mesmas etiquetas se repetem em muitas sessões: os termos de cada uma são memorizados.
+    return (PREFIXO_TAG + normalizar(tag), *termos_texto(tag))
+
+
+def termos_sessao(sessao):
+    """Conjunto de termos de busca da sessão (vazio se ela não tiver etiquetas nem nota)."""
+    termos = set()
+    for tag in sessao.get("tags", ()):
+        termos.update(_termos_tag(tag))
+    if sessao.get("nota"):
+        termos.update(termos_texto(sessao["nota"]))
+    return termos
+
+
+def termos_consulta(consulta):
+    """
+    Termos de uma consulta: ``#etiqueta`` casa só com a etiqueta; as demais
+    palavras casam com palavras da nota ou das etiquetas.
+    """
+    termos = set()
+    for parte in consulta.split():
+        if parte.startswith(PREFIXO_TAG):
+            tag = normalizar(parte.lstrip(PREFIXO_TAG))
+            if tag:
+                termos.add(PREFIXO_TAG + tag)
+        else:
+            termos.update(termos_texto(parte))
+    return termos
+
+
+class IndiceSessoes:
+    """Índice invertido termo -> sessões anotadas, atualizado a cada alteração do repositório."""
+
+    def __init__(self, repositorio):
+        self.repositorio = repositorio
+        # termo -> {chave da sessão}; None enquanto o índice não foi montado (ou foi invalidado)
+        self._termos = None
+        # chave da sessão -> (projeto, sessão, termos indexados)
+        self._sessoes = {}
+        self._geracao = None
+        self.montagens = 0
+        repositorio.adicionar_ouvinte(self._ao_alterar)
+
+    def _incluir(self, projeto, sessao):
+        termos = termos_sessao(sessao)
+        if not termos:
+            return
+        chave = id(sessao)
+        self._sessoes[chave] = (projeto, sessao, termos)
+        for termo in termos:
+            chaves = self._termos.get(termo)
+            if chaves is None:
+                chaves = self._termos[termo] = set()
+            chaves.add(chave)
+
+    def _retirar(self, chave):
+        entrada = self._sessoes.pop(chave, None)
+        if entrada is None:
+            return
+        for termo in entrada[2]:
+            chaves = self._termos[termo]
+            chaves.discard(chave)
+            if not chaves:
+                del self._termos[termo]
+
+    def _ao_alterar(self, operacao, projeto, anterior, sessao):
+        if self._termos is None or operacao == "salvar":
+            return
+        geracao = self.repositorio.geracao
+        # Como em TotaisDiarios: cada alteração notificada avança a geração em 1; outro salto
+        # (ou uma troca geral dos dados) pede remontar o índice.
+        if operacao in ("carregar", "compactar") or self._geracao not in (geracao - 1, geracao):
+            self._invalidar()
+            return
+        if operacao == "adicionar":
+            for incluida in sessao:
+                self._incluir(projeto, incluida)
+        else:
+            if anterior is not None:
+                self._retirar(id(anterior))
+            if sessao is not None:
+                # atualizar_sessao altera a sessão no lugar (``anterior`` é uma cópia): os termos
+                # antigos estão guardados com a própria sessão.
+                self._retirar(id(sessao))
+                self._incluir(projeto, sessao)
+        self._geracao = geracao
+
+    def _invalidar(self):
+        self._termos = None
+        self._sessoes = {}
+        self._geracao = None
+
+    def _garantir(self):
+        if self._termos is not None and self._geracao == self.repositorio.geracao:
+            return
+        self._termos = {}
+        self._sessoes = {}
+        for projeto, dados in list(self.repositorio.dados.items()):
+            for sessao in dados.get("sessoes", []):
+                if anotada(sessao):
+                    self._incluir(projeto, sessao)
+        self._geracao = self.repositorio.geracao
+        self.montagens += 1
+        logger.debug("Índice de busca montado: %d sessão(ões), %d termo(s)", len(self._sessoes), len(self._termos))
+
+    def buscar(self, consulta, projetos=None, data_inicio=None, data_fim=None):
+        """
+        [(projeto, sessão)] das sessões com todos os termos da ``consulta`` (texto ou
+        conjunto de termos), opcionalmente só dos ``projetos`` e com entrada entre
+        ``data_inicio`` e ``data_fim``; ordenadas pela entrada. Consulta vazia: [].
+        """
+        termos = termos_consulta(consulta) if isinstance(consulta, str) else set(consulta)
+        if not termos:
+            return []
+        self._garantir()
+        conjuntos = sorted((self._termos.get(termo, ()) for termo in termos), key=len)
+        chaves = set(conjuntos[0])
+        for conjunto in conjuntos[1:]:
+            if not chaves:
+                break
+            chaves &= conjunto
+        entradas = [self._sessoes[chave] for chave in chaves]
+        if projetos is not None:
+            projetos = set(projetos)
+            entradas = [e for e in entradas if e[0] in projetos]
+        # As entradas são texto ISO (datetime.isoformat): compará-las como texto equivale a
+        # comparar as datas, sem converter cada sessão.
+        if data_inicio is not None:
+            inicio = data_inicio.isoformat()
+            entradas = [e for e in entradas if e[1]["data"] >= inicio]
+        if data_fim is not None:
+            fim = data_fim.isoformat()
+            entradas = [e for e in entradas if e[1]["data"] <= fim]
+        resultado = [(projeto, sessao) for projeto, sessao, _ in entradas]
+        resultado.sort(key=lambda par: par[1]["data"])
+        return resultado
+
+    def buscar_tags(self, tags, projetos=None, data_inicio=None, data_fim=None):
+        """Como ``buscar``, para sessões com todas as ``tags`` (lista ou texto digitado)."""
+        termos = {PREFIXO_TAG + normalizar(tag) for tag in normalizar_tags(tags)}
+        return self.buscar(termos, projetos, data_inicio, data_fim)
+
+    def tags(self):
+        """{etiqueta: quantidade de sessões}, da mais usada para a menos usada."""
+        self._garantir()
+        contagem = {}
+        for termo, chaves in self._termos.items():
+            if termo.startswith(PREFIXO_TAG):
+                # Mostra a etiqueta como foi escrita (com acentos), tirada de uma das sessões.
+                tags = self._sessoes[next(iter(chaves))][1]["tags"]
+                tag = next(t for t in tags if PREFIXO_TAG + normalizar(t) == termo)
+                contagem[tag] = contagem.get(tag, 0) + len(chaves)
+        return dict(sorted(contagem.items(), key=lambda item: (-item[1], item[0])))
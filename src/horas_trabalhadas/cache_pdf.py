@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Cache em disco dos relatórios PDF de períodos encerrados (ex.: meses passados).
+
+A chave de cada PDF é o período, o conjunto de projetos, o agrupamento do resumo,
+as etiquetas filtradas e um hash do conteúdo das sessões de cada projeto no período: editar uma sessão
+de um mês fechado muda só as chaves dos relatórios que a incluem, e os demais
+continuam valendo. Exportar de novo um relatório em cache é uma cópia de arquivo.
+
+Os hashes por projeto são memorizados pela geração do projeto no repositório,
+então montar a chave não relê sessões de projetos que não mudaram.
+
+O diretório tem limite de tamanho: ao passar dele, saem os PDFs usados há mais
+tempo (o mtime de cada arquivo é atualizado a cada uso).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+NOME_DIRETORIO_CACHE = "cache_pdf"
+LIMITE_PADRAO_BYTES = 100 * 1024 * 1024
+# Muda quando o layout do PDF muda, para não servir relatórios no formato antigo.
+VERSAO_LAYOUT = 1
+
+
+def resumo_sessoes(sessoes):
+    """Hash do conteúdo das sessões (na ordem em que estão)."""
+    conteudo = json.dumps(sessoes, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def periodo_encerrado(data_fim, agora=None):
+    return data_fim < (agora or datetime.now())
+
+
+class CachePdf:
+    """PDFs renderizados em ``diretorio`` (``<chave>.pdf``), com descarte LRU por tamanho."""
+
+    def __init__(self, diretorio, limite_bytes=LIMITE_PADRAO_BYTES, repositorio=None):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        self.repositorio = repositorio
+        # (projeto, inicio, fim, etiquetas) -> (geração do projeto, hash das sessões)
+        self._resumos = {}
+        self.acertos = 0
+        self.falhas = 0
+
+    def _resumo_projeto(self, projeto, data_inicio, data_fim, sessoes, tags=()):
+        if self.repositorio is None:
+            return resumo_sessoes(sessoes)
+        geracao = self.repositorio.geracao_de(projeto)
+        memorizado = self._resumos.get((projeto, data_inicio, data_fim, tags))
+        if memorizado is not None and memorizado[0] == geracao:
+            return memorizado[1]
+        resumo = resumo_sessoes(sessoes)
+        self._resumos[(projeto, data_inicio, data_fim, tags)] = (geracao, resumo)
+        return resumo
+
+    def chave(self, data_inicio, data_fim, projetos, sessoes_periodo, agrupamento=None, tags=None):
+        """
+        Chave do relatório: período, projetos pedidos, agrupamento, etiquetas filtradas
+        e hash das sessões de cada projeto.
+        """
+        tags = tuple(sorted(tags or ()))
+        partes = {
+            "versao": VERSAO_LAYOUT,
+            "periodo": [data_inicio.isoformat(), data_fim.isoformat()],
+            "projetos": sorted(projetos) if projetos is not None else None,
+            "agrupamento": agrupamento,
+            "sessoes": {
+                projeto: self._resumo_projeto(projeto, data_inicio, data_fim, dados["sessoes"], tags)
+                for projeto, dados in sorted(sessoes_periodo.items())
+            },
+        }
+        if tags:
+            partes["tags"] = list(tags)
+        return hashlib.sha256(json.dumps(partes, sort_keys=True).encode("utf-8")).hexdigest()[:40]
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave + ".pdf")
+
+    def copiar(self, chave, destino):
+        """Copia o PDF em cache para ``destino``. Retorna False se não estiver em cache."""
+        caminho = self._caminho(chave)
+        try:
+            shutil.copyfile(caminho, destino)
+            os.utime(caminho)
+        except FileNotFoundError:
+            self.falhas += 1
+            return False
+        self.acertos += 1
+        logger.debug("Relatório PDF servido do cache: %s", chave)
+        return True
+
+    def guardar(self, chave, origem):
+        """Guarda uma cópia de ``origem`` e descarta os PDFs menos usados acima do limite."""
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self._caminho(chave)
+        temporario = caminho + ".tmp"
+        try:
+            shutil.copyfile(origem, temporario)
+            os.replace(temporario, caminho)
+        except OSError as e:
+            logger.error("Erro ao guardar relatório no cache: %s", e)
+            return
+        self.podar()
+
+    def podar(self):
+        """Remove os PDFs usados há mais tempo até o total caber no limite. Retorna quantos saíram."""
+        try:
+            nomes = [n for n in os.listdir(self.diretorio) if n.endswith(".pdf")]
+        except FileNotFoundError:
+            return 0
+        arquivos = []
+        for nome in nomes:
+            caminho = os.path.join(self.diretorio, nome)
+            try:
+                estado = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            arquivos.append((estado.st_mtime_ns, estado.st_size, caminho))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        removidos = 0
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.limite_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+            removidos += 1
+        if removidos:
+            logger.debug("Cache de PDF: %d relatório(s) descartado(s)", removidos)
+        return removidos
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Cache LRU dos dados de relatório (sessões filtradas e ordenadas, agregações).
+
+A chave combina o tipo de consulta, o período, a tupla ordenada de projetos e
+a geração do histórico (``RepositorioHistorico.geracao``). Qualquer alteração
+no histórico muda a geração, então um resultado calculado antes dela nunca é
+devolvido; as entradas de gerações anteriores são descartadas na próxima consulta.
+
+Relatórios filtrados por etiquetas (``tags``) partem do índice de busca
+(``busca.IndiceSessoes``) em vez de percorrer as sessões do período; as
+etiquetas entram na chave.
+
+Os resultados são compartilhados entre quem consulta e não devem ser alterados.
+"""
+
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+from .agregacao import ColunasSessoes, agregar, agregar_colunas
+from .busca import IndiceSessoes, normalizar_tags
+from .historico import (
+    CHAVE_AGREGADOS,
+    calcular_total_sessoes,
+    iterar_agregados_periodo,
+    iterar_sessoes_periodo,
+)
+
+logger = logging.getLogger(__name__)
+
+CAPACIDADE_PADRAO = 32
+SESSOES_POR_ETAPA = 2000
+
+
+class CacheLRU:
+    """Mapeamento de tamanho limitado que descarta o item usado há mais tempo."""
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave):
+        try:
+            valor = self._itens[chave]
+        except KeyError:
+            self.falhas += 1
+            return None
+        self._itens.move_to_end(chave)
+        self.acertos += 1
+        return valor
+
+    def armazenar(self, chave, valor):
+        self._itens[chave] = valor
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+
+    def limpar(self):
+        self._itens.clear()
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def __len__(self):
+        return len(self._itens)
+
+
+def calcular_sessoes_periodo(historico, data_inicio, data_fim, projetos=None):
+    """
+    Como ``filtrar_sessoes_por_periodo``, com as sessões de cada projeto já
+    ordenadas pela entrada: {projeto: {"sessoes": [...], "total_segundos": n}}.
+    """
+    return _montar_sessoes_periodo(iterar_sessoes_periodo(historico, data_inicio, data_fim, projetos))
+
+
+def _montar_sessoes_periodo(pares):
+    sessoes_periodo = {}
+    for projeto, sessao in pares:
+        dados = sessoes_periodo.get(projeto)
+        if dados is None:
+            dados = sessoes_periodo[projeto] = {"sessoes": [], "total_segundos": 0}
+        dados["sessoes"].append(sessao)
+    for dados in sessoes_periodo.values():
+        dados["sessoes"].sort(key=lambda x: x["data"])
+        dados["total_segundos"] = calcular_total_sessoes(dados["sessoes"])
+    return sessoes_periodo
+
+
+class RelatoriosEmCache:
+    """Consultas de relatório sobre um RepositorioHistorico, memorizadas por geração."""
+
+    def __init__(self, repositorio, capacidade=CAPACIDADE_PADRAO, indice=None):
+        self.repositorio = repositorio
+        self.cache = CacheLRU(capacidade)
+        self._geracao = repositorio.geracao
+        # IndiceSessoes para os filtros por etiqueta; criado na primeira consulta que precisar.
+        self.indice = indice
+
+    def chave(self, tipo, data_inicio, data_fim, projetos=None, *extra):
+        if projetos is None:
+            projetos = self.repositorio.dados.keys()
+        return (tipo, data_inicio, data_fim, tuple(sorted(projetos))) + extra + (self.repositorio.geracao,)
+
+    def _validar_geracao(self):
+        if self._geracao != self.repositorio.geracao:
+            self.cache.limpar()
+            self._geracao = self.repositorio.geracao
+
+    def obter(self, chave):
+        self._validar_geracao()
+        return self.cache.obter(chave)
+
+    def armazenar(self, chave, valor):
+        self._validar_geracao()
+        if chave[-1] == self._geracao:
+            self.cache.armazenar(chave, valor)
+
+    def _pares_com_tags(self, data_inicio, data_fim, projetos, tags):
+        if self.indice is None:
+            self.indice = IndiceSessoes(self.repositorio)
+        return self.indice.buscar_tags(tags, projetos, data_inicio, data_fim)
+
+    def sessoes_periodo(self, data_inicio, data_fim, projetos=None, tags=None):
+        """Sessões do período por projeto; com ``tags``, só as que têm todas elas."""
+        tags = tuple(normalizar_tags(tags))
+        chave = self.chave("sessoes", data_inicio, data_fim, projetos, *((tags,) if tags else ()))
+        resultado = self.obter(chave)
+        if resultado is None:
+            if tags:
+                resultado = _montar_sessoes_periodo(self._pares_com_tags(data_inicio, data_fim, chave[3], tags))
+            else:
+                ativos = set(self.repositorio.projetos_desde(data_inicio.date()))
+                resultado = calcular_sessoes_periodo(
+                    self.repositorio.dados, data_inicio, data_fim, [p for p in chave[3] if p in ativos]
+                )
+            self.armazenar(chave, resultado)
+        return resultado
+
+    def agregacao(self, data_inicio, data_fim, agrupamento, projetos=None, tags=None):
+        tags = tuple(normalizar_tags(tags))
+        chave = self.chave("agregacao", data_inicio, data_fim, projetos, agrupamento, *((tags,) if tags else ()))
+        resultado = self.obter(chave)
+        if resultado is None:
+            if tags:
+                colunas = ColunasSessoes.de_pares(
+                    [p for p in chave[3] if p in self.repositorio.dados],
+                    self._pares_com_tags(data_inicio, data_fim, chave[3], tags),
+                )
+                resultado = agregar_colunas(colunas, agrupamento)
+            else:
+                resultado = agregar(self.repositorio.dados, data_inicio, data_fim, agrupamento, chave[3])
+            self.armazenar(chave, resultado)
+        return resultado
+
+    def etapas_precalculo(self, data_inicio, data_fim, projetos=None, agrupamentos=()):
+        """
+        Gerador que calcula e guarda no cache as sessões do período (e as agregações
+        pedidas) em pequenas etapas: cede o controle a cada SESSOES_POR_ETAPA sessões
+        percorridas. Se o histórico mudar entre etapas, abandona o cálculo.
+        """
+        geracao = self.repositorio.geracao
+        historico = self.repositorio.dados
+        chave = self.chave("sessoes", data_inicio, data_fim, projetos)
+        projetos = chave[3]
+        sessoes_periodo = self.obter(chave)
+        agrupamentos = [
+            a for a in agrupamentos
+            if self.chave("agregacao", data_inicio, data_fim, projetos, a) not in self.cache
+        ]
+        pares = []
+        if sessoes_periodo is None or agrupamentos:
+            percorridas = 0
+            # Projetos sem tempo a partir do início do período não têm o que entrar (nem são lidos).
+            ativos = set(self.repositorio.projetos_desde(data_inicio.date()))
+            for projeto in projetos:
+                if projeto not in ativos:
+                    continue
+                dados = historico[projeto]
+                for sessao in dados.get("sessoes", []):
+                    if data_inicio <= datetime.fromisoformat(sessao["data"]) <= data_fim:
+                        pares.append((projeto, sessao))
+                    percorridas += 1
+                    if percorridas % SESSOES_POR_ETAPA == 0:
+                        yield
+                        if self.repositorio.geracao != geracao:
+                            return
+                if CHAVE_AGREGADOS in dados:
+                    pares.extend(
+                        (projeto, sessao) for sessao in iterar_agregados_periodo(dados, data_inicio, data_fim)
+                    )
+        if sessoes_periodo is None:
+            self.armazenar(chave, _montar_sessoes_periodo(pares))
+            yield
+            if self.repositorio.geracao != geracao:
+                return
+        colunas = None
+        for agrupamento in agrupamentos:
+            chave_agregacao = self.chave("agregacao", data_inicio, data_fim, projetos, agrupamento)
+            if colunas is None:
+                colunas = ColunasSessoes.de_pares([p for p in projetos if p in historico], pares)
+            self.armazenar(chave_agregacao, agregar_colunas(colunas, agrupamento))
+            yield
+            if self.repositorio.geracao != geracao:
+                return
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Teste de carga: N usuários virtuais batendo ponto, editando sessões e abrindo
+relatórios contra a camada de armazenamento (no próprio processo) ou contra a
+API local (``horas-trabalhadas servir``).
+
+Cada usuário alterna entrada, pausa, consulta de totais, saída e, com certa
+probabilidade, edição de uma sessão e relatório do período; as pausas seguem
+uma distribuição exponencial com média ``pausa``. Ao final são informados a
+vazão, as latências p50/p95/p99 por operação e a consistência dos totais
+(``total_segundos`` igual à soma das sessões, o mesmo invariante mantido por
+``RepositorioHistorico.recalcular_total``).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlsplit
+
+from .api import ErroRequisicao, ServicoPonto
+from .cache_relatorios import RelatoriosEmCache
+from .historico import (
+    NOME_ARQUIVO_HISTORICO,
+    NOME_ARQUIVO_SESSAO_ABERTA,
+    RepositorioFragmentado,
+    RepositorioHistorico,
+    abrir_repositorio,
+    verificar_totais,
+)
+from .ponto import ControlePonto
+
+logger = logging.getLogger(__name__)
+
+PROJETOS_POR_USUARIO = 3
+PROBABILIDADE_EDICAO = 0.2
+PROBABILIDADE_RELATORIO = 0.3
+
+
+class Estatisticas:
+    """Latências (s) e erros por operação."""
+
+    def __init__(self):
+        self.latencias = {}
+        self.erros = {}
+        self.inicio = time.perf_counter()
+        self.fim = None
+
+    def registrar(self, operacao, segundos):
+        self.latencias.setdefault(operacao, []).append(segundos)
+
+    def registrar_erro(self, operacao, mensagem):
+        self.erros[operacao] = self.erros.get(operacao, 0) + 1
+        logger.debug("carga: erro em %s: %s", operacao, mensagem)
+
+    @staticmethod
+    def _percentil(ordenadas, p):
+        if not ordenadas:
+            return 0.0
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100.0))]
+
+    def resumo(self):
+        duracao = (self.fim or time.perf_counter()) - self.inicio
+        operacoes = {}
+        for operacao in sorted(set(self.latencias) | set(self.erros)):
+            ordenadas = sorted(self.latencias.get(operacao, []))
+            operacoes[operacao] = {
+                "quantidade": len(ordenadas),
+                "erros": self.erros.get(operacao, 0),
+                "por_segundo": len(ordenadas) / duracao if duracao else 0.0,
+                "p50_ms": self._percentil(ordenadas, 50) * 1000,
+                "p95_ms": self._percentil(ordenadas, 95) * 1000,
+                "p99_ms": self._percentil(ordenadas, 99) * 1000,
+            }
+        total = sum(len(v) for v in self.latencias.values())
+        return {
+            "duracao_segundos": duracao,
+            "operacoes_total": total,
+            "operacoes_por_segundo": total / duracao if duracao else 0.0,
+            "erros_total": sum(self.erros.values()),
+            "operacoes": operacoes,
+        }
+
+
+class AlvoRepositorio:
+    """Operações direto no armazenamento (mesmo ServicoPonto da API), num diretório de dados."""
+
+    descricao = "armazenamento local"
+    edita_sessoes = True
+
+    def __init__(self, diretorio, intervalo_gravacao=1.0, fragmentado=False):
+        self.diretorio = diretorio
+        if fragmentado:
+            self.repositorio = RepositorioFragmentado(diretorio)
+            self.descricao = "armazenamento local (um arquivo por projeto)"
+        else:
+            self.repositorio = RepositorioHistorico(os.path.join(diretorio, NOME_ARQUIVO_HISTORICO))
+        self.repositorio.carregar()
+        self.servico = ServicoPonto(
+            self.repositorio,
+            ControlePonto(self.repositorio, os.path.join(diretorio, NOME_ARQUIVO_SESSAO_ABERTA)),
+            RelatoriosEmCache(self.repositorio),
+        )
+        self.intervalo_gravacao = intervalo_gravacao
+        self.sessoes_esperadas = {}
+
+    async def abrir(self):
+        return None
+
+    async def fechar(self, conexao):
+        pass
+
+    async def entrada(self, conexao, projeto):
+        return self.servico.entrada(projeto)
+
+    async def saida(self, conexao, projeto):
+        sessao = self.servico.saida(projeto)
+        self.sessoes_esperadas[projeto] = self.sessoes_esperadas.get(projeto, 0) + 1
+        return sessao
+
+    async def totais(self, conexao, projeto):
+        return self.servico.totais(projeto)
+
+    async def relatorio(self, conexao, data_inicio, data_fim, projetos):
+        return self.servico.relatorio(data_inicio, data_fim, projetos, "dia")
+
+    async def editar(self, conexao, projeto, rng):
+        sessoes = self.repositorio.dados.get(projeto, {}).get("sessoes")
+        if not sessoes:
+            return False
+        indice = rng.randrange(len(sessoes))
+        sessao = dict(sessoes[indice])
+        sessao["duracao_segundos"] = max(1.0, sessao["duracao_segundos"] + rng.uniform(-30, 30))
+        sessao["data_saida"] = (
+            datetime.fromisoformat(sessao["data"]) + timedelta(seconds=sessao["duracao_segundos"])
+        ).isoformat()
+        self.repositorio.substituir_sessao(projeto, indice, sessao)
+        self.servico.alteracoes_pendentes += 1
+        return True
+
+    async def laco_gravacao(self, estatisticas, fim):
+        while time.perf_counter() < fim:
+            await asyncio.sleep(self.intervalo_gravacao)
+            inicio = time.perf_counter()
+            if self.servico.salvar_pendente():
+                estatisticas.registrar("salvar", time.perf_counter() - inicio)
+
+    def verificar(self):
+        """Grava, relê do disco e confere totais e quantidade de sessões."""
+        self.servico.salvar_pendente()
+        relido = abrir_repositorio(self.diretorio)
+        relido.carregar()
+        problemas = [
+            f"{projeto}: total {total:.3f} != soma das sessões {soma:.3f}"
+            for projeto, total, soma in verificar_totais(relido.dados)
+        ]
+        for projeto, esperadas in sorted(self.sessoes_esperadas.items()):
+            gravadas = len(relido.dados.get(projeto, {}).get("sessoes", []))
+            if gravadas != esperadas:
+                problemas.append(f"{projeto}: {gravadas} sessão(ões) gravada(s), {esperadas} esperada(s)")
+        return problemas
+
+
+class AlvoApi:
+    """Operações pela API HTTP local; uma conexão keep-alive por usuário virtual (a API não edita sessões)."""
+
+    edita_sessoes = False
+
+    def __init__(self, url):
+        partes = urlsplit(url if "//" in url else f"http://{url}")
+        self.endereco = partes.hostname or "127.0.0.1"
+        self.porta = partes.port or 8765
+        self.descricao = f"API em {self.endereco}:{self.porta}"
+        self.sessoes_esperadas = {}
+        self.segundos_esperados = {}
+
+    async def abrir(self):
+        return await asyncio.open_connection(self.endereco, self.porta)
+
+    async def fechar(self, conexao):
+        _, escritor = conexao
+        escritor.close()
+
+    async def _requisitar(self, conexao, metodo, caminho, dados=None):
+        leitor, escritor = conexao
+        corpo = json.dumps(dados).encode("utf-8") if dados is not None else b""
+        escritor.write(
+            f"{metodo} {caminho} HTTP/1.1\r\nHost: {self.endereco}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(corpo)}\r\n\r\n".encode("latin-1")
+            + corpo
+        )
+        await escritor.drain()
+        status = int((await leitor.readline()).split()[1])
+        tamanho = 0
+        while True:
+            linha = await leitor.readline()
+            if linha in (b"\r\n", b"\n", b""):
+                break
+            nome, _, valor = linha.decode("latin-1").partition(":")
+            if nome.strip().lower() == "content-length":
+                tamanho = int(valor)
+        resposta = json.loads(await leitor.readexactly(tamanho)) if tamanho else None
+        if status >= 400:
+            raise ErroRequisicao(status, (resposta or {}).get("erro", ""))
+        return resposta
+
+    async def entrada(self, conexao, projeto):
+        return await self._requisitar(conexao, "POST", "/entrada", {"projeto": projeto})
+
+    async def saida(self, conexao, projeto):
+        sessao = await self._requisitar(conexao, "POST", "/saida", {"projeto": projeto})
+        self.sessoes_esperadas[projeto] = self.sessoes_esperadas.get(projeto, 0) + 1
+        self.segundos_esperados[projeto] = self.segundos_esperados.get(projeto, 0.0) + sessao["duracao_segundos"]
+        return sessao
+
+    async def totais(self, conexao, projeto):
+        return await self._requisitar(conexao, "GET", f"/totais?projeto={quote(projeto)}")
+
+    async def relatorio(self, conexao, data_inicio, data_fim, projetos):
+        consulta = f"de={data_inicio:%Y-%m-%d}&ate={data_fim:%Y-%m-%d}&agrupamento=dia"
+        consulta += "".join(f"&projeto={quote(p)}" for p in projetos)
+        return await self._requisitar(conexao, "GET", f"/relatorio?{consulta}")
+
+    async def laco_gravacao(self, estatisticas, fim):
+        pass
+
+    async def verificar_async(self):
+        """Compara, por projeto, sessões e segundos devolvidos pelas saídas com os totais da API."""
+        conexao = await self.abrir()
+        problemas = []
+        try:
+            for projeto, esperadas in sorted(self.sessoes_esperadas.items()):
+                totais = await self.totais(conexao, projeto)
+                if totais["sessoes"] < esperadas:
+                    problemas.append(f"{projeto}: {totais['sessoes']} sessão(ões) na API, {esperadas} esperada(s)")
+                esperado = self.segundos_esperados[projeto]
+                if totais["sessoes"] == esperadas and abs(totais["total_segundos"] - esperado) > 1e-6 * max(1.0, esperado):
+                    problemas.append(
+                        f"{projeto}: total {totais['total_segundos']:.3f} != soma das saídas {esperado:.3f}"
+                    )
+        finally:
+            await self.fechar(conexao)
+        return problemas
+
+
+async def _medir(estatisticas, operacao, coro):
+    inicio = time.perf_counter()
+    try:
+        resultado = await coro
+    except ErroRequisicao as e:
+        estatisticas.registrar_erro(operacao, e.mensagem)
+        return None
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        estatisticas.registrar_erro(operacao, str(e))
+        return None
+    estatisticas.registrar(operacao, time.perf_counter() - inicio)
+    return resultado
+
+
+async def _usuario(numero, alvo, estatisticas, fim, pausa, semente):
+    rng = random.Random(semente + numero)
+    projetos = [f"u{numero:03d}/Projeto {k}" for k in range(1, PROJETOS_POR_USUARIO + 1)]
+    conexao = await alvo.abrir()
+    # Usuários não começam todos no mesmo instante.
+    await asyncio.sleep(rng.uniform(0, pausa))
+    try:
+        while time.perf_counter() < fim:
+            projeto = rng.choice(projetos)
+            if await _medir(estatisticas, "entrada", alvo.entrada(conexao, projeto)) is None:
+                await asyncio.sleep(rng.expovariate(1.0 / pausa))
+                continue
+            await asyncio.sleep(rng.expovariate(1.0 / pausa))
+            await _medir(estatisticas, "totais", alvo.totais(conexao, projeto))
+            await asyncio.sleep(rng.expovariate(1.0 / pausa))
+            await _medir(estatisticas, "saida", alvo.saida(conexao, projeto))
+            if alvo.edita_sessoes and rng.random() < PROBABILIDADE_EDICAO:
+                await _medir(estatisticas, "editar", alvo.editar(conexao, projeto, rng))
+            if rng.random() < PROBABILIDADE_RELATORIO:
+                hoje = datetime.now()
+                await _medir(
+                    estatisticas, "relatorio",
+                    alvo.relatorio(conexao, hoje - timedelta(days=30), hoje, projetos),
+                )
+            await asyncio.sleep(rng.expovariate(1.0 / pausa))
+    finally:
+        await alvo.fechar(conexao)
+
+
+async def executar_carga(alvo, usuarios, duracao, pausa=0.5, semente=0):
+    """Roda os usuários virtuais por ``duracao`` segundos. Retorna (resumo, problemas de consistência)."""
+    estatisticas = Estatisticas()
+    fim = time.perf_counter() + duracao
+    await asyncio.gather(
+        alvo.laco_gravacao(estatisticas, fim),
+        *(_usuario(i, alvo, estatisticas, fim, pausa, semente) for i in range(usuarios)),
+    )
+    estatisticas.fim = time.perf_counter()
+    if isinstance(alvo, AlvoApi):
+        problemas = await alvo.verificar_async()
+    else:
+        problemas = alvo.verificar()
+    return estatisticas.resumo(), problemas
+
+
+def formatar_resumo(resumo, problemas, descricao, usuarios):
+    linhas = [
+        f"Alvo: {descricao} — {usuarios} usuário(s), {resumo['duracao_segundos']:.1f} s",
+        f"{resumo['operacoes_total']} operação(ões), {resumo['operacoes_por_segundo']:.1f}/s, "
+        f"{resumo['erros_total']} erro(s)",
+        "",
+        f"{'operação':<10} {'qtd':>8} {'/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'erros':>6}",
+    ]
+    for operacao, dados in resumo["operacoes"].items():
+        linhas.append(
+            f"{operacao:<10} {dados['quantidade']:>8} {dados['por_segundo']:>8.1f} "
+            f"{dados['p50_ms']:>9.2f} {dados['p95_ms']:>9.2f} {dados['p99_ms']:>9.2f} {dados['erros']:>6}"
+        )
+    linhas.append("")
+    if problemas:
+        linhas.append(f"Consistência: FALHOU ({len(problemas)} problema(s))")
+        linhas.extend(f"  {p}" for p in problemas[:20])
+    else:
+        linhas.append("Consistência: OK (totais iguais à soma das sessões)")
+    return "\n".join(linhas)
+
+
+def criar_alvo(api=None, diretorio=None, intervalo_gravacao=1.0, fragmentado=False):
+    """Alvo da API (se ``api``) ou do armazenamento num diretório (temporário se não informado)."""
+    if api:
+        return AlvoApi(api)
+    return AlvoRepositorio(diretorio or tempfile.mkdtemp(prefix="horas_carga_"), intervalo_gravacao, fragmentado)
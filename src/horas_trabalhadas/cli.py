@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+"""
+Comandos de linha de comando (modo sem interface gráfica).
+
+Uso: horas-trabalhadas <comando> [opções]. Sem comando, a janela Tk é aberta.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from . import instrumentacao
+from .backup import MANTER_DIARIOS, MANTER_MENSAIS, MANTER_ULTIMOS, Backup, backup_habilitado
+from .historico import ErroIntegridade, abrir_repositorio, localizar_diretorio_dados
+from .integridade import carregar_com_recuperacao
+from .sincronizacao import VARIAVEL_DIRETORIO, Sincronizador, sincronizacao_configurada
+
+logger = logging.getLogger(__name__)
+
+
+def _abrir_repositorio(args):
+    data_dir = args.dados or localizar_diretorio_dados()
+    repositorio = abrir_repositorio(data_dir)
+    resultado = carregar_com_recuperacao(repositorio)
+    if resultado.houve_problema:
+        print(f"Atenção — integridade do histórico:\n{resultado.resumo()}", file=sys.stderr)
+    if sincronizacao_configurada(data_dir):
+        # Registra no diário de sincronização as alterações feitas por este comando.
+        Sincronizador(repositorio, data_dir)
+    if backup_habilitado():
+        Backup(repositorio)
+    return repositorio
+
+
+def _cmd_importar(args):
+    from .importacao import importar_arquivo, importar_fluxo
+
+    repositorio = _abrir_repositorio(args)
+    if args.arquivo == "-":
+        formato = args.formato or "jsonl"
+        resultado = importar_fluxo(
+            repositorio, sys.stdin, formato, projeto_padrao=args.projeto,
+            ignorar_duplicadas=not args.permitir_duplicadas, tamanho_lote=args.lote,
+        )
+    else:
+        resultado = importar_arquivo(
+            repositorio, args.arquivo, args.formato, projeto_padrao=args.projeto,
+            ignorar_duplicadas=not args.permitir_duplicadas, tamanho_lote=args.lote,
+        )
+    for linha, mensagem in resultado.erros:
+        print(f"linha {linha}: {mensagem}", file=sys.stderr)
+    if resultado.rejeitadas > len(resultado.erros):
+        print(f"... e mais {resultado.rejeitadas - len(resultado.erros)} erro(s)", file=sys.stderr)
+    if resultado.importadas and not args.simular:
+        repositorio.salvar()
+    print(resultado.resumo())
+    return 0 if not resultado.rejeitadas else 1
+
+
+def _parse_data(texto):
+    """Aceita DD/MM/AAAA ou AAAA-MM-DD (argparse type)."""
+    for formato in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"data inválida: {texto!r} (use DD/MM/AAAA ou AAAA-MM-DD)")
+
+
+def _periodo(args):
+    """Período inclusivo [de 00:00, ate 23:59:59.999999], como no relatório customizado."""
+    data_inicio = args.de.replace(hour=0, minute=0, second=0, microsecond=0) if args.de else None
+    data_fim = args.ate.replace(hour=23, minute=59, second=59, microsecond=999999) if args.ate else None
+    return data_inicio, data_fim
+
+
+def _cmd_exportar(args):
+    from .exportacao import exportar
+
+    repositorio = _abrir_repositorio(args)
+    data_inicio, data_fim = _periodo(args)
+    kwargs = dict(
+        tipo=args.tipo, formato=args.formato,
+        data_inicio=data_inicio, data_fim=data_fim, projetos=args.projeto,
+    )
+    try:
+        if args.saida == "-":
+            exportar(repositorio.dados, sys.stdout, **kwargs)
+            sys.stdout.flush()
+        else:
+            with open(args.saida, "w", encoding="utf-8", newline="") as f:
+                quantidade = exportar(repositorio.dados, f, **kwargs)
+            print(f"{quantidade} linha(s) exportada(s) para {args.saida}", file=sys.stderr)
+    except BrokenPipeError:
+        # Consumidor do pipe encerrou (ex.: | head); não é erro.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    return 0
+
+
+def _cmd_relatorio(args):
+    import time
+
+    from .busca import normalizar_tags
+    from .cache_pdf import NOME_DIRETORIO_CACHE, CachePdf, periodo_encerrado
+    from .cache_relatorios import RelatoriosEmCache
+    from .relatorio_pdf import REPORTLAB_AVAILABLE, exportar_relatorio_pdf
+
+    if not REPORTLAB_AVAILABLE:
+        print("Exportação PDF não disponível. Instale: pip install reportlab", file=sys.stderr)
+        return 1
+    repositorio = _abrir_repositorio(args)
+    data_inicio, data_fim = _periodo(args)
+    data_inicio, data_fim = data_inicio or datetime.min, data_fim or datetime.max
+    tags = normalizar_tags(args.tag)
+    relatorios = RelatoriosEmCache(repositorio)
+    sessoes_periodo = relatorios.sessoes_periodo(data_inicio, data_fim, args.projeto, tags)
+    if not sessoes_periodo:
+        print("Nenhuma sessão no período", file=sys.stderr)
+        return 1
+    if data_inicio == datetime.min:
+        data_inicio = min(datetime.fromisoformat(d["sessoes"][0]["data"]) for d in sessoes_periodo.values())
+    if data_fim == datetime.max:
+        data_fim = max(datetime.fromisoformat(d["sessoes"][-1]["data"]) for d in sessoes_periodo.values())
+    chave = None
+    if not args.sem_cache and periodo_encerrado(data_fim):
+        cache = CachePdf(os.path.join(os.path.dirname(repositorio.arquivo), NOME_DIRETORIO_CACHE))
+        chave = cache.chave(data_inicio, data_fim, args.projeto, sessoes_periodo, args.agrupamento, tags)
+        if cache.copiar(chave, args.saida):
+            print(f"PDF gerado: {args.saida} — copiado do cache (período encerrado, sessões inalteradas)",
+                  file=sys.stderr)
+            return 0
+    resumo = relatorios.agregacao(data_inicio, data_fim, args.agrupamento, args.projeto, tags) \
+        if args.agrupamento else None
+    inicio = time.perf_counter()
+    paginas = exportar_relatorio_pdf(sessoes_periodo, data_inicio, data_fim, args.saida, resumo, tags)
+    duracao = time.perf_counter() - inicio
+    if not paginas:
+        print("Falha ao gerar o PDF (veja o log)", file=sys.stderr)
+        return 1
+    print(f"PDF gerado: {args.saida} — {paginas} página(s) em {duracao:.2f} s "
+          f"({paginas / duracao:.1f} páginas/s)", file=sys.stderr)
+    if chave is not None:
+        cache.guardar(chave, args.saida)
+    return 0
+
+
+def _cmd_buscar(args):
+    from .busca import IndiceSessoes
+    from .relatorio_pdf import formatar_duracao
+
+    repositorio = _abrir_repositorio(args)
+    data_inicio, data_fim = _periodo(args)
+    resultado = IndiceSessoes(repositorio).buscar(args.consulta, args.projeto, data_inicio, data_fim)
+    total = 0.0
+    for projeto, sessao in resultado:
+        tags = " ".join("#" + tag for tag in sessao.get("tags", ()))
+        print("\t".join((projeto, sessao["data"][:16], formatar_duracao(sessao["duracao_segundos"]),
+                         tags, sessao.get("nota", ""))))
+        total += sessao["duracao_segundos"]
+    print(f"{len(resultado)} sessão(ões), total {formatar_duracao(total)}", file=sys.stderr)
+    return 0 if resultado else 1
+
+
+def _cmd_servir(args):
+    import asyncio
+
+    from .api import ServicoPonto, ServidorApi
+    from .cache_relatorios import RelatoriosEmCache
+    from .eventos import BarramentoEventos
+    from .historico import NOME_ARQUIVO_SESSAO_ABERTA
+    from .ponto import ControlePonto
+
+    repositorio = _abrir_repositorio(args)
+    data_dir = os.path.dirname(repositorio.arquivo)
+    eventos = BarramentoEventos()
+    eventos.carregar_plugins()
+    ponto = ControlePonto(repositorio, os.path.join(data_dir, NOME_ARQUIVO_SESSAO_ABERTA), eventos)
+    recuperadas = ponto.recuperar()
+    if recuperadas:
+        repositorio.salvar()
+        ponto.confirmar_gravadas()
+        for projeto, duracao in recuperadas:
+            print(f"sessão interrompida recuperada: {projeto} ({duracao:.0f} s)", file=sys.stderr)
+    servico = ServicoPonto(repositorio, ponto, RelatoriosEmCache(repositorio))
+    servidor = ServidorApi(
+        servico, endereco=args.endereco, porta=args.porta, intervalo_gravacao=args.intervalo_gravacao
+    )
+    try:
+        asyncio.run(servidor.servir())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        eventos.encerrar()
+    return 0
+
+
+def _cmd_carga(args):
+    import asyncio
+
+    from .carga import criar_alvo, executar_carga, formatar_resumo
+
+    alvo = criar_alvo(args.api, args.diretorio, args.intervalo_gravacao, args.fragmentado)
+    if not args.api:
+        print(f"Diretório de dados do teste: {alvo.diretorio}", file=sys.stderr)
+    resumo, problemas = asyncio.run(
+        executar_carga(alvo, args.usuarios, args.duracao, pausa=args.pausa, semente=args.semente)
+    )
+    print(formatar_resumo(resumo, problemas, alvo.descricao, args.usuarios))
+    return 1 if problemas else 0
+
+
+def _cmd_compactar(args):
+    from .retencao import NOME_ARQUIVO_MORTO, compactar_historico, data_corte
+
+    if args.manter_dias <= 0:
+        print("--manter-dias deve ser maior que zero", file=sys.stderr)
+        return 2
+    repositorio = _abrir_repositorio(args)
+    if args.simular:
+        antigas = repositorio.sessoes_anteriores(data_corte(args.manter_dias))
+        print(f"{len(antigas)} sessão(ões) seriam compactadas")
+        return 0
+    compactadas = compactar_historico(repositorio, args.manter_dias, arquivar=not args.sem_arquivo)
+    if compactadas:
+        repositorio.salvar()
+    destino = "" if args.sem_arquivo or not compactadas else f"; detalhes em {NOME_ARQUIVO_MORTO}"
+    print(f"{compactadas} sessão(ões) compactada(s) em totais diários{destino}")
+    return 0
+
+
+def _parse_data_hora(texto):
+    """Aceita as datas de _parse_data e também AAAA-MM-DDTHH:MM[:SS] (argparse type)."""
+    try:
+        return datetime.fromisoformat(texto)
+    except ValueError:
+        return _parse_data(texto).replace(hour=23, minute=59, second=59, microsecond=999999)
+
+
+def _cmd_backup(args):
+    from .backup import armazem_do_diretorio, localizar_instantaneo, podar, restaurar
+
+    data_dir = args.dados or localizar_diretorio_dados()
+    armazem = armazem_do_diretorio(data_dir)
+    if args.acao == "listar":
+        for nome in armazem.listar():
+            manifesto = armazem.ler_instantaneo(nome)
+            print(f"{nome}  {len(manifesto['projetos']):>4} projeto(s)  {manifesto.get('bytes_novos', 0):>10} byte(s) novos")
+        return 0
+    if args.acao == "criar":
+        repositorio = abrir_repositorio(data_dir)
+        repositorio.carregar()
+        nome, gravados = Backup(repositorio).criar()
+        print(f"Backup {nome} criado ({gravados} byte(s) novos)")
+        return 0
+    if args.acao == "podar":
+        removidos, objetos = podar(armazem, args.manter_ultimos, args.manter_diarios, args.manter_mensais)
+        print(f"{removidos} backup(s) e {objetos} objeto(s) removidos")
+        return 0
+    nome = args.nome or localizar_instantaneo(armazem, args.ate)
+    if nome is None or nome not in armazem.listar():
+        print("Backup não encontrado", file=sys.stderr)
+        return 1
+    repositorio = abrir_repositorio(data_dir)
+    try:
+        repositorio.carregar()
+    except ErroIntegridade as e:
+        # Histórico ilegível: não há estado atual a preservar; a restauração libera a gravação.
+        print(f"Histórico atual ilegível ({e}); restaurando sem backup prévio", file=sys.stderr)
+        restaurar(repositorio, armazem, nome)
+        print(f"Histórico restaurado do backup {nome}")
+        return 0
+    # O estado atual vira um backup antes de ser substituído, para a restauração poder ser desfeita.
+    atual, _ = Backup(repositorio).criar()
+    restaurar(repositorio, armazem, nome)
+    print(f"Histórico restaurado do backup {nome} (o estado anterior está no backup {atual})")
+    return 0
+
+
+def _cmd_verificar(args):
+    from .integridade import reparar, varrer
+
+    data_dir = args.dados or localizar_diretorio_dados()
+    repositorio = abrir_repositorio(data_dir)
+    if args.reparar:
+        resultado = carregar_com_recuperacao(repositorio)
+        if resultado.houve_problema:
+            print(resultado.resumo())
+    else:
+        repositorio.carregar()
+    if not args.completo:
+        # Sem --completo, o carregamento já conferiu o que mudou desde a última verificação.
+        problemas = sorted(getattr(repositorio, "corrompidos", {}).items())
+    else:
+        problemas = varrer(repositorio)
+    for projeto, motivo in problemas:
+        print(f"{projeto or 'histórico'}: {motivo}")
+    if problemas and args.reparar:
+        resultado = reparar(repositorio, problemas)
+        print(resultado.resumo())
+        return 1 if resultado.perdidos else 0
+    if not problemas:
+        print("Histórico íntegro")
+    return 1 if problemas else 0
+
+
+def _cmd_fragmentar(args):
+    from .historico import fragmentar_historico
+
+    data_dir = args.dados or localizar_diretorio_dados()
+    try:
+        projetos = fragmentar_historico(data_dir)
+    except (FileExistsError, FileNotFoundError) as e:
+        print(f"Nada a converter: {e}", file=sys.stderr)
+        return 1
+    print(f"Histórico convertido: {projetos} projeto(s) em arquivos separados; "
+          f"o arquivo único foi mantido como historico_horas.json.migrado")
+    return 0
+
+
+def _cmd_sincronizar(args):
+    compartilhado = args.compartilhado or os.environ.get(VARIAVEL_DIRETORIO)
+    if not compartilhado:
+        print(f"Informe --compartilhado ou defina {VARIAVEL_DIRETORIO}", file=sys.stderr)
+        return 2
+    data_dir = args.dados or localizar_diretorio_dados()
+    repositorio = abrir_repositorio(data_dir)
+    repositorio.carregar()
+    sincronizador = Sincronizador(repositorio, data_dir)
+    if backup_habilitado():
+        Backup(repositorio)
+    enviadas, recebidas = sincronizador.sincronizar(compartilhado)
+    if recebidas:
+        repositorio.salvar()
+    print(f"{enviadas} alteração(ões) enviada(s), {recebidas} recebida(s) "
+          f"(dispositivo {sincronizador.dispositivo})")
+    return 0
+
+
+def _cmd_equipe(args):
+    from .equipe import exportar_pdf_equipe, formatar_texto, gerar_relatorio_equipe, localizar_arquivos
+
+    arquivos = localizar_arquivos(args.origem)
+    if not arquivos:
+        print(f"Nenhum arquivo de histórico em {args.origem!r}", file=sys.stderr)
+        return 1
+    data_inicio, data_fim = _periodo(args)
+    relatorio = gerar_relatorio_equipe(
+        arquivos, data_inicio or datetime.min, data_fim or datetime.max,
+        agrupamento=args.agrupamento, projetos=args.projeto, processos=args.processos,
+    )
+    print(formatar_texto(relatorio))
+    for caminho, erro in relatorio.erros:
+        print(f"{caminho}: {erro}", file=sys.stderr)
+    if args.pdf:
+        if not exportar_pdf_equipe(relatorio, args.pdf):
+            print("Não foi possível gerar o PDF (reportlab instalado?)", file=sys.stderr)
+            return 1
+        print(f"PDF gerado: {args.pdf}", file=sys.stderr)
+    return 1 if relatorio.erros else 0
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="horas-trabalhadas",
+        description="Timer Tool — ponto e horas por projeto. Sem comando, abre a janela.",
+    )
+    parser.add_argument("--dados", metavar="DIR", help="diretório de dados (padrão: data/ do projeto)")
+    parser.add_argument("--log", metavar="NIVEL", help="nível do log (DEBUG, INFO, WARNING...)")
+    parser.add_argument("--metricas", metavar="ARQUIVO",
+                        help="grava medições de carga/gravação/filtro em JSON lines ('-' para stderr)")
+    sub = parser.add_subparsers(dest="comando")
+
+    p_imp = sub.add_parser("importar", help="importa sessões de CSV ou JSON lines")
+    p_imp.add_argument("arquivo", help="arquivo de entrada ('-' para stdin)")
+    p_imp.add_argument("--formato", choices=("csv", "jsonl"), help="padrão: pela extensão do arquivo")
+    p_imp.add_argument("--projeto", help="projeto usado quando a linha não informa um")
+    p_imp.add_argument("--lote", type=int, default=5000, help="linhas por lote (padrão: 5000)")
+    p_imp.add_argument("--permitir-duplicadas", action="store_true",
+                       help="não ignora sessões já existentes (mesmo projeto e entrada)")
+    p_imp.add_argument("--simular", action="store_true", help="valida e resume sem gravar")
+    p_imp.set_defaults(func=_cmd_importar)
+
+    p_exp = sub.add_parser("exportar", help="exporta sessões ou agregados em CSV/JSON lines")
+    p_exp.add_argument("--tipo", choices=("sessoes", "diario", "projetos"), default="sessoes",
+                       help="sessões, totais por projeto e dia, ou totais por projeto")
+    p_exp.add_argument("--formato", choices=("csv", "jsonl"), default="csv")
+    p_exp.add_argument("--de", type=_parse_data, help="data inicial (inclusive)")
+    p_exp.add_argument("--ate", type=_parse_data, help="data final (inclusive)")
+    p_exp.add_argument("--projeto", action="append", help="filtra por projeto (pode repetir)")
+    p_exp.add_argument("-o", "--saida", default="-", help="arquivo de saída ('-' para stdout, padrão)")
+    p_exp.set_defaults(func=_cmd_exportar)
+
+    p_rel = sub.add_parser("relatorio", help="gera o relatório de horas em PDF (mede páginas/s)")
+    p_rel.add_argument("--de", type=_parse_data, help="data inicial (inclusive)")
+    p_rel.add_argument("--ate", type=_parse_data, help="data final (inclusive)")
+    p_rel.add_argument("--projeto", action="append", help="filtra por projeto (pode repetir)")
+    p_rel.add_argument("--tag", action="append",
+                       help="só sessões com a etiqueta (pode repetir: todas precisam estar na sessão)")
+    p_rel.add_argument("--agrupamento", choices=("dia", "semana", "mes", "dia_semana", "projeto"), default="semana",
+                       help="resumo por faixa de tempo (padrão: semana)")
+    p_rel.add_argument("--sem-resumo", dest="agrupamento", action="store_const", const=None,
+                       help="omite o resumo por faixa")
+    p_rel.add_argument("-o", "--saida", required=True, help="arquivo PDF de saída")
+    p_rel.add_argument("--sem-cache", action="store_true",
+                       help="sempre renderiza (não usa nem grava o cache de períodos encerrados)")
+    p_rel.set_defaults(func=_cmd_relatorio)
+
+    p_bus = sub.add_parser("buscar", help="busca sessões por etiqueta (#tag) ou palavra da nota")
+    p_bus.add_argument("consulta", help="ex.: '#cliente-x reunião' (todas as palavras precisam aparecer)")
+    p_bus.add_argument("--de", type=_parse_data, help="data inicial (inclusive)")
+    p_bus.add_argument("--ate", type=_parse_data, help="data final (inclusive)")
+    p_bus.add_argument("--projeto", action="append", help="filtra por projeto (pode repetir)")
+    p_bus.set_defaults(func=_cmd_buscar)
+
+    p_srv = sub.add_parser("servir", help="serve a API JSON local de ponto e relatórios")
+    p_srv.add_argument("--endereco", default="127.0.0.1", help="endereço de escuta (padrão: 127.0.0.1)")
+    p_srv.add_argument("--porta", type=int, default=8765, help="porta (padrão: 8765)")
+    p_srv.add_argument("--intervalo-gravacao", type=float, default=1.0, metavar="SEG",
+                       help="grava o histórico em lote no máximo a cada SEG segundos (padrão: 1)")
+    p_srv.set_defaults(func=_cmd_servir)
+
+    p_eq = sub.add_parser("equipe", help="consolida os históricos de várias pessoas num relatório")
+    p_eq.add_argument("origem", help="diretório com os arquivos .json (recursivo) ou padrão glob")
+    p_eq.add_argument("--de", type=_parse_data, help="data inicial (inclusive)")
+    p_eq.add_argument("--ate", type=_parse_data, help="data final (inclusive)")
+    p_eq.add_argument("--projeto", action="append", help="filtra por projeto (pode repetir)")
+    p_eq.add_argument("--agrupamento", choices=("dia", "semana", "mes", "dia_semana", "projeto"), default="semana")
+    p_eq.add_argument("--processos", type=int, help="processos em paralelo (padrão: núcleos da máquina)")
+    p_eq.add_argument("--pdf", metavar="ARQUIVO", help="gera também o relatório em PDF")
+    p_eq.set_defaults(func=_cmd_equipe)
+
+    p_comp = sub.add_parser("compactar", help="compacta sessões antigas em totais diários por projeto")
+    p_comp.add_argument("--manter-dias", type=int, required=True, metavar="N",
+                        help="mantém detalhadas as sessões dos últimos N dias")
+    p_comp.add_argument("--sem-arquivo", action="store_true",
+                        help="não guarda as sessões detalhadas no arquivo compactado (.jsonl.xz)")
+    p_comp.add_argument("--simular", action="store_true", help="só informa quantas sessões seriam compactadas")
+    p_comp.set_defaults(func=_cmd_compactar)
+
+    p_bkp = sub.add_parser("backup", help="lista, cria, restaura ou poda os backups do histórico")
+    p_bkp.add_argument("acao", choices=("listar", "criar", "restaurar", "podar"))
+    p_bkp.add_argument("nome", nargs="?", help="backup a restaurar (padrão: o mais recente, ou o último até --ate)")
+    p_bkp.add_argument("--ate", type=_parse_data_hora, metavar="DATA",
+                       help="restaura o último backup até DATA (DD/MM/AAAA ou AAAA-MM-DDTHH:MM)")
+    p_bkp.add_argument("--manter-ultimos", type=int, default=MANTER_ULTIMOS, metavar="N")
+    p_bkp.add_argument("--manter-diarios", type=int, default=MANTER_DIARIOS, metavar="N")
+    p_bkp.add_argument("--manter-mensais", type=int, default=MANTER_MENSAIS, metavar="N")
+    p_bkp.set_defaults(func=_cmd_backup)
+
+    p_verif = sub.add_parser("verificar", help="confere os checksums do histórico e recupera o que estiver corrompido")
+    p_verif.add_argument("--completo", action="store_true", help="relê e confere todos os arquivos, não só os alterados")
+    p_verif.add_argument("--reparar", action="store_true", help="recupera do backup ou da versão anterior o que falhar")
+    p_verif.set_defaults(func=_cmd_verificar)
+
+    p_frag = sub.add_parser("fragmentar", help="converte o histórico para um arquivo por projeto")
+    p_frag.set_defaults(func=_cmd_fragmentar)
+
+    p_sinc = sub.add_parser("sincronizar", help="troca alterações com outras máquinas por um diretório compartilhado")
+    p_sinc.add_argument("--compartilhado", metavar="DIR",
+                        help=f"diretório compartilhado entre as máquinas (padrão: ${VARIAVEL_DIRETORIO})")
+    p_sinc.set_defaults(func=_cmd_sincronizar)
+
+    p_carga = sub.add_parser("carga", help="teste de carga com usuários virtuais")
+    p_carga.add_argument("--usuarios", type=int, default=50, help="usuários virtuais (padrão: 50)")
+    p_carga.add_argument("--duracao", type=float, default=30.0, metavar="SEG", help="duração (padrão: 30 s)")
+    p_carga.add_argument("--pausa", type=float, default=0.5, metavar="SEG",
+                         help="pausa média entre ações de cada usuário (padrão: 0,5 s)")
+    p_carga.add_argument("--api", metavar="URL", help="usa a API local (ex.: http://127.0.0.1:8765) em vez do armazenamento")
+    p_carga.add_argument("--diretorio", metavar="DIR",
+                         help="diretório de dados do teste no armazenamento (padrão: temporário; não usa --dados)")
+    p_carga.add_argument("--intervalo-gravacao", type=float, default=1.0, metavar="SEG",
+                         help="gravação em lote no armazenamento (padrão: 1 s)")
+    p_carga.add_argument("--fragmentado", action="store_true",
+                         help="usa o histórico com um arquivo por projeto no armazenamento")
+    p_carga.add_argument("--semente", type=int, default=0, help="semente dos sorteios (padrão: 0)")
+    p_carga.set_defaults(func=_cmd_carga)
+    return parser
+
+
+def executar(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 2
+    if args.log:
+        logging.getLogger().setLevel(getattr(logging, args.log.upper(), logging.INFO))
+    if not args.metricas:
+        return _executar_comando(args)
+    saida = sys.stderr if args.metricas == "-" else open(args.metricas, "a", encoding="utf-8")
+    instrumentacao.ativar(saida)
+    try:
+        return _executar_comando(args)
+    finally:
+        instrumentacao.desativar()
+        if saida is not sys.stderr:
+            saida.close()
+
+
+def _executar_comando(args):
+    try:
+        return args.func(args)
+    except ErroIntegridade as e:
+        print(f"Histórico com problema de integridade: {e}", file=sys.stderr)
+        print("Use 'horas-trabalhadas backup restaurar' ou 'verificar --reparar'.", file=sys.stderr)
+        return 1
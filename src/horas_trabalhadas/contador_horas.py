@@ -8,25 +8,50 @@ Sistema para rastrear horas trabalhadas e registro de ponto (entrada/saída) em
 import logging
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import json
 import os
+import sys
+import threading
 from datetime import datetime, timedelta
 import time
 
+from .agregacao import AGRUPAMENTOS
+from .cache_pdf import NOME_DIRETORIO_CACHE, CachePdf, periodo_encerrado
+from .cache_relatorios import RelatoriosEmCache
+from . import api, instrumentacao, metricas_http
+from .agendador import Agendador
+from .diagnostico import MonitorLatencia, sonda_habilitada
+from .ponto import ControlePonto
+from .precalculo import PrecalculoOcioso
+from .relatorio_pdf import REPORTLAB_AVAILABLE
+from . import busca, eventos, integridade, mapa_calor, painel, relatorio_pdf, retencao
+from .backup import Backup, backup_habilitado
+from .sincronizacao import VARIAVEL_DIRETORIO, Sincronizador, sincronizacao_configurada
+from .historico import (
+    NOME_ARQUIVO_SESSAO_ABERTA,
+    ErroIntegridade,
+    abrir_repositorio,
+    calcular_total_sessoes,
+    iterar_sessoes_periodo,
+    localizar_diretorio_dados,
+    migrar_formato_historico,
+)
+
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 
-try:
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer, PageBreak
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
+# Nível do log quando a variável de ambiente não define outro (ex.: HORAS_TRABALHADAS_LOG=DEBUG).
+NIVEL_LOG_PADRAO = "INFO"
+
+# Folga após a virada do segundo, para o tick não cair um pouco antes dela.
+MARGEM_TICK_MS = 5
+# Manipuladores cuja duração entra nos histogramas do diagnóstico (preencher_tree é medido no local).
+HANDLERS_MONITORADOS = ("ponto_saida", "salvar_historico", "exibir_log", "exportar_relatorio_pdf")
+# Intervalo da sincronização periódica com o diretório compartilhado.
+INTERVALO_SINCRONIZACAO_SEG = 60
+# Retenção (HORAS_TRABALHADAS_RETENCAO_DIAS): primeira compactação após a abertura e repetição diária.
+ATRASO_RETENCAO_SEG = 30
+INTERVALO_RETENCAO_SEG = 24 * 3600
+# Linhas mostradas na janela de busca (o total e a contagem consideram todas as encontradas).
+LIMITE_RESULTADOS_BUSCA = 500
 
 
 class ContadorHoras:
@@ -35,51 +60,75 @@ class ContadorHoras:
     def __init__(self, root):
         self.root = root
         self.root.title("Timer Tool — Ponto e Horas")
-        self.root.geometry("830x720")
+        self.root.geometry("830x840")
         self.root.resizable(True, True)
-        self.root.minsize(830, 720)
+        self.root.minsize(830, 840)
 
         self.centralizar_janela()
         self._configurar_estilos()
 
-        current_file = os.path.abspath(__file__)
-        current_dir = os.path.dirname(current_file)
-        base_dir = current_dir
-        for _ in range(4):
-            if os.path.exists(os.path.join(base_dir, "setup.py")) or \
-               os.path.exists(os.path.join(base_dir, "pyproject.toml")):
-                break
-            parent = os.path.dirname(base_dir)
-            if parent == base_dir:
-                base_dir = os.path.expanduser("~")
-                break
-            base_dir = parent
-
-        data_dir = os.path.join(base_dir, "data")
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir, exist_ok=True)
-            logger.debug("Diretório data criado: %s", data_dir)
-        self.arquivo_historico = os.path.join(data_dir, "historico_horas.json")
-        self.arquivo_sessao_aberta = os.path.join(data_dir, "sessao_aberta.json")
+        data_dir = localizar_diretorio_dados()
+        self.repositorio = abrir_repositorio(data_dir)
+        self.arquivo_historico = self.repositorio.arquivo
+        self.arquivo_sessao_aberta = os.path.join(data_dir, NOME_ARQUIVO_SESSAO_ABERTA)
         self.intervalo_checkpoint_seg = 60
         logger.debug("Arquivo de histórico: %s", self.arquivo_historico)
 
-        self.tempo_inicio = None
-        self.tempo_decorrido = 0
-        self.contando = False
+        self.eventos = eventos.BarramentoEventos()
+        self.eventos.carregar_plugins()
+        self.ponto = ControlePonto(self.repositorio, self.arquivo_sessao_aberta, self.eventos)
+        self.agendador = Agendador(self.root)
         self.timer_id = None
         self.checkpoint_id = None
-        self.projeto_em_andamento = None
-
-        self.historico = self.carregar_historico()
-        logger.debug("Histórico carregado: %d projeto(s) -> %s", len(self.historico), list(self.historico.keys()))
+        self._total_hoje_cache = None
+        self.monitor = MonitorLatencia(self.root)
+        self.monitor.instrumentar(self, HANDLERS_MONITORADOS)
+
+        # Carrega direto no repositório: nada é marcado como alterado (no formato
+        # fragmentado, a primeira gravação só regrava os projetos que mudarem).
+        self.carregar_historico()
+        self.backup = Backup(self.repositorio) if backup_habilitado() else None
+        self.diretorio_sincronizacao = os.environ.get(VARIAVEL_DIRETORIO, "").strip() or None
+        self.sincronizador = None
+        if self.diretorio_sincronizacao or sincronizacao_configurada(data_dir):
+            self.sincronizador = Sincronizador(self.repositorio, data_dir)
+        self.indice_busca = busca.IndiceSessoes(self.repositorio)
+        self.relatorios = RelatoriosEmCache(self.repositorio, indice=self.indice_busca)
+        self.totais_diarios = mapa_calor.TotaisDiarios(self.repositorio)
+        self.painel = painel.PainelTotais(self.totais_diarios, self.ponto)
+        self.cache_pdf = CachePdf(os.path.join(data_dir, NOME_DIRETORIO_CACHE), repositorio=self.repositorio)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Histórico carregado: %d projeto(s) -> %s", len(self.historico), list(self.historico.keys()))
         self._sessao_recuperada_msg = None
         self.recuperar_sessao_aberta()
         self.criar_interface()
         self.atualizar_dropdown_projetos()
+        self.precalculo = PrecalculoOcioso(self.root, self.relatorios)
+        self.agendar_precalculo()
+        if sonda_habilitada():
+            self.monitor.iniciar()
+        self.sincronizacao_id = None
+        self.dias_retencao = retencao.dias_pelo_ambiente()
+        if self.dias_retencao:
+            self.agendador.agendar_em(ATRASO_RETENCAO_SEG, self.compactar_historico)
+        if self.diretorio_sincronizacao and self.sincronizador:
+            self.sincronizar()
+        self.api = None
+        porta_api = api.porta_pelo_ambiente()
+        if porta_api is not None:
+            self.iniciar_api(porta_api)
         if getattr(self, "_sessao_recuperada_msg", None):
             self.root.after(100, lambda: messagebox.showinfo("Sessão recuperada", self._sessao_recuperada_msg))
 
+    @property
+    def contando(self):
+        """True se há ao menos um timer em andamento."""
+        return bool(self.ponto.timers)
+
+    @property
+    def historico(self):
+        return self.repositorio.dados
+
     def _configurar_estilos(self):
         """Aplica estilos visuais à interface."""
         self.style = ttk.Style()
@@ -136,112 +185,70 @@ class ContadorHoras:
         self.root.geometry(f"{max(520, largura_janela)}x{max(620, altura_janela)}+{posicao_x}+{posicao_y}")
 
     def carregar_historico(self):
-        if os.path.exists(self.arquivo_historico):
-            logger.debug("Carregando histórico de %s", self.arquivo_historico)
-            try:
-                with open(self.arquivo_historico, "r", encoding="utf-8") as f:
-                    historico = json.load(f)
-                    migrado = self.migrar_formato_historico(historico)
-                    logger.debug("Histórico migrado: %s", list(migrado.keys()))
-                    return migrado
-            except Exception as e:
-                logger.exception("Erro ao carregar histórico: %s", e)
-                messagebox.showerror("Erro", f"Erro ao carregar histórico: {e}")
-                return {}
-        logger.debug("Arquivo de histórico não existe, iniciando com histórico vazio")
-        return {}
+        try:
+            resultado = integridade.carregar_com_recuperacao(self.repositorio)
+            migrado = self.repositorio.dados
+            if resultado.houve_problema:
+                messagebox.showwarning("Integridade do histórico", resultado.resumo())
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Histórico migrado: %s", list(migrado.keys()))
+            return migrado
+        except ErroIntegridade as e:
+            # O arquivo fica bloqueado para gravação: nada do que for feito agora o sobrescreve.
+            logger.error("Histórico corrompido e sem cópia para recuperar: %s", e)
+            messagebox.showerror(
+                "Erro",
+                f"O histórico está corrompido e não pôde ser recuperado:\n{e}\n\n"
+                "Ele não será sobrescrito. Restaure um backup (horas-trabalhadas backup restaurar).",
+            )
+            return self.repositorio.dados
+        except Exception as e:
+            logger.exception("Erro ao carregar histórico: %s", e)
+            messagebox.showerror("Erro", f"Erro ao carregar histórico: {e}")
+            return self.repositorio.dados
 
     def migrar_formato_historico(self, historico):
-        novo_historico = {}
-        for projeto, dados in historico.items():
-            if isinstance(dados, dict) and "sessoes" in dados:
-                novo_historico[projeto] = dados
-            elif isinstance(dados, (int, float)):
-                novo_historico[projeto] = {
-                    "total_segundos": dados,
-                    "sessoes": [],
-                }
-        return novo_historico
+        return migrar_formato_historico(historico)
 
     def salvar_sessao_aberta(self):
-        """Grava sessão em aberto em arquivo para recuperação em caso de encerramento abrupto."""
-        if not self.contando or not self.projeto_em_andamento or self.tempo_inicio is None:
-            return
-        try:
-            agora = time.time()
-            dados = {
-                "projeto": self.projeto_em_andamento,
-                "tempo_inicio": self.tempo_inicio,
-                "ultima_atualizacao": agora,
-            }
-            with open(self.arquivo_sessao_aberta, "w", encoding="utf-8") as f:
-                json.dump(dados, f, indent=2)
-            logger.debug("Checkpoint sessão aberta salvo: %s", self.projeto_em_andamento)
-        except Exception as e:
-            logger.exception("Erro ao salvar sessão aberta: %s", e)
+        """Grava as sessões em aberto em arquivo para recuperação em caso de encerramento abrupto."""
+        self.ponto.salvar_checkpoint()
 
     def agendar_checkpoint(self):
-        """Agenda o próximo salvamento periódico da sessão em aberto."""
+        """Agenda o salvamento periódico único que grava juntas todas as sessões em aberto."""
+        if self.checkpoint_id is not None or not self.contando:
+            return
+        self.checkpoint_id = self.agendador.agendar_em(
+            self.intervalo_checkpoint_seg, self._executar_checkpoint
+        )
+
+    def _executar_checkpoint(self):
+        self.checkpoint_id = None
         if not self.contando:
             return
         self.salvar_sessao_aberta()
-        self.checkpoint_id = self.root.after(
-            self.intervalo_checkpoint_seg * 1000, self.agendar_checkpoint
-        )
+        self.agendar_checkpoint()
 
     def recuperar_sessao_aberta(self):
-        """Se existir sessão aberta de execução anterior, incorpora ao histórico."""
-        if not os.path.exists(self.arquivo_sessao_aberta):
+        """Se existirem sessões abertas de execução anterior, incorpora ao histórico."""
+        recuperadas = self.ponto.recuperar()
+        if not recuperadas:
             return
-        try:
-            with open(self.arquivo_sessao_aberta, "r", encoding="utf-8") as f:
-                dados = json.load(f)
-            projeto = dados.get("projeto")
-            tempo_inicio = dados.get("tempo_inicio")
-            ultima_atualizacao = dados.get("ultima_atualizacao", tempo_inicio)
-            if not projeto or tempo_inicio is None:
-                os.remove(self.arquivo_sessao_aberta)
-                return
-            duracao_seg = ultima_atualizacao - tempo_inicio
-            if duracao_seg <= 0:
-                os.remove(self.arquivo_sessao_aberta)
-                return
-            data_inicio = datetime.fromtimestamp(tempo_inicio)
-            data_fim = datetime.fromtimestamp(ultima_atualizacao)
-            sessao = {
-                "data": data_inicio.isoformat(),
-                "data_saida": data_fim.isoformat(),
-                "duracao_segundos": duracao_seg,
-            }
-            if projeto in self.historico:
-                self.historico[projeto]["total_segundos"] += duracao_seg
-                self.historico[projeto]["sessoes"].append(sessao)
-            else:
-                self.historico[projeto] = {
-                    "total_segundos": duracao_seg,
-                    "sessoes": [sessao],
-                }
-            self.salvar_historico()
-            os.remove(self.arquivo_sessao_aberta)
-            logger.debug("Sessão recuperada: %s duracao=%.1fs", projeto, duracao_seg)
-            horas, resto = divmod(int(duracao_seg), 3600)
-            minutos, segs = divmod(resto, 60)
-            self._sessao_recuperada_msg = (
-                f"Sessão interrompida recuperada: '{projeto}' — "
-                f"{int(horas):02d}:{int(minutos):02d}:{int(segs):02d} (até o último registro)."
-            )
-        except Exception as e:
-            logger.exception("Erro ao recuperar sessão aberta: %s", e)
-            try:
-                os.remove(self.arquivo_sessao_aberta)
-            except OSError:
-                pass
+        self.salvar_historico()
+        self.ponto.salvar_checkpoint()
+        descricoes = "; ".join(
+            f"'{projeto}' — {self.formatar_duracao(duracao)}" for projeto, duracao in recuperadas
+        )
+        rotulo = "Sessão interrompida recuperada" if len(recuperadas) == 1 else "Sessões interrompidas recuperadas"
+        self._sessao_recuperada_msg = f"{rotulo}: {descricoes} (até o último registro)."
 
     def salvar_historico(self):
-        logger.debug("Salvando histórico em %s (projetos: %s)", self.arquivo_historico, list(self.historico.keys()))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Salvando histórico em %s (projetos: %s)", self.arquivo_historico, list(self.historico.keys()))
         try:
-            with open(self.arquivo_historico, "w", encoding="utf-8") as f:
-                json.dump(self.historico, f, indent=4, ensure_ascii=False)
+            encerradas = len(self.ponto.encerradas)
+            self.repositorio.salvar()
+            self.ponto.confirmar_gravadas(encerradas)
             logger.debug("Histórico salvo com sucesso")
         except Exception as e:
             logger.exception("Erro ao salvar histórico: %s", e)
@@ -271,6 +278,14 @@ class ContadorHoras:
             card_projeto, textvariable=self.projeto_var, width=44
         )
         self.dropdown_projetos.grid(row=1, column=0, pady=(0, 4))
+        anotacao_frame = ttk.Frame(card_projeto)
+        anotacao_frame.grid(row=2, column=0, pady=(4, 0))
+        ttk.Label(anotacao_frame, text="Etiquetas:").grid(row=0, column=0, sticky=tk.E, padx=(0, 4))
+        self.tags_var = tk.StringVar()
+        ttk.Entry(anotacao_frame, textvariable=self.tags_var, width=16).grid(row=0, column=1, padx=(0, 10))
+        ttk.Label(anotacao_frame, text="Nota:").grid(row=0, column=2, sticky=tk.E, padx=(0, 4))
+        self.nota_var = tk.StringVar()
+        ttk.Entry(anotacao_frame, textvariable=self.nota_var, width=30).grid(row=0, column=3)
 
         self.card_ponto = ttk.Frame(main_frame, style="Card.TFrame", padding="20")
         self.card_ponto.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 12))
@@ -289,6 +304,20 @@ class ContadorHoras:
         self.label_em_andamento.grid(row=3, column=0, pady=(0, 12))
         self.label_em_andamento.grid_remove()
 
+        self.tree_timers = ttk.Treeview(
+            self.card_ponto, columns=("projeto", "entrada", "decorrido"),
+            show="headings", height=3, selectmode="browse",
+        )
+        self.tree_timers.heading("projeto", text="Projeto")
+        self.tree_timers.heading("entrada", text="Entrada")
+        self.tree_timers.heading("decorrido", text="Decorrido")
+        self.tree_timers.column("projeto", width=220)
+        self.tree_timers.column("entrada", width=120, anchor=tk.CENTER)
+        self.tree_timers.column("decorrido", width=100, anchor=tk.CENTER)
+        self.tree_timers.grid(row=6, column=0, pady=(8, 0))
+        self.tree_timers.grid_remove()
+        self.tree_timers.bind("<<TreeviewSelect>>", self._ao_selecionar_timer)
+
         botoes_frame = ttk.Frame(self.card_ponto)
         botoes_frame.grid(row=4, column=0, pady=(0, 4))
         botoes_sec_frame = ttk.Frame(self.card_ponto)
@@ -323,6 +352,13 @@ class ContadorHoras:
             width=18,
         )
         self.btn_adicionar_ponto.pack(side=tk.LEFT, padx=4)
+        self.btn_importar = ttk.Button(
+            botoes_sec_frame,
+            text="Importar sessões",
+            command=self.importar_sessoes,
+            width=18,
+        )
+        self.btn_importar.pack(side=tk.LEFT, padx=4)
 
         self.label_status = ttk.Label(main_frame, text="", style="TLabel", foreground="#059669")
         self.label_status.grid(row=3, column=0, pady=(4, 0))
@@ -330,10 +366,22 @@ class ContadorHoras:
         self.label_total = ttk.Label(main_frame, text="", style="Total.TLabel")
         self.label_total.grid(row=4, column=0, pady=(8, 2))
         self.label_total_hoje = ttk.Label(main_frame, text="", style="Total.TLabel")
-        self.label_total_hoje.grid(row=5, column=0, pady=(0, 16))
+        self.label_total_hoje.grid(row=5, column=0, pady=(0, 12))
+
+        card_painel = ttk.Frame(main_frame, style="Card.TFrame", padding="12")
+        card_painel.grid(row=6, column=0, sticky=(tk.W, tk.E), pady=(0, 12))
+        ttk.Label(card_painel, text="Todos os projetos", style="Section.TLabel").grid(
+            row=0, column=0, columnspan=3, pady=(0, 6)
+        )
+        self.labels_painel = []
+        for coluna in range(len(painel.PERIODOS)):
+            card_painel.grid_columnconfigure(coluna, weight=1)
+            label = ttk.Label(card_painel, text="", style="Total.TLabel")
+            label.grid(row=1, column=coluna, padx=8)
+            self.labels_painel.append(label)
 
         card_relatorios = ttk.Frame(main_frame, style="Card.TFrame", padding="16")
-        card_relatorios.grid(row=6, column=0, sticky=(tk.W, tk.E), pady=(0, 12))
+        card_relatorios.grid(row=7, column=0, sticky=(tk.W, tk.E), pady=(0, 12))
         card_relatorios.grid_columnconfigure(0, weight=1)
 
         ttk.Label(card_relatorios, text="Relatórios", style="Section.TLabel").grid(
@@ -361,20 +409,43 @@ class ContadorHoras:
             width=22,
         )
         self.btn_relatorio_avancado.grid(row=2, column=0, columnspan=3, padx=4, pady=(4, 0))
+        linha_ferramentas = ttk.Frame(card_relatorios)
+        linha_ferramentas.grid(row=3, column=0, columnspan=3, pady=(4, 0))
+        self.btn_mapa_calor = ttk.Button(
+            linha_ferramentas, text="Mapa de calor", command=self.abrir_mapa_calor, width=14
+        )
+        self.btn_mapa_calor.pack(side=tk.LEFT, padx=4)
+        self.btn_busca = ttk.Button(
+            linha_ferramentas, text="Buscar sessões", command=self.abrir_busca, width=14
+        )
+        self.btn_busca.pack(side=tk.LEFT, padx=4)
+        self.btn_diagnostico = ttk.Button(
+            linha_ferramentas, text="Diagnóstico", command=self.abrir_diagnostico, width=14
+        )
+        self.btn_diagnostico.pack(side=tk.LEFT, padx=4)
 
-        self.dropdown_projetos.bind("<<ComboboxSelected>>", self.atualizar_total_projeto)
+        self.dropdown_projetos.bind("<<ComboboxSelected>>", self._ao_sair_projeto)
         self.dropdown_projetos.bind("<FocusOut>", self._ao_sair_projeto)
         self.root.bind("<Return>", self._ao_tecla_enter)
+        self.root.bind("<Map>", self._ao_mapear_janela)
+        self.root.bind("<Unmap>", self._ao_desmapear_janela)
 
     def _ao_sair_projeto(self, event=None):
+        self._atualizar_estado_ponto()
         self.atualizar_total_projeto()
 
     def _ao_tecla_enter(self, event=None):
-        if self.contando:
-            return
-        if self.obter_projeto_selecionado():
+        projeto = self.obter_projeto_selecionado()
+        if projeto and not self.ponto.em_andamento(projeto):
             self.ponto_entrada()
 
+    def _ao_selecionar_timer(self, event=None):
+        selecao = self.tree_timers.selection()
+        if selecao and selecao[0] in self.ponto.timers:
+            self.projeto_var.set(selecao[0])
+            self._ao_sair_projeto()
+            self._reiniciar_tick()
+
     def _mostrar_status_temporario(self, mensagem, segundos=5):
         if self._status_after_id:
             self.root.after_cancel(self._status_after_id)
@@ -396,19 +467,26 @@ class ContadorHoras:
         """Retorna total de segundos trabalhados hoje no projeto (inclui sessão em andamento se for o mesmo)."""
         if not projeto:
             return 0.0
-        total = 0.0
-        if projeto in self.historico:
-            hoje = datetime.now().date()
-            for sessao in self.historico[projeto].get("sessoes", []):
-                data_sessao = datetime.fromisoformat(sessao["data"]).date()
-                if data_sessao == hoje:
-                    total += sessao["duracao_segundos"]
-        if self.contando and self.projeto_em_andamento == projeto and self.tempo_inicio:
-            total += time.time() - self.tempo_inicio
+        hoje = datetime.now().date()
+        # O total das sessões fechadas só muda com o histórico ou com a virada do dia;
+        # guardá-lo evita percorrer todas as sessões a cada tick do cronômetro.
+        chave = (projeto, hoje, self.repositorio.geracao)
+        if self._total_hoje_cache and self._total_hoje_cache[0] == chave:
+            total = self._total_hoje_cache[1]
+        else:
+            total = 0.0
+            if projeto in self.historico:
+                for sessao in self.historico[projeto].get("sessoes", []):
+                    data_sessao = datetime.fromisoformat(sessao["data"]).date()
+                    if data_sessao == hoje:
+                        total += sessao["duracao_segundos"]
+            self._total_hoje_cache = (chave, total)
+        if self.ponto.em_andamento(projeto):
+            total += self.ponto.decorrido(projeto)
         return total
 
     def atualizar_total_projeto(self, event=None):
-        projeto = self.projeto_em_andamento if self.contando else self.projeto_var.get()
+        projeto = self.projeto_exibido() or self.projeto_var.get()
         if projeto:
             if projeto in self.historico:
                 total_segundos = self.historico[projeto]["total_segundos"]
@@ -428,12 +506,51 @@ class ContadorHoras:
         else:
             self.label_total.config(text="")
             self.label_total_hoje.config(text="")
+        self.atualizar_painel()
+
+    def atualizar_painel(self):
+        """Totais de hoje, da semana e do mês de todos os projetos, com os timers abertos."""
+        for label, titulo, segundos in zip(self.labels_painel, ("Hoje", "Semana", "Mês"), self.painel.totais()):
+            label.config(text=f"{titulo}: {self.formatar_duracao(segundos)}")
 
     def obter_projeto_selecionado(self):
         return self.projeto_var.get().strip() or None
 
+    def projeto_exibido(self):
+        """Projeto cujo timer aparece no display: o selecionado, se em andamento, ou o mais recente."""
+        projeto = self.obter_projeto_selecionado()
+        if projeto and self.ponto.em_andamento(projeto):
+            return projeto
+        if self.ponto.timers:
+            return next(reversed(list(self.ponto.timers)))
+        return None
+
+    def _atualizar_estado_ponto(self):
+        """Habilita os botões e mostra a lista de timers conforme os timers em andamento."""
+        projeto = self.obter_projeto_selecionado()
+        self.btn_entrada.config(state="disabled" if projeto and self.ponto.em_andamento(projeto) else "normal")
+        self.btn_saida.config(state="normal" if self.contando else "disabled")
+        quantidade = len(self.ponto.timers)
+        if quantidade:
+            texto = "● Timer em andamento" if quantidade == 1 else f"● {quantidade} timers em andamento"
+            self.label_em_andamento.config(text=texto)
+            self.label_em_andamento.grid()
+        else:
+            self.label_em_andamento.grid_remove()
+        existentes = set(self.tree_timers.get_children(""))
+        for item in existentes - set(self.ponto.timers):
+            self.tree_timers.delete(item)
+        for projeto_timer, inicio in self.ponto.timers.items():
+            if projeto_timer not in existentes:
+                entrada = datetime.fromtimestamp(inicio).strftime("%d/%m %H:%M")
+                self.tree_timers.insert("", tk.END, iid=projeto_timer, values=(projeto_timer, entrada, "00:00:00"))
+        if quantidade > 1:
+            self.tree_timers.grid()
+        else:
+            self.tree_timers.grid_remove()
+
     def ponto_entrada(self):
-        """Registra ponto de entrada e inicia o cronômetro."""
+        """Registra ponto de entrada e inicia o cronômetro do projeto (outros timers continuam)."""
         projeto = self.obter_projeto_selecionado()
         if not projeto:
             logger.debug("Ponto entrada ignorado: nenhum projeto selecionado")
@@ -441,102 +558,193 @@ class ContadorHoras:
                 "Aviso", "Selecione um projeto existente ou digite um novo projeto."
             )
             return
+        if self.ponto.em_andamento(projeto):
+            messagebox.showwarning("Aviso", f"O projeto '{projeto}' já está em andamento.")
+            return
 
-        self.tempo_inicio = time.time()
-        logger.debug("Ponto de entrada: projeto=%s tempo_inicio=%s", projeto, datetime.fromtimestamp(self.tempo_inicio))
-        self.tempo_decorrido = 0
-        self.contando = True
-        self.projeto_em_andamento = projeto
-
-        self.btn_entrada.config(state="disabled")
-        self.dropdown_projetos.config(state="disabled")
-        self.btn_saida.config(state="normal")
-        self.label_em_andamento.grid()
-
-        dt_entrada = datetime.fromtimestamp(self.tempo_inicio)
-        self.label_entrada.config(text=f"Entrada: {dt_entrada.strftime('%d/%m/%Y %H:%M')}")
-
-        self.salvar_sessao_aberta()
+        tempo_inicio = self.ponto.iniciar(projeto, tags=self.tags_var.get(), nota=self.nota_var.get())
+        self.tags_var.set("")
+        self.nota_var.set("")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Ponto de entrada: projeto=%s tempo_inicio=%s", projeto, datetime.fromtimestamp(tempo_inicio))
+        self._atualizar_estado_ponto()
         self.agendar_checkpoint()
-        self.atualizar_display_tempo()
+        self._reiniciar_tick()
 
     def ponto_saida(self):
-        """Registra ponto de saída e salva a sessão."""
+        """Registra ponto de saída do projeto selecionado (ou do único em andamento) e salva a sessão."""
         if not self.contando:
-            logger.debug("Ponto saída ignorado: contando=False")
+            logger.debug("Ponto saída ignorado: nenhum timer em andamento")
             return
 
-        projeto = self.projeto_em_andamento or self.obter_projeto_selecionado()
-        self.contando = False
-        tempo_fim = time.time()
-        tempo_trabalhado = tempo_fim - self.tempo_inicio
-        data_hora_inicio = datetime.fromtimestamp(self.tempo_inicio)
-        data_hora_fim = datetime.fromtimestamp(tempo_fim)
+        projeto = self.obter_projeto_selecionado()
+        if not self.ponto.em_andamento(projeto):
+            if len(self.ponto.timers) > 1:
+                messagebox.showwarning(
+                    "Aviso", "Há mais de um timer em andamento. Selecione na lista o projeto a encerrar."
+                )
+                return
+            projeto = next(iter(self.ponto.timers))
+        sessao = self.ponto.encerrar(projeto, tags=self.tags_var.get(), nota=self.nota_var.get())
+        self.tags_var.set("")
+        self.nota_var.set("")
+        tempo_trabalhado = sessao["duracao_segundos"]
+        data_hora_inicio = datetime.fromisoformat(sessao["data"])
+        data_hora_fim = datetime.fromisoformat(sessao["data_saida"])
         logger.debug(
             "Ponto de saída: projeto=%s duracao_seg=%.1f entrada=%s saida=%s",
             projeto, tempo_trabalhado, data_hora_inicio, data_hora_fim,
         )
+        self.salvar_historico()
 
-        if self.timer_id:
-            self.root.after_cancel(self.timer_id)
+        if not self.contando:
+            self.agendador.cancelar(self.timer_id)
             self.timer_id = None
-        if self.checkpoint_id:
-            self.root.after_cancel(self.checkpoint_id)
+            self.agendador.cancelar(self.checkpoint_id)
             self.checkpoint_id = None
+            self.label_entrada.config(text="")
+            self.label_tempo.config(text="00:00:00")
+        self._atualizar_estado_ponto()
+        self.atualizar_dropdown_projetos()
+        self._reiniciar_tick()
+        self.agendar_precalculo()
+
+        horas, resto = divmod(int(tempo_trabalhado), 3600)
+        minutos, segundos = divmod(resto, 60)
+        msg = (
+            f"Saída registrada: {projeto} — "
+            f"{data_hora_inicio.strftime('%H:%M')} a {data_hora_fim.strftime('%H:%M')} "
+            f"({horas:02d}:{minutos:02d}:{segundos:02d})"
+        )
+        self._mostrar_status_temporario(msg, 6)
+
+    def compactar_historico(self):
+        """Compacta as sessões fora da janela de retenção e reagenda para o dia seguinte."""
         try:
-            if os.path.exists(self.arquivo_sessao_aberta):
-                os.remove(self.arquivo_sessao_aberta)
-        except OSError:
-            pass
+            if retencao.compactar_historico(self.repositorio, self.dias_retencao):
+                self.salvar_historico()
+        except OSError as e:
+            logger.error("Erro ao arquivar sessões antigas: %s", e)
+        finally:
+            self.agendador.agendar_em(INTERVALO_RETENCAO_SEG, self.compactar_historico)
+
+    def sincronizar(self):
+        """Troca alterações com o diretório compartilhado e reagenda a próxima troca."""
+        self.agendador.cancelar(self.sincronizacao_id)
+        try:
+            try:
+                _, recebidas = self.sincronizador.sincronizar(self.diretorio_sincronizacao)
+            except (OSError, ValueError) as e:
+                logger.error("Erro ao sincronizar com %s: %s", self.diretorio_sincronizacao, e)
+                recebidas = 0
+            if recebidas:
+                self.salvar_historico()
+                self.atualizar_dropdown_projetos()
+                self.atualizar_total_projeto()
+                self._mostrar_status_temporario(f"Sincronização: {recebidas} alteração(ões) recebida(s)", 6)
+        finally:
+            # Um erro inesperado não pode encerrar a sincronização periódica até o fim da sessão.
+            self.sincronizacao_id = self.agendador.agendar_em(INTERVALO_SINCRONIZACAO_SEG, self.sincronizar)
+
+    def encerrar_sincronizacao(self):
+        """Envia as últimas alterações antes de fechar."""
+        if not (self.diretorio_sincronizacao and self.sincronizador):
+            return
+        try:
+            _, recebidas = self.sincronizador.sincronizar(self.diretorio_sincronizacao)
+            if recebidas:
+                self.repositorio.salvar()
+        except (OSError, ValueError) as e:
+            logger.error("Erro ao sincronizar com %s: %s", self.diretorio_sincronizacao, e)
+
+    def iniciar_api(self, porta):
+        """Serve a API JSON local junto da janela; as operações rodam na thread do Tk."""
+        servico = api.ServicoPonto(
+            self.repositorio, self.ponto, self.relatorios, ao_alterar=self._ao_alterar_pela_api
+        )
+        executor = api.ExecutorTk(self.root)
+        executor.iniciar()
+        self.api = api.ServidorApi(servico, porta=porta, executor=executor).iniciar_em_thread()
 
-        if projeto:
-            sessao = {
-                "data": data_hora_inicio.isoformat(),
-                "data_saida": data_hora_fim.isoformat(),
-                "duracao_segundos": tempo_trabalhado,
-            }
-            if projeto in self.historico:
-                self.historico[projeto]["total_segundos"] += tempo_trabalhado
-                self.historico[projeto]["sessoes"].append(sessao)
-            else:
-                self.historico[projeto] = {
-                    "total_segundos": tempo_trabalhado,
-                    "sessoes": [sessao],
-                }
-            self.salvar_historico()
+    def encerrar_api(self):
+        """Para a API e grava as alterações que ela ainda não gravou."""
+        if self.api is None:
+            return
+        self.api.parar_thread()
+        self.api.executor.parar()
+        try:
+            self.api.servico.salvar_pendente()
+        except Exception as e:
+            logger.exception("Erro ao salvar histórico: %s", e)
+        self.api = None
 
-        self.btn_entrada.config(state="normal")
-        self.dropdown_projetos.config(state="normal")
-        self.btn_saida.config(state="disabled")
-        self.label_entrada.config(text="")
-        self.label_em_andamento.grid_remove()
-        self.projeto_em_andamento = None
+    def _ao_alterar_pela_api(self):
+        """Reflete na janela uma entrada/saída feita pela API."""
+        if not self.contando:
+            self.agendador.cancelar(self.checkpoint_id)
+            self.checkpoint_id = None
+            self.label_entrada.config(text="")
+            self.label_tempo.config(text="00:00:00")
+        self._atualizar_estado_ponto()
         self.atualizar_dropdown_projetos()
-        self.label_tempo.config(text="00:00:00")
+        self.agendar_checkpoint()
+        self._reiniciar_tick()
 
-        horas, resto = divmod(int(tempo_trabalhado), 3600)
-        minutos, segundos = divmod(resto, 60)
-        if projeto:
-            msg = (
-                f"Saída registrada: {projeto} — "
-                f"{data_hora_inicio.strftime('%H:%M')} a {data_hora_fim.strftime('%H:%M')} "
-                f"({horas:02d}:{minutos:02d}:{segundos:02d})"
-            )
-            self._mostrar_status_temporario(msg, 6)
+    def _reiniciar_tick(self):
+        """Realinha o tick ao projeto exibido (ex.: após entrada, saída ou troca de seleção)."""
+        self.agendador.cancelar(self.timer_id)
+        self.timer_id = None
+        self.atualizar_display_tempo()
 
     def atualizar_display_tempo(self):
-        if self.contando:
-            self.tempo_decorrido = time.time() - self.tempo_inicio
-            horas, resto = divmod(int(self.tempo_decorrido), 3600)
-            minutos, segundos = divmod(resto, 60)
-            self.label_tempo.config(text=f"{horas:02d}:{minutos:02d}:{segundos:02d}")
-            self.atualizar_total_projeto()
-            self.timer_id = self.root.after(1000, self.atualizar_display_tempo)
+        """
+        Tick único do display para todos os timers. Atualiza o cronômetro do projeto
+        exibido e a lista de timers, e agenda o próximo tick logo após a próxima virada
+        de segundo do tempo decorrido exibido (sem acumular atraso). Com a janela
+        minimizada ou oculta não reagenda; _ao_mapear_janela retoma ao reexibir.
+        """
+        self.timer_id = None
+        if not self.contando or self._janela_oculta():
+            return
+        agora = time.time()
+        projeto = self.projeto_exibido()
+        decorrido = self.ponto.decorrido(projeto, agora)
+        self.label_tempo.config(text=self.formatar_duracao(decorrido))
+        dt_entrada = datetime.fromtimestamp(self.ponto.timers[projeto])
+        self.label_entrada.config(text=f"Entrada: {dt_entrada.strftime('%d/%m/%Y %H:%M')} — {projeto}")
+        if len(self.ponto.timers) > 1:
+            for projeto_timer in self.ponto.timers:
+                self.tree_timers.set(
+                    projeto_timer, "decorrido", self.formatar_duracao(self.ponto.decorrido(projeto_timer, agora))
+                )
+        self.atualizar_total_projeto()
+        atraso = 1.0 - decorrido % 1.0 + MARGEM_TICK_MS / 1000.0
+        self.timer_id = self.agendador.agendar(agora + atraso, self.atualizar_display_tempo)
+
+    def _janela_oculta(self):
+        try:
+            return self.root.state() in ("iconic", "withdrawn")
+        except tk.TclError:
+            return True
+
+    def _ao_desmapear_janela(self, event=None):
+        if event is not None and event.widget is not self.root:
+            return
+        self.agendador.cancelar(self.timer_id)
+        self.timer_id = None
+        self.monitor.suspender()
+
+    def _ao_mapear_janela(self, event=None):
+        if event is not None and event.widget is not self.root:
+            return
+        self.monitor.retomar()
+        if self.contando and self.timer_id is None:
+            self.atualizar_display_tempo()
 
     def _recalcular_total_projeto(self, projeto):
         """Recalcula total_segundos do projeto a partir das sessões."""
-        sessoes = self.historico[projeto].get("sessoes", [])
-        self.historico[projeto]["total_segundos"] = sum(s["duracao_segundos"] for s in sessoes)
+        self.repositorio.recalcular_total(projeto)
+        self.repositorio.marcar_alterado(projeto)
 
     def abrir_adicionar_ponto(self):
         """Abre janela para adicionar um ponto manualmente (data/hora entrada e saída)."""
@@ -570,6 +778,12 @@ class ContadorHoras:
         ttk.Entry(frame, textvariable=v_hora_ent, width=8).grid(row=2, column=1, padx=8, pady=4)
         ttk.Entry(frame, textvariable=v_data_sai, width=14).grid(row=3, column=1, padx=8, pady=4)
         ttk.Entry(frame, textvariable=v_hora_sai, width=8).grid(row=4, column=1, padx=8, pady=4)
+        ttk.Label(frame, text="Etiquetas (opcional):").grid(row=5, column=0, sticky=tk.W, pady=4)
+        ttk.Label(frame, text="Nota (opcional):").grid(row=6, column=0, sticky=tk.W, pady=4)
+        v_tags = tk.StringVar()
+        v_nota = tk.StringVar()
+        ttk.Entry(frame, textvariable=v_tags, width=36).grid(row=5, column=1, padx=8, pady=4)
+        ttk.Entry(frame, textvariable=v_nota, width=36).grid(row=6, column=1, padx=8, pady=4)
 
         def parse_data_hora(data_str, hora_str):
             try:
@@ -594,17 +808,17 @@ class ContadorHoras:
                 messagebox.showerror("Erro", "A saída deve ser posterior à entrada.")
                 return
             duracao = (ds - di).total_seconds()
-            sessao = {
-                "data": di.isoformat(),
-                "data_saida": ds.isoformat(),
-                "duracao_segundos": duracao,
-            }
-            if projeto in self.historico:
-                self.historico[projeto]["total_segundos"] += duracao
-                self.historico[projeto]["sessoes"].append(sessao)
-            else:
-                self.historico[projeto] = {"total_segundos": duracao, "sessoes": [sessao]}
+            sessao = busca.anotar(
+                {
+                    "data": di.isoformat(),
+                    "data_saida": ds.isoformat(),
+                    "duracao_segundos": duracao,
+                },
+                v_tags.get(), v_nota.get(),
+            )
+            self.repositorio.adicionar_sessao(projeto, sessao)
             self.salvar_historico()
+            self.eventos.publicar("sessao_adicionada", projeto, sessao)
             self.atualizar_dropdown_projetos()
             self.atualizar_total_projeto()
             logger.debug("Ponto adicionado manualmente: %s %s a %s", projeto, di, ds)
@@ -612,15 +826,47 @@ class ContadorHoras:
             janela.destroy()
 
         btns = ttk.Frame(frame)
-        btns.grid(row=5, column=0, columnspan=2, pady=16)
+        btns.grid(row=7, column=0, columnspan=2, pady=16)
         ttk.Button(btns, text="Adicionar", command=salvar).pack(side=tk.LEFT, padx=4)
         ttk.Button(btns, text="Cancelar", command=janela.destroy).pack(side=tk.LEFT, padx=4)
 
+    def importar_sessoes(self):
+        """Importa sessões de um arquivo CSV ou JSON lines e grava o histórico uma única vez."""
+        from .importacao import importar_arquivo
+
+        caminho = filedialog.askopenfilename(
+            title="Importar sessões",
+            filetypes=[("CSV ou JSON lines", "*.csv *.jsonl *.ndjson"), ("Todos", "*.*")],
+        )
+        if not caminho:
+            return
+        self.root.config(cursor="watch")
+        self.root.update_idletasks()
+        try:
+            resultado = importar_arquivo(self.repositorio, caminho)
+        except Exception as e:
+            logger.exception("Erro ao importar %s: %s", caminho, e)
+            messagebox.showerror("Erro", f"Erro ao importar: {e}")
+            return
+        finally:
+            self.root.config(cursor="")
+        if resultado.importadas:
+            self.salvar_historico()
+            self.atualizar_dropdown_projetos()
+            self.agendar_precalculo()
+        mensagem = resultado.resumo()
+        if resultado.erros:
+            detalhes = "\n".join(f"Linha {linha}: {msg}" for linha, msg in resultado.erros[:10])
+            mensagem += f"\n\nPrimeiros erros:\n{detalhes}"
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Importação de %s: %s", caminho, resultado.resumo())
+        messagebox.showinfo("Importação", mensagem)
+
     def abrir_editar_ponto(self):
         """Abre janela para listar, editar ou excluir pontos existentes."""
         janela = tk.Toplevel(self.root)
         janela.title("Editar ponto")
-        janela.geometry("820x420")
+        janela.geometry("920x420")
         janela.resizable(True, True)
         janela.transient(self.root)
 
@@ -633,7 +879,7 @@ class ContadorHoras:
             row=0, column=0, sticky=tk.W, pady=(0, 8)
         )
 
-        colunas = ("projeto", "data_entrada", "hora_entrada", "data_saida", "hora_saida", "duracao")
+        colunas = ("projeto", "data_entrada", "hora_entrada", "data_saida", "hora_saida", "duracao", "tags")
         tree = ttk.Treeview(frame, columns=colunas, show="headings", height=14, selectmode="browse")
         tree.heading("projeto", text="Projeto")
         tree.heading("data_entrada", text="Data entrada")
@@ -641,40 +887,52 @@ class ContadorHoras:
         tree.heading("data_saida", text="Data saída")
         tree.heading("hora_saida", text="Hora saída")
         tree.heading("duracao", text="Duração")
+        tree.heading("tags", text="Etiquetas")
         tree.column("projeto", width=140)
         tree.column("data_entrada", width=100)
         tree.column("hora_entrada", width=80)
         tree.column("data_saida", width=100)
         tree.column("hora_saida", width=80)
         tree.column("duracao", width=80)
+        tree.column("tags", width=140)
         scroll = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
         tree.configure(yscrollcommand=scroll.set)
         tree.grid(row=1, column=0, sticky=(tk.N, tk.S, tk.E, tk.W), pady=(0, 8))
         scroll.grid(row=1, column=1, sticky=(tk.N, tk.S), pady=(0, 8))
 
+        # Cada linha guarda (projeto, sessão) — o próprio objeto, não a posição: sincronização,
+        # API e compactação podem mudar as posições enquanto a janela está aberta.
         itens_para_sessao = {}
+        exibida = {"geracao": None, "agendada": False}
 
         def preencher_tree():
-            for item in tree.get_children(""):
-                tree.delete(item)
-            itens_para_sessao.clear()
-            for projeto in sorted(self.historico.keys()):
-                for i, sessao in enumerate(self.historico[projeto].get("sessoes", [])):
-                    di = datetime.fromisoformat(sessao["data"])
-                    data_ent = di.strftime("%d/%m/%Y")
-                    hora_ent = di.strftime("%H:%M")
-                    if "data_saida" in sessao:
-                        ds = datetime.fromisoformat(sessao["data_saida"])
-                        data_sai = ds.strftime("%d/%m/%Y")
-                        hora_sai = ds.strftime("%H:%M")
-                    else:
-                        data_sai = "-"
-                        hora_sai = "-"
-                    dur = self.formatar_duracao(sessao["duracao_segundos"])
-                    item_id = tree.insert("", tk.END, values=(projeto, data_ent, hora_ent, data_sai, hora_sai, dur))
-                    itens_para_sessao[item_id] = (projeto, i)
-
-        preencher_tree()
+            exibida["geracao"] = self.repositorio.geracao
+            selecionada = obter_selecao()[1]
+            with self.monitor.medir("preencher_tree"):
+                for item in tree.get_children(""):
+                    tree.delete(item)
+                itens_para_sessao.clear()
+                for projeto in sorted(self.historico.keys()):
+                    for sessao in self.historico[projeto].get("sessoes", []):
+                        di = datetime.fromisoformat(sessao["data"])
+                        data_ent = di.strftime("%d/%m/%Y")
+                        hora_ent = di.strftime("%H:%M")
+                        if "data_saida" in sessao:
+                            ds = datetime.fromisoformat(sessao["data_saida"])
+                            data_sai = ds.strftime("%d/%m/%Y")
+                            hora_sai = ds.strftime("%H:%M")
+                        else:
+                            data_sai = "-"
+                            hora_sai = "-"
+                        dur = self.formatar_duracao(sessao["duracao_segundos"])
+                        tags = " ".join(sessao.get("tags", ()))
+                        item_id = tree.insert(
+                            "", tk.END, values=(projeto, data_ent, hora_ent, data_sai, hora_sai, dur, tags)
+                        )
+                        itens_para_sessao[item_id] = (projeto, sessao)
+                        if sessao is selecionada:
+                            tree.selection_set(item_id)
+                            tree.see(item_id)
 
         def obter_selecao():
             sel = tree.selection()
@@ -683,12 +941,45 @@ class ContadorHoras:
             item_id = sel[0]
             return itens_para_sessao.get(item_id, (None, None))
 
+        def posicao_atual(projeto, sessao):
+            """Posição da sessão no projeto agora, ou None se ela foi alterada ou removida por outro caminho."""
+            dados = self.historico.get(projeto)
+            if dados is not None:
+                for i, s in enumerate(dados.get("sessoes", [])):
+                    if s is sessao:
+                        return i
+            messagebox.showwarning(
+                "Aviso", "O ponto foi alterado ou removido enquanto a janela estava aberta.", parent=janela
+            )
+            preencher_tree()
+            return None
+
+        def ao_alterar(operacao, projeto, anterior, sessao):
+            # Alterações feitas por outro caminho (sincronização, API, retenção): atualiza a
+            # lista uma vez, quando o Tk estiver ocioso.
+            if operacao == "salvar" or exibida["agendada"]:
+                return
+            exibida["agendada"] = True
+            janela.after_idle(atualizar_se_mudou)
+
+        def atualizar_se_mudou():
+            exibida["agendada"] = False
+            if janela.winfo_exists() and exibida["geracao"] != self.repositorio.geracao:
+                preencher_tree()
+
+        def ao_fechar(event):
+            if event.widget is janela:
+                self.repositorio.remover_ouvinte(ao_alterar)
+
+        preencher_tree()
+        self.repositorio.adicionar_ouvinte(ao_alterar)
+        janela.bind("<Destroy>", ao_fechar)
+
         def editar():
-            projeto, idx = obter_selecao()
+            projeto, sessao = obter_selecao()
             if projeto is None:
                 messagebox.showwarning("Aviso", "Selecione um ponto na lista.")
                 return
-            sessao = self.historico[projeto]["sessoes"][idx]
             di = datetime.fromisoformat(sessao["data"])
             if "data_saida" in sessao:
                 ds = datetime.fromisoformat(sessao["data_saida"])
@@ -712,6 +1003,12 @@ class ContadorHoras:
             ttk.Entry(f_ed, textvariable=v_hora_ent, width=8).grid(row=1, column=1, padx=8, pady=4)
             ttk.Entry(f_ed, textvariable=v_data_sai, width=14).grid(row=2, column=1, padx=8, pady=4)
             ttk.Entry(f_ed, textvariable=v_hora_sai, width=8).grid(row=3, column=1, padx=8, pady=4)
+            ttk.Label(f_ed, text="Etiquetas:").grid(row=4, column=0, sticky=tk.W, pady=4)
+            ttk.Label(f_ed, text="Nota:").grid(row=5, column=0, sticky=tk.W, pady=4)
+            v_tags = tk.StringVar(value=", ".join(sessao.get("tags", ())))
+            v_nota = tk.StringVar(value=sessao.get("nota", ""))
+            ttk.Entry(f_ed, textvariable=v_tags, width=36).grid(row=4, column=1, padx=8, pady=4)
+            ttk.Entry(f_ed, textvariable=v_nota, width=36).grid(row=5, column=1, padx=8, pady=4)
 
             def parse_data_hora(data_str, hora_str):
                 try:
@@ -733,13 +1030,22 @@ class ContadorHoras:
                     messagebox.showerror("Erro", "A saída deve ser posterior à entrada.")
                     return
                 duracao = (ds_novo - di_novo).total_seconds()
-                self.historico[projeto]["sessoes"][idx] = {
-                    "data": di_novo.isoformat(),
-                    "data_saida": ds_novo.isoformat(),
-                    "duracao_segundos": duracao,
-                }
-                self._recalcular_total_projeto(projeto)
+                idx = posicao_atual(projeto, sessao)
+                if idx is None:
+                    janela_ed.destroy()
+                    return
+                anterior = sessao
+                nova = busca.anotar(
+                    {
+                        "data": di_novo.isoformat(),
+                        "data_saida": ds_novo.isoformat(),
+                        "duracao_segundos": duracao,
+                    },
+                    v_tags.get(), v_nota.get(),
+                )
+                self.repositorio.substituir_sessao(projeto, idx, nova)
                 self.salvar_historico()
+                self.eventos.publicar("sessao_editada", projeto, nova, anterior)
                 self.atualizar_dropdown_projetos()
                 if self.projeto_var.get() == projeto:
                     self.atualizar_total_projeto()
@@ -747,21 +1053,22 @@ class ContadorHoras:
                 preencher_tree()
                 messagebox.showinfo("Sucesso", "Ponto atualizado.")
 
-            ttk.Button(f_ed, text="Salvar", command=salvar_edicao).grid(row=4, column=0, columnspan=2, pady=16)
+            ttk.Button(f_ed, text="Salvar", command=salvar_edicao).grid(row=6, column=0, columnspan=2, pady=16)
 
         def excluir():
-            projeto, idx = obter_selecao()
+            projeto, sessao = obter_selecao()
             if projeto is None:
                 messagebox.showwarning("Aviso", "Selecione um ponto na lista.")
                 return
             if not messagebox.askyesno("Confirmar", "Excluir este ponto? Esta ação não pode ser desfeita."):
                 return
-            self.historico[projeto]["sessoes"].pop(idx)
-            if not self.historico[projeto]["sessoes"]:
-                del self.historico[projeto]
-            else:
-                self._recalcular_total_projeto(projeto)
+            idx = posicao_atual(projeto, sessao)
+            if idx is None:
+                return
+            anterior = sessao
+            self.repositorio.remover_sessao(projeto, idx)
             self.salvar_historico()
+            self.eventos.publicar("sessao_removida", projeto, None, anterior)
             self.atualizar_dropdown_projetos()
             if self.projeto_var.get() == projeto:
                 self.atualizar_total_projeto()
@@ -779,43 +1086,69 @@ class ContadorHoras:
             projetos = list(self.historico.keys())
         logger.debug("Filtrando sessões: %s a %s projetos=%s", data_inicio, data_fim, projetos)
         sessoes_periodo = {}
-        for projeto in projetos:
-            if projeto not in self.historico:
-                continue
-            dados = self.historico[projeto]
-            sessoes_filtradas = []
-            for sessao in dados.get("sessoes", []):
-                data_sessao = datetime.fromisoformat(sessao["data"])
-                if data_inicio <= data_sessao <= data_fim:
-                    sessoes_filtradas.append(sessao)
-            if sessoes_filtradas:
-                total_segundos = sum(s["duracao_segundos"] for s in sessoes_filtradas)
-                sessoes_periodo[projeto] = {
-                    "sessoes": sessoes_filtradas,
-                    "total_segundos": total_segundos,
-                }
-        logger.debug("Sessões no período: %d projeto(s), totais=%s", len(sessoes_periodo), {p: d["total_segundos"] for p, d in sessoes_periodo.items()})
+        for projeto, sessao in iterar_sessoes_periodo(self.historico, data_inicio, data_fim, projetos):
+            dados = sessoes_periodo.get(projeto)
+            if dados is None:
+                dados = sessoes_periodo[projeto] = {"sessoes": [], "total_segundos": 0}
+            dados["sessoes"].append(sessao)
+        for dados in sessoes_periodo.values():
+            dados["total_segundos"] = calcular_total_sessoes(dados["sessoes"])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Sessões no período: %d projeto(s), totais=%s",
+                len(sessoes_periodo), {p: d["total_segundos"] for p, d in sessoes_periodo.items()},
+            )
         return sessoes_periodo
 
+    def agregar_sessoes(self, data_inicio, data_fim, agrupamento, projetos=None, tags=None):
+        """Totais do período agrupados por faixa de tempo e projeto (ver agregacao.AGRUPAMENTOS)."""
+        return self.relatorios.agregacao(data_inicio, data_fim, agrupamento, projetos, tags)
+
     def formatar_duracao(self, segundos):
         horas, resto = divmod(int(segundos), 3600)
         minutos, segundos_rest = divmod(resto, 60)
         return f"{horas:02d}:{minutos:02d}:{segundos_rest:02d}"
 
-    def gerar_log_semanal(self):
+    def _periodo_ultimos_dias(self, dias):
         hoje = datetime.now()
         data_fim = hoje.replace(hour=23, minute=59, second=59, microsecond=999999)
-        data_inicio = (hoje - timedelta(days=7)).replace(
+        data_inicio = (hoje - timedelta(days=dias)).replace(
             hour=0, minute=0, second=0, microsecond=0
         )
-        self.exibir_log(data_inicio, data_fim, "Semanal", None)
+        return data_inicio, data_fim
 
-    def gerar_log_mensal(self):
+    def _periodo_mes(self, ano, mes):
+        """Período do mês (levanta ValueError se mês/ano inválidos)."""
+        data_inicio = datetime(ano, mes, 1, 0, 0, 0, 0)
+        if mes == 12:
+            data_fim = datetime(ano, 12, 31, 23, 59, 59, 999999)
+        else:
+            data_fim = (datetime(ano, mes + 1, 1) - timedelta(seconds=1))
+        return data_inicio, data_fim
+
+    def periodos_frequentes(self):
+        """Períodos dos relatórios mais abertos: 7 e 30 dias, mês atual e mês anterior."""
         hoje = datetime.now()
-        data_fim = hoje.replace(hour=23, minute=59, second=59, microsecond=999999)
-        data_inicio = (hoje - timedelta(days=30)).replace(
-            hour=0, minute=0, second=0, microsecond=0
+        ano_anterior, mes_anterior = (hoje.year, hoje.month - 1) if hoje.month > 1 else (hoje.year - 1, 12)
+        return [
+            self._periodo_ultimos_dias(7),
+            self._periodo_ultimos_dias(30),
+            self._periodo_mes(hoje.year, hoje.month),
+            self._periodo_mes(ano_anterior, mes_anterior),
+        ]
+
+    def agendar_precalculo(self):
+        """Pré-calcula no tempo ocioso os relatórios de periodos_frequentes (todos os projetos)."""
+        self.precalculo.agendar(
+            [(inicio, fim, None, ("semana",)) for inicio, fim in self.periodos_frequentes()]
         )
+
+    def gerar_log_semanal(self):
+        data_inicio, data_fim = self._periodo_ultimos_dias(7)
+        self.exibir_log(data_inicio, data_fim, "Semanal", None)
+
+    def gerar_log_mensal(self):
+        data_inicio, data_fim = self._periodo_ultimos_dias(30)
         self.exibir_log(data_inicio, data_fim, "Mensal", None)
 
     def abrir_relatorio_mensal_config(self):
@@ -866,11 +1199,7 @@ class ContadorHoras:
         def visualizar():
             mes, ano = mes_var.get(), ano_var.get()
             try:
-                data_inicio = datetime(ano, mes, 1, 0, 0, 0, 0)
-                if mes == 12:
-                    data_fim = datetime(ano, 12, 31, 23, 59, 59, 999999)
-                else:
-                    data_fim = (datetime(ano, mes + 1, 1) - timedelta(seconds=1))
+                data_inicio, data_fim = self._periodo_mes(ano, mes)
             except Exception:
                 messagebox.showerror("Erro", "Mês/ano inválidos.")
                 return
@@ -889,11 +1218,7 @@ class ContadorHoras:
         def exportar_pdf():
             mes, ano = mes_var.get(), ano_var.get()
             try:
-                data_inicio = datetime(ano, mes, 1, 0, 0, 0, 0)
-                if mes == 12:
-                    data_fim = datetime(ano, 12, 31, 23, 59, 59, 999999)
-                else:
-                    data_fim = (datetime(ano, mes + 1, 1) - timedelta(seconds=1))
+                data_inicio, data_fim = self._periodo_mes(ano, mes)
             except Exception:
                 messagebox.showerror("Erro", "Mês/ano inválidos.")
                 return
@@ -945,7 +1270,7 @@ class ContadorHoras:
         """Abre janela de relatório com período de tempo selecionado (data inicial e final)."""
         janela = tk.Toplevel(self.root)
         janela.title("Relatório customizado — Período")
-        janela.geometry("480x460")
+        janela.geometry("480x500")
         janela.resizable(True, True)
         janela.transient(self.root)
         janela.grab_set()
@@ -989,6 +1314,12 @@ class ContadorHoras:
         if not projetos:
             ttk.Label(inner, text="Nenhum projeto no histórico.").grid(row=0, column=0, sticky=tk.W)
 
+        tags_frame = ttk.Frame(frame)
+        tags_frame.grid(row=5, column=0, sticky=tk.W, pady=(0, 4))
+        ttk.Label(tags_frame, text="Só sessões com as etiquetas:").pack(side=tk.LEFT, padx=(0, 4))
+        tags_var = tk.StringVar()
+        ttk.Entry(tags_frame, textvariable=tags_var, width=24).pack(side=tk.LEFT)
+
         def obter_periodo():
             di = self._parse_data_br(data_inicio_var.get())
             df = self._parse_data_br(data_fim_var.get())
@@ -1019,6 +1350,7 @@ class ContadorHoras:
                 "Customizado",
                 proj_selecionados,
                 janela_parent=janela,
+                tags=busca.normalizar_tags(tags_var.get()),
             )
 
         def exportar_pdf():
@@ -1044,106 +1376,416 @@ class ContadorHoras:
             if not caminho:
                 return
             if self.exportar_relatorio_pdf(
-                data_inicio, data_fim, proj_selecionados, caminho
+                data_inicio, data_fim, proj_selecionados, caminho,
+                tags=busca.normalizar_tags(tags_var.get()),
             ):
                 messagebox.showinfo("Sucesso", f"Relatório salvo em:\n{caminho}")
             else:
                 messagebox.showerror("Erro", "Falha ao gerar o PDF.")
 
+        def exportar_csv():
+            data_inicio, data_fim = obter_periodo()
+            if data_inicio is None:
+                return
+            proj_selecionados = [p for p, v in vars_projetos.items() if v.get()]
+            if not proj_selecionados:
+                messagebox.showwarning("Aviso", "Selecione ao menos um projeto.")
+                return
+            sufixo = f"{data_inicio.strftime('%Y%m%d')}_{data_fim.strftime('%Y%m%d')}"
+            caminho = filedialog.asksaveasfilename(
+                defaultextension=".csv",
+                filetypes=[("CSV", "*.csv")],
+                initialfile=f"sessoes_{sufixo}.csv",
+            )
+            if not caminho:
+                return
+            if self.exportar_sessoes_csv(
+                data_inicio, data_fim, proj_selecionados, caminho, busca.normalizar_tags(tags_var.get())
+            ):
+                messagebox.showinfo("Sucesso", f"Sessões exportadas em:\n{caminho}")
+            else:
+                messagebox.showerror("Erro", "Falha ao exportar o CSV.")
+
         botoes = ttk.Frame(frame)
-        botoes.grid(row=5, column=0, pady=(8, 0))
+        botoes.grid(row=6, column=0, pady=(8, 0))
         ttk.Button(botoes, text="Visualizar relatório", command=visualizar).pack(
             side=tk.LEFT, padx=4
         )
         ttk.Button(botoes, text="Exportar PDF", command=exportar_pdf).pack(
             side=tk.LEFT, padx=4
         )
+        ttk.Button(botoes, text="Exportar CSV", command=exportar_csv).pack(
+            side=tk.LEFT, padx=4
+        )
         ttk.Button(botoes, text="Fechar", command=janela.destroy).pack(side=tk.LEFT, padx=4)
 
-    def exportar_relatorio_pdf(self, data_inicio, data_fim, projetos, caminho):
-        """Gera PDF do relatório de horas para o período e projetos indicados."""
+    def exportar_sessoes_csv(self, data_inicio, data_fim, projetos, caminho, tags=None):
+        """
+        Exporta em CSV as sessões do período e projetos indicados, linha a linha; com
+        ``tags``, só as sessões que têm todas elas (pelo índice de busca).
+        """
+        from .exportacao import CAMPOS_SESSOES, escrever_csv, exportar, iterar_linhas_sessoes
+
+        try:
+            with open(caminho, "w", encoding="utf-8", newline="") as f:
+                if tags:
+                    pares = self.indice_busca.buscar_tags(tags, projetos, data_inicio, data_fim)
+                    quantidade = escrever_csv(iterar_linhas_sessoes(None, None, None, pares=pares), f, CAMPOS_SESSOES)
+                else:
+                    quantidade = exportar(
+                        self.historico, f, "sessoes", "csv", data_inicio, data_fim, projetos
+                    )
+            logger.debug("CSV exportado: %s (%d linha(s))", caminho, quantidade)
+            return True
+        except Exception as e:
+            logger.exception("Falha ao exportar CSV: %s", e)
+            return False
+
+    def exportar_relatorio_pdf(self, data_inicio, data_fim, projetos, caminho, agrupamento="semana", tags=None):
+        """
+        Gera PDF do relatório de horas para o período e projetos indicados.
+        Com agrupamento (ver agregacao.AGRUPAMENTOS), inclui um resumo por faixa e projeto.
+        Com ``tags``, só entram as sessões que têm todas elas.
+        """
         logger.debug("exportar_relatorio_pdf: caminho=%s projetos=%s", caminho, projetos)
         if not REPORTLAB_AVAILABLE:
             logger.debug("exportar_relatorio_pdf: reportlab não disponível")
             return False
-        sessoes_periodo = self.filtrar_sessoes_por_periodo(
-            data_inicio, data_fim, projetos
-        )
+        sessoes_periodo = self.relatorios.sessoes_periodo(data_inicio, data_fim, projetos, tags)
         if not sessoes_periodo:
             logger.debug("exportar_relatorio_pdf: nenhuma sessão no período")
             return False
+        # Período encerrado (ex.: mês passado): o PDF é reaproveitado enquanto as sessões não mudarem.
+        chave = None
+        if periodo_encerrado(data_fim):
+            chave = self.cache_pdf.chave(data_inicio, data_fim, projetos, sessoes_periodo, agrupamento, tags)
+            if self.cache_pdf.copiar(chave, caminho):
+                return True
+        resumo = self.agregar_sessoes(data_inicio, data_fim, agrupamento, projetos, tags) if agrupamento else None
+        if not relatorio_pdf.exportar_relatorio_pdf(sessoes_periodo, data_inicio, data_fim, caminho, resumo, tags):
+            return False
+        if chave is not None:
+            self.cache_pdf.guardar(chave, caminho)
+        return True
+
+    def abrir_mapa_calor(self):
+        """Calendário com as horas de cada dia, por ano, dos projetos selecionados."""
+        janela = tk.Toplevel(self.root)
+        janela.title("Mapa de calor — horas por dia")
+        janela.geometry("1000x560")
+        janela.resizable(True, True)
+        janela.transient(self.root)
+
+        frame = ttk.Frame(janela, padding="16")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.grid_columnconfigure(1, weight=1)
+        frame.grid_rowconfigure(1, weight=1)
 
-        doc = SimpleDocTemplate(
-            caminho, pagesize=A4, rightMargin=2 * cm, leftMargin=2 * cm,
-            topMargin=2 * cm, bottomMargin=2 * cm,
+        ttk.Label(frame, text="Projetos", style="Section.TLabel").grid(row=0, column=0, sticky=tk.W, pady=(0, 4))
+        projetos = sorted(self.historico.keys())
+        lista = tk.Listbox(frame, selectmode=tk.EXTENDED, exportselection=False, width=24)
+        for projeto in projetos:
+            lista.insert(tk.END, projeto)
+        lista.selection_set(0, tk.END)
+        lista.grid(row=1, column=0, sticky=(tk.N, tk.S, tk.W), padx=(0, 12))
+
+        titulo_var = tk.StringVar()
+        ttk.Label(frame, textvariable=titulo_var, style="Section.TLabel").grid(
+            row=0, column=1, sticky=tk.W, pady=(0, 4)
         )
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            "CustomTitle", parent=styles["Heading1"], fontSize=16, spaceAfter=12
+        canvas = tk.Canvas(frame, background="white", highlightthickness=0)
+        rolagem = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=canvas.yview)
+        canvas.configure(yscrollcommand=rolagem.set)
+        canvas.grid(row=1, column=1, sticky=(tk.N, tk.S, tk.E, tk.W))
+        rolagem.grid(row=1, column=2, sticky=(tk.N, tk.S))
+        detalhe_var = tk.StringVar(value="Passe o mouse sobre um dia para ver as horas.")
+        ttk.Label(frame, textvariable=detalhe_var).grid(row=2, column=0, columnspan=3, sticky=tk.W, pady=(8, 0))
+
+        tamanho, espaco, margem, altura_ano = 13, 2, 48, 7 * 15 + 28
+        # Estado do desenho: anos na tela, id do retângulo -> (ano, posição), retângulos e níveis por ano, totais.
+        estado = {"anos": None, "celulas": {}, "retangulos": {}, "niveis": {}, "totais": {}}
+
+        def desenhar_grade(anos):
+            canvas.delete("all")
+            estado["celulas"].clear()
+            estado["retangulos"].clear()
+            estado["niveis"].clear()
+            for i, ano in enumerate(reversed(anos)):
+                topo = i * altura_ano
+                canvas.create_text(
+                    4, topo + 4, text=str(ano), anchor=tk.NW, font=("Segoe UI", 10, "bold"), tags=f"ano-{ano}"
+                )
+                retangulos = []
+                for posicao in range(mapa_calor.dias_no_ano(ano)):
+                    coluna, linha = mapa_calor.celula(ano, posicao)
+                    x = margem + coluna * (tamanho + espaco)
+                    y = topo + 22 + linha * (tamanho + espaco)
+                    item = canvas.create_rectangle(x, y, x + tamanho, y + tamanho, width=0)
+                    estado["celulas"][item] = (ano, posicao)
+                    retangulos.append(item)
+                estado["retangulos"][ano] = retangulos
+                estado["niveis"][ano] = [None] * len(retangulos)
+            canvas.configure(scrollregion=(0, 0, margem + 54 * (tamanho + espaco), len(anos) * altura_ano))
+            estado["anos"] = anos
+
+        def atualizar(event=None):
+            inicio = time.perf_counter()
+            selecionados = [projetos[i] for i in lista.curselection()]
+            anos = self.totais_diarios.anos(selecionados)
+            if anos != estado["anos"]:
+                desenhar_grade(anos)
+            estado["totais"] = {ano: self.totais_diarios.somar(selecionados, ano) for ano in anos}
+            cores = mapa_calor.CORES_NIVEIS
+            for ano, dias in estado["totais"].items():
+                niveis = estado["niveis"][ano]
+                # Só os dias que mudaram de cor são reconfigurados.
+                for posicao, item in enumerate(estado["retangulos"][ano]):
+                    nivel = mapa_calor.nivel(dias[posicao])
+                    if nivel != niveis[posicao]:
+                        niveis[posicao] = nivel
+                        canvas.itemconfigure(item, fill=cores[nivel])
+                canvas.itemconfigure(f"ano-{ano}", text=f"{ano}  {sum(dias) / 3600:.0f} h")
+            total = sum(sum(dias) for dias in estado["totais"].values())
+            titulo_var.set(f"{len(selecionados)} projeto(s) — {self.formatar_duracao(total)}")
+            logger.debug("Mapa de calor desenhado em %.1f ms", (time.perf_counter() - inicio) * 1000)
+
+        def ao_mover(event):
+            itens = canvas.find_withtag("current")
+            celula = estado["celulas"].get(itens[0]) if itens else None
+            if celula is None:
+                return
+            ano, posicao = celula
+            dia = datetime(ano, 1, 1) + timedelta(days=posicao)
+            detalhe_var.set(
+                f"{dia.strftime('%d/%m/%Y')}: {self.formatar_duracao(estado['totais'][ano][posicao])}"
+            )
+
+        lista.bind("<<ListboxSelect>>", atualizar)
+        canvas.bind("<Motion>", ao_mover)
+        canvas.bind("<MouseWheel>", lambda e: canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        ttk.Button(frame, text="Fechar", command=janela.destroy).grid(row=3, column=0, columnspan=3, pady=(8, 0))
+        atualizar()
+
+    def abrir_busca(self):
+        """Busca sessões por etiqueta (#etiqueta) ou palavra da nota, a cada tecla, pelo índice invertido."""
+        janela = tk.Toplevel(self.root)
+        janela.title("Buscar sessões")
+        janela.geometry("860x480")
+        janela.resizable(True, True)
+        janela.transient(self.root)
+
+        frame = ttk.Frame(janela, padding="16")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.grid_columnconfigure(1, weight=1)
+        frame.grid_rowconfigure(2, weight=1)
+
+        ttk.Label(frame, text="Buscar:").grid(row=0, column=0, sticky=tk.W, padx=(0, 6))
+        consulta_var = tk.StringVar()
+        entrada = ttk.Entry(frame, textvariable=consulta_var)
+        entrada.grid(row=0, column=1, sticky=(tk.W, tk.E))
+        ttk.Label(frame, text="Etiquetas:").grid(row=0, column=2, sticky=tk.E, padx=(12, 6))
+        combo_tags = ttk.Combobox(frame, values=list(self.indice_busca.tags()), state="readonly", width=18)
+        combo_tags.grid(row=0, column=3, sticky=tk.W)
+        ttk.Label(
+            frame, text="Ex.: #cliente-x reunião — todas as palavras precisam aparecer na sessão",
+            font=("Segoe UI", 9),
+        ).grid(row=1, column=0, columnspan=4, sticky=tk.W, pady=(2, 8))
+
+        colunas = ("projeto", "data", "duracao", "tags", "nota")
+        tree = ttk.Treeview(frame, columns=colunas, show="headings", height=14)
+        for coluna, titulo, largura in (
+            ("projeto", "Projeto", 140), ("data", "Entrada", 120), ("duracao", "Duração", 80),
+            ("tags", "Etiquetas", 160), ("nota", "Nota", 300),
+        ):
+            tree.heading(coluna, text=titulo)
+            tree.column(coluna, width=largura, anchor=tk.CENTER if coluna in ("data", "duracao") else tk.W)
+        scroll = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        tree.grid(row=2, column=0, columnspan=4, sticky=(tk.N, tk.S, tk.E, tk.W))
+        scroll.grid(row=2, column=4, sticky=(tk.N, tk.S))
+        resumo_var = tk.StringVar()
+        ttk.Label(frame, textvariable=resumo_var, style="Total.TLabel").grid(
+            row=3, column=0, columnspan=4, pady=(8, 0)
         )
-        elements = []
-        elements.append(
-            Paragraph("Relatório de Horas Trabalhadas", title_style)
+
+        def buscar(*_):
+            inicio = time.perf_counter()
+            resultado = self.indice_busca.buscar(consulta_var.get())
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            tree.delete(*tree.get_children(""))
+            for projeto, sessao in resultado[-LIMITE_RESULTADOS_BUSCA:][::-1]:
+                tree.insert("", tk.END, values=(
+                    projeto,
+                    datetime.fromisoformat(sessao["data"]).strftime("%d/%m/%Y %H:%M"),
+                    self.formatar_duracao(sessao["duracao_segundos"]),
+                    " ".join("#" + tag for tag in sessao.get("tags", ())),
+                    sessao.get("nota", ""),
+                ))
+            if not consulta_var.get().strip():
+                resumo_var.set("")
+                return
+            total = sum(sessao["duracao_segundos"] for _, sessao in resultado)
+            texto = f"{len(resultado)} sessão(ões) — {self.formatar_duracao(total)}"
+            if len(resultado) > LIMITE_RESULTADOS_BUSCA:
+                texto += f" (mostrando as {LIMITE_RESULTADOS_BUSCA} mais recentes)"
+            resumo_var.set(texto)
+            logger.debug("Busca %r: %d sessão(ões) em %.2f ms", consulta_var.get(), len(resultado), duracao_ms)
+
+        def escolher_tag(event=None):
+            consulta = consulta_var.get().rstrip()
+            consulta_var.set(f"{consulta} #{combo_tags.get()}".lstrip())
+            entrada.icursor(tk.END)
+            entrada.focus_set()
+
+        consulta_var.trace_add("write", buscar)
+        combo_tags.bind("<<ComboboxSelected>>", escolher_tag)
+        ttk.Button(frame, text="Fechar", command=janela.destroy).grid(row=4, column=0, columnspan=4, pady=(8, 0))
+        entrada.focus_set()
+
+    def abrir_diagnostico(self):
+        """Janela com os histogramas de latência, as ocorrências de bloqueio e o limiar."""
+        janela = tk.Toplevel(self.root)
+        janela.title("Diagnóstico — latência da interface")
+        janela.geometry("760x520")
+        janela.resizable(True, True)
+        janela.transient(self.root)
+
+        frame = ttk.Frame(janela, padding="16")
+        frame.pack(fill=tk.BOTH, expand=True)
+        frame.grid_columnconfigure(0, weight=1)
+        frame.grid_rowconfigure(1, weight=1)
+        frame.grid_rowconfigure(3, weight=1)
+
+        colunas = ("origem", "quantidade", "media", "p50", "p95", "p99", "maximo")
+        tree = ttk.Treeview(frame, columns=colunas, show="headings", height=7)
+        for coluna, titulo, largura in (
+            ("origem", "Origem", 180), ("quantidade", "Medições", 80), ("media", "Média (ms)", 80),
+            ("p50", "p50 (ms)", 70), ("p95", "p95 (ms)", 70), ("p99", "p99 (ms)", 70), ("maximo", "Máx. (ms)", 80),
+        ):
+            tree.heading(coluna, text=titulo)
+            tree.column(coluna, width=largura, anchor=tk.W if coluna == "origem" else tk.E)
+        ttk.Label(frame, text="Latências", style="Section.TLabel").grid(row=0, column=0, sticky=tk.W, pady=(0, 4))
+        tree.grid(row=1, column=0, sticky=(tk.N, tk.S, tk.E, tk.W), pady=(0, 8))
+
+        ttk.Label(frame, text="Bloqueios acima do limiar", style="Section.TLabel").grid(
+            row=2, column=0, sticky=tk.W, pady=(0, 4)
         )
-        elements.append(
-            Paragraph(
-                f"Período: {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}",
-                styles["Normal"],
-            )
+        tree_ocorrencias = ttk.Treeview(
+            frame, columns=("instante", "origem", "duracao", "causa"), show="headings", height=6
         )
-        elements.append(Spacer(1, 16))
+        for coluna, titulo, largura in (
+            ("instante", "Instante", 160), ("origem", "Origem", 180), ("duracao", "Duração (ms)", 100),
+            ("causa", "Último manipulador", 180),
+        ):
+            tree_ocorrencias.heading(coluna, text=titulo)
+            tree_ocorrencias.column(coluna, width=largura)
+        tree_ocorrencias.grid(row=3, column=0, sticky=(tk.N, tk.S, tk.E, tk.W), pady=(0, 8))
+
+        def atualizar():
+            resumo = self.monitor.resumo()
+            tree.delete(*tree.get_children(""))
+            for origem, dados in resumo["histogramas"].items():
+                tree.insert("", tk.END, values=(
+                    origem, dados["quantidade"], f"{dados['media_ms']:.1f}", f"{dados['p50_ms']:.0f}",
+                    f"{dados['p95_ms']:.0f}", f"{dados['p99_ms']:.0f}", f"{dados['maximo_ms']:.1f}",
+                ))
+            tree_ocorrencias.delete(*tree_ocorrencias.get_children(""))
+            for ocorrencia in reversed(resumo["ocorrencias"]):
+                tree_ocorrencias.insert("", tk.END, values=(
+                    ocorrencia["instante"], ocorrencia["origem"], ocorrencia["duracao_ms"],
+                    ocorrencia["causa_provavel"] or "-",
+                ))
+
+        def aplicar_limiar(event=None):
+            try:
+                limiar = int(limiar_var.get())
+            except ValueError:
+                messagebox.showerror("Erro", "Limiar inválido. Informe um número inteiro de milissegundos.")
+                return
+            if limiar <= 0:
+                messagebox.showerror("Erro", "O limiar deve ser maior que zero.")
+                return
+            self.monitor.limiar_ms = limiar
+            logger.info("Limiar de bloqueio alterado para %d ms", limiar)
 
-        total_geral = sum(d["total_segundos"] for d in sessoes_periodo.values())
-        elements.append(
-            Paragraph(
-                f"Total geral: {self.formatar_duracao(total_geral)}",
-                styles["Normal"],
+        def salvar_arquivo():
+            caminho = filedialog.asksaveasfilename(
+                parent=janela,
+                title="Salvar diagnóstico",
+                defaultextension=".json",
+                initialfile=f"diagnostico_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                filetypes=[("JSON", "*.json")],
             )
-        )
-        elements.append(Spacer(1, 20))
+            if not caminho:
+                return
+            try:
+                self.monitor.despejar(caminho)
+            except OSError as e:
+                logger.exception("Erro ao gravar diagnóstico: %s", e)
+                messagebox.showerror("Erro", f"Não foi possível salvar o diagnóstico:\n{e}")
+                return
+            self._mostrar_status_temporario(f"Diagnóstico salvo em {caminho}", 6)
 
-        for projeto in sorted(sessoes_periodo.keys()):
-            dados = sessoes_periodo[projeto]
-            elements.append(
-                Paragraph(f"<b>{projeto}</b> — Total: {self.formatar_duracao(dados['total_segundos'])}", styles["Normal"])
+        def limpar():
+            self.monitor.limpar()
+            atualizar()
+
+        def alternar_sonda():
+            if sonda_var.get():
+                self.monitor.iniciar()
+            else:
+                self.monitor.parar()
+            logger.info("Sonda do laço de eventos %s", "ligada" if sonda_var.get() else "desligada")
+
+        def verificar_integridade():
+            botao_integridade.config(state=tk.DISABLED)
+            resultado = {}
+            # A varredura só lê do disco; a reparação (que altera o repositório) volta à thread do Tk.
+            tarefa = threading.Thread(
+                target=lambda: resultado.update(problemas=integridade.varrer(self.repositorio)),
+                name="verificar-integridade", daemon=True,
             )
-            table_data = [["Data", "Entrada", "Saída", "Duração"]]
-            for s in sorted(dados["sessoes"], key=lambda x: x["data"]):
-                di = datetime.fromisoformat(s["data"])
-                entrada = di.strftime("%d/%m/%Y %H:%M")
-                if "data_saida" in s:
-                    ds = datetime.fromisoformat(s["data_saida"])
-                    saida = ds.strftime("%H:%M")
+            tarefa.start()
+
+            def aguardar():
+                if tarefa.is_alive():
+                    janela.after(100, aguardar)
+                    return
+                if janela.winfo_exists():
+                    botao_integridade.config(state=tk.NORMAL)
+                problemas = resultado.get("problemas")
+                if problemas is None:
+                    messagebox.showerror("Integridade", "A verificação falhou; veja o log.", parent=janela)
+                elif not problemas:
+                    messagebox.showinfo("Integridade", "Histórico íntegro.", parent=janela)
                 else:
-                    saida = "-"
-                dur = self.formatar_duracao(s["duracao_segundos"])
-                table_data.append([entrada.split()[0], entrada.split()[1], saida, dur])
-            t = Table(table_data, colWidths=[3 * cm, 2.5 * cm, 2 * cm, 2 * cm])
-            t.setStyle(
-                TableStyle(
-                    [
-                        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#2563eb")),
-                        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                        ("FONTSIZE", (0, 0), (-1, 0), 10),
-                        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-                        ("BACKGROUND", (0, 1), (-1, -1), colors.HexColor("#f8fafc")),
-                        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#e2e8f0")),
-                        ("FONTSIZE", (0, 1), (-1, -1), 9),
-                    ]
-                )
-            )
-            elements.append(t)
-            elements.append(Spacer(1, 14))
+                    lista = "\n".join(f"{p or 'histórico'}: {m}" for p, m in problemas)
+                    if messagebox.askyesno("Integridade", f"{lista}\n\nRecuperar agora?", parent=janela):
+                        recuperacao = integridade.reparar(self.repositorio, problemas)
+                        self.atualizar_dropdown_projetos()
+                        messagebox.showinfo("Integridade", recuperacao.resumo(), parent=janela)
 
-        try:
-            doc.build(elements)
-            logger.debug("PDF gerado com sucesso: %s", caminho)
-            return True
-        except Exception as e:
-            logger.exception("Falha ao gerar PDF: %s", e)
-            return False
+            janela.after(100, aguardar)
+
+        botoes = ttk.Frame(frame)
+        botoes.grid(row=4, column=0, pady=(4, 0))
+        ttk.Label(botoes, text="Limiar (ms):").pack(side=tk.LEFT, padx=(0, 4))
+        limiar_var = tk.StringVar(value=str(self.monitor.limiar_ms))
+        entry_limiar = ttk.Entry(botoes, textvariable=limiar_var, width=6)
+        entry_limiar.pack(side=tk.LEFT, padx=(0, 4))
+        entry_limiar.bind("<Return>", aplicar_limiar)
+        ttk.Button(botoes, text="Aplicar", command=aplicar_limiar).pack(side=tk.LEFT, padx=4)
+        sonda_var = tk.BooleanVar(value=self.monitor.ligado)
+        ttk.Checkbutton(botoes, text="Sonda do laço", variable=sonda_var, command=alternar_sonda).pack(
+            side=tk.LEFT, padx=4
+        )
+        ttk.Button(botoes, text="Atualizar", command=atualizar).pack(side=tk.LEFT, padx=4)
+        ttk.Button(botoes, text="Limpar", command=limpar).pack(side=tk.LEFT, padx=4)
+        ttk.Button(botoes, text="Salvar em arquivo", command=salvar_arquivo).pack(side=tk.LEFT, padx=4)
+        botao_integridade = ttk.Button(botoes, text="Verificar integridade", command=verificar_integridade)
+        botao_integridade.pack(side=tk.LEFT, padx=4)
+        ttk.Button(botoes, text="Fechar", command=janela.destroy).pack(side=tk.LEFT, padx=4)
+        atualizar()
 
     def centralizar_janela_log(self, janela_log):
         janela_log.update_idletasks()
@@ -1155,18 +1797,21 @@ class ContadorHoras:
         posicao_y = (altura_tela // 2) - (altura_janela // 2)
         janela_log.geometry(f"{largura_janela}x{altura_janela}+{posicao_x}+{posicao_y}")
 
-    def exibir_log(self, data_inicio, data_fim, tipo_log, projetos_filtro, janela_parent=None):
-        logger.debug("exibir_log: tipo=%s periodo=%s a %s projetos_filtro=%s", tipo_log, data_inicio, data_fim, projetos_filtro)
-        sessoes_periodo = self.filtrar_sessoes_por_periodo(
-            data_inicio, data_fim, projetos_filtro
+    def exibir_log(self, data_inicio, data_fim, tipo_log, projetos_filtro, janela_parent=None, tags=None):
+        logger.debug(
+            "exibir_log: tipo=%s periodo=%s a %s projetos_filtro=%s tags=%s",
+            tipo_log, data_inicio, data_fim, projetos_filtro, tags,
         )
+        sessoes_periodo = self.relatorios.sessoes_periodo(data_inicio, data_fim, projetos_filtro, tags)
+        texto_tags = " ".join("#" + tag for tag in tags or ())
 
         if not sessoes_periodo:
             logger.debug("exibir_log: nenhuma sessão no período")
             messagebox.showinfo(
                 "Log " + tipo_log,
                 f"Nenhuma sessão no período de {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}"
-                + (" para os projetos selecionados." if projetos_filtro else "."),
+                + (" para os projetos selecionados" if projetos_filtro else "")
+                + (f" com as etiquetas {texto_tags}." if texto_tags else "."),
             )
             if janela_parent:
                 janela_parent.deiconify()
@@ -1176,7 +1821,7 @@ class ContadorHoras:
         janela_log.title(
             f"Log {tipo_log} — {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}"
         )
-        janela_log.geometry("720x520")
+        janela_log.geometry("720x640")
         janela_log.resizable(True, True)
 
         janela_log.grid_rowconfigure(0, weight=1)
@@ -1184,7 +1829,7 @@ class ContadorHoras:
 
         frame_principal = ttk.Frame(janela_log, padding="16")
         frame_principal.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
-        frame_principal.grid_rowconfigure(3, weight=1)
+        frame_principal.grid_rowconfigure(4, weight=1)
         frame_principal.grid_columnconfigure(0, weight=1)
 
         ttk.Label(frame_principal, text=f"Relatório {tipo_log}", style="Title.TLabel").grid(
@@ -1192,7 +1837,8 @@ class ContadorHoras:
         )
         ttk.Label(
             frame_principal,
-            text=f"Período: {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}",
+            text=f"Período: {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}"
+            + (f" — etiquetas: {texto_tags}" if texto_tags else ""),
         ).grid(row=1, column=0, sticky=tk.N, pady=(0, 8))
 
         total_geral_segundos = sum(d["total_segundos"] for d in sessoes_periodo.values())
@@ -1202,6 +1848,40 @@ class ContadorHoras:
             style="Total.TLabel",
         ).grid(row=2, column=0, pady=(0, 12))
 
+        resumo_frame = ttk.Frame(frame_principal)
+        resumo_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 8))
+        resumo_frame.grid_columnconfigure(0, weight=1)
+        ttk.Label(resumo_frame, text="Resumo por:").grid(row=0, column=0, sticky=tk.E, padx=(0, 6))
+        agrupamento_var = tk.StringVar(value=AGRUPAMENTOS["semana"])
+        combo_agrupamento = ttk.Combobox(
+            resumo_frame, textvariable=agrupamento_var, values=list(AGRUPAMENTOS.values()),
+            state="readonly", width=16,
+        )
+        combo_agrupamento.grid(row=0, column=1, sticky=tk.W, pady=(0, 4))
+        tree_resumo = ttk.Treeview(resumo_frame, columns=("duracao",), show="tree headings", height=6)
+        tree_resumo.heading("#0", text="Período / projeto")
+        tree_resumo.heading("duracao", text="Duração")
+        tree_resumo.column("#0", width=320)
+        tree_resumo.column("duracao", width=100, anchor=tk.CENTER)
+        tree_resumo.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E))
+
+        def preencher_resumo(event=None):
+            agrupamento = next(k for k, v in AGRUPAMENTOS.items() if v == agrupamento_var.get())
+            tree_resumo.delete(*tree_resumo.get_children(""))
+            resultado = self.agregar_sessoes(data_inicio, data_fim, agrupamento, projetos_filtro, tags)
+            totais = resultado.total_por_chave()
+            pais = {}
+            for chave, projeto, segundos in resultado.linhas():
+                if chave not in pais:
+                    pais[chave] = tree_resumo.insert(
+                        "", tk.END, text=resultado.rotulo(chave),
+                        values=(self.formatar_duracao(totais[chave]),),
+                    )
+                tree_resumo.insert(pais[chave], tk.END, text=projeto, values=(self.formatar_duracao(segundos),))
+
+        combo_agrupamento.bind("<<ComboboxSelected>>", preencher_resumo)
+        preencher_resumo()
+
         canvas = tk.Canvas(frame_principal)
         scrollbar = ttk.Scrollbar(frame_principal, orient="vertical", command=canvas.yview)
         frame_scrollavel = ttk.Frame(canvas)
@@ -1213,29 +1893,42 @@ class ContadorHoras:
         canvas.create_window(0, 0, window=frame_scrollavel, anchor="n")
         canvas.configure(yscrollcommand=scrollbar.set)
 
-        canvas.grid(row=3, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
-        scrollbar.grid(row=3, column=1, sticky=(tk.N, tk.S))
+        canvas.grid(row=4, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+        scrollbar.grid(row=4, column=1, sticky=(tk.N, tk.S))
         frame_principal.grid_columnconfigure(0, weight=1)
 
-        for projeto, dados in sorted(sessoes_periodo.items()):
-            lf = ttk.LabelFrame(frame_scrollavel, text=projeto, padding="10")
-            lf.pack(fill=tk.X, pady=6, padx=4)
-            ttk.Label(
-                lf, text=f"Total: {self.formatar_duracao(dados['total_segundos'])}"
-            ).pack(anchor=tk.W)
-            for i, sessao in enumerate(
-                sorted(dados["sessoes"], key=lambda x: x["data"]), 1
-            ):
-                data_sessao = datetime.fromisoformat(sessao["data"])
-                duracao = self.formatar_duracao(sessao["duracao_segundos"])
-                saida_str = ""
-                if "data_saida" in sessao:
-                    ds = datetime.fromisoformat(sessao["data_saida"])
-                    saida_str = f" — Saída: {ds.strftime('%H:%M')}"
-                texto = (
-                    f"{i}. {data_sessao.strftime('%d/%m/%Y %H:%M')}{saida_str} — Duração: {duracao}"
-                )
-                ttk.Label(lf, text=texto).pack(anchor=tk.W)
+        with instrumentacao.medir("renderizar_relatorio", formato="janela") as medicao:
+            sessoes_exibidas = 0
+            for projeto, dados in sorted(sessoes_periodo.items()):
+                lf = ttk.LabelFrame(frame_scrollavel, text=projeto, padding="10")
+                lf.pack(fill=tk.X, pady=6, padx=4)
+                ttk.Label(
+                    lf, text=f"Total: {self.formatar_duracao(dados['total_segundos'])}"
+                ).pack(anchor=tk.W)
+                for i, sessao in enumerate(dados["sessoes"], 1):
+                    data_sessao = datetime.fromisoformat(sessao["data"])
+                    duracao = self.formatar_duracao(sessao["duracao_segundos"])
+                    if "agregado" in sessao:
+                        texto = (
+                            f"{i}. {data_sessao.strftime('%d/%m/%Y')} — {sessao['agregado']} sessão(ões) "
+                            f"compactada(s) — Duração: {duracao}"
+                        )
+                        ttk.Label(lf, text=texto).pack(anchor=tk.W)
+                        continue
+                    saida_str = ""
+                    if "data_saida" in sessao:
+                        ds = datetime.fromisoformat(sessao["data_saida"])
+                        saida_str = f" — Saída: {ds.strftime('%H:%M')}"
+                    texto = (
+                        f"{i}. {data_sessao.strftime('%d/%m/%Y %H:%M')}{saida_str} — Duração: {duracao}"
+                    )
+                    if "tags" in sessao:
+                        texto += " — " + " ".join("#" + tag for tag in sessao["tags"])
+                    if "nota" in sessao:
+                        texto += f" — {sessao['nota']}"
+                    ttk.Label(lf, text=texto).pack(anchor=tk.W)
+                sessoes_exibidas += len(dados["sessoes"])
+            medicao.anotar(projetos=len(sessoes_periodo), sessoes=sessoes_exibidas)
 
         def fechar():
             janela_log.destroy()
@@ -1243,15 +1936,34 @@ class ContadorHoras:
                 janela_parent.deiconify()
 
         ttk.Button(frame_principal, text="Fechar", command=fechar).grid(
-            row=4, column=0, pady=12
+            row=5, column=0, pady=12
         )
         self.centralizar_janela_log(janela_log)
 
 
-def main():
+def configurar_logging(nivel=None):
+    """Configura o log do processo (nível por argumento ou HORAS_TRABALHADAS_LOG) e as métricas."""
+    nivel = (nivel or os.environ.get("HORAS_TRABALHADAS_LOG") or NIVEL_LOG_PADRAO).upper()
+    logging.basicConfig(
+        level=getattr(logging, nivel, logging.INFO),
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    instrumentacao.ativar_pelo_ambiente()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    configurar_logging()
+    metricas_http.iniciar_pelo_ambiente()
+    if argv:
+        from .cli import executar
+        sys.exit(executar(argv))
     root = tk.Tk()
     app = ContadorHoras(root)
     root.mainloop()
+    app.encerrar_api()
+    app.encerrar_sincronizacao()
+    app.eventos.encerrar()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Diagnóstico de travamentos da janela: atraso do loop de eventos Tk e duração
+dos principais manipuladores.
+
+O ``MonitorLatencia`` arma uma sonda ``after`` a cada ``intervalo_ms`` e compara
+o instante previsto com o instante em que ela realmente rodou; a diferença é o
+tempo em que o loop ficou ocupado com outra coisa. A sonda acorda o processo
+sozinha, então só é ligada a pedido (HORAS_TRABALHADAS_SONDA=1 ou o painel de
+diagnóstico) e fica suspensa com a janela minimizada. Os manipuladores medidos
+com ``medir`` entram em histogramas próprios (sem custo fora das chamadas), e
+qualquer bloqueio acima de ``limiar_ms`` é registrado no log e na lista de
+ocorrências.
+"""
+
+import bisect
+import json
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (ms) das faixas do histograma; a última faixa é aberta.
+FAIXAS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+LIMIAR_PADRAO_MS = 200
+INTERVALO_SONDA_MS = 500
+MAX_OCORRENCIAS = 200
+NOME_LACO = "laço de eventos"
+VARIAVEL_SONDA = "HORAS_TRABALHADAS_SONDA"
+
+
+def sonda_habilitada():
+    """True se HORAS_TRABALHADAS_SONDA pede a sonda do laço de eventos desde a partida (padrão: desligada)."""
+    return os.environ.get(VARIAVEL_SONDA, "").strip().lower() in ("1", "true", "sim", "on")
+
+
+class Histograma:
+    """Contagem de latências (ms) em faixas fixas, com soma e máximo."""
+
+    def __init__(self, faixas=FAIXAS_MS):
+        self.faixas = tuple(faixas)
+        self.contagens = [0] * (len(self.faixas) + 1)
+        self.quantidade = 0
+        self.soma_ms = 0.0
+        self.maximo_ms = 0.0
+
+    def registrar(self, ms):
+        self.contagens[bisect.bisect_left(self.faixas, ms)] += 1
+        self.quantidade += 1
+        self.soma_ms += ms
+        if ms > self.maximo_ms:
+            self.maximo_ms = ms
+
+    def media_ms(self):
+        return self.soma_ms / self.quantidade if self.quantidade else 0.0
+
+    def percentil(self, p):
+        """Limite superior da faixa que contém o percentil ``p`` (0–100); o máximo na última faixa."""
+        if not self.quantidade:
+            return 0.0
+        alvo = self.quantidade * p / 100.0
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo and contagem:
+                return float(min(self.faixas[i], self.maximo_ms)) if i < len(self.faixas) else self.maximo_ms
+        return self.maximo_ms
+
+    def resumo(self):
+        rotulos = [f"<={f}" for f in self.faixas] + [f">{self.faixas[-1]}"]
+        return {
+            "quantidade": self.quantidade,
+            "media_ms": round(self.media_ms(), 2),
+            "p50_ms": round(self.percentil(50), 2),
+            "p95_ms": round(self.percentil(95), 2),
+            "p99_ms": round(self.percentil(99), 2),
+            "maximo_ms": round(self.maximo_ms, 2),
+            "faixas": {r: c for r, c in zip(rotulos, self.contagens) if c},
+        }
+
+
+class MonitorLatencia:
+    """Vigia do loop Tk: sonda de atraso, histogramas por manipulador e ocorrências de bloqueio."""
+
+    def __init__(self, root, limiar_ms=LIMIAR_PADRAO_MS, intervalo_ms=INTERVALO_SONDA_MS):
+        self.root = root
+        self.limiar_ms = limiar_ms
+        self.intervalo_ms = intervalo_ms
+        self.histogramas = {}
+        self.ocorrencias = deque(maxlen=MAX_OCORRENCIAS)
+        self.inicio = datetime.now()
+        self._after_id = None
+        self._ligado = False
+        self._previsto = None
+        self._ultimo_manipulador = None
+
+    def histograma(self, nome):
+        h = self.histogramas.get(nome)
+        if h is None:
+            h = self.histogramas[nome] = Histograma()
+        return h
+
+    @property
+    def ligado(self):
+        return self._ligado
+
+    def iniciar(self):
+        self._ligado = True
+        self.retomar()
+
+    def parar(self):
+        self._ligado = False
+        self.suspender()
+
+    def suspender(self):
+        """Para a sonda sem desligá-la (janela minimizada); ``retomar`` volta a armá-la."""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def retomar(self):
+        if self._ligado and self._after_id is None:
+            self._armar_sonda()
+
+    def _armar_sonda(self):
+        self._previsto = time.perf_counter() + self.intervalo_ms / 1000.0
+        self._after_id = self.root.after(self.intervalo_ms, self._sonda)
+
+    def _sonda(self):
+        atraso_ms = max(0.0, (time.perf_counter() - self._previsto) * 1000.0)
+        self.histograma(NOME_LACO).registrar(atraso_ms)
+        if atraso_ms > self.limiar_ms:
+            self._registrar_ocorrencia(NOME_LACO, atraso_ms, self._ultimo_manipulador)
+        self._ultimo_manipulador = None
+        self._armar_sonda()
+
+    def _registrar_ocorrencia(self, nome, ms, causa=None):
+        self.ocorrencias.append({
+            "instante": datetime.now().isoformat(timespec="seconds"),
+            "origem": nome,
+            "duracao_ms": round(ms, 1),
+            "causa_provavel": causa,
+        })
+        if causa:
+            logger.warning("%s bloqueado por %.0f ms (limiar %d ms; último manipulador: %s)",
+                           nome, ms, self.limiar_ms, causa)
+        else:
+            logger.warning("%s bloqueou o laço de eventos por %.0f ms (limiar %d ms)", nome, ms, self.limiar_ms)
+
+    @contextmanager
+    def medir(self, nome):
+        """Mede o bloco como manipulador ``nome``."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000.0
+            self.histograma(nome).registrar(ms)
+            self._ultimo_manipulador = nome
+            if ms > self.limiar_ms:
+                self._registrar_ocorrencia(nome, ms)
+
+    def instrumentar(self, objeto, nomes):
+        """Substitui os métodos ``nomes`` de ``objeto`` por versões medidas."""
+        for nome in nomes:
+            original = getattr(objeto, nome)
+
+            def medido(*args, _original=original, _nome=nome, **kwargs):
+                with self.medir(_nome):
+                    return _original(*args, **kwargs)
+
+            setattr(objeto, nome, wraps(original)(medido))
+
+    def resumo(self):
+        return {
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "limiar_ms": self.limiar_ms,
+            "intervalo_sonda_ms": self.intervalo_ms,
+            "sonda_ligada": self._ligado,
+            "histogramas": {nome: h.resumo() for nome, h in sorted(self.histogramas.items())},
+            "ocorrencias": list(self.ocorrencias),
+        }
+
+    def despejar(self, caminho):
+        """Grava o resumo em JSON no caminho indicado."""
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(self.resumo(), f, indent=2, ensure_ascii=False)
+        logger.info("Diagnóstico gravado em %s", caminho)
+
+    def limpar(self):
+        self.histogramas.clear()
+        self.ocorrencias.clear()
+        self.inicio = datetime.now()
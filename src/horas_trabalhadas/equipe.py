@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Relatório de equipe: consolida vários arquivos de histórico (um por pessoa).
+
+Cada arquivo é lido, migrado e filtrado num processo do pool; o processo devolve
+só os agregados do período (totais por projeto e por faixa/projeto), e o processo
+principal os mescla à medida que chegam. A memória do processo principal fica
+proporcional ao número de pessoas × projetos × faixas, não ao tamanho dos arquivos,
+e cada processo do pool carrega um arquivo por vez.
+
+Num diretório, cada diretório de dados do programa (com ``historico_horas.json``
+ou, no formato fragmentado, ``historico_indice.json``) conta só pelo histórico:
+backups, instantâneos e arquivos de projeto ficam de fora. Os demais ``.json``
+são tratados como históricos de uma pessoa; os que não têm a estrutura de um
+histórico vão para ``RelatorioEquipe.erros`` em vez de contar como arquivo.
+
+O usuário de cada arquivo é o nome do arquivo sem extensão ou, para os arquivos
+de um diretório de dados, o nome do diretório acima (ignorando ``data/``).
+"""
+
+import glob
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .agregacao import AGRUPAMENTOS, ResultadoAgregacao, agregar
+from .historico import (
+    NOME_ARQUIVO_HISTORICO,
+    NOME_ARQUIVO_INDICE,
+    ErroIntegridade,
+    abrir_repositorio,
+    historico_fragmentado,
+    iterar_sessoes_periodo,
+    migrar_formato_historico,
+)
+
+from .relatorio_pdf import COR_RESUMO, COR_SESSOES, REPORTLAB_AVAILABLE, estilo_tabela, estilos
+
+logger = logging.getLogger(__name__)
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, Spacer
+except ImportError:
+    pass
+
+
+def formatar_duracao(segundos):
+    horas, resto = divmod(int(segundos), 3600)
+    minutos, segundos_rest = divmod(resto, 60)
+    return f"{horas:02d}:{minutos:02d}:{segundos_rest:02d}"
+
+
+def localizar_arquivos(origem):
+    """
+    Históricos de um diretório (recursivo) ou de um padrão glob, em ordem. De um
+    diretório de dados do programa entra só o histórico (o índice, se fragmentado).
+    """
+    if not os.path.isdir(origem):
+        return sorted(a for a in glob.glob(origem, recursive=True) if os.path.isfile(a))
+    arquivos = []
+    for diretorio, subdiretorios, nomes in os.walk(origem):
+        if historico_fragmentado(diretorio):
+            arquivos.append(os.path.join(diretorio, NOME_ARQUIVO_INDICE))
+        elif NOME_ARQUIVO_HISTORICO in nomes:
+            arquivos.append(os.path.join(diretorio, NOME_ARQUIVO_HISTORICO))
+        else:
+            arquivos.extend(os.path.join(diretorio, nome) for nome in nomes if nome.endswith(".json"))
+            continue
+        subdiretorios.clear()
+    return sorted(arquivos)
+
+
+def parece_historico(dados):
+    """True se ``dados`` tem a estrutura de um histórico: {projeto: {"sessoes": [...]}} (ou total antigo)."""
+    return isinstance(dados, dict) and all(
+        isinstance(valor, (int, float)) or (isinstance(valor, dict) and isinstance(valor.get("sessoes"), list))
+        for valor in dados.values()
+    )
+
+
+def nome_usuario(caminho):
+    nome = os.path.basename(caminho)
+    if nome not in (NOME_ARQUIVO_HISTORICO, NOME_ARQUIVO_INDICE):
+        return os.path.splitext(nome)[0]
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    if os.path.basename(diretorio) == "data":
+        diretorio = os.path.dirname(diretorio)
+    return os.path.basename(diretorio) or nome
+
+
+def agregar_arquivo(caminho, data_inicio, data_fim, agrupamento="semana", projetos=None):
+    """
+    Executado no pool: lê e agrega um arquivo. Retorna (caminho, por_projeto, por_faixa, erro),
+    com por_projeto = {projeto: (sessoes, segundos)} e por_faixa = {chave da faixa: segundos}.
+    Um ``historico_indice.json`` é aberto como histórico fragmentado (lendo só os
+    projetos com tempo no período).
+    """
+    try:
+        if os.path.basename(caminho) == NOME_ARQUIVO_INDICE:
+            repositorio = abrir_repositorio(os.path.dirname(caminho))
+            repositorio.carregar()
+            if repositorio.corrompidos:
+                return caminho, {}, {}, f"projeto(s) corrompido(s): {', '.join(sorted(repositorio.corrompidos))}"
+            historico = repositorio.dados
+            ativos = repositorio.projetos_desde(data_inicio.date())
+            projetos = ativos if projetos is None else [p for p in projetos if p in ativos]
+        else:
+            with open(caminho, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+            if not parece_historico(dados):
+                return caminho, {}, {}, "não é um arquivo de histórico"
+            historico = migrar_formato_historico(dados)
+        # No formato fragmentado os projetos são lidos (e conferidos) aqui, sob demanda.
+        por_projeto = {}
+        for projeto, sessao in iterar_sessoes_periodo(historico, data_inicio, data_fim, projetos):
+            sessoes, segundos = por_projeto.get(projeto, (0, 0.0))
+            por_projeto[projeto] = (sessoes + sessao.get("agregado", 1), segundos + sessao["duracao_segundos"])
+        por_faixa = {}
+        if agrupamento and por_projeto:
+            por_faixa = agregar(historico, data_inicio, data_fim, agrupamento, projetos).total_por_chave()
+    except (OSError, ValueError, ErroIntegridade) as e:
+        return caminho, {}, {}, str(e)
+    return caminho, por_projeto, por_faixa, None
+
+
+class RelatorioEquipe:
+    """Agregados mesclados: por (usuário, projeto) e por (faixa, usuário)."""
+
+    def __init__(self, data_inicio, data_fim, agrupamento="semana"):
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.agrupamento = agrupamento
+        self.por_usuario_projeto = {}
+        self.por_faixa_usuario = {}
+        self.arquivos = 0
+        self.erros = []
+        self._rotulador = ResultadoAgregacao(agrupamento, [], [], {})
+
+    def mesclar(self, usuario, por_projeto, por_faixa):
+        self.arquivos += 1
+        for projeto, (sessoes, segundos) in por_projeto.items():
+            anteriores = self.por_usuario_projeto.get((usuario, projeto), (0, 0.0))
+            self.por_usuario_projeto[(usuario, projeto)] = (anteriores[0] + sessoes, anteriores[1] + segundos)
+        for chave, segundos in por_faixa.items():
+            k = (chave, usuario)
+            self.por_faixa_usuario[k] = self.por_faixa_usuario.get(k, 0.0) + segundos
+
+    def usuarios(self):
+        return sorted({u for u, _ in self.por_usuario_projeto})
+
+    def total_usuario(self, usuario):
+        return sum(s for (u, _), (_, s) in self.por_usuario_projeto.items() if u == usuario)
+
+    def total_geral(self):
+        return sum(s for _, s in self.por_usuario_projeto.values())
+
+    def linhas(self):
+        """(usuário, projeto, sessões, segundos) ordenados."""
+        for (usuario, projeto), (sessoes, segundos) in sorted(self.por_usuario_projeto.items()):
+            yield usuario, projeto, sessoes, segundos
+
+    def rotulo(self, chave):
+        return self._rotulador.rotulo(chave)
+
+    def faixas(self):
+        return sorted({c for c, _ in self.por_faixa_usuario}, key=lambda c: (c is None, c))
+
+
+def gerar_relatorio_equipe(arquivos, data_inicio, data_fim, agrupamento="semana", projetos=None, processos=None):
+    """Agrega os arquivos em paralelo (``processos`` workers; padrão: núcleos da máquina)."""
+    if agrupamento and agrupamento not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento desconhecido: {agrupamento}")
+    relatorio = RelatorioEquipe(data_inicio, data_fim, agrupamento)
+    if not arquivos:
+        return relatorio
+    usuarios = {caminho: nome_usuario(caminho) for caminho in arquivos}
+    if processos == 1 or len(arquivos) == 1:
+        resultados = (agregar_arquivo(c, data_inicio, data_fim, agrupamento, projetos) for c in arquivos)
+        _mesclar_resultados(relatorio, usuarios, resultados)
+        return relatorio
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        futuros = [
+            pool.submit(agregar_arquivo, caminho, data_inicio, data_fim, agrupamento, projetos)
+            for caminho in arquivos
+        ]
+        _mesclar_resultados(relatorio, usuarios, (f.result() for f in as_completed(futuros)))
+    return relatorio
+
+
+def _mesclar_resultados(relatorio, usuarios, resultados):
+    for caminho, por_projeto, por_faixa, erro in resultados:
+        if erro:
+            logger.error("Relatório de equipe: erro ao ler %s: %s", caminho, erro)
+            relatorio.erros.append((caminho, erro))
+            continue
+        relatorio.mesclar(usuarios[caminho], por_projeto, por_faixa)
+
+
+def formatar_texto(relatorio):
+    linhas = [
+        f"Relatório de equipe — {relatorio.data_inicio:%d/%m/%Y} a {relatorio.data_fim:%d/%m/%Y} "
+        f"({relatorio.arquivos} arquivo(s))",
+        f"Total geral: {formatar_duracao(relatorio.total_geral())}",
+        "",
+    ]
+    usuario_atual = None
+    for usuario, projeto, sessoes, segundos in relatorio.linhas():
+        if usuario != usuario_atual:
+            if usuario_atual is not None:
+                linhas.append("")
+            linhas.append(f"{usuario} — {formatar_duracao(relatorio.total_usuario(usuario))}")
+            usuario_atual = usuario
+        linhas.append(f"  {projeto:<40} {sessoes:>6} sessão(ões)  {formatar_duracao(segundos)}")
+    if relatorio.agrupamento and relatorio.por_faixa_usuario:
+        linhas.extend(["", f"Resumo por {AGRUPAMENTOS[relatorio.agrupamento].lower()}:"])
+        for chave in relatorio.faixas():
+            for usuario in relatorio.usuarios():
+                segundos = relatorio.por_faixa_usuario.get((chave, usuario))
+                if segundos:
+                    linhas.append(f"  {relatorio.rotulo(chave):<24} {usuario:<24} {formatar_duracao(segundos)}")
+    return "\n".join(linhas)
+
+
+def exportar_pdf_equipe(relatorio, caminho):
+    """Gera o PDF do relatório de equipe. Retorna False se o reportlab não estiver disponível."""
+    if not REPORTLAB_AVAILABLE:
+        logger.debug("exportar_pdf_equipe: reportlab não disponível")
+        return False
+    doc = SimpleDocTemplate(
+        caminho, pagesize=A4, rightMargin=2 * cm, leftMargin=2 * cm,
+        topMargin=2 * cm, bottomMargin=2 * cm,
+    )
+    styles = estilos()
+    title_style = styles["TituloRelatorio"]
+    elements = [
+        Paragraph("Relatório de Horas da Equipe", title_style),
+        Paragraph(
+            f"Período: {relatorio.data_inicio.strftime('%d/%m/%Y')} a {relatorio.data_fim.strftime('%d/%m/%Y')}",
+            styles["Normal"],
+        ),
+        Spacer(1, 16),
+        Paragraph(f"Total geral: {formatar_duracao(relatorio.total_geral())}", styles["Normal"]),
+        Spacer(1, 20),
+    ]
+
+    dados = [["Usuário", "Total"]]
+    for usuario in relatorio.usuarios():
+        dados.append([usuario, formatar_duracao(relatorio.total_usuario(usuario))])
+    t = Table(dados, colWidths=[9 * cm, 3 * cm], repeatRows=1)
+    t.setStyle(estilo_tabela(COR_RESUMO))
+    elements.extend([t, Spacer(1, 20)])
+
+    if relatorio.agrupamento and relatorio.por_faixa_usuario:
+        elements.append(
+            Paragraph(f"<b>Resumo por {AGRUPAMENTOS[relatorio.agrupamento].lower()}</b>", styles["Normal"])
+        )
+        dados = [[AGRUPAMENTOS[relatorio.agrupamento], "Usuário", "Duração"]]
+        for chave in relatorio.faixas():
+            for usuario in relatorio.usuarios():
+                segundos = relatorio.por_faixa_usuario.get((chave, usuario))
+                if segundos:
+                    dados.append([relatorio.rotulo(chave), usuario, formatar_duracao(segundos)])
+        t = Table(dados, colWidths=[4.5 * cm, 6 * cm, 2.5 * cm], repeatRows=1)
+        t.setStyle(estilo_tabela(COR_RESUMO))
+        elements.extend([t, Spacer(1, 20)])
+
+    for usuario in relatorio.usuarios():
+        elements.append(
+            Paragraph(
+                f"<b>{usuario}</b> — Total: {formatar_duracao(relatorio.total_usuario(usuario))}",
+                styles["Normal"],
+            )
+        )
+        dados = [["Projeto", "Sessões", "Duração"]]
+        for u, projeto, sessoes, segundos in relatorio.linhas():
+            if u == usuario:
+                dados.append([projeto, str(sessoes), formatar_duracao(segundos)])
+        t = Table(dados, colWidths=[8 * cm, 2 * cm, 2.5 * cm], repeatRows=1)
+        t.setStyle(estilo_tabela(COR_SESSOES))
+        elements.extend([t, Spacer(1, 14)])
+
+    try:
+        doc.build(elements)
+        logger.debug("PDF de equipe gerado com sucesso: %s", caminho)
+        return True
+    except Exception as e:
+        logger.exception("Falha ao gerar PDF de equipe: %s", e)
+        return False
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Eventos de ponto e de edição do histórico entregues a integrações (plugins).
+
+Quem publica (``ControlePonto``, janela) só monta o evento e o põe nas filas dos
+manipuladores interessados: não há E/S nem espera na thread do Tk. Um pool
+pequeno de threads entrega os eventos em lotes, na ordem, a cada manipulador; o
+mesmo manipulador nunca roda em duas threads ao mesmo tempo, e um manipulador
+lento ocupa só uma thread e só a sua fila.
+
+Cada fila tem capacidade limitada: quando enche (integração parada ou lenta
+demais), o evento mais antigo daquele manipulador é descartado e contado, em vez
+de a memória crescer sem limite ou de quem publica ficar esperando.
+
+Plugins são descobertos pelo grupo de entry points ``horas_trabalhadas.eventos``:
+cada entrada aponta para uma função que recebe o barramento e registra seus
+manipuladores::
+
+    [project.entry-points."horas_trabalhadas.eventos"]
+    erp = "minha_integracao:registrar"
+
+    def registrar(barramento):
+        barramento.registrar(enviar_ao_erp, tipos={"ponto_saida"}, nome="erp")
+
+    def enviar_ao_erp(eventos):   # lista de eventos, na ordem em que ocorreram
+        ...
+
+Cada evento é um dict ``{"tipo", "instante", "projeto", "sessao", "anterior"}``
+com cópias das sessões (podem ser lidas na thread do manipulador).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from . import instrumentacao
+
+logger = logging.getLogger(__name__)
+
+try:
+    from importlib.metadata import entry_points
+    METADATA_AVAILABLE = True
+except ImportError:
+    METADATA_AVAILABLE = False
+
+GRUPO_ENTRY_POINTS = "horas_trabalhadas.eventos"
+TIPOS = ("ponto_entrada", "ponto_saida", "sessao_adicionada", "sessao_editada", "sessao_removida")
+
+TRABALHADORES_PADRAO = 2
+CAPACIDADE_PADRAO = 1000
+LOTE_PADRAO = 50
+
+
+def _entradas_do_grupo(grupo):
+    pontos = entry_points()
+    if hasattr(pontos, "select"):
+        return list(pontos.select(group=grupo))
+    return list(pontos.get(grupo, []))
+
+
+class Manipulador:
+    """Função registrada, com sua fila e contadores."""
+
+    def __init__(self, funcao, nome, tipos, capacidade, lote):
+        self.funcao = funcao
+        self.nome = nome
+        self.tipos = frozenset(tipos) if tipos else None
+        self.capacidade = capacidade
+        self.lote = lote
+        self.fila = deque()
+        # True enquanto está na fila de prontos ou rodando numa thread do pool.
+        self.agendado = False
+        self.entregues = 0
+        self.descartados = 0
+        self.falhas = 0
+
+    def aceita(self, tipo):
+        return self.tipos is None or tipo in self.tipos
+
+
+class BarramentoEventos:
+    """Publicação sem bloqueio e entrega em lotes por um pool limitado de threads."""
+
+    def __init__(self, trabalhadores=TRABALHADORES_PADRAO, capacidade=CAPACIDADE_PADRAO, lote=LOTE_PADRAO):
+        self.trabalhadores = trabalhadores
+        self.capacidade = capacidade
+        self.lote = lote
+        self.manipuladores = []
+        self._condicao = threading.Condition()
+        self._prontos = deque()
+        self._threads = []
+        self._encerrando = False
+
+    @property
+    def ativo(self):
+        return bool(self.manipuladores)
+
+    def registrar(self, funcao, tipos=None, nome=None, capacidade=None, lote=None):
+        """
+        Registra ``funcao(eventos)`` para os ``tipos`` indicados (None: todos). As threads
+        do pool só são criadas no primeiro registro. Retorna o Manipulador.
+        """
+        desconhecidos = set(tipos or ()) - set(TIPOS)
+        if desconhecidos:
+            raise ValueError(f"Tipos de evento desconhecidos: {', '.join(sorted(desconhecidos))}")
+        manipulador = Manipulador(
+            funcao, nome or getattr(funcao, "__qualname__", repr(funcao)), tipos,
+            capacidade or self.capacidade, lote or self.lote,
+        )
+        with self._condicao:
+            self.manipuladores = self.manipuladores + [manipulador]
+            if not self._threads:
+                self._iniciar_threads()
+        logger.debug("Manipulador de eventos registrado: %s (tipos: %s)", manipulador.nome, tipos or "todos")
+        return manipulador
+
+    def carregar_plugins(self, grupo=GRUPO_ENTRY_POINTS):
+        """Chama a função de registro de cada plugin instalado. Retorna quantos foram carregados."""
+        if not METADATA_AVAILABLE:
+            logger.debug("carregar_plugins: importlib.metadata não disponível")
+            return 0
+        carregados = 0
+        for ponto in _entradas_do_grupo(grupo):
+            try:
+                ponto.load()(self)
+                carregados += 1
+                logger.info("Plugin de eventos carregado: %s", ponto.name)
+            except Exception as e:
+                logger.exception("Erro ao carregar o plugin de eventos %s: %s", ponto.name, e)
+        return carregados
+
+    def _iniciar_threads(self):
+        for i in range(self.trabalhadores):
+            thread = threading.Thread(target=self._trabalhar, name=f"eventos-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def publicar(self, tipo, projeto=None, sessao=None, anterior=None):
+        """Enfileira o evento para os manipuladores interessados; nunca espera por eles."""
+        manipuladores = self.manipuladores
+        if not manipuladores or self._encerrando:
+            return
+        evento = {
+            "tipo": tipo,
+            "instante": datetime.now().isoformat(),
+            "projeto": projeto,
+            "sessao": dict(sessao) if sessao is not None else None,
+            "anterior": dict(anterior) if anterior is not None else None,
+        }
+        descartados = 0
+        with self._condicao:
+            for manipulador in manipuladores:
+                if not manipulador.aceita(tipo):
+                    continue
+                if len(manipulador.fila) >= manipulador.capacidade:
+                    manipulador.fila.popleft()
+                    manipulador.descartados += 1
+                    descartados += 1
+                    if manipulador.descartados == 1 or manipulador.descartados % 1000 == 0:
+                        logger.warning(
+                            "Fila de eventos de %s cheia: %d evento(s) descartado(s) até agora",
+                            manipulador.nome, manipulador.descartados,
+                        )
+                manipulador.fila.append(evento)
+                if not manipulador.agendado:
+                    manipulador.agendado = True
+                    self._prontos.append(manipulador)
+                    self._condicao.notify()
+        if descartados:
+            instrumentacao.contar("eventos_descartados", descartados)
+
+    def _trabalhar(self):
+        while True:
+            with self._condicao:
+                while not self._prontos and not self._encerrando:
+                    self._condicao.wait()
+                if not self._prontos:
+                    return
+                manipulador = self._prontos.popleft()
+                lote = [manipulador.fila.popleft() for _ in range(min(manipulador.lote, len(manipulador.fila)))]
+            try:
+                manipulador.funcao(lote)
+            except Exception as e:
+                manipulador.falhas += 1
+                instrumentacao.contar("eventos_falhas")
+                # Integração com defeito falha em todo lote: o log registra a primeira e uma a cada 100.
+                if manipulador.falhas == 1 or manipulador.falhas % 100 == 0:
+                    logger.exception(
+                        "Erro no manipulador de eventos %s (%d falha(s)): %s", manipulador.nome, manipulador.falhas, e
+                    )
+            with self._condicao:
+                manipulador.entregues += len(lote)
+                if manipulador.fila:
+                    self._prontos.append(manipulador)
+                    self._condicao.notify()
+                else:
+                    manipulador.agendado = False
+                    self._condicao.notify_all()
+
+    def pendentes(self):
+        with self._condicao:
+            return sum(len(m.fila) for m in self.manipuladores)
+
+    def esperar(self, tempo_limite=None):
+        """Espera até todos os eventos publicados serem entregues. Retorna False se o tempo acabar."""
+        limite = None if tempo_limite is None else time.monotonic() + tempo_limite
+        with self._condicao:
+            while any(m.agendado for m in self.manipuladores):
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._condicao.wait(restante)
+        return True
+
+    def encerrar(self, tempo_limite=5.0):
+        """Entrega o que estiver na fila (até ``tempo_limite``) e para as threads."""
+        if not self._threads:
+            return
+        inicio = time.monotonic()
+        if not self.esperar(tempo_limite):
+            logger.warning("Encerrando com %d evento(s) não entregue(s)", self.pendentes())
+        with self._condicao:
+            self._encerrando = True
+            for manipulador in self.manipuladores:
+                manipulador.fila.clear()
+                manipulador.agendado = False
+            self._prontos.clear()
+            self._condicao.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, tempo_limite - (time.monotonic() - inicio)))
+        self._threads = []
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Exportação em fluxo (CSV ou JSON lines) de sessões e de agregados.
+
+As linhas são produzidas por geradores e escritas uma a uma, sem montar a
+lista completa em memória; o filtro de período/projetos é o mesmo de
+``filtrar_sessoes_por_periodo`` (sessões cuja entrada está no período).
+"""
+
+import csv
+import json
+from datetime import datetime
+
+from .agregacao import agregar
+from .historico import iterar_sessoes_periodo
+
+CAMPOS_SESSOES = ("projeto", "data", "data_saida", "duracao_segundos", "tags", "nota")
+CAMPOS_DIARIO = ("projeto", "dia", "duracao_segundos")
+CAMPOS_PROJETOS = ("projeto", "sessoes", "duracao_segundos")
+
+
+def iterar_linhas_sessoes(historico, data_inicio, data_fim, projetos=None, pares=None):
+    """
+    Uma linha por sessão, na ordem em que estão gravadas (dias compactados: uma linha
+    por dia); etiquetas separadas por espaço. ``pares`` ((projeto, sessao) já
+    selecionados, ex.: de uma busca por etiqueta) substitui o filtro do período.
+    """
+    if pares is None:
+        pares = iterar_sessoes_periodo(historico, data_inicio, data_fim, projetos)
+    for projeto, sessao in pares:
+        yield {
+            "projeto": projeto,
+            "data": sessao["data"],
+            "data_saida": sessao.get("data_saida", ""),
+            "duracao_segundos": sessao["duracao_segundos"],
+            "tags": " ".join(sessao.get("tags", ())),
+            "nota": sessao.get("nota", ""),
+        }
+
+
+def iterar_linhas_diarias(historico, data_inicio, data_fim, projetos=None):
+    """
+    Uma linha por (projeto, dia), com sessões que cruzam a meia-noite repartidas.
+    Agrega um projeto por vez: a memória é proporcional aos dias de um projeto.
+    """
+    if projetos is None:
+        projetos = list(historico.keys())
+    for projeto in projetos:
+        resultado = agregar(historico, data_inicio, data_fim, "dia", [projeto])
+        for dia, _, segundos in resultado.linhas():
+            yield {"projeto": projeto, "dia": dia.isoformat(), "duracao_segundos": segundos}
+
+
+def iterar_linhas_projetos(historico, data_inicio, data_fim, projetos=None):
+    """Uma linha por projeto com número de sessões e total no período."""
+    if projetos is None:
+        projetos = list(historico.keys())
+    for projeto in projetos:
+        quantidade = 0
+        total = 0.0
+        for _, sessao in iterar_sessoes_periodo(historico, data_inicio, data_fim, [projeto]):
+            quantidade += sessao.get("agregado", 1)
+            total += sessao["duracao_segundos"]
+        if quantidade:
+            yield {"projeto": projeto, "sessoes": quantidade, "duracao_segundos": total}
+
+
+TIPOS_EXPORTACAO = {
+    "sessoes": (iterar_linhas_sessoes, CAMPOS_SESSOES),
+    "diario": (iterar_linhas_diarias, CAMPOS_DIARIO),
+    "projetos": (iterar_linhas_projetos, CAMPOS_PROJETOS),
+}
+
+
+def escrever_csv(linhas, arquivo, campos):
+    escritor = csv.DictWriter(arquivo, fieldnames=campos, lineterminator="\n")
+    escritor.writeheader()
+    quantidade = 0
+    for linha in linhas:
+        escritor.writerow(linha)
+        quantidade += 1
+    return quantidade
+
+
+def escrever_jsonl(linhas, arquivo):
+    quantidade = 0
+    for linha in linhas:
+        arquivo.write(json.dumps(linha, ensure_ascii=False))
+        arquivo.write("\n")
+        quantidade += 1
+    return quantidade
+
+
+def exportar(historico, arquivo, tipo="sessoes", formato="csv",
+             data_inicio=None, data_fim=None, projetos=None):
+    """Escreve no arquivo (já aberto) as linhas do tipo pedido. Retorna o número de linhas."""
+    if tipo not in TIPOS_EXPORTACAO:
+        raise ValueError(f"Tipo de exportação desconhecido: {tipo}")
+    gerador, campos = TIPOS_EXPORTACAO[tipo]
+    linhas = gerador(
+        historico,
+        data_inicio or datetime.min,
+        data_fim or datetime.max,
+        projetos,
+    )
+    if formato == "csv":
+        return escrever_csv(linhas, arquivo, campos)
+    if formato == "jsonl":
+        return escrever_jsonl(linhas, arquivo)
+    raise ValueError(f"Formato de exportação desconhecido: {formato}")
@@ -0,0 +1,941 @@
+# -*- coding: utf-8 -*-
+"""
+Armazenamento do histórico de horas, independente da interface gráfica.
+
+Concentra a localização do diretório de dados, a leitura/migração/gravação do
+arquivo JSON (ou, no formato fragmentado, de um arquivo por projeto) e as
+operações de inclusão de sessões, para que a janela Tk e os comandos de linha de
+comando usem o mesmo caminho.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime, timedelta
+
+from . import instrumentacao, partida_rapida
+
+logger = logging.getLogger(__name__)
+
+NOME_ARQUIVO_HISTORICO = "historico_horas.json"
+NOME_ARQUIVO_SESSAO_ABERTA = "sessao_aberta.json"
+# Formato fragmentado: índice (nomes e totais) + um arquivo por projeto em projetos/.
+NOME_ARQUIVO_INDICE = "historico_indice.json"
+NOME_DIRETORIO_PROJETOS = "projetos"
+# Integridade: o arquivo único tem o checksum ao lado; no fragmentado, fica no índice.
+SUFIXO_CHECKSUM = ".sha256"
+SUFIXO_ANTERIOR = ".anterior"
+# Sessões compactadas de cada projeto: {"AAAA-MM-DD": [quantidade, segundos]} pelo dia da entrada.
+CHAVE_AGREGADOS = "agregados_diarios"
+
+
+def localizar_diretorio_dados():
+    """Retorna (criando se preciso) o diretório data/ na raiz do projeto ou em ~."""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(4):
+        if os.path.exists(os.path.join(base_dir, "setup.py")) or \
+           os.path.exists(os.path.join(base_dir, "pyproject.toml")):
+            break
+        parent = os.path.dirname(base_dir)
+        if parent == base_dir:
+            base_dir = os.path.expanduser("~")
+            break
+        base_dir = parent
+
+    data_dir = os.path.join(base_dir, "data")
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir, exist_ok=True)
+        logger.debug("Diretório data criado: %s", data_dir)
+    return data_dir
+
+
+class ErroIntegridade(Exception):
+    """Arquivo do histórico ilegível, ausente ou com checksum diferente do gravado."""
+
+    def __init__(self, mensagem, projeto=None):
+        super().__init__(mensagem)
+        self.projeto = projeto
+
+
+def checksum(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def assinatura_arquivo(caminho):
+    """[tamanho, mtime_ns]: se não mudou desde a última verificação, o conteúdo não precisa ser relido."""
+    estado = os.stat(caminho)
+    return [estado.st_size, estado.st_mtime_ns]
+
+
+def serializar_historico(dados, indent=None):
+    return json.dumps(dados, indent=indent, ensure_ascii=False).encode("utf-8")
+
+
+def gravar_atomico(caminho, conteudo, manter_anterior=False):
+    """
+    Grava os bytes num temporário ao lado e troca pelo destino: quem lê vê o arquivo
+    antigo ou o novo inteiro. Com ``manter_anterior``, a versão substituída fica como
+    ``<arquivo>.anterior`` (um link, ou cópia onde não há links, feito antes da troca:
+    o destino nunca fica ausente). Retorna a assinatura do arquivo gravado.
+    """
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(conteudo)
+        f.flush()
+        os.fsync(f.fileno())
+    if manter_anterior and os.path.exists(caminho):
+        anterior = caminho + SUFIXO_ANTERIOR
+        provisorio = anterior + ".tmp"
+        try:
+            os.remove(provisorio)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(caminho, provisorio)
+        except OSError:
+            shutil.copy2(caminho, provisorio)
+        os.replace(provisorio, anterior)
+    os.replace(temporario, caminho)
+    return assinatura_arquivo(caminho)
+
+
+def gravar_json_atomico(caminho, dados, indent=None):
+    """Grava o JSON de forma atômica (ver ``gravar_atomico``)."""
+    gravar_atomico(caminho, serializar_historico(dados, indent))
+
+
+def restaurar_ausente(caminho, somas=()):
+    """
+    Põe de volta o arquivo ``caminho`` que sumiu (ex.: queda no meio da gravação de uma
+    versão antiga, que renomeava o arquivo antes de trocar) a partir do ``.tmp`` ou do
+    ``.anterior`` ao lado: o primeiro com um dos checksums ``somas`` ou, sem checksum
+    conhecido, o primeiro JSON válido. Retorna o conteúdo restaurado; None se não há
+    cópia ao lado. Havendo cópias e nenhuma conferindo, levanta ErroIntegridade.
+    """
+    candidatos = []
+    for sufixo in (".tmp", SUFIXO_ANTERIOR):
+        try:
+            with open(caminho + sufixo, "rb") as f:
+                candidatos.append((caminho + sufixo, f.read()))
+        except OSError:
+            pass
+    for origem, conteudo in candidatos:
+        if somas:
+            valido = checksum(conteudo) in somas
+        else:
+            try:
+                json.loads(conteudo)
+                valido = True
+            except ValueError:
+                valido = False
+        if valido:
+            gravar_atomico(caminho, conteudo)
+            logger.warning("%s ausente: restaurado de %s", caminho, origem)
+            return conteudo
+    if candidatos:
+        raise ErroIntegridade(f"{caminho}: arquivo ausente e nenhuma cópia ao lado (.tmp, .anterior) confere")
+    return None
+
+
+def ler_verificado(caminho, esperado, verificado=None, projeto=None, alternativo=None):
+    """
+    Lê o arquivo e confere o checksum ``esperado`` (None: sem checksum gravado). A conta
+    é pulada quando a assinatura atual é a ``verificado`` da última verificação limpa.
+    ``alternativo`` também é aceito: o checksum da versão anterior, enquanto uma gravação
+    interrompida não chegou a trocar o arquivo. Retorna (conteudo, assinatura, conferido),
+    com ``conferido`` o checksum que conferiu (None se a conta foi pulada).
+    """
+    try:
+        with open(caminho, "rb") as f:
+            conteudo = f.read()
+        assinatura = assinatura_arquivo(caminho)
+    except OSError as e:
+        raise ErroIntegridade(f"{caminho}: {e}", projeto) from e
+    if esperado is None or assinatura == verificado:
+        return conteudo, assinatura, None
+    soma = checksum(conteudo)
+    if soma != esperado and (alternativo is None or soma != alternativo):
+        raise ErroIntegridade(f"{caminho}: checksum não confere (arquivo corrompido ou alterado fora da aplicação)", projeto)
+    return conteudo, assinatura, soma
+
+
+def checksum_alternativo(registro):
+    """Checksum da versão anterior ainda aceito: o registro foi gravado antes dos dados e a troca não foi confirmada."""
+    return registro.get("sha256_anterior") if registro.get("verificado") is None else None
+
+
+def decodificar_json(conteudo, caminho, projeto=None):
+    try:
+        return json.loads(conteudo)
+    except ValueError as e:
+        raise ErroIntegridade(f"{caminho}: JSON inválido ({e})", projeto) from e
+
+
+def nome_fragmento(projeto):
+    """Nome do arquivo do projeto: legível, com hash para não colidir entre nomes parecidos."""
+    base = re.sub(r"[^\w.-]+", "_", projeto).strip("._")[:40] or "projeto"
+    return f"{base}-{hashlib.sha1(projeto.encode('utf-8')).hexdigest()[:8]}.json"
+
+
+def migrar_formato_historico(historico):
+    """Converte entradas do formato antigo (apenas número) para o formato com sessões."""
+    novo_historico = {}
+    for projeto, dados in historico.items():
+        if isinstance(dados, dict) and "sessoes" in dados:
+            novo_historico[projeto] = dados
+        elif isinstance(dados, (int, float)):
+            novo_historico[projeto] = {
+                "total_segundos": dados,
+                "sessoes": [],
+            }
+    return novo_historico
+
+
+def sessao_agregada(dia, quantidade, segundos):
+    """
+    Pseudo-sessão que representa nos relatórios as sessões compactadas de um dia:
+    entrada à meia-noite, sem saída, com ``agregado`` = quantidade de sessões.
+    """
+    return {"data": f"{dia}T00:00:00", "duracao_segundos": segundos, "agregado": quantidade}
+
+
+def partes_por_dia(entrada, segundos):
+    """[(dia, segundos)] de uma sessão repartida à meia-noite pelos dias que ela ocupa."""
+    partes = []
+    while True:
+        meia_noite = datetime.combine(entrada.date() + timedelta(days=1), datetime.min.time())
+        parte = min(segundos, (meia_noite - entrada).total_seconds())
+        partes.append((entrada.date(), parte))
+        segundos -= parte
+        if segundos <= 0:
+            return partes
+        entrada = meia_noite
+
+
+def iterar_agregados_periodo(dados, data_inicio, data_fim):
+    """Pseudo-sessões dos dias compactados do projeto com entrada em [data_inicio, data_fim]."""
+    for dia, (quantidade, segundos) in dados.get(CHAVE_AGREGADOS, {}).items():
+        sessao = sessao_agregada(dia, quantidade, segundos)
+        if data_inicio <= datetime.fromisoformat(sessao["data"]) <= data_fim:
+            yield sessao
+
+
+def ultimo_dia(dados):
+    """
+    Dia (ISO) até o qual o projeto pode ter tempo registrado, ou None se não tem nenhum:
+    a maior entrada somada à maior duração (um limite, sem converter cada sessão).
+    """
+    sessoes = dados.get("sessoes") or ()
+    ultimo = max(dados.get(CHAVE_AGREGADOS) or (), default=None)
+    if sessoes:
+        entrada = datetime.fromisoformat(max(s["data"] for s in sessoes))
+        fim = entrada + timedelta(seconds=max(s["duracao_segundos"] for s in sessoes))
+        ultimo = max(ultimo or "", fim.date().isoformat())
+    return ultimo
+
+
+def iterar_sessoes_periodo(historico, data_inicio, data_fim, projetos=None):
+    """
+    Gera (projeto, sessao) das sessões cuja entrada está em [data_inicio, data_fim].
+    Com projetos=None considera todos; projetos inexistentes são ignorados.
+    Dias compactados entram como uma pseudo-sessão por dia (``sessao_agregada``).
+    """
+    if projetos is None:
+        projetos = list(historico.keys())
+    if instrumentacao.ativo():
+        return _iterar_sessoes_periodo_medindo(historico, data_inicio, data_fim, projetos)
+    return _iterar_sessoes_periodo(historico, data_inicio, data_fim, projetos)
+
+
+def _iterar_sessoes_periodo(historico, data_inicio, data_fim, projetos):
+    for projeto in projetos:
+        dados = historico.get(projeto)
+        if dados is None:
+            continue
+        for sessao in dados.get("sessoes", []):
+            if data_inicio <= datetime.fromisoformat(sessao["data"]) <= data_fim:
+                yield projeto, sessao
+        if CHAVE_AGREGADOS in dados:
+            for sessao in iterar_agregados_periodo(dados, data_inicio, data_fim):
+                yield projeto, sessao
+
+
+def _iterar_sessoes_periodo_medindo(historico, data_inicio, data_fim, projetos):
+    """Igual a _iterar_sessoes_periodo, registrando sessões percorridas e selecionadas."""
+    percorridas = selecionadas = 0
+    with instrumentacao.medir("filtrar") as medicao:
+        try:
+            for projeto in projetos:
+                dados = historico.get(projeto)
+                if dados is None:
+                    continue
+                for sessao in dados.get("sessoes", []):
+                    percorridas += 1
+                    if data_inicio <= datetime.fromisoformat(sessao["data"]) <= data_fim:
+                        selecionadas += 1
+                        yield projeto, sessao
+                if CHAVE_AGREGADOS in dados:
+                    for sessao in iterar_agregados_periodo(dados, data_inicio, data_fim):
+                        selecionadas += 1
+                        yield projeto, sessao
+        finally:
+            medicao.anotar(percorridas=percorridas, selecionadas=selecionadas)
+
+
+def calcular_total_sessoes(sessoes):
+    """Soma duracao_segundos das sessões (invariante de total_segundos do projeto)."""
+    return sum(s["duracao_segundos"] for s in sessoes)
+
+
+def calcular_total_projeto(dados):
+    """Soma das sessões detalhadas e dos dias compactados do projeto."""
+    total = calcular_total_sessoes(dados.get("sessoes", []))
+    if CHAVE_AGREGADOS in dados:
+        total += sum(segundos for _, segundos in dados[CHAVE_AGREGADOS].values())
+    return total
+
+
+def verificar_totais(historico, tolerancia=1e-6):
+    """
+    Confere o invariante total_segundos == soma das sessões (e dos dias compactados)
+    em cada projeto. Retorna [(projeto, total_gravado, soma_sessoes)] dos divergentes.
+    """
+    divergentes = []
+    for projeto, dados in historico.items():
+        soma = calcular_total_projeto(dados)
+        if abs(dados.get("total_segundos", 0) - soma) > tolerancia * max(1.0, abs(soma)):
+            divergentes.append((projeto, dados.get("total_segundos", 0), soma))
+    return divergentes
+
+
+class RepositorioHistorico:
+    """
+    Histórico de projetos em memória associado ao arquivo JSON em disco.
+
+    ``geracao`` é incrementada a cada alteração dos dados; quem guarda resultados
+    derivados (ex.: cache de relatórios) compara a geração para não servir dados velhos.
+    ``geracao_de(projeto)`` é a geração da última alteração daquele projeto.
+    As alterações devem passar pelos métodos abaixo ou chamar ``marcar_alterado``.
+
+    Ouvintes (``adicionar_ouvinte``) recebem ``(operacao, projeto, anterior, sessao)``
+    a cada sessão alterada ("substituir") ou removida ("remover"), uma vez por
+    inclusão ("adicionar", com a lista das sessões incluídas juntas em ``sessao``),
+    e também ``("carregar" | "salvar" | "compactar", None, None, None)``.
+    """
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.dados = {}
+        self.geracao = 0
+        self.geracao_todos = 0
+        self.geracao_projetos = {}
+        self.ouvintes = []
+        # True quando o arquivo existe mas não pôde ser carregado: salvar() recusa gravar.
+        self.bloqueado = False
+        # Instantâneo de partida rápida (ver ``partida_rapida``); None quando desligado.
+        self.instantaneo = None
+        if partida_rapida.partida_rapida_habilitada():
+            self.instantaneo = partida_rapida.GravadorInstantaneo(arquivo)
+        # (geração, extras) lidos com o histórico do instantâneo; valem enquanto a geração não mudar.
+        self.extras_instantaneo = None
+
+    def marcar_alterado(self, projeto=None):
+        self.geracao += 1
+        if projeto is None:
+            self.geracao_todos = self.geracao
+        else:
+            self.geracao_projetos[projeto] = self.geracao
+
+    def geracao_de(self, projeto):
+        return max(self.geracao_todos, self.geracao_projetos.get(projeto, 0))
+
+    def projetos_desde(self, dia):
+        """
+        Projetos que podem ter tempo registrado de ``dia`` (date) em diante; os demais
+        ficam de fora de totais e relatórios a partir dele. Aqui, todos (já estão em memória).
+        """
+        return list(self.dados)
+
+    def adicionar_ouvinte(self, ouvinte):
+        self.ouvintes.append(ouvinte)
+
+    def remover_ouvinte(self, ouvinte):
+        self.ouvintes.remove(ouvinte)
+
+    def _notificar(self, operacao, projeto=None, anterior=None, sessao=None):
+        for ouvinte in self.ouvintes:
+            ouvinte(operacao, projeto, anterior, sessao)
+
+    @property
+    def arquivo_checksum(self):
+        return self.arquivo + SUFIXO_CHECKSUM
+
+    def _ler_checksum(self):
+        try:
+            with open(self.arquivo_checksum, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _gravar_checksum(self, soma, verificado, anterior=None):
+        registro = {"sha256": soma, "verificado": verificado}
+        if anterior is not None:
+            registro["sha256_anterior"] = anterior
+        gravar_json_atomico(self.arquivo_checksum, registro)
+
+    def _checksum_atual(self):
+        """Checksum do arquivo em disco: o registrado (ou o anterior, se a última troca não se confirmou)."""
+        registro = self._ler_checksum()
+        if registro.get("sha256") is not None and registro.get("verificado") is not None:
+            return registro["sha256"]
+        # Sem checksum gravado, ou com uma troca não confirmada: vale o do próprio arquivo.
+        try:
+            with open(self.arquivo, "rb") as f:
+                return checksum(f.read())
+        except OSError:
+            return None
+
+    def carregar(self):
+        """
+        Lê, confere e migra o arquivo. Arquivo ilegível ou com checksum diferente do
+        gravado levanta ErroIntegridade (e o histórico em memória fica bloqueado para
+        gravação, ver ``bloqueado``); outras exceções de leitura são propagadas. Arquivo
+        ausente com ``.tmp`` ou ``.anterior`` ao lado é restaurado (``restaurar_ausente``).
+        """
+        self.bloqueado = True
+        registro = self._ler_checksum()
+        if not os.path.exists(self.arquivo):
+            restaurado = restaurar_ausente(self.arquivo, {registro.get("sha256"), registro.get("sha256_anterior")} - {None})
+            if restaurado is None:
+                logger.debug("Arquivo de histórico não existe, iniciando com histórico vazio")
+                self.dados = {}
+                self.bloqueado = False
+                self.marcar_alterado()
+                self._notificar("carregar")
+                return self.dados
+            registro = {"sha256": checksum(restaurado), "verificado": None}
+            self._gravar_checksum(registro["sha256"], None)
+        logger.debug("Carregando histórico de %s", self.arquivo)
+        lido = self._ler_instantaneo(registro)
+        extras = refazer = None
+        if lido is not None:
+            dados, extras = lido
+        else:
+            with instrumentacao.medir("carregar") as medicao:
+                conteudo, assinatura, conferido = ler_verificado(
+                    self.arquivo, registro.get("sha256"), registro.get("verificado"),
+                    alternativo=checksum_alternativo(registro),
+                )
+                historico = decodificar_json(conteudo, self.arquivo)
+                if instrumentacao.ativo():
+                    medicao.anotar(bytes=len(conteudo), projetos=len(historico))
+            if conferido:
+                # Conferiu com o checksum da versão anterior: a última gravação não chegou a
+                # trocar o arquivo, e o registro volta a ser o do arquivo que ficou.
+                self._gravar_checksum(
+                    conferido, assinatura, registro.get("sha256_anterior") if conferido == registro["sha256"] else None
+                )
+            with instrumentacao.medir("migrar"):
+                dados = migrar_formato_historico(historico)
+            refazer = (assinatura, conferido or registro.get("sha256") or checksum(conteudo))
+        self.dados = dados
+        self.bloqueado = False
+        self.marcar_alterado()
+        self.extras_instantaneo = (self.geracao, extras) if extras else None
+        self._notificar("carregar")
+        # Depois de notificar: quem exporta extras já descartou o que derivou dos dados anteriores.
+        if refazer is not None and self.instantaneo is not None:
+            self.instantaneo.agendar(self.dados, *refazer)
+        if instrumentacao.ativo():
+            self._publicar_tamanho()
+        return self.dados
+
+    def _ler_instantaneo(self, registro):
+        """
+        (histórico, extras) do instantâneo de partida rápida, se ele corresponde ao arquivo atual.
+        Com checksum gravado, vale o sha256 registrado na última verificação limpa desta
+        assinatura; sem checksum, o do próprio arquivo. Retorna None para ler o JSON.
+        """
+        if self.instantaneo is None:
+            return None
+        with instrumentacao.medir("carregar_instantaneo") as medicao:
+            try:
+                assinatura = assinatura_arquivo(self.arquivo)
+                if registro.get("sha256") is None:
+                    with open(self.arquivo, "rb") as f:
+                        soma = checksum(f.read())
+                elif registro.get("verificado") == assinatura:
+                    soma = registro["sha256"]
+                else:
+                    return None
+            except OSError:
+                return None
+            lido = partida_rapida.ler_instantaneo(self.arquivo, assinatura, soma)
+            if instrumentacao.ativo():
+                medicao.anotar(valido=lido is not None)
+        if lido is not None:
+            logger.debug("Histórico carregado do instantâneo de partida rápida")
+        return lido
+
+    def substituir_dados(self, dados):
+        """Troca todo o histórico em memória (ex.: cópia recuperada) e libera a gravação."""
+        self.dados = dados
+        self.bloqueado = False
+        self.marcar_alterado()
+        self._notificar("carregar")
+
+    def verificar(self, completo=False):
+        """
+        Confere o arquivo em disco contra o checksum sem carregá-lo. Sem ``completo``,
+        só relê se mudou desde a última verificação limpa. Retorna [(projeto, motivo)];
+        aqui ``projeto`` é sempre None (o arquivo é uma partição só).
+        """
+        if not os.path.exists(self.arquivo):
+            return []
+        registro = self._ler_checksum()
+        try:
+            ler_verificado(
+                self.arquivo, registro.get("sha256"), None if completo else registro.get("verificado"),
+                alternativo=checksum_alternativo(registro),
+            )
+        except ErroIntegridade as e:
+            return [(None, str(e))]
+        return []
+
+    def salvar(self):
+        """
+        Grava o histórico completo de forma atômica, com o checksum ao lado; a versão
+        anterior fica em ``.anterior``. O checksum novo é registrado antes da troca (com o
+        do arquivo atual ainda aceito), para que uma queda entre as duas gravações não
+        faça um arquivo íntegro parecer corrompido. Exceções de escrita são propagadas.
+        """
+        if self.bloqueado:
+            raise ErroIntegridade(
+                f"{self.arquivo} não foi carregado corretamente; a gravação foi bloqueada para não sobrescrevê-lo"
+            )
+        with instrumentacao.medir("salvar") as medicao:
+            conteudo = serializar_historico(self.dados, indent=4)
+            soma = checksum(conteudo)
+            anterior = self._checksum_atual()
+            self._gravar_checksum(soma, None, anterior)
+            assinatura = gravar_atomico(self.arquivo, conteudo, manter_anterior=True)
+            self._gravar_checksum(soma, assinatura, anterior)
+            if instrumentacao.ativo():
+                medicao.anotar(bytes=len(conteudo), projetos=len(self.dados))
+        if self.instantaneo is not None:
+            self.instantaneo.agendar(self.dados, assinatura, soma)
+        self._notificar("salvar")
+        if instrumentacao.ativo():
+            self._publicar_tamanho()
+
+    def _publicar_tamanho(self):
+        instrumentacao.definir("historico_bytes", os.path.getsize(self.arquivo))
+        instrumentacao.definir("historico_projetos", len(self.dados))
+        instrumentacao.definir("historico_sessoes", sum(len(d.get("sessoes", [])) for d in self.dados.values()))
+
+    def adicionar_sessao(self, projeto, sessao):
+        """Inclui uma sessão no projeto (criando-o se preciso) e atualiza o total."""
+        self.adicionar_sessoes(projeto, [sessao])
+
+    def adicionar_sessoes(self, projeto, sessoes):
+        """Inclui várias sessões de uma vez no projeto, somando o total incrementalmente."""
+        if not sessoes:
+            return
+        dados = self.dados.get(projeto)
+        if dados is None:
+            dados = self.dados[projeto] = {"total_segundos": 0, "sessoes": []}
+        dados["sessoes"].extend(sessoes)
+        dados["total_segundos"] += calcular_total_sessoes(sessoes)
+        self.marcar_alterado(projeto)
+        self._notificar("adicionar", projeto, None, sessoes)
+
+    def substituir_sessao(self, projeto, indice, sessao):
+        """Troca a sessão ``indice`` do projeto e recalcula o total (mantendo o ``id``, se houver)."""
+        sessoes = self.dados[projeto]["sessoes"]
+        anterior = sessoes[indice]
+        if "id" in anterior and "id" not in sessao:
+            sessao["id"] = anterior["id"]
+        sessoes[indice] = sessao
+        self.recalcular_total(projeto)
+        self.marcar_alterado(projeto)
+        self._notificar("substituir", projeto, anterior, sessao)
+
+    def atualizar_sessao(self, projeto, sessao, novos_dados):
+        """
+        Altera no lugar uma sessão já presente no projeto, ajustando o total pela
+        diferença de duração (sem percorrer as demais sessões).
+        """
+        anterior = dict(sessao)
+        sessao.clear()
+        sessao.update(novos_dados)
+        self.dados[projeto]["total_segundos"] += sessao["duracao_segundos"] - anterior["duracao_segundos"]
+        self.marcar_alterado(projeto)
+        self._notificar("substituir", projeto, anterior, sessao)
+
+    def remover_sessao(self, projeto, indice):
+        """Remove a sessão ``indice``; o projeto é excluído quando fica sem sessões."""
+        sessao = self.dados[projeto]["sessoes"].pop(indice)
+        if not self.dados[projeto]["sessoes"] and not self.dados[projeto].get(CHAVE_AGREGADOS):
+            del self.dados[projeto]
+        else:
+            self.recalcular_total(projeto)
+        self.marcar_alterado(projeto)
+        self._notificar("remover", projeto, sessao, None)
+        return sessao
+
+    def recalcular_total(self, projeto):
+        """Recalcula total_segundos do projeto a partir das sessões e dos dias compactados."""
+        dados = self.dados[projeto]
+        dados["total_segundos"] = calcular_total_projeto(dados)
+
+    def sessoes_anteriores(self, data_corte):
+        """(projeto, sessao) das sessões detalhadas com entrada antes de ``data_corte``."""
+        return [
+            (projeto, sessao)
+            for projeto, dados in self.dados.items()
+            for sessao in dados.get("sessoes", [])
+            if datetime.fromisoformat(sessao["data"]) < data_corte
+        ]
+
+    def compactar(self, data_corte):
+        """
+        Troca as sessões com entrada antes de ``data_corte`` por totais diários
+        (``CHAVE_AGREGADOS``). ``total_segundos`` não muda. Sessões que cruzam a meia-noite
+        são repartidas entre os dias (a sessão conta na quantidade do dia da entrada), como
+        na agregação por dia dos relatórios. Retorna quantas sessões saíram.
+        """
+        compactadas = 0
+        for projeto, dados in self.dados.items():
+            mantidas = []
+            agregados = dados.get(CHAVE_AGREGADOS, {})
+            for sessao in dados.get("sessoes", []):
+                entrada = datetime.fromisoformat(sessao["data"])
+                if entrada >= data_corte:
+                    mantidas.append(sessao)
+                    continue
+                for i, (dia, parte) in enumerate(partes_por_dia(entrada, sessao["duracao_segundos"])):
+                    dia = dia.isoformat()
+                    quantidade, segundos = agregados.get(dia, (0, 0.0))
+                    agregados[dia] = [quantidade + (1 if i == 0 else 0), segundos + parte]
+            if len(mantidas) != len(dados.get("sessoes", [])):
+                compactadas += len(dados["sessoes"]) - len(mantidas)
+                dados["sessoes"] = mantidas
+                dados[CHAVE_AGREGADOS] = dict(sorted(agregados.items()))
+        if compactadas:
+            self.marcar_alterado()
+            self._notificar("compactar")
+        return compactadas
+
+
+_PENDENTE = object()
+
+
+class ProjetosSobDemanda(dict):
+    """
+    ``dict`` projeto -> dados em que cada projeto é lido do seu arquivo no primeiro
+    acesso. Nomes (``in``, ``keys``, ``len``) não leem nada; ``items``/``values``
+    leem todos.
+    """
+
+    def __init__(self, nomes, ler_projeto):
+        super().__init__((nome, _PENDENTE) for nome in nomes)
+        self._ler_projeto = ler_projeto
+
+    def __getitem__(self, projeto):
+        dados = super().__getitem__(projeto)
+        if dados is _PENDENTE:
+            dados = self._ler_projeto(projeto)
+            super().__setitem__(projeto, dados)
+        return dados
+
+    def get(self, projeto, padrao=None):
+        return self[projeto] if projeto in self else padrao
+
+    def values(self):
+        return [self[projeto] for projeto in self]
+
+    def items(self):
+        return [(projeto, self[projeto]) for projeto in self]
+
+    def pop(self, projeto, *padrao):
+        if projeto not in self and padrao:
+            return padrao[0]
+        dados = self[projeto]
+        super().pop(projeto)
+        return dados
+
+    def descartar(self, projeto):
+        """Tira o projeto sem lê-lo (ex.: arquivo corrompido)."""
+        super().pop(projeto, None)
+
+    def carregados(self):
+        return [projeto for projeto, dados in super().items() if dados is not _PENDENTE]
+
+    def carregado(self, projeto):
+        return super().get(projeto, _PENDENTE) is not _PENDENTE
+
+
+class RepositorioFragmentado(RepositorioHistorico):
+    """
+    Histórico com um arquivo JSON por projeto (``projetos/``) e um índice pequeno
+    (``historico_indice.json``) com nome, arquivo, total, quantidade de sessões e o
+    último dia com tempo registrado (``ultimo_dia``).
+
+    Carregar lê só o índice; cada projeto é lido quando acessado. Salvar grava, de
+    forma atômica, apenas os projetos alterados desde a última gravação (os que
+    passaram por ``marcar_alterado(projeto)``) e depois o índice; ``marcar_alterado()``
+    sem projeto marca todos os projetos carregados.
+
+    O índice guarda o checksum de cada arquivo de projeto e a assinatura (tamanho,
+    mtime) da última verificação limpa: ao carregar, só os arquivos que mudaram desde
+    então são relidos e conferidos. Projetos com arquivo ausente ou corrompido ficam
+    de fora de ``dados`` e em ``corrompidos`` (projeto -> motivo), sem impedir o uso
+    dos demais, e nunca são sobrescritos nem apagados por ``salvar``.
+    """
+
+    def __init__(self, diretorio):
+        super().__init__(os.path.join(diretorio, NOME_ARQUIVO_INDICE))
+        # Carregar já lê só o índice (os projetos vêm sob demanda): não há instantâneo.
+        self.instantaneo = None
+        self.diretorio_projetos = os.path.join(diretorio, NOME_DIRETORIO_PROJETOS)
+        self.indice = {}
+        self.corrompidos = {}
+        self._alterados = set()
+        self._todos_alterados = False
+
+    def marcar_alterado(self, projeto=None):
+        super().marcar_alterado(projeto)
+        if projeto is None:
+            self._todos_alterados = True
+        else:
+            self._alterados.add(projeto)
+
+    def carregar(self):
+        """
+        Lê o índice e confere os arquivos de projeto alterados desde a última verificação;
+        os projetos são lidos sob demanda. Índice ilegível levanta ErroIntegridade (e
+        bloqueia a gravação); projetos corrompidos vão para ``corrompidos``.
+        """
+        self.bloqueado = False
+        if not os.path.exists(self.arquivo):
+            try:
+                restaurar_ausente(self.arquivo)
+            except ErroIntegridade:
+                self.bloqueado = True
+                raise
+        if os.path.exists(self.arquivo):
+            with instrumentacao.medir("carregar") as medicao:
+                try:
+                    with open(self.arquivo, "rb") as f:
+                        conteudo = f.read()
+                except OSError as e:
+                    self.bloqueado = True
+                    raise ErroIntegridade(f"{self.arquivo}: {e}") from e
+                try:
+                    self.indice = decodificar_json(conteudo, self.arquivo)["projetos"]
+                except (ErroIntegridade, KeyError, TypeError) as e:
+                    self.bloqueado = True
+                    raise ErroIntegridade(f"{self.arquivo}: índice inválido ({e})") from e
+                if instrumentacao.ativo():
+                    medicao.anotar(bytes=len(conteudo), projetos=len(self.indice))
+        else:
+            logger.debug("Índice do histórico não existe, iniciando com histórico vazio")
+            self.indice = {}
+        self.corrompidos = dict(self.verificar())
+        for projeto, motivo in self.corrompidos.items():
+            logger.error("Projeto %r isolado: %s", projeto, motivo)
+        self.dados = ProjetosSobDemanda(
+            [p for p in self.indice if p not in self.corrompidos], self._ler_projeto
+        )
+        self.geracao += 1
+        self.geracao_todos = self.geracao
+        self._alterados.clear()
+        self._todos_alterados = False
+        self._notificar("carregar")
+        if instrumentacao.ativo():
+            self._publicar_tamanho()
+        return self.dados
+
+    def projetos_desde(self, dia):
+        """
+        Como em RepositorioHistorico, sem ler projetos: os ainda não lidos entram só se o
+        ``ultimo_dia`` do índice chega a ``dia`` (ou se o índice ainda não o tem).
+        """
+        dados = self.dados
+        if not isinstance(dados, ProjetosSobDemanda):
+            return list(dados)
+        limite = dia.isoformat()
+        projetos = []
+        for projeto in dados:
+            entrada = self.indice.get(projeto, {})
+            if dados.carregado(projeto) or "ultimo_dia" not in entrada or (entrada["ultimo_dia"] or "") >= limite:
+                projetos.append(projeto)
+        return projetos
+
+    def caminho_projeto(self, projeto):
+        return os.path.join(self.diretorio_projetos, self.indice[projeto]["arquivo"])
+
+    def verificar(self, completo=False):
+        """
+        Confere os arquivos de projeto contra os checksums do índice, sem carregá-los.
+        Sem ``completo``, só relê os que mudaram desde a última verificação limpa (e
+        a registra no índice em memória). Retorna [(projeto, motivo)] dos problemas.
+        """
+        problemas = []
+        for projeto, entrada in list(self.indice.items()):
+            try:
+                conteudo, assinatura, conferido = ler_verificado(
+                    self.caminho_projeto(projeto), entrada.get("sha256"),
+                    None if completo else entrada.get("verificado"), projeto,
+                    alternativo=checksum_alternativo(entrada),
+                )
+                if conferido and conferido != entrada["sha256"]:
+                    # A gravação foi interrompida depois do índice e antes do arquivo do
+                    # projeto: a entrada volta a descrever o arquivo que ficou.
+                    dados = decodificar_json(conteudo, self.caminho_projeto(projeto), projeto)
+                    self.indice[projeto] = entrada = self._entrada_indice(entrada["arquivo"], dados, conteudo)
+            except ErroIntegridade as e:
+                problemas.append((projeto, str(e)))
+                continue
+            if conferido and not completo:
+                entrada["verificado"] = assinatura
+        return problemas
+
+    def _ler_projeto(self, projeto):
+        caminho = self.caminho_projeto(projeto)
+        logger.debug("Carregando projeto %r de %s", projeto, caminho)
+        with instrumentacao.medir("carregar_projeto") as medicao:
+            entrada = self.indice[projeto]
+            conteudo, _, _ = ler_verificado(caminho, entrada.get("sha256"), entrada.get("verificado"), projeto)
+            dados = decodificar_json(conteudo, caminho, projeto)
+            if "ultimo_dia" not in entrada:
+                # Índice de uma versão anterior: completa a entrada (vai para o disco na próxima gravação).
+                entrada["ultimo_dia"] = ultimo_dia(dados)
+            if instrumentacao.ativo():
+                medicao.anotar(bytes=len(conteudo))
+        return dados
+
+    def _projetos_a_gravar(self):
+        if not self._todos_alterados:
+            projetos = set(self._alterados)
+        else:
+            carregados = self.dados.carregados() if isinstance(self.dados, ProjetosSobDemanda) else self.dados
+            projetos = self._alterados | set(carregados) | (set(self.indice) - set(self.dados))
+        # Projeto corrompido só é regravado se voltou a ``dados`` (ex.: recuperado de backup).
+        return {p for p in projetos if p not in self.corrompidos or p in self.dados}
+
+    @staticmethod
+    def _entrada_indice(arquivo, dados, conteudo, verificado=None):
+        return {
+            "arquivo": arquivo,
+            "total_segundos": dados.get("total_segundos", 0),
+            "sessoes": len(dados.get("sessoes", [])),
+            "bytes": len(conteudo),
+            "sha256": checksum(conteudo),
+            "verificado": verificado,
+            "ultimo_dia": ultimo_dia(dados),
+        }
+
+    def _gravar_indice(self, manter_anterior=False):
+        gravar_atomico(
+            self.arquivo, serializar_historico({"versao": 1, "projetos": self.indice}, indent=1),
+            manter_anterior=manter_anterior,
+        )
+
+    def salvar(self):
+        """
+        Grava os projetos alterados e o índice. O índice é gravado primeiro, com os
+        checksums novos e os anteriores ainda aceitos (ver ``checksum_alternativo``),
+        depois os projetos, e de novo ao fim com as assinaturas: uma queda no meio
+        não faz um arquivo íntegro parecer corrompido. Arquivos de projetos excluídos
+        só são apagados depois de saírem do índice. Exceções de escrita são propagadas.
+        """
+        if self.bloqueado:
+            raise ErroIntegridade(
+                f"{self.arquivo} não foi carregado corretamente; a gravação foi bloqueada para não sobrescrevê-lo"
+            )
+        os.makedirs(self.diretorio_projetos, exist_ok=True)
+        with instrumentacao.medir("salvar") as medicao:
+            a_gravar = []
+            excluidos = []
+            for projeto in sorted(self._projetos_a_gravar()):
+                entrada = self.indice.get(projeto)
+                if projeto not in self.dados:
+                    if entrada is not None:
+                        excluidos.append(entrada["arquivo"])
+                        del self.indice[projeto]
+                    continue
+                dados = self.dados[projeto]
+                arquivo = entrada["arquivo"] if entrada else nome_fragmento(projeto)
+                conteudo = serializar_historico(dados)
+                self.indice[projeto] = self._entrada_indice(arquivo, dados, conteudo)
+                if entrada and "sha256" in entrada:
+                    self.indice[projeto]["sha256_anterior"] = entrada["sha256"]
+                a_gravar.append((projeto, arquivo, conteudo))
+            self._gravar_indice(manter_anterior=True)
+            bytes_gravados = 0
+            for projeto, arquivo, conteudo in a_gravar:
+                caminho = os.path.join(self.diretorio_projetos, arquivo)
+                self.indice[projeto]["verificado"] = gravar_atomico(caminho, conteudo, manter_anterior=True)
+                self.corrompidos.pop(projeto, None)
+                bytes_gravados += len(conteudo)
+            if a_gravar:
+                self._gravar_indice()
+            for arquivo in excluidos:
+                for sufixo in ("", SUFIXO_ANTERIOR):
+                    try:
+                        os.remove(os.path.join(self.diretorio_projetos, arquivo) + sufixo)
+                    except FileNotFoundError:
+                        pass
+            if instrumentacao.ativo():
+                medicao.anotar(bytes=bytes_gravados + os.path.getsize(self.arquivo), projetos=len(a_gravar))
+        logger.debug("Histórico fragmentado: %d projeto(s) gravado(s)", len(a_gravar))
+        self._alterados.clear()
+        self._todos_alterados = False
+        self._notificar("salvar")
+        if instrumentacao.ativo():
+            self._publicar_tamanho()
+
+    def _publicar_tamanho(self):
+        instrumentacao.definir(
+            "historico_bytes", sum(e.get("bytes", 0) for e in self.indice.values())
+        )
+        instrumentacao.definir("historico_projetos", len(self.indice))
+        instrumentacao.definir("historico_sessoes", sum(e.get("sessoes", 0) for e in self.indice.values()))
+
+
+def historico_fragmentado(data_dir):
+    return os.path.exists(os.path.join(data_dir, NOME_ARQUIVO_INDICE))
+
+
+def abrir_repositorio(data_dir):
+    """Repositório do diretório de dados no formato encontrado (fragmentado ou arquivo único); não carrega."""
+    if historico_fragmentado(data_dir):
+        return RepositorioFragmentado(data_dir)
+    return RepositorioHistorico(os.path.join(data_dir, NOME_ARQUIVO_HISTORICO))
+
+
+def fragmentar_historico(data_dir):
+    """
+    Converte ``historico_horas.json`` para o formato fragmentado. O arquivo único é
+    mantido como ``historico_horas.json.migrado``. Retorna o número de projetos.
+    """
+    origem = RepositorioHistorico(os.path.join(data_dir, NOME_ARQUIVO_HISTORICO))
+    if historico_fragmentado(data_dir):
+        raise FileExistsError(f"O histórico em {data_dir} já está fragmentado")
+    if not os.path.exists(origem.arquivo):
+        raise FileNotFoundError(origem.arquivo)
+    origem.carregar()
+    destino = RepositorioFragmentado(data_dir)
+    destino.carregar()
+    destino.dados = origem.dados
+    destino.marcar_alterado()
+    destino.salvar()
+    os.replace(origem.arquivo, origem.arquivo + ".migrado")
+    if origem.instantaneo is not None:
+        origem.instantaneo.esperar()
+    partida_rapida.descartar_instantaneo(origem.arquivo)
+    return len(destino.indice)
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Importação em lote de sessões a partir de CSV ou JSON lines.
+
+A entrada é lida em fluxo e processada em lotes: cada lote é validado,
+agrupado por projeto e incorporado ao histórico em memória com atualização
+incremental dos totais. A gravação em disco fica a cargo de quem chama, uma
+única vez ao final (ver ``importar_arquivo``).
+
+Além do formato próprio (``projeto``, ``data``, ``data_saida``,
+``duracao_segundos``, ``tags``, ``nota``), os cabeçalhos mais comuns de outros rastreadores de
+horas são reconhecidos (ex.: ``Project``, ``Start date``/``Start time``,
+``End date``/``End time``, ``Duration``, ``Tags``, ``Description``).
+"""
+
+import csv
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+from .busca import anotar
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE_PADRAO = 5000
+MAX_ERROS_REGISTRADOS = 1000
+
+# Nomes de coluna aceitos (comparados em minúsculas, sem espaços nas pontas).
+ALIASES_COLUNAS = {
+    "projeto": ("projeto", "project", "projeto/cliente", "client", "cliente"),
+    "inicio": ("data", "entrada", "inicio", "início", "start", "start_time", "started_at"),
+    "data_inicio": ("data entrada", "data_entrada", "start date", "start_date"),
+    "hora_inicio": ("hora entrada", "hora_entrada", "start time"),
+    "fim": ("data_saida", "saida", "saída", "fim", "end", "end_time", "stopped_at"),
+    "data_fim": ("data saída", "data saida", "end date", "end_date"),
+    "hora_fim": ("hora saída", "hora saida", "hora_saida", "end time"),
+    "duracao": ("duracao_segundos", "duracao", "duração", "duration", "seconds"),
+    "tags": ("tags", "tag", "etiquetas"),
+    "nota": ("nota", "notas", "note", "notes", "description", "descrição", "descricao"),
+}
+
+
+class ErroImportacao(ValueError):
+    """Linha de entrada inválida."""
+
+
+class ResultadoImportacao:
+    """Resumo de uma importação: contagens e primeiras linhas rejeitadas."""
+
+    def __init__(self):
+        self.importadas = 0
+        self.duplicadas = 0
+        self.rejeitadas = 0
+        self.projetos = set()
+        self.total_segundos = 0.0
+        self.erros = []
+
+    def registrar_erro(self, linha, mensagem):
+        self.rejeitadas += 1
+        if len(self.erros) < MAX_ERROS_REGISTRADOS:
+            self.erros.append((linha, mensagem))
+
+    def resumo(self):
+        return (
+            f"{self.importadas} sessão(ões) importada(s) em {len(self.projetos)} projeto(s); "
+            f"{self.duplicadas} duplicada(s) ignorada(s); {self.rejeitadas} linha(s) rejeitada(s)."
+        )
+
+
+def _parse_data_hora(texto):
+    """Aceita ISO 8601 e DD/MM/AAAA HH:MM[:SS]. Levanta ErroImportacao se inválido."""
+    texto = (texto or "").strip()
+    if not texto:
+        raise ErroImportacao("data/hora vazia")
+    if texto.endswith(("Z", "z")):
+        # UTC: convertido para o horário local como qualquer outro fuso.
+        texto = texto[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(texto)
+    except ValueError:
+        pass
+    else:
+        # Sessões são gravadas em horário local sem fuso.
+        if dt.tzinfo is not None:
+            dt = dt.astimezone().replace(tzinfo=None)
+        return dt
+    # Caminho rápido para o formato brasileiro usado nos diálogos (DD/MM/AAAA HH:MM[:SS]).
+    try:
+        if len(texto) >= 10 and texto[2] == "/" and texto[5] == "/":
+            dia, mes, ano = int(texto[0:2]), int(texto[3:5]), int(texto[6:10])
+            hora = texto[10:].strip()
+            h = m = s = 0
+            if hora:
+                partes = hora.split(":")
+                h = int(partes[0])
+                m = int(partes[1]) if len(partes) > 1 else 0
+                s = int(partes[2]) if len(partes) > 2 else 0
+            return datetime(ano, mes, dia, h, m, s)
+    except (ValueError, IndexError):
+        pass
+    raise ErroImportacao(f"data/hora inválida: {texto!r}")
+
+
+def _parse_duracao(valor):
+    """Aceita segundos (número) ou HH:MM[:SS]."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = (valor or "").strip().replace(",", ".")
+    if not texto:
+        return None
+    if ":" in texto:
+        partes = texto.split(":")
+        try:
+            numeros = [float(p) for p in partes]
+        except ValueError:
+            raise ErroImportacao(f"duração inválida: {texto!r}")
+        segundos = 0.0
+        for n in numeros:
+            segundos = segundos * 60 + n
+        if len(numeros) == 2:
+            segundos *= 60
+        return segundos
+    try:
+        return float(texto)
+    except ValueError:
+        raise ErroImportacao(f"duração inválida: {texto!r}")
+
+
+def _combinar(data, hora):
+    data = (data or "").strip()
+    hora = (hora or "").strip()
+    if not data:
+        return ""
+    if not hora:
+        return data
+    if "/" in data:
+        return f"{data} {hora}"
+    return f"{data}T{hora}"
+
+
+def montar_sessao(registro, projeto_padrao=None):
+    """
+    Converte um registro (dict com chaves canônicas) em (projeto, sessao).
+    Levanta ErroImportacao se o registro não for válido.
+    """
+    projeto = (registro.get("projeto") or projeto_padrao or "").strip()
+    if not projeto:
+        raise ErroImportacao("projeto ausente")
+
+    texto_inicio = registro.get("inicio") or _combinar(registro.get("data_inicio"), registro.get("hora_inicio"))
+    inicio = _parse_data_hora(texto_inicio)
+
+    texto_fim = registro.get("fim") or _combinar(registro.get("data_fim"), registro.get("hora_fim"))
+    duracao = _parse_duracao(registro.get("duracao"))
+    if texto_fim:
+        fim = _parse_data_hora(texto_fim)
+        if duracao is None:
+            duracao = (fim - inicio).total_seconds()
+    elif duracao is not None:
+        fim = inicio + timedelta(seconds=duracao)
+    else:
+        raise ErroImportacao("informe a saída ou a duração")
+
+    if fim <= inicio or duracao is None or duracao <= 0:
+        raise ErroImportacao("a saída deve ser posterior à entrada")
+    sessao = {
+        "data": inicio.isoformat(),
+        "data_saida": fim.isoformat(),
+        "duracao_segundos": duracao,
+    }
+    return projeto, anotar(sessao, registro.get("tags"), registro.get("nota"))
+
+
+def _mapear_cabecalho(cabecalho):
+    """Retorna {chave_canonica: indice_coluna} para as colunas reconhecidas."""
+    normalizado = [c.strip().lower() for c in cabecalho]
+    mapa = {}
+    for chave, aliases in ALIASES_COLUNAS.items():
+        for i, nome in enumerate(normalizado):
+            if nome in aliases:
+                mapa[chave] = i
+                break
+    return mapa
+
+
+def ler_registros_csv(arquivo):
+    """Gera (numero_linha, registro) a partir de um CSV com cabeçalho (',' ou ';')."""
+    # Detecta o delimitador só pela linha de cabeçalho, para funcionar também com stdin.
+    primeira = arquivo.readline()
+    if not primeira.strip():
+        return
+    try:
+        dialeto = csv.Sniffer().sniff(primeira, delimiters=",;\t")
+    except csv.Error:
+        dialeto = csv.excel
+    cabecalho = next(csv.reader([primeira], dialeto))
+    leitor = csv.reader(arquivo, dialeto)
+    mapa = _mapear_cabecalho(cabecalho)
+    if "projeto" not in mapa:
+        logger.debug("CSV sem coluna de projeto; usando projeto padrão")
+    itens = list(mapa.items())
+    # line_num conta as linhas físicas lidas (um campo entre aspas pode ocupar várias):
+    # o registro começa na linha seguinte ao fim do anterior (+1 pelo cabeçalho).
+    fim_anterior = 0
+    for linha in leitor:
+        numero = fim_anterior + 2
+        fim_anterior = leitor.line_num
+        if not linha:
+            continue
+        registro = {}
+        for chave, i in itens:
+            if i < len(linha):
+                registro[chave] = linha[i]
+        yield numero, registro
+
+
+def ler_registros_jsonl(arquivo):
+    """Gera (numero_linha, registro) a partir de JSON lines (um objeto por linha)."""
+    for numero, linha in enumerate(arquivo, 1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            obj = json.loads(linha)
+        except ValueError as e:
+            yield numero, ErroImportacao(f"JSON inválido: {e}")
+            continue
+        if not isinstance(obj, dict):
+            yield numero, ErroImportacao("cada linha deve ser um objeto JSON")
+            continue
+        registro = {}
+        for chave, valor in obj.items():
+            nome = str(chave).strip().lower()
+            for canonica, aliases in ALIASES_COLUNAS.items():
+                if nome in aliases:
+                    registro[canonica] = valor if isinstance(valor, (int, float)) else str(valor)
+                    break
+        yield numero, registro
+
+
+def _lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def importar_registros(repositorio, registros, projeto_padrao=None, ignorar_duplicadas=True,
+                       tamanho_lote=TAMANHO_LOTE_PADRAO, resultado=None):
+    """
+    Incorpora registros (numero_linha, registro) ao repositório em lotes; cada lote
+    entra com uma inclusão por projeto (uma notificação aos ouvintes do repositório).
+    Não grava em disco. Retorna ResultadoImportacao.
+    """
+    resultado = resultado or ResultadoImportacao()
+    existentes = None
+    if ignorar_duplicadas:
+        existentes = {
+            (projeto, s["data"])
+            for projeto, dados in repositorio.dados.items()
+            for s in dados.get("sessoes", [])
+        }
+    for lote in _lotes(registros, tamanho_lote):
+        por_projeto = {}
+        for numero, registro in lote:
+            if isinstance(registro, ErroImportacao):
+                resultado.registrar_erro(numero, str(registro))
+                continue
+            try:
+                projeto, sessao = montar_sessao(registro, projeto_padrao)
+            except ErroImportacao as e:
+                resultado.registrar_erro(numero, str(e))
+                continue
+            if existentes is not None:
+                chave = (projeto, sessao["data"])
+                if chave in existentes:
+                    resultado.duplicadas += 1
+                    continue
+                existentes.add(chave)
+            por_projeto.setdefault(projeto, []).append(sessao)
+        for projeto, sessoes in por_projeto.items():
+            repositorio.adicionar_sessoes(projeto, sessoes)
+            resultado.importadas += len(sessoes)
+            resultado.total_segundos += sum(s["duracao_segundos"] for s in sessoes)
+            resultado.projetos.add(projeto)
+        logger.debug("Lote importado: %d linha(s), %d sessão(ões) até agora", len(lote), resultado.importadas)
+    return resultado
+
+
+def detectar_formato(caminho):
+    ext = os.path.splitext(caminho)[1].lower()
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    return "csv"
+
+
+def importar_arquivo(repositorio, caminho, formato=None, projeto_padrao=None,
+                     ignorar_duplicadas=True, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Importa um arquivo CSV ou JSON lines para o repositório (sem gravar em disco)."""
+    formato = formato or detectar_formato(caminho)
+    with open(caminho, "r", encoding="utf-8-sig", newline="") as f:
+        return importar_fluxo(
+            repositorio, f, formato, projeto_padrao=projeto_padrao,
+            ignorar_duplicadas=ignorar_duplicadas, tamanho_lote=tamanho_lote,
+        )
+
+
+def importar_fluxo(repositorio, arquivo, formato, projeto_padrao=None,
+                   ignorar_duplicadas=True, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Importa de um objeto arquivo já aberto (ex.: sys.stdin no caso de JSON lines)."""
+    if formato == "jsonl":
+        registros = ler_registros_jsonl(arquivo)
+    elif formato == "csv":
+        registros = ler_registros_csv(arquivo)
+    else:
+        raise ValueError(f"Formato de importação desconhecido: {formato}")
+    return importar_registros(
+        repositorio, registros, projeto_padrao=projeto_padrao,
+        ignorar_duplicadas=ignorar_duplicadas, tamanho_lote=tamanho_lote,
+    )
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Medições estruturadas dos caminhos quentes (carregar, migrar, salvar, filtrar,
+renderizar relatório).
+
+Desligadas por padrão: ``medir`` devolve um objeto nulo compartilhado e
+``contar`` retorna logo na primeira linha, então o custo com a instrumentação
+desligada é uma chamada de função. Ligadas (``ativar`` ou variável de ambiente
+``HORAS_TRABALHADAS_METRICAS=1``), cada operação medida vira um evento JSON
+(nome, duração e campos como bytes ou sessões percorridas/selecionadas) enviado
+ao logger ``horas_trabalhadas.metricas`` ou a um arquivo, e os totais por nome
+(com histograma de duração) e os indicadores definidos com ``definir`` ficam
+disponíveis em ``instantaneo()``, inclusive para outras threads.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from .diagnostico import FAIXAS_MS, Histograma
+
+logger = logging.getLogger(__name__)
+logger_metricas = logging.getLogger("horas_trabalhadas.metricas")
+
+VARIAVEL_AMBIENTE = "HORAS_TRABALHADAS_METRICAS"
+
+_ativo = False
+_eventos = False
+_saida = None
+_lock = threading.Lock()
+_medicoes = {}
+_contadores = {}
+_indicadores = {}
+
+
+def ativo():
+    return _ativo
+
+
+def ativar(saida=None, eventos=True):
+    """
+    Liga a instrumentação. Com ``saida`` (arquivo aberto), os eventos vão para ele
+    em JSON lines; com ``eventos=False`` só acumula os totais (ex.: para /metrics).
+    """
+    global _ativo, _eventos, _saida
+    if eventos:
+        _eventos = True
+        _saida = saida
+    _ativo = True
+
+
+def desativar():
+    global _ativo, _eventos, _saida
+    _ativo = False
+    _eventos = False
+    _saida = None
+
+
+def ativar_pelo_ambiente():
+    if os.environ.get(VARIAVEL_AMBIENTE, "").strip().lower() in ("1", "true", "sim", "on"):
+        ativar()
+
+
+def zerar():
+    with _lock:
+        _medicoes.clear()
+        _contadores.clear()
+        _indicadores.clear()
+
+
+class _MedicaoNula:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def anotar(self, **campos):
+        pass
+
+
+_NULA = _MedicaoNula()
+
+
+class Medicao:
+    """Cronometra um bloco ``with``; ``anotar`` acrescenta campos ao evento."""
+
+    __slots__ = ("nome", "campos", "_inicio")
+
+    def __init__(self, nome, campos):
+        self.nome = nome
+        self.campos = campos
+        self._inicio = None
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_exc, exc, tb):
+        duracao_ms = (time.perf_counter() - self._inicio) * 1000.0
+        if tipo_exc is not None:
+            self.campos["erro"] = tipo_exc.__name__
+        registrar(self.nome, duracao_ms, self.campos)
+        return False
+
+    def anotar(self, **campos):
+        self.campos.update(campos)
+
+
+def medir(nome, **campos):
+    """Context manager que mede a operação ``nome`` (nulo se desligado)."""
+    if not _ativo:
+        return _NULA
+    return Medicao(nome, campos)
+
+
+def contar(nome, quantidade=1):
+    if not _ativo:
+        return
+    with _lock:
+        _contadores[nome] = _contadores.get(nome, 0) + quantidade
+
+
+def definir(nome, valor):
+    """Atualiza um indicador de valor atual (ex.: timers abertos, tamanho do histórico)."""
+    if not _ativo:
+        return
+    with _lock:
+        _indicadores[nome] = valor
+
+
+def registrar(nome, duracao_ms, campos=None):
+    """Acumula uma medição já feita e emite o evento estruturado."""
+    if not _ativo:
+        return
+    campos = campos or {}
+    with _lock:
+        total = _medicoes.get(nome)
+        if total is None:
+            total = _medicoes[nome] = {"histograma": Histograma(), "campos": {}}
+        total["histograma"].registrar(duracao_ms)
+        somas = total["campos"]
+        for campo, valor in campos.items():
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                somas[campo] = somas.get(campo, 0) + valor
+    if _eventos:
+        _emitir({"evento": nome, "duracao_ms": round(duracao_ms, 3), **campos})
+
+
+def _emitir(evento):
+    linha = json.dumps(evento, ensure_ascii=False, default=str)
+    saida = _saida
+    if saida is not None:
+        try:
+            saida.write(linha + "\n")
+            saida.flush()
+        except (OSError, ValueError) as e:
+            logger.warning("Falha ao gravar métrica: %s", e)
+    else:
+        logger_metricas.info("%s", linha)
+
+
+def instantaneo():
+    """
+    Cópia dos totais: {"faixas_ms": (...), "medicoes": {nome: {quantidade, total_ms,
+    maximo_ms, contagens, campos}}, "contadores": {nome: n}, "indicadores": {nome: v}}.
+    ``contagens`` tem uma posição por faixa de FAIXAS_MS e uma última para o excedente.
+    """
+    with _lock:
+        medicoes = {
+            nome: {
+                "quantidade": total["histograma"].quantidade,
+                "total_ms": total["histograma"].soma_ms,
+                "maximo_ms": total["histograma"].maximo_ms,
+                "contagens": list(total["histograma"].contagens),
+                "campos": dict(total["campos"]),
+            }
+            for nome, total in _medicoes.items()
+        }
+        return {
+            "faixas_ms": FAIXAS_MS,
+            "medicoes": medicoes,
+            "contadores": dict(_contadores),
+            "indicadores": dict(_indicadores),
+        }
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Recuperação de partes corrompidas do histórico e varredura completa de integridade.
+
+O repositório confere checksums ao carregar (só o que mudou desde a última
+verificação limpa) e isola o que não confere: no formato fragmentado, o projeto
+afetado sai de ``dados`` e os demais seguem utilizáveis; no arquivo único, o
+histórico fica bloqueado para gravação em vez de ser sobrescrito por um vazio.
+
+Aqui a parte afetada é trocada pela última cópia boa: a do backup mais recente
+(``backup.py``) ou a versão anterior guardada ao lado (``.anterior``), preferindo
+a que tem exatamente o checksum registrado. O arquivo ruim é mantido como
+``.corrompido-<data>`` para inspeção.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+
+from .backup import armazem_do_diretorio, localizar_instantaneo, montar_historico, ultima_copia_projeto
+from .historico import (
+    SUFIXO_ANTERIOR,
+    ErroIntegridade,
+    ProjetosSobDemanda,
+    RepositorioFragmentado,
+    checksum,
+    gravar_json_atomico,
+    migrar_formato_historico,
+    nome_fragmento,
+    serializar_historico,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ResultadoRecuperacao:
+    """``recuperados``: [(projeto ou None, origem, exata)]; ``perdidos``: [(projeto ou None, motivo)]."""
+
+    def __init__(self):
+        self.recuperados = []
+        self.perdidos = []
+
+    @property
+    def houve_problema(self):
+        return bool(self.recuperados or self.perdidos)
+
+    def resumo(self):
+        linhas = []
+        for parte, origem, exata in self.recuperados:
+            detalhe = "" if exata else " (confira as alterações mais recentes)"
+            linhas.append(f"{parte or 'histórico'}: recuperado de {origem}{detalhe}")
+        for parte, motivo in self.perdidos:
+            linhas.append(f"{parte or 'histórico'}: não recuperado — {motivo}")
+        return "\n".join(linhas)
+
+
+def _isolar_arquivo(caminho):
+    if os.path.exists(caminho):
+        destino = f"{caminho}.corrompido-{datetime.now():%Y%m%dT%H%M%S}"
+        os.replace(caminho, destino)
+        logger.warning("Arquivo corrompido mantido como %s", destino)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, "rb") as f:
+            conteudo = f.read()
+        return json.loads(conteudo), conteudo
+    except (OSError, ValueError):
+        return None, None
+
+
+def _escolher(candidatos, esperado):
+    """Primeiro candidato (origem, dados, conteúdo serializado) com o checksum esperado, senão o primeiro."""
+    candidatos = [c for c in candidatos if c[1] is not None]
+    for origem, dados, conteudo in candidatos:
+        if esperado is not None and checksum(conteudo) == esperado:
+            return origem, dados, True
+    if candidatos:
+        return candidatos[0][0], candidatos[0][1], False
+    return None, None, False
+
+
+def _recuperar_arquivo_unico(repositorio, resultado):
+    data_dir = os.path.dirname(repositorio.arquivo)
+    esperado = repositorio._ler_checksum().get("sha256")
+    candidatos = []
+    armazem = armazem_do_diretorio(data_dir)
+    nome = localizar_instantaneo(armazem)
+    if nome is not None:
+        try:
+            historico = montar_historico(armazem, nome)
+            candidatos.append((f"backup {nome}", historico, serializar_historico(historico, indent=4)))
+        except (OSError, ValueError) as e:
+            logger.warning("Backup %s ilegível: %s", nome, e)
+    anterior, conteudo = _ler_json(repositorio.arquivo + SUFIXO_ANTERIOR)
+    candidatos.append(("versão anterior", anterior, conteudo))
+    origem, dados, exata = _escolher(candidatos, esperado)
+    if origem is None:
+        resultado.perdidos.append((None, "nenhum backup ou versão anterior disponível"))
+        return
+    _isolar_arquivo(repositorio.arquivo)
+    repositorio.substituir_dados(migrar_formato_historico(dados))
+    resultado.recuperados.append((None, origem, exata))
+
+
+def _reconstruir_indice(repositorio, resultado):
+    """
+    Regrava o índice do formato fragmentado a partir do índice anterior e dos projetos
+    do último backup. Os arquivos de projeto legíveis voltam como estão; os demais
+    ficam sem arquivo e são recuperados do backup ao recarregar.
+    """
+    data_dir = os.path.dirname(repositorio.arquivo)
+    armazem = armazem_do_diretorio(data_dir)
+    anterior, _ = _ler_json(repositorio.arquivo + SUFIXO_ANTERIOR)
+    projetos = {p: e["arquivo"] for p, e in ((anterior or {}).get("projetos") or {}).items()}
+    nome = localizar_instantaneo(armazem)
+    if nome is not None:
+        for projeto in armazem.ler_instantaneo(nome)["projetos"]:
+            projetos.setdefault(projeto, nome_fragmento(projeto))
+    if not projetos:
+        resultado.perdidos.append((None, "índice ilegível, sem índice anterior nem backup"))
+        return False
+    indice = {}
+    for projeto, arquivo in projetos.items():
+        caminho = os.path.join(repositorio.diretorio_projetos, arquivo)
+        dados, conteudo = _ler_json(caminho)
+        if dados is None:
+            _isolar_arquivo(caminho)
+            indice[projeto] = {"arquivo": arquivo}
+        else:
+            indice[projeto] = {"arquivo": arquivo, "sha256": checksum(conteudo)}
+    _isolar_arquivo(repositorio.arquivo)
+    gravar_json_atomico(repositorio.arquivo, {"versao": 1, "projetos": indice}, indent=1)
+    resultado.recuperados.append((None, "índice anterior" if anterior else f"backup {nome}", False))
+    return True
+
+
+def recuperar_projetos(repositorio, projetos, resultado=None):
+    """Troca os projetos corrompidos (formato fragmentado) pela última cópia boa. Não grava."""
+    resultado = resultado or ResultadoRecuperacao()
+    armazem = armazem_do_diretorio(os.path.dirname(repositorio.arquivo))
+    for projeto in projetos:
+        entrada = repositorio.indice.get(projeto, {})
+        caminho = os.path.join(repositorio.diretorio_projetos, entrada.get("arquivo", nome_fragmento(projeto)))
+        copia, nome = ultima_copia_projeto(armazem, projeto)
+        candidatos = []
+        if copia is not None:
+            candidatos.append((f"backup {nome}", copia, serializar_historico(copia)))
+        anterior, conteudo = _ler_json(caminho + SUFIXO_ANTERIOR)
+        if anterior is not None and entrada.get("sha256_anterior") in (None, checksum(conteudo)):
+            candidatos.append(("versão anterior", anterior, conteudo))
+        origem, dados, exata = _escolher(candidatos, entrada.get("sha256"))
+        if origem is None:
+            resultado.perdidos.append((projeto, repositorio.corrompidos.get(projeto, "sem cópia disponível")))
+            continue
+        _isolar_arquivo(caminho)
+        repositorio.dados[projeto] = dados
+        repositorio.marcar_alterado(projeto)
+        resultado.recuperados.append((projeto, origem, exata))
+    return resultado
+
+
+def carregar_com_recuperacao(repositorio):
+    """
+    Carrega o repositório recuperando o que estiver corrompido e grava o resultado.
+    Se o histórico (arquivo único ou índice) não puder ser recuperado, levanta
+    ErroIntegridade e o repositório continua bloqueado para gravação.
+    """
+    resultado = ResultadoRecuperacao()
+    try:
+        repositorio.carregar()
+    except ErroIntegridade as e:
+        logger.error("Histórico com problema de integridade: %s", e)
+        if isinstance(repositorio, RepositorioFragmentado):
+            if _reconstruir_indice(repositorio, resultado):
+                repositorio.carregar()
+        else:
+            _recuperar_arquivo_unico(repositorio, resultado)
+        if repositorio.bloqueado:
+            raise ErroIntegridade(f"{e}; {resultado.resumo()}") from e
+    if isinstance(repositorio, RepositorioFragmentado) and repositorio.corrompidos:
+        recuperar_projetos(repositorio, list(repositorio.corrompidos), resultado)
+    if resultado.recuperados:
+        repositorio.salvar()
+    if resultado.houve_problema:
+        logger.warning("Integridade do histórico:\n%s", resultado.resumo())
+    return resultado
+
+
+def varrer(repositorio):
+    """
+    Varredura completa: relê e confere todos os arquivos, ignorando as verificações
+    anteriores. Só lê do disco (pode rodar fora da thread da interface).
+    Retorna [(projeto ou None, motivo)].
+    """
+    return repositorio.verificar(completo=True)
+
+
+def reparar(repositorio, problemas):
+    """
+    Corrige o que ``varrer`` apontou e grava. No formato fragmentado, um projeto já
+    lido nesta execução é regravado da memória (foi conferido ao ser lido); os outros
+    vêm da última cópia boa. Retorna ResultadoRecuperacao.
+    """
+    resultado = ResultadoRecuperacao()
+    if not problemas:
+        return resultado
+    if isinstance(repositorio, RepositorioFragmentado):
+        restantes = []
+        dados = repositorio.dados
+        for projeto, motivo in problemas:
+            em_memoria = projeto in dados if not isinstance(dados, ProjetosSobDemanda) else dados.carregado(projeto)
+            if em_memoria and projeto not in repositorio.corrompidos:
+                caminho = repositorio.caminho_projeto(projeto)
+                _isolar_arquivo(caminho)
+                repositorio.marcar_alterado(projeto)
+                resultado.recuperados.append((projeto, "cópia em memória", True))
+            else:
+                repositorio.corrompidos[projeto] = motivo
+                if isinstance(dados, ProjetosSobDemanda):
+                    dados.descartar(projeto)
+                restantes.append(projeto)
+        recuperar_projetos(repositorio, restantes, resultado)
+    elif repositorio.bloqueado:
+        _recuperar_arquivo_unico(repositorio, resultado)
+    else:
+        # O arquivo único foi conferido ao carregar: a cópia em memória é a boa.
+        _isolar_arquivo(repositorio.arquivo)
+        repositorio.marcar_alterado()
+        resultado.recuperados.append((None, "cópia em memória", True))
+    if resultado.recuperados:
+        repositorio.salvar()
+    return resultado
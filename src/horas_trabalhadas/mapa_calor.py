@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Totais diários por projeto para o mapa de calor (calendário do ano).
+
+Cada projeto tem, por ano, um ``array('d')`` de 366 posições com os segundos
+trabalhados em cada dia (posição = dia do ano - 1). Os arrays de um projeto são
+montados do histórico na primeira consulta e, daí em diante, mantidos pelas
+notificações do repositório: incluir, alterar ou remover uma sessão só soma ou
+subtrai a duração dela nos dias que ela ocupa. Desenhar vários anos ou trocar
+os projetos selecionados é somar arrays, sem reler sessões. Os totais de todos
+os projetos num período (``segundos_entre``, usados no painel de totais) somam só
+os projetos com tempo a partir do início dele (``projetos_desde`` do repositório):
+no formato fragmentado, os demais nem são lidos.
+
+A distribuição segue a agregação por dia (``agregacao``): sessões que cruzam a
+meia-noite são repartidas entre os dias, e dias compactados pela retenção contam
+inteiros no dia da entrada. Mudanças que não passam pelos métodos do repositório
+(só ``marcar_alterado``) são percebidas pela geração do projeto, e o projeto é
+remontado na consulta seguinte.
+"""
+
+import calendar
+import logging
+from array import array
+from datetime import date, datetime, timedelta
+
+from .historico import CHAVE_AGREGADOS, partes_por_dia
+
+logger = logging.getLogger(__name__)
+
+DIAS_ANO = 366
+# Limites (em horas) entre os níveis de cor do mapa: 0, até 2 h, até 4 h, até 6 h, até 8 h, mais.
+NIVEIS_HORAS = (2, 4, 6, 8)
+CORES_NIVEIS = ("#ebedf0", "#c6e48b", "#7bc96f", "#40a35a", "#239a3b", "#196127")
+# Restos de ponto flutuante após subtrair uma sessão são tratados como zero.
+_RESIDUO = 1e-6
+# Nome dos totais no instantâneo de partida rápida; muda se a distribuição pelos dias mudar.
+EXTRA_INSTANTANEO = "totais_diarios/1"
+
+
+def _posicao(dia):
+    return dia.toordinal() - date(dia.year, 1, 1).toordinal()
+
+
+def _somar(anos, dia, segundos):
+    dias = anos.get(dia.year)
+    if dias is None:
+        dias = anos[dia.year] = array("d", bytes(8 * DIAS_ANO))
+    i = _posicao(dia)
+    valor = dias[i] + segundos
+    dias[i] = 0.0 if -_RESIDUO < valor < _RESIDUO else valor
+
+
+def distribuir_sessao(anos, sessao, sinal=1.0):
+    """Soma (ou subtrai, com ``sinal`` -1) a duração da sessão nos dias que ela ocupa."""
+    inicio = datetime.fromisoformat(sessao["data"])
+    if "agregado" in sessao:
+        _somar(anos, inicio.date(), sinal * sessao["duracao_segundos"])
+        return
+    for dia, parte in partes_por_dia(inicio, sessao["duracao_segundos"]):
+        _somar(anos, dia, sinal * parte)
+
+
+def montar_anos(dados):
+    """{ano: array('d')} com os segundos por dia de um projeto ({"sessoes", CHAVE_AGREGADOS})."""
+    anos = {}
+    for sessao in dados.get("sessoes", []):
+        distribuir_sessao(anos, sessao)
+    for dia, (_, segundos) in dados.get(CHAVE_AGREGADOS, {}).items():
+        _somar(anos, date.fromisoformat(dia), segundos)
+    return anos
+
+
+def nivel(segundos):
+    """Nível de cor (0 a len(NIVEIS_HORAS) + 1) das horas de um dia."""
+    if segundos <= 0:
+        return 0
+    horas = segundos / 3600
+    for i, limite in enumerate(NIVEIS_HORAS):
+        if horas <= limite:
+            return i + 1
+    return len(NIVEIS_HORAS) + 1
+
+
+def celula(ano, posicao):
+    """(coluna da semana, linha do dia da semana) do dia ``posicao`` do ano, segunda-feira no topo."""
+    deslocamento = date(ano, 1, 1).weekday()
+    return (posicao + deslocamento) // 7, (posicao + deslocamento) % 7
+
+
+def dias_no_ano(ano):
+    return 366 if calendar.isleap(ano) else 365
+
+
+class TotaisDiarios:
+    """Arrays de segundos por dia de cada projeto, atualizados a cada alteração do repositório."""
+
+    def __init__(self, repositorio):
+        self.repositorio = repositorio
+        # projeto -> (geração do projeto refletida nos arrays, {ano: array('d')})
+        self._projetos = {}
+        self.montagens = 0
+        repositorio.adicionar_ouvinte(self._ao_alterar)
+        if repositorio.instantaneo is not None:
+            repositorio.instantaneo.extras[EXTRA_INSTANTANEO] = self.exportar
+        self._importar(repositorio.extras_instantaneo)
+
+    def exportar(self):
+        """{projeto: {ano: bytes}} dos projetos com arrays em dia, para o instantâneo de partida rápida."""
+        return {
+            projeto: {ano: dias.tobytes() for ano, dias in anos.items()}
+            for projeto, (geracao, anos) in self._projetos.items()
+            if geracao == self.repositorio.geracao_de(projeto)
+        }
+
+    def _importar(self, extras_instantaneo):
+        # Os totais do instantâneo valem se nada mudou no histórico desde que ele foi lido.
+        if extras_instantaneo is None or extras_instantaneo[0] != self.repositorio.geracao:
+            return
+        for projeto, anos in extras_instantaneo[1].get(EXTRA_INSTANTANEO, {}).items():
+            if projeto not in self.repositorio.dados:
+                continue
+            arrays = {}
+            for ano, conteudo in anos.items():
+                arrays[ano] = array("d")
+                arrays[ano].frombytes(conteudo)
+            self._projetos[projeto] = (self.repositorio.geracao_de(projeto), arrays)
+
+    def _ao_alterar(self, operacao, projeto, anterior, sessao):
+        if operacao in ("carregar", "compactar"):
+            self._projetos.clear()
+            return
+        if operacao == "salvar":
+            return
+        entrada = self._projetos.get(projeto)
+        if entrada is None:
+            return
+        if entrada[0] < self.repositorio.geracao_todos:
+            # Houve uma troca geral dos dados sem notificação: remonta na próxima consulta.
+            del self._projetos[projeto]
+            return
+        anos = entrada[1]
+        if operacao == "adicionar":
+            for incluida in sessao:
+                distribuir_sessao(anos, incluida)
+        else:
+            if anterior is not None:
+                distribuir_sessao(anos, anterior, -1.0)
+            if sessao is not None:
+                distribuir_sessao(anos, sessao)
+        self._projetos[projeto] = (self.repositorio.geracao_de(projeto), anos)
+
+    def anos_do_projeto(self, projeto):
+        """{ano: array('d')} do projeto (vazio se ele não existir). Não altere os arrays."""
+        geracao = self.repositorio.geracao_de(projeto)
+        entrada = self._projetos.get(projeto)
+        if entrada is not None and entrada[0] == geracao:
+            return entrada[1]
+        dados = self.repositorio.dados.get(projeto)
+        anos = montar_anos(dados) if dados is not None else {}
+        self._projetos[projeto] = (geracao, anos)
+        self.montagens += 1
+        logger.debug("Totais diários montados: %s (%d ano(s))", projeto, len(anos))
+        return anos
+
+    def anos(self, projetos):
+        """Anos com tempo registrado em algum dos projetos, em ordem."""
+        encontrados = set()
+        for projeto in projetos:
+            encontrados.update(ano for ano, dias in self.anos_do_projeto(projeto).items() if any(dias))
+        return sorted(encontrados)
+
+    def somar(self, projetos, ano):
+        """array('d') com a soma dia a dia dos projetos no ano."""
+        total = array("d", bytes(8 * DIAS_ANO))
+        for projeto in projetos:
+            dias = self.anos_do_projeto(projeto).get(ano)
+            if dias is not None:
+                total = array("d", map(float.__add__, total, dias))
+        return total
+
+    def segundos_entre(self, primeiro_dia, ultimo_dia):
+        """Segundos de todos os projetos nos dias de ``primeiro_dia`` a ``ultimo_dia`` (inclusive)."""
+        total = 0.0
+        for projeto in self.repositorio.projetos_desde(primeiro_dia):
+            anos = self.anos_do_projeto(projeto)
+            dia = primeiro_dia
+            while dia <= ultimo_dia:
+                dias = anos.get(dia.year)
+                if dias is not None:
+                    total += dias[_posicao(dia)]
+                dia += timedelta(days=1)
+        return total
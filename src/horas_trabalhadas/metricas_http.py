@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Endpoint HTTP local (``/metrics``) com as métricas do processo no formato texto
+do Prometheus.
+
+O servidor (``http.server``) roda numa thread daemon e só lê
+``instrumentacao.instantaneo()``, uma cópia feita sob um lock de curta duração;
+nada é consultado no loop Tk nem nos dados do histórico. Ligado pela variável
+de ambiente ``HORAS_TRABALHADAS_METRICAS_PORTA`` (escuta apenas em 127.0.0.1).
+"""
+
+import logging
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import instrumentacao
+
+logger = logging.getLogger(__name__)
+
+VARIAVEL_PORTA = "HORAS_TRABALHADAS_METRICAS_PORTA"
+ENDERECO_PADRAO = "127.0.0.1"
+PREFIXO = "horas_trabalhadas"
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Ajuda das métricas conhecidas; as demais saem com o próprio nome.
+DESCRICOES = {
+    "carregar": "Leitura do arquivo de histórico",
+    "carregar_projeto": "Leitura do arquivo de um projeto (histórico fragmentado)",
+    "migrar": "Migração do formato do histórico",
+    "salvar": "Gravação do arquivo de histórico",
+    "filtrar": "Filtro de sessões por período",
+    "renderizar_relatorio": "Renderização de relatório (janela ou PDF)",
+    "recuperacoes": "Inicializações que recuperaram sessões abertas",
+    "sessoes_recuperadas": "Sessões abertas recuperadas após encerramento abrupto",
+    "timers_abertos": "Timers em andamento",
+    "historico_bytes": "Tamanho do arquivo de histórico em bytes",
+    "historico_projetos": "Projetos no histórico",
+    "historico_sessoes": "Sessões no histórico",
+}
+
+
+def _nome(texto):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", texto)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        return repr(valor)
+    return str(valor)
+
+
+def formatar_prometheus(instantaneo):
+    """Texto de exposição do Prometheus a partir de ``instrumentacao.instantaneo()``."""
+    linhas = []
+    faixas_seg = [f / 1000.0 for f in instantaneo["faixas_ms"]]
+
+    nome_hist = f"{PREFIXO}_operacao_duracao_segundos"
+    if instantaneo["medicoes"]:
+        linhas.append(f"# HELP {nome_hist} Duração das operações instrumentadas.")
+        linhas.append(f"# TYPE {nome_hist} histogram")
+    for operacao, dados in sorted(instantaneo["medicoes"].items()):
+        rotulo = f'operacao="{_escapar(operacao)}"'
+        acumulado = 0
+        for limite, contagem in zip(faixas_seg, dados["contagens"]):
+            acumulado += contagem
+            linhas.append(f'{nome_hist}_bucket{{{rotulo},le="{_numero(limite)}"}} {acumulado}')
+        linhas.append(f'{nome_hist}_bucket{{{rotulo},le="+Inf"}} {dados["quantidade"]}')
+        linhas.append(f"{nome_hist}_sum{{{rotulo}}} {_numero(dados['total_ms'] / 1000.0)}")
+        linhas.append(f"{nome_hist}_count{{{rotulo}}} {dados['quantidade']}")
+
+    campos = {}
+    for operacao, dados in instantaneo["medicoes"].items():
+        for campo, valor in dados["campos"].items():
+            campos.setdefault(campo, []).append((operacao, valor))
+    for campo, valores in sorted(campos.items()):
+        nome = f"{PREFIXO}_operacao_{_nome(campo)}_total"
+        linhas.append(f"# HELP {nome} Soma de '{campo}' nas operações instrumentadas.")
+        linhas.append(f"# TYPE {nome} counter")
+        for operacao, valor in sorted(valores):
+            linhas.append(f'{nome}{{operacao="{_escapar(operacao)}"}} {_numero(valor)}')
+
+    for contador, valor in sorted(instantaneo["contadores"].items()):
+        nome = f"{PREFIXO}_{_nome(contador)}_total"
+        linhas.append(f"# HELP {nome} {DESCRICOES.get(contador, contador)}.")
+        linhas.append(f"# TYPE {nome} counter")
+        linhas.append(f"{nome} {_numero(valor)}")
+
+    for indicador, valor in sorted(instantaneo["indicadores"].items()):
+        nome = f"{PREFIXO}_{_nome(indicador)}"
+        linhas.append(f"# HELP {nome} {DESCRICOES.get(indicador, indicador)}.")
+        linhas.append(f"# TYPE {nome} gauge")
+        linhas.append(f"{nome} {_numero(valor)}")
+    return "\n".join(linhas) + "\n"
+
+
+class _ManipuladorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = formatar_prometheus(instrumentacao.instantaneo()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTEUDO)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        logger.debug("metricas_http: " + formato, *args)
+
+
+class ServidorMetricas:
+    """Servidor de /metrics numa thread daemon. Liga a instrumentação (sem eventos) ao iniciar."""
+
+    def __init__(self, porta, endereco=ENDERECO_PADRAO):
+        self.porta = porta
+        self.endereco = endereco
+        self._servidor = None
+        self._thread = None
+
+    def iniciar(self):
+        instrumentacao.ativar(eventos=False)
+        self._servidor = ThreadingHTTPServer((self.endereco, self.porta), _ManipuladorMetricas)
+        self._servidor.daemon_threads = True
+        self.porta = self._servidor.server_address[1]
+        self._thread = threading.Thread(
+            target=self._servidor.serve_forever, name="metricas-http", daemon=True
+        )
+        self._thread.start()
+        logger.info("Métricas em http://%s:%d/metrics", self.endereco, self.porta)
+        return self
+
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+
+def iniciar_pelo_ambiente():
+    """Inicia o servidor se HORAS_TRABALHADAS_METRICAS_PORTA estiver definida. Retorna-o ou None."""
+    valor = os.environ.get(VARIAVEL_PORTA, "").strip()
+    if not valor:
+        return None
+    try:
+        return ServidorMetricas(int(valor)).iniciar()
+    except (ValueError, OSError) as e:
+        logger.error("Não foi possível iniciar o endpoint de métricas (%s=%s): %s", VARIAVEL_PORTA, valor, e)
+        return None
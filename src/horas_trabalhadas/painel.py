@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Totais de hoje, da semana e do mês de todos os projetos, para o painel da janela.
+
+As sessões fechadas vêm dos totais diários (``mapa_calor.TotaisDiarios``), que
+já são mantidos a cada alteração do histórico: os três totais são somados uma vez
+por geração do repositório e por dia, e não a cada tick. A cada tick só entra o
+tempo dos timers em andamento, recortado no início do dia, da semana (segunda-feira)
+e do mês, como na agregação por dia.
+"""
+
+import time
+from datetime import date, datetime, timedelta
+
+PERIODOS = ("hoje", "semana", "mes")
+
+
+def inicios_periodos(hoje):
+    """Primeiro dia de cada período (hoje, semana, mês) que contém ``hoje``."""
+    return hoje, hoje - timedelta(days=hoje.weekday()), hoje.replace(day=1)
+
+
+class PainelTotais:
+    """Totais (em segundos) de todos os projetos em cada período de ``PERIODOS``."""
+
+    def __init__(self, totais_diarios, ponto):
+        self.totais_diarios = totais_diarios
+        self.ponto = ponto
+        # (geração do repositório, hoje) -> totais das sessões fechadas e início dos períodos (timestamp)
+        self._fechados = None
+
+    def _totais_fechados(self, hoje):
+        chave = (self.totais_diarios.repositorio.geracao, hoje)
+        if self._fechados is not None and self._fechados[0] == chave:
+            return self._fechados[1], self._fechados[2]
+        inicios = inicios_periodos(hoje)
+        fechados = tuple(self.totais_diarios.segundos_entre(inicio, hoje) for inicio in inicios)
+        limites = tuple(datetime.combine(inicio, datetime.min.time()).timestamp() for inicio in inicios)
+        self._fechados = (chave, fechados, limites)
+        return fechados, limites
+
+    def totais(self, agora=None):
+        """(hoje, semana, mês) em segundos, incluindo o tempo decorrido dos timers abertos."""
+        agora = agora or time.time()
+        fechados, limites = self._totais_fechados(date.fromtimestamp(agora))
+        totais = list(fechados)
+        for inicio in self.ponto.timers.values():
+            for i, limite in enumerate(limites):
+                if agora > limite:
+                    totais[i] += agora - max(inicio, limite)
+        return tuple(totais)
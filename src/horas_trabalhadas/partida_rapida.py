@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Instantâneo binário do histórico já lido e migrado, para abrir a aplicação rápido.
+
+Ao lado de ``historico_horas.json`` fica ``historico_horas.json.marshal``: um
+cabeçalho com o formato, a versão do Python, a assinatura (tamanho, mtime) e o
+sha256 do JSON de onde veio, seguido do histórico serializado com ``marshal``
+(dicts, listas, strings e números, como estão em memória). Carregá-lo custa uma
+fração de ``json.load`` + ``migrar_formato_historico``.
+
+O instantâneo só é usado quando corresponde ao arquivo atual: mesma assinatura e
+o mesmo sha256 registrado no checksum do histórico (ou, sem checksum gravado, o
+sha256 do próprio arquivo). Qualquer diferença, inclusive de versão do Python,
+faz a leitura voltar ao JSON, e o instantâneo é refeito em segundo plano; o mesmo
+acontece após cada gravação do histórico.
+
+Estruturas derivadas que custam para montar (ex.: os totais diários do mapa de
+calor, que precisam interpretar a data de cada sessão) podem ir junto: quem as
+mantém registra em ``GravadorInstantaneo.extras`` uma função que as exporta
+(coerentes com os dados daquele momento) e, ao abrir, lê
+``RepositorioHistorico.extras_instantaneo``.
+
+Desligue com HORAS_TRABALHADAS_PARTIDA_RAPIDA=0.
+"""
+
+import logging
+import marshal
+import os
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+VARIAVEL_PARTIDA_RAPIDA = "HORAS_TRABALHADAS_PARTIDA_RAPIDA"
+SUFIXO_INSTANTANEO = ".marshal"
+# Muda quando a estrutura do instantâneo muda.
+VERSAO_FORMATO = 1
+_BYTES_TAMANHO_CABECALHO = 4
+
+
+def partida_rapida_habilitada():
+    """O instantâneo fica ligado, a menos que HORAS_TRABALHADAS_PARTIDA_RAPIDA=0."""
+    return os.environ.get(VARIAVEL_PARTIDA_RAPIDA, "1").strip().lower() not in ("0", "nao", "não", "false", "off")
+
+
+def caminho_instantaneo(arquivo):
+    return arquivo + SUFIXO_INSTANTANEO
+
+
+def _compatibilidade():
+    # O formato do marshal pode mudar entre versões do Python.
+    return [VERSAO_FORMATO, marshal.version, list(sys.version_info[:2])]
+
+
+def serializar_instantaneo(dados, assinatura, soma, extras=None):
+    """Bytes do instantâneo: tamanho do cabeçalho, cabeçalho e {"dados", "extras"} (marshal)."""
+    cabecalho = marshal.dumps({"compatibilidade": _compatibilidade(), "assinatura": list(assinatura), "sha256": soma})
+    corpo = marshal.dumps({"dados": dados, "extras": extras or {}})
+    return len(cabecalho).to_bytes(_BYTES_TAMANHO_CABECALHO, "little") + cabecalho + corpo
+
+
+def ler_instantaneo(arquivo, assinatura, soma):
+    """
+    (histórico, extras) do instantâneo de ``arquivo`` se ele foi feito do conteúdo
+    com essa ``assinatura`` e esse ``soma`` (sha256); senão None.
+    """
+    caminho = caminho_instantaneo(arquivo)
+    try:
+        with open(caminho, "rb") as f:
+            conteudo = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning("Não foi possível ler o instantâneo %s: %s", caminho, e)
+        return None
+    try:
+        tamanho = int.from_bytes(conteudo[:_BYTES_TAMANHO_CABECALHO], "little")
+        fim_cabecalho = _BYTES_TAMANHO_CABECALHO + tamanho
+        cabecalho = marshal.loads(conteudo[_BYTES_TAMANHO_CABECALHO:fim_cabecalho])
+        if cabecalho != {"compatibilidade": _compatibilidade(), "assinatura": list(assinatura), "sha256": soma}:
+            logger.debug("Instantâneo %s não corresponde ao histórico atual", caminho)
+            return None
+        corpo = marshal.loads(memoryview(conteudo)[fim_cabecalho:])
+        dados, extras = corpo["dados"], corpo["extras"]
+    except (EOFError, ValueError, TypeError, KeyError) as e:
+        logger.warning("Instantâneo %s inválido (%s); será refeito", caminho, e)
+        return None
+    if not isinstance(dados, dict):
+        return None
+    return dados, extras
+
+
+def descartar_instantaneo(arquivo):
+    try:
+        os.remove(caminho_instantaneo(arquivo))
+    except FileNotFoundError:
+        pass
+
+
+class GravadorInstantaneo:
+    """
+    Grava o instantâneo numa thread. A serialização é feita na chamada (os dados
+    podem mudar logo depois); só a escrita no disco fica em segundo plano. Pedidos
+    que chegam durante uma escrita são juntados: grava-se apenas o mais recente.
+    A thread não é daemon, então uma escrita em andamento termina antes de o
+    processo sair.
+    """
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self._trava = threading.Lock()
+        self._pendente = None
+        self._thread = None
+        # nome -> função sem argumentos que devolve a estrutura derivada (tipos aceitos pelo marshal)
+        self.extras = {}
+        self.gravados = 0
+
+    def _exportar_extras(self):
+        extras = {}
+        for nome, exportar in self.extras.items():
+            try:
+                extras[nome] = exportar()
+            except Exception as e:
+                logger.exception("Erro ao exportar %s para o instantâneo: %s", nome, e)
+        return extras
+
+    def agendar(self, dados, assinatura, soma):
+        conteudo = serializar_instantaneo(dados, assinatura, soma, self._exportar_extras())
+        with self._trava:
+            self._pendente = conteudo
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._gravar, name="instantaneo-historico")
+                self._thread.start()
+
+    def _gravar(self):
+        caminho = caminho_instantaneo(self.arquivo)
+        while True:
+            with self._trava:
+                conteudo, self._pendente = self._pendente, None
+                if conteudo is None:
+                    self._thread = None
+                    return
+            temporario = caminho + ".tmp"
+            try:
+                with open(temporario, "wb") as f:
+                    f.write(conteudo)
+                os.replace(temporario, caminho)
+                self.gravados += 1
+                logger.debug("Instantâneo do histórico gravado: %s (%d bytes)", caminho, len(conteudo))
+            except OSError as e:
+                logger.warning("Não foi possível gravar o instantâneo %s: %s", caminho, e)
+
+    def esperar(self, tempo_limite=None):
+        """Espera a escrita em andamento (se houver). Retorna False se o tempo acabar."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(tempo_limite)
+            return not thread.is_alive()
+        return True
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Controle dos timers em andamento (ponto de entrada/saída), sem interface gráfica.
+
+Vários projetos podem ter timer aberto ao mesmo tempo. As sessões abertas são
+gravadas juntas, num único arquivo de recuperação (``sessao_aberta.json``), para
+que um encerramento abrupto não perca o tempo registrado até o último checkpoint.
+Sessões já encerradas continuam no mesmo arquivo até o histórico ser gravado
+(``confirmar_gravadas``): quem grava em lote, como a API, não as perde se o
+processo cair entre a saída e a gravação.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from . import instrumentacao
+from .busca import anotar, normalizar_tags
+
+logger = logging.getLogger(__name__)
+
+
+class ErroPonto(ValueError):
+    """Operação de ponto inválida (ex.: entrada em projeto já em andamento)."""
+
+
+def montar_sessao(tempo_inicio, tempo_fim):
+    """Sessão no formato do histórico a partir de dois timestamps."""
+    return {
+        "data": datetime.fromtimestamp(tempo_inicio).isoformat(),
+        "data_saida": datetime.fromtimestamp(tempo_fim).isoformat(),
+        "duracao_segundos": tempo_fim - tempo_inicio,
+    }
+
+
+class ControlePonto:
+    """
+    Timers abertos por projeto sobre um RepositorioHistorico. Com ``eventos``
+    (BarramentoEventos), publica ponto_entrada/ponto_saida e as sessões recuperadas.
+    Etiquetas e nota dadas na entrada ficam com o timer (e no checkpoint) até a saída.
+    """
+
+    def __init__(self, repositorio, arquivo_sessao_aberta, eventos=None):
+        self.repositorio = repositorio
+        self.arquivo_sessao_aberta = arquivo_sessao_aberta
+        self.eventos = eventos
+        # projeto -> tempo_inicio (time.time()), na ordem em que foram iniciados
+        self.timers = {}
+        # projeto -> {"tags": [...], "nota": "..."} dados na entrada (só dos timers anotados)
+        self.anotacoes = {}
+        # [(projeto, sessao)] encerradas (ou recuperadas) e ainda não gravadas no histórico
+        self.encerradas = []
+
+    def em_andamento(self, projeto):
+        return projeto in self.timers
+
+    def decorrido(self, projeto, agora=None):
+        return (agora or time.time()) - self.timers[projeto]
+
+    def iniciar(self, projeto, instante=None, tags=None, nota=None):
+        """
+        Abre o timer do projeto, com etiquetas e nota opcionais para a sessão.
+        Levanta ErroPonto se já estiver aberto.
+        """
+        if not projeto:
+            raise ErroPonto("Informe o projeto.")
+        if projeto in self.timers:
+            raise ErroPonto(f"O projeto '{projeto}' já está em andamento.")
+        self.timers[projeto] = instante or time.time()
+        anotacao = anotar({}, tags, nota)
+        if anotacao:
+            self.anotacoes[projeto] = anotacao
+        self.salvar_checkpoint()
+        if self.eventos:
+            self.eventos.publicar(
+                "ponto_entrada", projeto, {"data": datetime.fromtimestamp(self.timers[projeto]).isoformat()}
+            )
+        return self.timers[projeto]
+
+    def encerrar(self, projeto, instante=None, tags=None, nota=None):
+        """
+        Fecha o timer do projeto e inclui a sessão no repositório (sem gravar o
+        histórico em disco); ela fica no checkpoint até ``confirmar_gravadas``. Retorna a sessão. As ``tags`` somam-se às da entrada e
+        a ``nota``, se dada, substitui a da entrada. Levanta ErroPonto se não estiver aberto.
+        """
+        if projeto not in self.timers:
+            raise ErroPonto(f"O projeto '{projeto}' não está em andamento.")
+        tempo_inicio = self.timers.pop(projeto)
+        anotacao = self.anotacoes.pop(projeto, {})
+        sessao = montar_sessao(tempo_inicio, instante or time.time())
+        anotar(
+            sessao,
+            anotacao.get("tags", []) + normalizar_tags(tags),
+            nota if (nota or "").strip() else anotacao.get("nota"),
+        )
+        self.repositorio.adicionar_sessao(projeto, sessao)
+        self.encerradas.append((projeto, sessao))
+        self.salvar_checkpoint()
+        if self.eventos:
+            self.eventos.publicar("ponto_saida", projeto, sessao)
+        return sessao
+
+    def confirmar_gravadas(self, quantidade=None):
+        """
+        Chamado depois de gravado o histórico: tira do checkpoint as ``quantidade``
+        primeiras sessões encerradas (todas com None), as que a gravação incluiu.
+        """
+        if not self.encerradas:
+            return
+        if quantidade is None:
+            quantidade = len(self.encerradas)
+        if quantidade:
+            del self.encerradas[:quantidade]
+            self.salvar_checkpoint()
+
+    def salvar_checkpoint(self, agora=None):
+        """
+        Grava as sessões abertas e as encerradas ainda não gravadas no arquivo de
+        recuperação (ou o remove se não houver nenhuma).
+        """
+        instrumentacao.definir("timers_abertos", len(self.timers))
+        if not self.timers and not self.encerradas:
+            try:
+                if os.path.exists(self.arquivo_sessao_aberta):
+                    os.remove(self.arquivo_sessao_aberta)
+            except OSError:
+                pass
+            return
+        try:
+            dados = {
+                "sessoes": [
+                    dict({"projeto": projeto, "tempo_inicio": inicio}, **self.anotacoes.get(projeto, {}))
+                    for projeto, inicio in self.timers.items()
+                ],
+                "encerradas": [dict(sessao, projeto=projeto) for projeto, sessao in self.encerradas],
+                "ultima_atualizacao": agora or time.time(),
+            }
+            with open(self.arquivo_sessao_aberta, "w", encoding="utf-8") as f:
+                json.dump(dados, f, indent=2, ensure_ascii=False)
+            logger.debug(
+                "Checkpoint salvo: %d sessão(ões) aberta(s), %d encerrada(s) a gravar",
+                len(self.timers), len(self.encerradas),
+            )
+        except Exception as e:
+            logger.exception("Erro ao salvar sessão aberta: %s", e)
+
+    def recuperar(self):
+        """
+        Incorpora ao repositório as sessões abertas de uma execução anterior, até o
+        último checkpoint, e as encerradas que não chegaram a ser gravadas (as que já
+        estão no histórico são ignoradas). Retorna [(projeto, duracao_seg)]. Aceita
+        também o formato antigo, com uma única sessão. As recuperadas ficam em
+        ``encerradas``: o arquivo só sai (``confirmar_gravadas``) depois de gravado o histórico.
+        """
+        if not os.path.exists(self.arquivo_sessao_aberta):
+            return []
+        recuperadas = []
+        try:
+            with open(self.arquivo_sessao_aberta, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+            if "sessoes" in dados:
+                abertas = dados["sessoes"]
+            else:
+                abertas = [{"projeto": dados.get("projeto"), "tempo_inicio": dados.get("tempo_inicio")}]
+            for aberta in abertas:
+                projeto = aberta.get("projeto")
+                tempo_inicio = aberta.get("tempo_inicio")
+                if not projeto or tempo_inicio is None:
+                    continue
+                ultima_atualizacao = dados.get("ultima_atualizacao", tempo_inicio)
+                duracao_seg = ultima_atualizacao - tempo_inicio
+                if duracao_seg <= 0:
+                    continue
+                sessao = anotar(montar_sessao(tempo_inicio, ultima_atualizacao), aberta.get("tags"), aberta.get("nota"))
+                self._incorporar(projeto, sessao)
+                recuperadas.append((projeto, duracao_seg))
+                logger.debug("Sessão recuperada: %s duracao=%.1fs", projeto, duracao_seg)
+            for encerrada in dados.get("encerradas", []):
+                sessao = dict(encerrada)
+                projeto = sessao.pop("projeto", None)
+                if not projeto or "data" not in sessao or "duracao_segundos" not in sessao:
+                    continue
+                # O processo pode ter caído depois de gravar o histórico e antes de limpar o checkpoint.
+                if any(
+                    s["data"] == sessao["data"] and s["duracao_segundos"] == sessao["duracao_segundos"]
+                    for s in self.repositorio.dados.get(projeto, {}).get("sessoes", [])
+                ):
+                    continue
+                self._incorporar(projeto, sessao)
+                recuperadas.append((projeto, sessao["duracao_segundos"]))
+                logger.debug("Sessão encerrada não gravada recuperada: %s %s", projeto, sessao["data"])
+        except Exception as e:
+            logger.exception("Erro ao recuperar sessão aberta: %s", e)
+        if not recuperadas:
+            try:
+                os.remove(self.arquivo_sessao_aberta)
+            except OSError:
+                pass
+        else:
+            instrumentacao.contar("recuperacoes")
+            instrumentacao.contar("sessoes_recuperadas", len(recuperadas))
+        return recuperadas
+
+    def _incorporar(self, projeto, sessao):
+        self.repositorio.adicionar_sessao(projeto, sessao)
+        self.encerradas.append((projeto, sessao))
+        if self.eventos:
+            self.eventos.publicar("sessao_adicionada", projeto, sessao)
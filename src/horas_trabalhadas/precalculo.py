@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Pré-cálculo dos relatórios mais usados no tempo ocioso do loop Tk.
+
+As tarefas são geradores de ``RelatoriosEmCache.etapas_precalculo``; cada fatia
+roda dentro de ``after_idle`` por no máximo ``orcamento_ms`` e a seguinte só é
+agendada depois de ``intervalo_ms``, deixando o tick do cronômetro e os eventos
+de teclado/mouse passarem na frente.
+"""
+
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PrecalculoOcioso:
+    """Executa tarefas de pré-cálculo em fatias curtas no tempo ocioso do Tk."""
+
+    def __init__(self, root, relatorios, orcamento_ms=8, intervalo_ms=30):
+        self.root = root
+        self.relatorios = relatorios
+        self.orcamento_seg = orcamento_ms / 1000.0
+        self.intervalo_ms = intervalo_ms
+        self._fila = deque()
+        self._atual = None
+        self._after_id = None
+
+    def agendar(self, tarefas):
+        """Substitui as tarefas pendentes por ``tarefas``: [(inicio, fim, projetos, agrupamentos)]."""
+        self.cancelar()
+        self._fila.extend(tarefas)
+        self._after_id = self.root.after_idle(self._fatia)
+
+    def cancelar(self):
+        if self._after_id:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._fila.clear()
+        self._atual = None
+
+    def _fatia(self):
+        self._after_id = None
+        limite = time.perf_counter() + self.orcamento_seg
+        while time.perf_counter() < limite:
+            if self._atual is None:
+                if not self._fila:
+                    logger.debug("Pré-cálculo de relatórios concluído")
+                    return
+                inicio, fim, projetos, agrupamentos = self._fila.popleft()
+                self._atual = self.relatorios.etapas_precalculo(inicio, fim, projetos, agrupamentos)
+            try:
+                next(self._atual)
+            except StopIteration:
+                self._atual = None
+        self._after_id = self.root.after(self.intervalo_ms, self._proxima_fatia)
+
+    def _proxima_fatia(self):
+        self._after_id = self.root.after_idle(self._fatia)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Geração do relatório de horas em PDF (reportlab), pensada para períodos longos.
+
+- Estilos de parágrafo e de tabela são montados uma vez por processo e reusados
+  em todas as exportações (``estilos``, ``estilo_tabela``).
+- As sessões de cada projeto viram tabelas de até ``LINHAS_POR_BLOCO`` linhas,
+  cada uma com o cabeçalho: o reportlab mede e quebra tabelas pequenas, em vez
+  de redividir a cada página uma tabela com todas as sessões do projeto.
+- Os elementos são gerados sob demanda (``FluxoElementos``) à medida que o
+  reportlab monta as páginas: só os blocos da página em andamento ficam em
+  memória, não os de todo o relatório.
+
+As linhas usam o texto ISO das sessões (``AAAA-MM-DDTHH:MM``) diretamente, sem
+converter para datetime, e as sessões já vêm ordenadas de ``sessoes_periodo``.
+"""
+
+import logging
+import time
+from collections import deque
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from . import instrumentacao
+from .agregacao import AGRUPAMENTOS
+
+logger = logging.getLogger(__name__)
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+# Linhas de sessão por tabela: um pouco menos do que cabe numa página A4 com fonte 9.
+LINHAS_POR_BLOCO = 40
+# Elementos gerados à frente do que o reportlab está posicionando (keepWithNext olha o seguinte).
+ELEMENTOS_A_FRENTE = 4
+
+COR_RESUMO = "#059669"
+COR_SESSOES = "#2563eb"
+
+
+def formatar_duracao(segundos):
+    horas, resto = divmod(int(segundos), 3600)
+    minutos, segundos_rest = divmod(resto, 60)
+    return f"{horas:02d}:{minutos:02d}:{segundos_rest:02d}"
+
+
+@lru_cache(maxsize=None)
+def estilos():
+    """Folha de estilos do relatório (criada uma vez): a do reportlab mais o título."""
+    folha = getSampleStyleSheet()
+    folha.add(ParagraphStyle("TituloRelatorio", parent=folha["Heading1"], fontSize=16, spaceAfter=12))
+    return folha
+
+
+@lru_cache(maxsize=None)
+def estilo_tabela(cor):
+    """TableStyle com cabeçalho na ``cor`` (criado uma vez por cor e compartilhado entre tabelas)."""
+    return TableStyle(
+        [
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor(cor)),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+            ("BACKGROUND", (0, 1), (-1, -1), colors.HexColor("#f8fafc")),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#e2e8f0")),
+            ("FONTSIZE", (0, 1), (-1, -1), 9),
+        ]
+    )
+
+
+def tabelas_em_blocos(cabecalho, linhas, larguras, cor, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Gera Tables de até ``linhas_por_bloco`` linhas de ``linhas`` (iterável), cada uma com o cabeçalho."""
+    estilo = estilo_tabela(cor)
+    bloco = [cabecalho]
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) > linhas_por_bloco:
+            tabela = Table(bloco, colWidths=larguras, repeatRows=1)
+            tabela.setStyle(estilo)
+            yield tabela
+            bloco = [cabecalho]
+    if len(bloco) > 1:
+        tabela = Table(bloco, colWidths=larguras, repeatRows=1)
+        tabela.setStyle(estilo)
+        yield tabela
+
+
+def linhas_sessoes(sessoes):
+    """[data, entrada, saída, duração] de cada sessão; dias compactados mostram a quantidade."""
+    for s in sessoes:
+        d = s["data"]
+        data = f"{d[8:10]}/{d[5:7]}/{d[0:4]}"
+        dur = formatar_duracao(s["duracao_segundos"])
+        if "agregado" in s:
+            yield [data, f"{s['agregado']} sessão(ões)", "-", dur]
+            continue
+        saida = s.get("data_saida")
+        yield [data, d[11:16], saida[11:16] if saida else "-", dur]
+
+
+class FluxoElementos:
+    """
+    Lista de elementos do reportlab alimentada por um gerador. O ``build`` do
+    reportlab consome a lista pela frente (lê, apaga e reinsere as partes que
+    quebrou); aqui só os primeiros elementos existem de fato, e os seguintes são
+    gerados quando a frente esvazia.
+    """
+
+    def __init__(self, elementos, a_frente=ELEMENTOS_A_FRENTE):
+        self._fila = deque()
+        self._gerador = iter(elementos)
+        self._a_frente = a_frente
+
+    def _completar(self, quantidade):
+        while len(self._fila) < quantidade and self._gerador is not None:
+            try:
+                self._fila.append(next(self._gerador))
+            except StopIteration:
+                self._gerador = None
+
+    def __len__(self):
+        self._completar(self._a_frente)
+        return len(self._fila)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            self._completar(indice.stop if indice.stop is not None else self._a_frente)
+            return list(self._fila)[indice]
+        self._completar(indice + 1)
+        return self._fila[indice]
+
+    def __delitem__(self, indice):
+        if isinstance(indice, slice):
+            for _ in range(len(range(*indice.indices(len(self._fila))))):
+                self._fila.popleft()
+            return
+        self._completar(indice + 1)
+        del self._fila[indice]
+
+    def __setitem__(self, indice, valores):
+        # O reportlab só reinsere na frente: flowables[0:0] = partes.
+        if not (isinstance(indice, slice) and indice.start in (0, None) and indice.stop == 0):
+            raise IndexError("FluxoElementos só aceita inserção na frente")
+        self._fila.extendleft(reversed(list(valores)))
+
+    def insert(self, indice, elemento):
+        self._completar(indice)
+        self._fila.insert(indice, elemento)
+
+
+def elementos_relatorio(sessoes_periodo, data_inicio, data_fim, resumo=None, tags=None):
+    """
+    Gera os elementos do relatório; ``resumo`` é um ResultadoAgregacao (ou None) e
+    ``tags``, as etiquetas pelas quais as sessões foram filtradas.
+    """
+    folha = estilos()
+    yield Paragraph("Relatório de Horas Trabalhadas", folha["TituloRelatorio"])
+    yield Paragraph(
+        f"Período: {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}", folha["Normal"]
+    )
+    if tags:
+        yield Paragraph(f"Etiquetas: {escape(' '.join('#' + tag for tag in tags))}", folha["Normal"])
+    yield Spacer(1, 16)
+    total_geral = sum(d["total_segundos"] for d in sessoes_periodo.values())
+    yield Paragraph(f"Total geral: {formatar_duracao(total_geral)}", folha["Normal"])
+    yield Spacer(1, 20)
+
+    if resumo is not None:
+        yield Paragraph(f"<b>Resumo por {AGRUPAMENTOS[resumo.agrupamento].lower()}</b>", folha["Normal"])
+        linhas = (
+            [resumo.rotulo(chave), projeto, formatar_duracao(segundos)]
+            for chave, projeto, segundos in resumo.linhas()
+        )
+        yield from tabelas_em_blocos(
+            [AGRUPAMENTOS[resumo.agrupamento], "Projeto", "Duração"], linhas,
+            [4.5 * cm, 6 * cm, 2.5 * cm], COR_RESUMO,
+        )
+        yield Spacer(1, 20)
+
+    for projeto in sorted(sessoes_periodo):
+        dados = sessoes_periodo[projeto]
+        titulo = Paragraph(
+            f"<b>{projeto}</b> — Total: {formatar_duracao(dados['total_segundos'])}", folha["Normal"]
+        )
+        # O título não fica sozinho no pé da página, separado da primeira tabela.
+        titulo.keepWithNext = True
+        yield titulo
+        yield from tabelas_em_blocos(
+            ["Data", "Entrada", "Saída", "Duração"], linhas_sessoes(dados["sessoes"]),
+            [3 * cm, 2.5 * cm, 2 * cm, 2 * cm], COR_SESSOES,
+        )
+        yield Spacer(1, 14)
+
+
+def exportar_relatorio_pdf(sessoes_periodo, data_inicio, data_fim, caminho, resumo=None, tags=None):
+    """
+    Gera o PDF de ``sessoes_periodo`` ({projeto: {"sessoes", "total_segundos"}}, sessões
+    ordenadas). Retorna o número de páginas, ou 0 se o reportlab não estiver
+    disponível ou a geração falhar.
+    """
+    if not REPORTLAB_AVAILABLE:
+        logger.debug("exportar_relatorio_pdf: reportlab não disponível")
+        return 0
+    doc = SimpleDocTemplate(
+        caminho, pagesize=A4, rightMargin=2 * cm, leftMargin=2 * cm,
+        topMargin=2 * cm, bottomMargin=2 * cm,
+    )
+    inicio = time.perf_counter()
+    try:
+        with instrumentacao.medir("renderizar_relatorio", formato="pdf") as medicao:
+            doc.build(FluxoElementos(elementos_relatorio(sessoes_periodo, data_inicio, data_fim, resumo, tags)))
+            if instrumentacao.ativo():
+                duracao = time.perf_counter() - inicio
+                medicao.anotar(
+                    projetos=len(sessoes_periodo),
+                    sessoes=sum(len(d["sessoes"]) for d in sessoes_periodo.values()),
+                    paginas=doc.page,
+                    paginas_por_seg=round(doc.page / duracao, 1) if duracao else None,
+                )
+    except Exception as e:
+        logger.exception("Falha ao gerar PDF: %s", e)
+        return 0
+    logger.debug("PDF gerado com sucesso: %s (%d página(s))", caminho, doc.page)
+    return doc.page
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Retenção: compacta as sessões antigas em totais diários por projeto.
+
+Sessões com entrada antes do corte (início do dia, ``dias`` atrás) saem da lista
+``sessoes`` e viram ``agregados_diarios`` ({dia: [quantidade, segundos]}); o
+``total_segundos`` do projeto não muda e os relatórios sobre o período compactado
+usam uma pseudo-sessão por dia (ver ``historico.sessao_agregada``). Sessões que
+cruzam a meia-noite são repartidas entre os dias, como na agregação por dia, então
+os totais por dia, semana, mês e projeto continuam exatos; só o detalhe de
+entrada/saída de cada sessão deixa o arquivo principal.
+
+Opcionalmente, as sessões removidas são acrescentadas (JSON lines, uma por linha,
+com o projeto) a um arquivo compactado com LZMA ao lado do histórico, gravado
+antes de o histórico ser alterado.
+"""
+
+import json
+import logging
+import lzma
+import os
+from datetime import datetime, timedelta
+
+from .historico import CHAVE_AGREGADOS
+
+logger = logging.getLogger(__name__)
+
+NOME_ARQUIVO_MORTO = "historico_arquivado.jsonl.xz"
+VARIAVEL_DIAS = "HORAS_TRABALHADAS_RETENCAO_DIAS"
+
+
+def data_corte(dias, agora=None):
+    """Meia-noite de ``dias`` dias atrás: sessões com entrada antes dela são compactadas."""
+    agora = agora or datetime.now()
+    return (agora - timedelta(days=dias)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def dias_pelo_ambiente():
+    """Dias de retenção definidos em HORAS_TRABALHADAS_RETENCAO_DIAS, ou None."""
+    valor = os.environ.get(VARIAVEL_DIAS, "").strip()
+    if not valor:
+        return None
+    try:
+        dias = int(valor)
+    except ValueError:
+        logger.error("%s inválida: %r (use um número de dias)", VARIAVEL_DIAS, valor)
+        return None
+    return dias if dias > 0 else None
+
+
+def arquivar_sessoes(caminho, pares):
+    """Acrescenta (projeto, sessao) ao arquivo morto; cada chamada grava um novo fluxo LZMA."""
+    with lzma.open(caminho, "at", encoding="utf-8") as f:
+        for projeto, sessao in pares:
+            f.write(json.dumps({"projeto": projeto, **sessao}, ensure_ascii=False))
+            f.write("\n")
+    with open(caminho, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def iterar_arquivadas(caminho):
+    """Gera (projeto, sessao) das sessões guardadas no arquivo morto."""
+    if not os.path.exists(caminho):
+        return
+    with lzma.open(caminho, "rt", encoding="utf-8") as f:
+        for linha in f:
+            registro = json.loads(linha)
+            yield registro.pop("projeto"), registro
+
+
+def compactar_historico(repositorio, dias, arquivar=True, agora=None):
+    """
+    Compacta no repositório as sessões anteriores ao corte (não grava o histórico).
+    Com ``arquivar``, guarda antes as sessões detalhadas no arquivo morto; se essa
+    gravação falhar, a exceção é propagada e o histórico fica como estava.
+    Retorna o número de sessões compactadas.
+    """
+    corte = data_corte(dias, agora)
+    antigas = repositorio.sessoes_anteriores(corte)
+    if not antigas:
+        return 0
+    if arquivar:
+        caminho = os.path.join(os.path.dirname(repositorio.arquivo), NOME_ARQUIVO_MORTO)
+        arquivar_sessoes(caminho, antigas)
+    compactadas = repositorio.compactar(corte)
+    dias_compactados = sum(len(d.get(CHAVE_AGREGADOS, {})) for d in repositorio.dados.values())
+    logger.info(
+        "Retenção: %d sessão(ões) anteriores a %s compactadas (%d dia(s) agregados no total)",
+        compactadas, corte.date().isoformat(), dias_compactados,
+    )
+    return compactadas
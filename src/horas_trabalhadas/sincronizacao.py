@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+Sincronização incremental entre máquinas por um diretório compartilhado
+(pasta de rede, pendrive, pasta sincronizada por outro programa).
+
+Cada dispositivo registra as alterações de sessão que faz (inclusão, edição,
+exclusão) num diário local; ao sincronizar, acrescenta essas alterações, com
+número de sequência próprio, ao seu arquivo ``<dispositivo>.jsonl`` no diretório
+compartilhado e lê dos arquivos dos outros dispositivos só o que veio depois da
+última posição (em bytes) já lida. O custo de cada sincronização acompanha o
+número de alterações trocadas, não o tamanho do histórico.
+
+As sessões são identificadas por ``id``: um uuid para as criadas com a
+sincronização ativa e, para as antigas, um hash de projeto + entrada (igual em
+todas as máquinas que têm a mesma cópia). Conflitos são resolvidos pela última
+escrita: vence a versão com maior (instante, dispositivo), o que dá o mesmo
+resultado em qualquer ordem de aplicação, e os totais convergem.
+
+A versão de cada sessão fica na própria sessão (``"versao"``, ao lado do ``id``);
+o estado local (``sincronizacao.json``) guarda só o dispositivo, a sequência, as
+posições lidas e as versões das sessões removidas nos últimos
+``RETENCAO_REMOCOES_SEG`` (para que uma alteração mais antiga, recebida depois,
+não traga a sessão de volta). Assim o estado, regravado a cada gravação do
+histórico, não cresce com o tamanho do histórico.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+NOME_ARQUIVO_ESTADO = "sincronizacao.json"
+NOME_ARQUIVO_PENDENTES = "alteracoes_pendentes.jsonl"
+VARIAVEL_DIRETORIO = "HORAS_TRABALHADAS_SYNC_DIR"
+RETENCAO_REMOCOES_SEG = 90 * 86400
+CAMPOS_ALTERACAO = ("seq", "op", "projeto", "id", "ts", "disp")
+
+
+class ErroSincronizacao(ValueError):
+    """Alteração ilegível ou incompleta no arquivo de outro dispositivo."""
+
+
+def id_sessao_legado(projeto, sessao):
+    """Id determinístico de uma sessão sem ``id`` (mesma cópia → mesmo id em todas as máquinas)."""
+    return hashlib.sha1(f"{projeto}\0{sessao['data']}".encode("utf-8")).hexdigest()[:20]
+
+
+def id_sessao(projeto, sessao):
+    return sessao.get("id") or id_sessao_legado(projeto, sessao)
+
+
+def versao_sessao(sessao):
+    """(instante, dispositivo) da última escrita da sessão; [0, ""] se nunca sincronizada."""
+    return sessao.get("versao") or [0, ""]
+
+
+def validar_alteracao(alteracao):
+    """Levanta ErroSincronizacao se a alteração recebida não tiver os campos e tipos esperados."""
+    if not isinstance(alteracao, dict):
+        raise ErroSincronizacao("alteração não é um objeto")
+    faltando = [campo for campo in CAMPOS_ALTERACAO if campo not in alteracao]
+    if faltando:
+        raise ErroSincronizacao(f"alteração sem {', '.join(faltando)}")
+    if not isinstance(alteracao["seq"], int) or not isinstance(alteracao["ts"], (int, float)):
+        raise ErroSincronizacao("seq e ts devem ser números")
+    if alteracao["op"] not in ("gravar", "remover"):
+        raise ErroSincronizacao(f"operação desconhecida: {alteracao['op']!r}")
+    if alteracao["op"] == "gravar":
+        sessao = alteracao.get("sessao")
+        if not (isinstance(sessao, dict) and isinstance(sessao.get("data"), str)
+                and isinstance(sessao.get("duracao_segundos"), (int, float))):
+            raise ErroSincronizacao("sessão ausente ou incompleta")
+
+
+def sincronizacao_configurada(diretorio_dados):
+    return os.path.exists(os.path.join(diretorio_dados, NOME_ARQUIVO_ESTADO))
+
+
+class Sincronizador:
+    """
+    Diário das alterações locais e troca com o diretório compartilhado.
+
+    Ao ser criado, passa a ouvir o repositório: toda alteração de sessão feita
+    por qualquer caminho (janela, importação, API) entra no diário. Na primeira
+    vez num diretório de dados, publica as sessões existentes com versão zero,
+    para que os outros dispositivos as recebam.
+    """
+
+    def __init__(self, repositorio, diretorio_dados):
+        self.repositorio = repositorio
+        self.arquivo_estado = os.path.join(diretorio_dados, NOME_ARQUIVO_ESTADO)
+        self.arquivo_pendentes = os.path.join(diretorio_dados, NOME_ARQUIVO_PENDENTES)
+        self._buffer = []
+        # projeto -> {id: sessão}, montado só para os projetos que recebem alterações
+        self._indices = {}
+        self._aplicando = False
+        novo = not os.path.exists(self.arquivo_estado)
+        self.estado = self._ler_estado()
+        # Formato anterior guardava a versão de todas as sessões no estado.
+        self.estado.pop("versoes", None)
+        self.estado.setdefault("removidas", {})
+        repositorio.adicionar_ouvinte(self._ao_alterar)
+        if novo:
+            self._publicar_existentes()
+            self._gravar_estado()
+
+    @property
+    def dispositivo(self):
+        return self.estado["dispositivo"]
+
+    # --- estado e diário local ---
+
+    def _ler_estado(self):
+        if os.path.exists(self.arquivo_estado):
+            with open(self.arquivo_estado, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"dispositivo": uuid.uuid4().hex[:12], "seq": 0, "posicoes": {}, "ultimas_seq": {}, "removidas": {}}
+
+    def _gravar_estado(self):
+        temporario = self.arquivo_estado + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self.estado, f, ensure_ascii=False)
+        os.replace(temporario, self.arquivo_estado)
+
+    def _publicar_existentes(self):
+        for projeto, dados in self.repositorio.dados.items():
+            for sessao in dados.get("sessoes", []):
+                self._buffer.append({
+                    "ts": 0, "op": "gravar", "projeto": projeto,
+                    "id": id_sessao(projeto, sessao), "sessao": sessao,
+                })
+        self._descarregar_buffer()
+
+    def _ao_alterar(self, operacao, projeto, anterior, sessao):
+        if operacao in ("carregar", "compactar"):
+            self._indices = {}
+            return
+        if operacao == "salvar":
+            self._descarregar_buffer()
+            return
+        if self._aplicando:
+            return
+        if operacao == "adicionar":
+            for incluida in sessao:
+                incluida.setdefault("id", uuid.uuid4().hex)
+                self._registrar("gravar", projeto, incluida["id"], incluida)
+        elif operacao == "substituir":
+            sid = sessao.get("id") or id_sessao(projeto, anterior)
+            sessao["id"] = sid
+            self._registrar("gravar", projeto, sid, sessao)
+        else:
+            self._registrar("remover", projeto, id_sessao(projeto, anterior), None)
+
+    def _registrar(self, op, projeto, sid, sessao):
+        agora = time.time()
+        versao = [agora, self.dispositivo]
+        self._buffer.append({"ts": agora, "op": op, "projeto": projeto, "id": sid, "sessao": sessao})
+        indice = self._indices.get(projeto)
+        if op == "remover":
+            self.estado["removidas"][sid] = versao
+            if indice is not None:
+                indice.pop(sid, None)
+        else:
+            sessao["versao"] = versao
+            self.estado["removidas"].pop(sid, None)
+            if indice is not None:
+                indice[sid] = sessao
+
+    def _podar_removidas(self, agora=None):
+        limite = (agora or time.time()) - RETENCAO_REMOCOES_SEG
+        removidas = self.estado["removidas"]
+        for sid in [sid for sid, (ts, _) in removidas.items() if ts < limite]:
+            del removidas[sid]
+
+    def _descarregar_buffer(self):
+        """Grava no diário local (junto com o histórico) as alterações ainda em memória."""
+        if not self._buffer:
+            return
+        with open(self.arquivo_pendentes, "a", encoding="utf-8") as f:
+            for alteracao in self._buffer:
+                f.write(json.dumps(alteracao, ensure_ascii=False))
+                f.write("\n")
+        self._buffer.clear()
+        self._gravar_estado()
+
+    # --- troca com o diretório compartilhado ---
+
+    def sincronizar(self, diretorio_compartilhado):
+        """
+        Envia as alterações locais e aplica as recebidas. Retorna (enviadas, recebidas).
+        Se algo foi recebido, o histórico precisa ser gravado pelo chamador.
+        """
+        os.makedirs(diretorio_compartilhado, exist_ok=True)
+        enviadas = self._enviar(diretorio_compartilhado)
+        recebidas = 0
+        for nome in sorted(os.listdir(diretorio_compartilhado)):
+            dispositivo, extensao = os.path.splitext(nome)
+            if extensao != ".jsonl" or dispositivo == self.dispositivo:
+                continue
+            recebidas += self._receber(os.path.join(diretorio_compartilhado, nome), dispositivo)
+        self._podar_removidas()
+        self._gravar_estado()
+        logger.info("Sincronização: %d alteração(ões) enviada(s), %d recebida(s)", enviadas, recebidas)
+        return enviadas, recebidas
+
+    def _enviar(self, diretorio_compartilhado):
+        self._descarregar_buffer()
+        if not os.path.exists(self.arquivo_pendentes):
+            return 0
+        with open(self.arquivo_pendentes, "r", encoding="utf-8") as f:
+            alteracoes = [json.loads(linha) for linha in f if linha.strip()]
+        if alteracoes:
+            seq = self.estado["seq"]
+            destino = os.path.join(diretorio_compartilhado, f"{self.dispositivo}.jsonl")
+            with open(destino, "a", encoding="utf-8") as f:
+                for alteracao in alteracoes:
+                    seq += 1
+                    f.write(json.dumps({"seq": seq, "disp": self.dispositivo, **alteracao}, ensure_ascii=False))
+                    f.write("\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.estado["seq"] = seq
+            self._gravar_estado()
+        os.remove(self.arquivo_pendentes)
+        return len(alteracoes)
+
+    def _receber(self, caminho, dispositivo):
+        posicao = self.estado["posicoes"].get(dispositivo, 0)
+        ultima_seq = self.estado["ultimas_seq"].get(dispositivo, 0)
+        recebidas = 0
+        with open(caminho, "rb") as f:
+            f.seek(posicao)
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    # Linha ainda sendo escrita pelo outro dispositivo: fica para a próxima vez.
+                    break
+                try:
+                    alteracao = json.loads(linha)
+                    validar_alteracao(alteracao)
+                except ValueError as e:
+                    # Linha malformada: é pulada (e registrada) para não travar a sincronização.
+                    logger.error("Sincronização: alteração inválida em %s (byte %d): %s", caminho, posicao, e)
+                    posicao += len(linha)
+                    continue
+                posicao += len(linha)
+                if alteracao["seq"] <= ultima_seq:
+                    continue
+                if alteracao["seq"] != ultima_seq + 1:
+                    logger.warning(
+                        "Sincronização: sequência de %s pulou de %d para %d",
+                        dispositivo, ultima_seq, alteracao["seq"],
+                    )
+                ultima_seq = alteracao["seq"]
+                if self._aplicar(alteracao):
+                    recebidas += 1
+        self.estado["posicoes"][dispositivo] = posicao
+        self.estado["ultimas_seq"][dispositivo] = ultima_seq
+        return recebidas
+
+    def _indexar(self, projeto):
+        """{id: sessão} do projeto (só ele é lido); cada alteração recebida diz o projeto da sessão."""
+        indice = self._indices.get(projeto)
+        if indice is None:
+            dados = self.repositorio.dados.get(projeto)
+            indice = self._indices[projeto] = {
+                id_sessao(projeto, sessao): sessao for sessao in (dados or {}).get("sessoes", [])
+            }
+        return indice
+
+    def _aplicar(self, alteracao):
+        """Aplica uma alteração recebida se ela for mais nova que a versão local (última escrita vence)."""
+        sid = alteracao["id"]
+        versao = [alteracao["ts"], alteracao["disp"]]
+        projeto = alteracao["projeto"]
+        indice = self._indexar(projeto)
+        existente = indice.get(sid)
+        if existente is not None:
+            atual = versao_sessao(existente)
+        else:
+            atual = self.estado["removidas"].get(sid, [0, ""])
+        if versao <= atual:
+            return False
+        self._aplicando = True
+        try:
+            if alteracao["op"] == "remover":
+                if existente is not None:
+                    sessoes = self.repositorio.dados[projeto]["sessoes"]
+                    posicao = next(i for i, s in enumerate(sessoes) if s is existente)
+                    self.repositorio.remover_sessao(projeto, posicao)
+                    del indice[sid]
+                if versao[0]:
+                    self.estado["removidas"][sid] = versao
+            else:
+                nova = dict(alteracao["sessao"], id=sid)
+                nova.pop("versao", None)
+                if versao[0]:
+                    nova["versao"] = versao
+                self.estado["removidas"].pop(sid, None)
+                if existente is not None:
+                    if existente != nova:
+                        self.repositorio.atualizar_sessao(projeto, existente, nova)
+                else:
+                    self.repositorio.adicionar_sessao(projeto, nova)
+                    indice[sid] = nova
+        finally:
+            self._aplicando = False
+        return True
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _ambiente_isolado(monkeypatch):
+    """Sem backup automático nem instantâneo de partida rápida: cada teste só mexe no próprio tmp_path."""
+    monkeypatch.setenv("HORAS_TRABALHADAS_BACKUP", "0")
+    monkeypatch.setenv("HORAS_TRABALHADAS_PARTIDA_RAPIDA", "0")
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from horas_trabalhadas import agendador
+from horas_trabalhadas.agendador import Agendador
+
+
+class RootFalso:
+    """Só o necessário do Tk: ``after`` guarda o callback, que o teste dispara à mão."""
+
+    def __init__(self):
+        self.armados = {}
+        self._proximo = 0
+
+    def after(self, atraso_ms, callback):
+        self._proximo += 1
+        after_id = f"after#{self._proximo}"
+        self.armados[after_id] = callback
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.armados.pop(after_id, None)
+
+    def disparar(self):
+        for after_id, callback in list(self.armados.items()):
+            del self.armados[after_id]
+            callback()
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(agendador.time, "time", lambda: agora[0])
+    return agora
+
+
+def test_cancelar_tarefa_ja_executada_nao_acumula(relogio):
+    root = RootFalso()
+    ag = Agendador(root)
+    executadas = []
+    for _ in range(100):
+        tarefa = ag.agendar_em(1, lambda: executadas.append(1))
+        relogio[0] += 2
+        root.disparar()
+        ag.cancelar(tarefa)
+    assert len(executadas) == 100
+    assert ag.pendentes() == 0
+    assert not ag._canceladas
+
+
+def test_pendentes_conta_so_tarefas_ativas(relogio):
+    root = RootFalso()
+    ag = Agendador(root)
+    executadas = []
+    a = ag.agendar_em(1, lambda: executadas.append("a"))
+    b = ag.agendar_em(2, lambda: executadas.append("b"))
+    ag.agendar_em(3, lambda: executadas.append("c"))
+    assert ag.pendentes() == 3
+    ag.cancelar(b)
+    ag.cancelar(b)
+    ag.cancelar(None)
+    assert ag.pendentes() == 2
+    relogio[0] += 1
+    root.disparar()
+    ag.cancelar(a)
+    assert ag.pendentes() == 1
+    relogio[0] += 5
+    root.disparar()
+    assert executadas == ["a", "c"]
+    assert ag.pendentes() == 0
+    assert not ag._canceladas and not ag._heap
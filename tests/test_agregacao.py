@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from horas_trabalhadas import agregacao
+from horas_trabalhadas.agregacao import AGRUPAMENTOS, agregar
+from horas_trabalhadas.historico import CHAVE_AGREGADOS, calcular_total_sessoes
+
+
+@pytest.fixture(scope="module")
+def historico():
+    aleatorio = random.Random(42)
+    inicio = datetime(2024, 1, 1)
+    historico = {}
+    for projeto in ("alfa", "beta", "gama"):
+        sessoes = []
+        for _ in range(400):
+            entrada = inicio + timedelta(seconds=aleatorio.randrange(0, 90 * 86400))
+            # Algumas cruzam a meia-noite ou duram mais de um dia.
+            curta, longa = aleatorio.randrange(60, 4 * 3600), aleatorio.randrange(20 * 3600, 50 * 3600)
+            duracao = float(aleatorio.choice([curta, longa]))
+            sessoes.append({"data": entrada.isoformat(), "duracao_segundos": duracao})
+        historico[projeto] = {"total_segundos": calcular_total_sessoes(sessoes), "sessoes": sessoes}
+    historico["alfa"][CHAVE_AGREGADOS] = {"2024-01-05": [3, 30 * 3600.0], "2024-02-10": [1, 600.0]}
+    return historico
+
+
+@pytest.mark.skipif(not agregacao.NUMPY_AVAILABLE, reason="NumPy não instalado")
+@pytest.mark.parametrize("agrupamento", sorted(AGRUPAMENTOS))
+def test_numpy_e_stdlib_dao_o_mesmo_resultado(historico, agrupamento, monkeypatch):
+    periodo = (datetime(2024, 1, 1), datetime(2024, 3, 31, 23, 59, 59))
+    com_numpy = agregar(historico, *periodo, agrupamento)
+    monkeypatch.setattr(agregacao, "NUMPY_AVAILABLE", False)
+    sem_numpy = agregar(historico, *periodo, agrupamento)
+    assert com_numpy.chaves == sem_numpy.chaves
+    assert com_numpy.valores.keys() == sem_numpy.valores.keys()
+    for chave, segundos in com_numpy.valores.items():
+        assert segundos == pytest.approx(sem_numpy.valores[chave], abs=1e-6)
+
+
+def test_total_geral_igual_a_soma_das_sessoes(historico, monkeypatch):
+    monkeypatch.setattr(agregacao, "NUMPY_AVAILABLE", False)
+    resultado = agregar(historico, datetime(2024, 1, 1), datetime(2024, 3, 31, 23, 59, 59), "semana")
+    esperado = sum(d["total_segundos"] for d in historico.values()) + 30 * 3600.0 + 600.0
+    assert resultado.total_geral() == pytest.approx(esperado)
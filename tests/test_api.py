@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import signal
+import threading
+
+import pytest
+
+from horas_trabalhadas.api import ExecutorTk, ServicoPonto, ServidorApi
+from horas_trabalhadas.cache_relatorios import RelatoriosEmCache
+from horas_trabalhadas.historico import NOME_ARQUIVO_SESSAO_ABERTA, RepositorioHistorico
+from horas_trabalhadas.ponto import ControlePonto
+
+
+class EscritorFalso:
+    def __init__(self):
+        self.dados = b""
+        self.fechado = False
+
+    def write(self, dados):
+        self.dados += dados
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.fechado = True
+
+
+def atender(requisicao):
+    async def rodar():
+        leitor = asyncio.StreamReader()
+        leitor.feed_data(requisicao)
+        leitor.feed_eof()
+        escritor = EscritorFalso()
+        await ServidorApi(servico=None)._atender(leitor, escritor)
+        return escritor
+
+    return asyncio.run(rodar())
+
+
+@pytest.mark.parametrize("valor", ["abc", "-5", "1_0", "1.5"])
+def test_content_length_invalido_devolve_400(valor):
+    escritor = atender(f"POST /entrada HTTP/1.1\r\nContent-Length: {valor}\r\n\r\n".encode("latin-1"))
+    assert escritor.dados.startswith(b"HTTP/1.1 400 ")
+    assert escritor.fechado
+
+
+class RootFalso:
+    def __init__(self):
+        self.agendados = []
+        self._trava = threading.Lock()
+
+    def after(self, atraso_ms, callback):
+        with self._trava:
+            self.agendados.append(callback)
+        return "after#1"
+
+    def rodar_pendentes(self):
+        with self._trava:
+            agendados, self.agendados = self.agendados, []
+        for callback in agendados:
+            callback()
+
+
+def test_executor_so_agenda_com_trabalho_na_fila():
+    root = RootFalso()
+    executor = ExecutorTk(root)
+    executor.iniciar()
+    assert root.agendados == []
+    futuros = [executor.submeter(lambda x: x * 2, i) for i in range(3)]
+    assert len(root.agendados) == 1
+    root.rodar_pendentes()
+    assert [f.result(0) for f in futuros] == [0, 2, 4]
+    assert root.agendados == []
+    falha = executor.submeter(lambda: 1 / 0)
+    root.rodar_pendentes()
+    with pytest.raises(ZeroDivisionError):
+        falha.result(0)
+    assert root.agendados == []
+
+
+def abrir_servico(diretorio):
+    repositorio = RepositorioHistorico(str(diretorio / "historico_horas.json"))
+    repositorio.carregar()
+    ponto = ControlePonto(repositorio, str(diretorio / NOME_ARQUIVO_SESSAO_ABERTA))
+    return ServicoPonto(repositorio, ponto, RelatoriosEmCache(repositorio))
+
+
+def test_sessao_encerrada_fica_no_checkpoint_ate_ser_gravada(tmp_path):
+    servico = abrir_servico(tmp_path)
+    servico.entrada("alfa")
+    sessao = servico.saida("alfa")
+    assert os.path.exists(tmp_path / NOME_ARQUIVO_SESSAO_ABERTA)
+
+    # Queda antes da gravação em lote: a sessão volta do checkpoint.
+    reaberto = abrir_servico(tmp_path)
+    assert reaberto.ponto.recuperar() == [("alfa", sessao["duracao_segundos"])]
+    reaberto.repositorio.salvar()
+    # Queda depois de gravar o histórico e antes de limpar o checkpoint: nada é duplicado.
+    de_novo = abrir_servico(tmp_path)
+    assert de_novo.ponto.recuperar() == []
+    assert len(de_novo.repositorio.dados["alfa"]["sessoes"]) == 1
+    assert not os.path.exists(tmp_path / NOME_ARQUIVO_SESSAO_ABERTA)
+
+    servico.alteracoes_pendentes = 1
+    servico.salvar_pendente()
+    assert servico.ponto.encerradas == []
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGTERM") or os.name == "nt", reason="sinais POSIX")
+def test_sigterm_grava_as_alteracoes_pendentes(tmp_path):
+    servico = abrir_servico(tmp_path)
+    servidor = ServidorApi(servico, porta=0, intervalo_gravacao=3600)
+
+    async def rodar():
+        tarefa = asyncio.create_task(servidor.servir())
+        while servidor._servidor is None:
+            await asyncio.sleep(0)
+        await servidor._chamar(servico.entrada, "alfa", altera=True)
+        await servidor._chamar(servico.saida, "alfa", altera=True)
+        os.kill(os.getpid(), signal.SIGTERM)
+        with pytest.raises(asyncio.CancelledError):
+            await tarefa
+
+    asyncio.run(rodar())
+    assert servico.alteracoes_pendentes == 0
+    assert not os.path.exists(tmp_path / NOME_ARQUIVO_SESSAO_ABERTA)
+    relido = RepositorioHistorico(servico.repositorio.arquivo)
+    relido.carregar()
+    assert len(relido.dados["alfa"]["sessoes"]) == 1
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import copy
+from datetime import datetime
+
+import pytest
+
+from horas_trabalhadas.backup import (
+    ArmazemBackup,
+    Backup,
+    localizar_instantaneo,
+    montar_historico,
+    podar,
+    restaurar,
+)
+from horas_trabalhadas.historico import RepositorioHistorico
+
+
+def sessao(data, segundos=3600.0):
+    return {"data": data, "duracao_segundos": segundos}
+
+
+@pytest.fixture
+def repositorio(tmp_path):
+    repositorio = RepositorioHistorico(str(tmp_path / "historico_horas.json"))
+    repositorio.carregar()
+    repositorio.adicionar_sessoes("alfa", [sessao("2024-01-02T09:00:00"), sessao("2024-02-05T09:00:00")])
+    repositorio.adicionar_sessao("beta", sessao("2024-01-03T14:00:00", 1800.0))
+    return repositorio
+
+
+@pytest.fixture
+def backup(repositorio, tmp_path):
+    return Backup(repositorio, str(tmp_path / "backups"))
+
+
+def contar_objetos(armazem):
+    return len(list(armazem.objetos()))
+
+
+def test_criar_e_restaurar(repositorio, backup):
+    original = copy.deepcopy(dict(repositorio.dados))
+    primeiro, _ = backup.criar(datetime(2024, 3, 1, 10))
+    repositorio.remover_sessao("alfa", 0)
+    repositorio.adicionar_sessao("gama", sessao("2024-02-10T08:00:00"))
+    backup.criar(datetime(2024, 3, 1, 11))
+
+    assert localizar_instantaneo(backup.armazem, datetime(2024, 3, 1, 10, 30)) == primeiro
+    restaurar(repositorio, backup.armazem, primeiro)
+    assert dict(repositorio.dados) == original
+    relido = RepositorioHistorico(repositorio.arquivo)
+    relido.carregar()
+    assert dict(relido.dados) == original
+
+
+def test_blocos_iguais_nao_sao_gravados_de_novo(repositorio, backup):
+    backup.criar(datetime(2024, 3, 1, 10))
+    objetos = contar_objetos(backup.armazem)
+    _, gravados = backup.criar(datetime(2024, 3, 1, 11))
+    assert gravados == 0
+    assert contar_objetos(backup.armazem) == objetos
+
+    repositorio.adicionar_sessao("alfa", sessao("2024-02-06T09:00:00"))
+    backup.criar(datetime(2024, 3, 1, 12))
+    # Só o bloco de fevereiro, o cabeçalho (total) e a árvore de "alfa" são novos.
+    assert contar_objetos(backup.armazem) == objetos + 3
+
+
+def test_meses_intercalados_mantem_a_ordem(repositorio, backup):
+    repositorio.adicionar_sessao("alfa", sessao("2024-01-20T09:00:00"))
+    sessoes = [s["data"] for s in repositorio.dados["alfa"]["sessoes"]]
+    assert sessoes == ["2024-01-02T09:00:00", "2024-02-05T09:00:00", "2024-01-20T09:00:00"]
+    nome, _ = backup.criar(datetime(2024, 3, 1, 10))
+    arvore = backup.armazem.ler_objeto(backup.armazem.ler_instantaneo(nome)["projetos"]["alfa"])
+    assert arvore["ordem"] == [0, 1, 0]
+    assert [s["data"] for s in montar_historico(backup.armazem, nome)["alfa"]["sessoes"]] == sessoes
+
+
+def test_poda_mantem_o_mais_recente_e_objetos_em_uso(repositorio, backup):
+    backup.criar(datetime(2024, 1, 1, 10))
+    repositorio.adicionar_sessao("alfa", sessao("2024-02-06T09:00:00"))
+    ultimo, _ = backup.criar(datetime(2024, 3, 1, 10))
+
+    removidos, objetos = podar(backup.armazem, 0, 0, 0)
+    assert (removidos, objetos) == (1, 3)
+    assert backup.armazem.listar() == [ultimo]
+    esperado = copy.deepcopy(dict(repositorio.dados))
+    assert montar_historico(backup.armazem, ultimo) == esperado
+
+
+def test_arvore_memorizada_removida_e_regravada(repositorio, backup, tmp_path):
+    backup.criar(datetime(2024, 1, 1, 10))
+    # Outro processo poda o diretório depois de um instantâneo sem "beta".
+    outro = ArmazemBackup(backup.armazem.diretorio)
+    repositorio_outro = RepositorioHistorico(str(tmp_path / "outro.json"))
+    repositorio_outro.adicionar_sessao("alfa", sessao("2024-01-02T09:00:00"))
+    Backup(repositorio_outro, outro.diretorio).criar(datetime(2024, 2, 1, 10))
+    podar(outro, 0, 0, 0)
+
+    repositorio.adicionar_sessao("alfa", sessao("2024-02-06T09:00:00"))
+    nome, _ = backup.criar(datetime(2024, 3, 1, 10))
+    assert montar_historico(backup.armazem, nome) == copy.deepcopy(dict(repositorio.dados))
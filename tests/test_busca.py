@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+import pytest
+
+from horas_trabalhadas.busca import IndiceSessoes, anotar, termos_consulta, termos_sessao
+from horas_trabalhadas.historico import RepositorioHistorico
+
+CONSULTAS = ["#cliente", "#reunião", "#cliente reuniao", "planejamento", "#cliente #interno", "sprint"]
+
+
+def sessao(data, tags=None, nota=None):
+    return anotar({"data": data, "duracao_segundos": 3600}, tags, nota)
+
+
+def varredura(repositorio, consulta):
+    termos = termos_consulta(consulta)
+    return [
+        (projeto, s)
+        for projeto, dados in repositorio.dados.items()
+        for s in dados.get("sessoes", [])
+        if termos <= termos_sessao(s)
+    ]
+
+
+def conferir(indice, repositorio):
+    for consulta in CONSULTAS:
+        esperado = sorted(varredura(repositorio, consulta), key=lambda par: par[1]["data"])
+        assert indice.buscar(consulta) == esperado, consulta
+    esperado = sorted(varredura(repositorio, "#cliente #reunião"), key=lambda par: par[1]["data"])
+    assert indice.buscar_tags("Cliente, #Reunião") == esperado
+
+
+@pytest.fixture
+def repositorio():
+    repositorio = RepositorioHistorico("inexistente.json")
+    repositorio.adicionar_sessoes("alfa", [
+        sessao("2024-01-02T09:00:00", "cliente reunião", "Reunião de planejamento"),
+        sessao("2024-01-03T09:00:00", "interno"),
+        sessao("2024-01-04T09:00:00"),
+    ])
+    repositorio.adicionar_sessao("beta", sessao("2024-02-01T09:00:00", "cliente", "sprint 3"))
+    return repositorio
+
+
+def test_indice_acompanha_as_alteracoes(repositorio):
+    indice = IndiceSessoes(repositorio)
+    conferir(indice, repositorio)
+    assert indice.montagens == 1
+
+    repositorio.adicionar_sessoes("beta", [
+        sessao("2024-02-02T09:00:00", "cliente interno"),
+        sessao("2024-02-03T09:00:00", nota="planejamento da sprint"),
+    ])
+    conferir(indice, repositorio)
+    # Edição no lugar: a sessão anotada perde a etiqueta e ganha outra nota.
+    primeira = repositorio.dados["alfa"]["sessoes"][0]
+    repositorio.atualizar_sessao("alfa", primeira, sessao(primeira["data"], "reunião", "retrospectiva"))
+    conferir(indice, repositorio)
+    # Troca por outro objeto e edição de uma sessão que não estava no índice.
+    repositorio.substituir_sessao("alfa", 1, sessao("2024-01-03T09:00:00", "cliente", "reunião"))
+    sem_nada = repositorio.dados["alfa"]["sessoes"][2]
+    repositorio.atualizar_sessao("alfa", sem_nada, sessao(sem_nada["data"], "interno"))
+    conferir(indice, repositorio)
+    repositorio.remover_sessao("beta", 0)
+    conferir(indice, repositorio)
+    assert indice.montagens == 1
+
+
+def test_compactacao_e_troca_geral_remontam(repositorio):
+    indice = IndiceSessoes(repositorio)
+    conferir(indice, repositorio)
+    repositorio.compactar(datetime(2024, 1, 31))
+    conferir(indice, repositorio)
+    assert indice.buscar("#interno") == []
+    assert indice.montagens == 2
+
+    # Alteração sem passar pelos métodos do repositório: percebida pela geração.
+    repositorio.dados["beta"]["sessoes"].append(sessao("2024-02-05T09:00:00", "interno"))
+    repositorio.marcar_alterado("beta")
+    conferir(indice, repositorio)
+    assert indice.montagens == 3
+
+
+def test_filtros_de_projeto_e_periodo(repositorio):
+    indice = IndiceSessoes(repositorio)
+    assert [p for p, _ in indice.buscar("#cliente", projetos=["beta"])] == ["beta"]
+    alfa, beta = repositorio.dados["alfa"]["sessoes"][0], repositorio.dados["beta"]["sessoes"][0]
+    assert indice.buscar("#cliente", data_inicio=datetime(2024, 1, 15)) == [("beta", beta)]
+    assert indice.buscar("#cliente", data_fim=datetime(2024, 1, 15)) == [("alfa", alfa)]
+    assert indice.tags() == {"cliente": 2, "interno": 1, "reunião": 1}
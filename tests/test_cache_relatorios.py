@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+from horas_trabalhadas import cache_relatorios
+from horas_trabalhadas.cache_relatorios import CacheLRU, RelatoriosEmCache
+from horas_trabalhadas.historico import RepositorioHistorico
+
+PERIODO = (datetime(2024, 1, 1), datetime(2024, 1, 31, 23, 59, 59))
+
+
+def sessao(data, segundos=3600.0):
+    return {"data": data, "duracao_segundos": segundos}
+
+
+def repositorio_com_sessoes(quantidade=10):
+    repositorio = RepositorioHistorico("inexistente.json")
+    repositorio.adicionar_sessoes("alfa", [sessao(f"2024-01-{i % 28 + 1:02d}T09:00:00") for i in range(quantidade)])
+    repositorio.adicionar_sessao("beta", sessao("2024-01-15T14:00:00", 1800.0))
+    return repositorio
+
+
+def total(sessoes_periodo):
+    return sum(dados["total_segundos"] for dados in sessoes_periodo.values())
+
+
+def test_alteracao_do_historico_invalida_o_cache():
+    repositorio = repositorio_com_sessoes()
+    relatorios = RelatoriosEmCache(repositorio)
+    antes = relatorios.sessoes_periodo(*PERIODO)
+    assert relatorios.sessoes_periodo(*PERIODO) is antes
+    semana = relatorios.agregacao(*PERIODO, "semana")
+
+    repositorio.adicionar_sessao("beta", sessao("2024-01-20T10:00:00", 600.0))
+
+    depois = relatorios.sessoes_periodo(*PERIODO)
+    assert depois is not antes
+    assert total(depois) == total(antes) + 600.0
+    assert relatorios.agregacao(*PERIODO, "semana").total_geral() == semana.total_geral() + 600.0
+    # Só as entradas da geração atual continuam no cache.
+    assert len(relatorios.cache) == 2
+
+    repositorio.remover_sessao("beta", 0)
+    assert total(relatorios.sessoes_periodo(*PERIODO)) == total(depois) - 1800.0
+
+
+def test_lru_descarta_o_usado_ha_mais_tempo():
+    cache = CacheLRU(capacidade=2)
+    cache.armazenar("a", 1)
+    cache.armazenar("b", 2)
+    assert cache.obter("a") == 1
+    cache.armazenar("c", 3)
+    assert "b" not in cache
+    assert cache.obter("a") == 1 and cache.obter("c") == 3
+    assert len(cache) == 2
+
+    relatorios = RelatoriosEmCache(repositorio_com_sessoes(), capacidade=2)
+    for dia in (10, 20, 31):
+        relatorios.sessoes_periodo(datetime(2024, 1, 1), datetime(2024, 1, dia))
+    assert len(relatorios.cache) == 2
+    assert relatorios.chave("sessoes", datetime(2024, 1, 1), datetime(2024, 1, 10)) not in relatorios.cache
+
+
+def test_precalculo_abandonado_quando_o_historico_muda(monkeypatch):
+    monkeypatch.setattr(cache_relatorios, "SESSOES_POR_ETAPA", 3)
+    repositorio = repositorio_com_sessoes(quantidade=10)
+    relatorios = RelatoriosEmCache(repositorio)
+    chave = relatorios.chave("sessoes", *PERIODO)
+    etapas = relatorios.etapas_precalculo(*PERIODO, agrupamentos=("dia",))
+    next(etapas)
+
+    repositorio.adicionar_sessao("alfa", sessao("2024-01-05T18:00:00", 900.0))
+
+    assert list(etapas) == []
+    assert len(relatorios.cache) == 0
+    assert chave not in relatorios.cache
+    assert total(relatorios.sessoes_periodo(*PERIODO)) == 10 * 3600.0 + 1800.0 + 900.0
+
+
+def test_precalculo_completo_serve_as_consultas():
+    repositorio = repositorio_com_sessoes()
+    relatorios = RelatoriosEmCache(repositorio)
+    for _ in relatorios.etapas_precalculo(*PERIODO, agrupamentos=("dia", "mes")):
+        pass
+    falhas = relatorios.cache.falhas
+    assert total(relatorios.sessoes_periodo(*PERIODO)) == 10 * 3600.0 + 1800.0
+    assert relatorios.agregacao(*PERIODO, "mes").total_geral() == 10 * 3600.0 + 1800.0
+    assert relatorios.cache.falhas == falhas
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from horas_trabalhadas.equipe import gerar_relatorio_equipe, localizar_arquivos
+from horas_trabalhadas.historico import RepositorioFragmentado, RepositorioHistorico
+
+PERIODO = (datetime(2024, 1, 1), datetime(2024, 1, 31, 23, 59, 59))
+
+
+def sessao(data, segundos):
+    return {"data": data, "duracao_segundos": segundos}
+
+
+def gravar_json(caminho, dados):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(dados, f)
+
+
+@pytest.fixture
+def equipe(tmp_path):
+    # alice: diretório de dados com arquivo único e um manifesto de backup ao lado.
+    alice = RepositorioHistorico(str(tmp_path / "alice" / "data" / "historico_horas.json"))
+    os.makedirs(os.path.dirname(alice.arquivo))
+    alice.carregar()
+    alice.adicionar_sessao("site", sessao("2024-01-02T09:00:00", 3600))
+    alice.salvar()
+    gravar_json(str(tmp_path / "alice" / "data" / "backups" / "instantaneos" / "1.json"), {"arvore": "abc"})
+    # bruno: formato fragmentado, com um projeto sem tempo no período.
+    bruno = RepositorioFragmentado(str(tmp_path / "bruno"))
+    bruno.carregar()
+    bruno.adicionar_sessao("app", sessao("2024-01-03T10:00:00", 1800))
+    bruno.adicionar_sessao("antigo", sessao("2020-05-01T10:00:00", 600))
+    bruno.salvar()
+    # carla: um arquivo solto com o nome da pessoa; e um JSON que não é histórico.
+    gravar_json(str(tmp_path / "carla.json"), {"site": {"total_segundos": 900, "sessoes": [
+        sessao("2024-01-04T08:00:00", 900)
+    ]}})
+    gravar_json(str(tmp_path / "config.json"), {"tema": "escuro"})
+    return tmp_path
+
+
+def test_diretorio_de_dados_conta_so_pelo_historico(equipe):
+    assert localizar_arquivos(str(equipe)) == sorted([
+        str(equipe / "alice" / "data" / "historico_horas.json"),
+        str(equipe / "bruno" / "historico_indice.json"),
+        str(equipe / "carla.json"),
+        str(equipe / "config.json"),
+    ])
+
+
+def test_fragmentado_e_arquivos_nao_reconhecidos(equipe):
+    relatorio = gerar_relatorio_equipe(localizar_arquivos(str(equipe)), *PERIODO, processos=1)
+    assert relatorio.arquivos == 3
+    assert list(relatorio.linhas()) == [
+        ("alice", "site", 1, 3600),
+        ("bruno", "app", 1, 1800),
+        ("carla", "site", 1, 900),
+    ]
+    assert relatorio.erros == [(str(equipe / "config.json"), "não é um arquivo de histórico")]
+
+
+def test_projeto_corrompido_e_reportado(equipe):
+    with open(equipe / "bruno" / "projetos" / os.listdir(equipe / "bruno" / "projetos")[0], "a") as f:
+        f.write(" ")
+    relatorio = gerar_relatorio_equipe([str(equipe / "bruno" / "historico_indice.json")], *PERIODO, processos=1)
+    assert relatorio.arquivos == 0
+    assert len(relatorio.erros) == 1 and "corrompido" in relatorio.erros[0][1]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from horas_trabalhadas import historico, integridade, mapa_calor, painel
+from horas_trabalhadas.cache_relatorios import RelatoriosEmCache
+from horas_trabalhadas.historico import RepositorioFragmentado
+from horas_trabalhadas.sincronizacao import Sincronizador
+
+PROJETOS = [f"projeto {i:02d}" for i in range(20)]
+RECENTES = PROJETOS[:2]
+
+
+def sessao(entrada, segundos):
+    return {"data": entrada.isoformat(), "duracao_segundos": segundos}
+
+
+@pytest.fixture
+def diretorio(tmp_path):
+    agora = datetime.now().replace(microsecond=0)
+    repositorio = RepositorioFragmentado(str(tmp_path))
+    repositorio.carregar()
+    for projeto in PROJETOS:
+        repositorio.adicionar_sessao(projeto, sessao(datetime(2020, 3, 2, 9), 3600))
+    for projeto in RECENTES:
+        repositorio.adicionar_sessao(projeto, sessao(agora - timedelta(hours=2), 1800))
+    repositorio.salvar()
+    return str(tmp_path)
+
+
+def contar_gravacoes(monkeypatch, diretorio_projetos):
+    gravados = []
+    original = historico.gravar_atomico
+
+    def gravar(caminho, conteudo, manter_anterior=False):
+        if os.path.dirname(caminho) == diretorio_projetos:
+            gravados.append(os.path.basename(caminho))
+        return original(caminho, conteudo, manter_anterior)
+
+    monkeypatch.setattr(historico, "gravar_atomico", gravar)
+    return gravados
+
+
+def test_partida_le_so_os_projetos_recentes(diretorio):
+    repositorio = RepositorioFragmentado(diretorio)
+    integridade.carregar_com_recuperacao(repositorio)
+    totais = mapa_calor.TotaisDiarios(repositorio)
+    hoje, _, _ = painel.PainelTotais(totais, SimpleNamespace(timers={})).totais()
+    assert hoje == pytest.approx(1800 * len(RECENTES))
+    relatorios = RelatoriosEmCache(repositorio)
+    fim = datetime.now()
+    for _ in relatorios.etapas_precalculo(fim - timedelta(days=30), fim, None, ("semana",)):
+        pass
+    assert sorted(repositorio.dados.carregados()) == RECENTES
+
+
+def test_primeira_gravacao_regrava_so_o_projeto_alterado(diretorio, monkeypatch):
+    repositorio = RepositorioFragmentado(diretorio)
+    repositorio.carregar()
+    gravados = contar_gravacoes(monkeypatch, repositorio.diretorio_projetos)
+    repositorio.adicionar_sessao(PROJETOS[5], sessao(datetime(2020, 3, 3, 9), 60))
+    repositorio.salvar()
+    assert gravados == [historico.nome_fragmento(PROJETOS[5])]
+    assert repositorio.dados.carregados() == [PROJETOS[5]]
+    assert RepositorioFragmentado(diretorio).carregar()[PROJETOS[5]]["total_segundos"] == 3660
+
+
+def test_sincronizacao_indexa_so_o_projeto_recebido(diretorio):
+    repositorio = RepositorioFragmentado(diretorio)
+    repositorio.carregar()
+    with open(os.path.join(diretorio, "sincronizacao.json"), "w") as f:
+        f.write('{"dispositivo": "local", "seq": 0, "posicoes": {}, "ultimas_seq": {}, "versoes": {}}')
+    sincronizador = Sincronizador(repositorio, diretorio)
+    nova = sessao(datetime(2020, 3, 4, 9), 120)
+    assert sincronizador._aplicar(
+        {"seq": 1, "disp": "outro", "ts": 10.0, "op": "gravar", "projeto": PROJETOS[7], "id": "x1", "sessao": nova}
+    )
+    assert repositorio.dados.carregados() == [PROJETOS[7]]
+    assert repositorio.dados[PROJETOS[7]]["total_segundos"] == 3720
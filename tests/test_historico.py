@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+from horas_trabalhadas import historico
+from horas_trabalhadas.historico import (
+    SUFIXO_ANTERIOR,
+    ErroIntegridade,
+    RepositorioFragmentado,
+    RepositorioHistorico,
+    gravar_atomico,
+)
+
+
+def sessao(data, segundos):
+    return {"data": data, "duracao_segundos": segundos}
+
+
+@pytest.fixture
+def repositorio(tmp_path):
+    repositorio = RepositorioHistorico(str(tmp_path / "historico_horas.json"))
+    repositorio.carregar()
+    repositorio.adicionar_sessao("alfa", sessao("2024-01-02T09:00:00", 3600))
+    repositorio.salvar()
+    return repositorio
+
+
+def interromper_troca(monkeypatch):
+    """Faz a próxima gravação com ``manter_anterior`` cair antes de trocar o arquivo."""
+    original = historico.gravar_atomico
+
+    def gravar(caminho, conteudo, manter_anterior=False):
+        if manter_anterior:
+            raise OSError("queda simulada")
+        return original(caminho, conteudo, manter_anterior)
+
+    monkeypatch.setattr(historico, "gravar_atomico", gravar)
+
+
+def test_gravar_atomico_mantem_anterior_sem_tirar_o_arquivo(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "dados.json")
+    gravar_atomico(caminho, b"v1")
+    trocas = []
+    original = os.replace
+
+    def replace(origem, destino):
+        trocas.append((origem, destino, os.path.exists(caminho)))
+        original(origem, destino)
+
+    monkeypatch.setattr(os, "replace", replace)
+    gravar_atomico(caminho, b"v2", manter_anterior=True)
+    assert all(existia for _, _, existia in trocas)
+    assert [destino for _, destino, _ in trocas if destino == caminho] == [caminho]
+    with open(caminho, "rb") as f:
+        assert f.read() == b"v2"
+    with open(caminho + SUFIXO_ANTERIOR, "rb") as f:
+        assert f.read() == b"v1"
+    assert not os.path.exists(caminho + ".tmp")
+
+
+def test_queda_entre_checksum_e_dados_nao_acusa_corrupcao(repositorio, monkeypatch):
+    repositorio.adicionar_sessao("alfa", sessao("2024-01-03T09:00:00", 1800))
+    interromper_troca(monkeypatch)
+    with pytest.raises(OSError):
+        repositorio.salvar()
+    monkeypatch.undo()
+    novo = RepositorioHistorico(repositorio.arquivo)
+    dados = novo.carregar()
+    assert dados["alfa"]["total_segundos"] == 3600
+    assert novo.verificar(completo=True) == []
+    novo.adicionar_sessao("alfa", sessao("2024-01-04T09:00:00", 600))
+    novo.salvar()
+    assert RepositorioHistorico(repositorio.arquivo).carregar()["alfa"]["total_segundos"] == 4200
+
+
+def test_arquivo_ausente_volta_do_anterior(repositorio):
+    repositorio.adicionar_sessao("beta", sessao("2024-01-03T09:00:00", 600))
+    repositorio.salvar()
+    # Queda no meio da gravação antiga: o arquivo já tinha virado ``.anterior``.
+    os.replace(repositorio.arquivo, repositorio.arquivo + SUFIXO_ANTERIOR)
+    novo = RepositorioHistorico(repositorio.arquivo)
+    dados = novo.carregar()
+    assert dados["alfa"]["total_segundos"] == 3600
+    assert not novo.bloqueado
+    assert os.path.exists(repositorio.arquivo)
+
+
+def test_arquivo_ausente_volta_do_temporario_completo(repositorio):
+    repositorio.adicionar_sessao("beta", sessao("2024-01-03T09:00:00", 600))
+    repositorio.salvar()
+    os.replace(repositorio.arquivo, repositorio.arquivo + ".tmp")
+    dados = RepositorioHistorico(repositorio.arquivo).carregar()
+    assert set(dados) == {"alfa", "beta"}
+
+
+def test_arquivo_ausente_com_copias_que_nao_conferem_bloqueia(repositorio):
+    os.remove(repositorio.arquivo)
+    with open(repositorio.arquivo + ".tmp", "w") as f:
+        f.write('{"trunc')
+    with open(repositorio.arquivo + SUFIXO_ANTERIOR, "w") as f:
+        json.dump({"outro": {"total_segundos": 1, "sessoes": []}}, f)
+    novo = RepositorioHistorico(repositorio.arquivo)
+    with pytest.raises(ErroIntegridade):
+        novo.carregar()
+    assert novo.bloqueado
+
+
+def test_fragmentado_queda_entre_indice_e_projeto(tmp_path, monkeypatch):
+    repositorio = RepositorioFragmentado(str(tmp_path))
+    repositorio.carregar()
+    repositorio.adicionar_sessao("alfa", sessao("2024-01-02T09:00:00", 3600))
+    repositorio.adicionar_sessao("beta", sessao("2024-01-02T10:00:00", 60))
+    repositorio.salvar()
+    repositorio.adicionar_sessao("alfa", sessao("2024-01-03T09:00:00", 1800))
+    original = historico.gravar_atomico
+
+    def gravar(caminho, conteudo, manter_anterior=False):
+        if os.path.dirname(caminho) == repositorio.diretorio_projetos:
+            raise OSError("queda simulada")
+        return original(caminho, conteudo, manter_anterior)
+
+    monkeypatch.setattr(historico, "gravar_atomico", gravar)
+    with pytest.raises(OSError):
+        repositorio.salvar()
+    monkeypatch.undo()
+    novo = RepositorioFragmentado(str(tmp_path))
+    novo.carregar()
+    assert novo.corrompidos == {}
+    assert novo.indice["alfa"]["total_segundos"] == 3600
+    assert novo.dados["alfa"]["total_segundos"] == 3600
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import io
+import time
+
+import pytest
+
+from horas_trabalhadas.historico import RepositorioHistorico
+from horas_trabalhadas.importacao import importar_fluxo
+
+
+def importar(texto, repositorio=None, **opcoes):
+    repositorio = repositorio or RepositorioHistorico("inexistente.json")
+    return repositorio, importar_fluxo(repositorio, io.StringIO(texto), "csv", **opcoes)
+
+
+def test_erros_com_numero_da_linha_fisica():
+    texto = (
+        "projeto,data,data_saida,nota\n"
+        'alfa,2024-01-02T09:00:00,2024-01-02T10:00:00,"nota\nem duas linhas"\n'
+        "alfa,ontem,2024-01-02T10:00:00,\n"
+        ",2024-01-03T09:00:00,2024-01-03T10:00:00,\n"
+        "alfa,2024-01-04T10:00:00,2024-01-04T09:00:00,\n"
+    )
+    repositorio, resultado = importar(texto)
+    assert resultado.importadas == 1
+    assert repositorio.dados["alfa"]["sessoes"][0]["nota"] == "nota\nem duas linhas"
+    assert [linha for linha, _ in resultado.erros] == [4, 5, 6]
+    assert "data/hora inválida" in resultado.erros[0][1]
+    assert resultado.erros[1][1] == "projeto ausente"
+    assert "posterior" in resultado.erros[2][1]
+    assert resultado.rejeitadas == 3
+
+
+def test_duplicadas_e_projeto_padrao():
+    texto = (
+        "data;duracao\n"
+        "02/01/2024 09:00;01:30\n"
+        "02/01/2024 09:00;01:30\n"
+        "03/01/2024 09:00;abc\n"
+    )
+    repositorio, resultado = importar(texto, projeto_padrao="beta")
+    assert resultado.importadas == 1
+    assert resultado.duplicadas == 1
+    assert resultado.erros == [(4, "duração inválida: 'abc'")]
+    assert repositorio.dados["beta"]["total_segundos"] == 5400
+
+
+def test_notifica_uma_vez_por_lote_e_projeto():
+    repositorio = RepositorioHistorico("inexistente.json")
+    notificacoes = []
+    repositorio.adicionar_ouvinte(lambda operacao, projeto, anterior, sessao: notificacoes.append(
+        (operacao, projeto, len(sessao))
+    ))
+    linhas = "".join(f"{'alfa' if i % 2 else 'beta'},2024-01-{i + 1:02d}T09:00:00,60\n" for i in range(10))
+    _, resultado = importar("projeto,data,duracao\n" + linhas, repositorio, tamanho_lote=4)
+    assert resultado.importadas == 10
+    assert sorted(notificacoes) == sorted([
+        ("adicionar", "beta", 2), ("adicionar", "alfa", 2),
+        ("adicionar", "beta", 2), ("adicionar", "alfa", 2),
+        ("adicionar", "alfa", 1), ("adicionar", "beta", 1),
+    ])
+
+
+@pytest.fixture
+def fuso_sao_paulo(monkeypatch):
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset indisponível")
+    monkeypatch.setenv("TZ", "America/Sao_Paulo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_utc_com_z_e_com_deslocamento_convertidos_para_o_horario_local(fuso_sao_paulo):
+    texto = (
+        "projeto,data,data_saida\n"
+        "alfa,2024-01-01T08:00:00Z,2024-01-01T09:00:00Z\n"
+        "beta,2024-01-01T08:00:00+00:00,2024-01-01T09:00:00+00:00\n"
+    )
+    repositorio, resultado = importar(texto)
+    assert resultado.importadas == 2
+    for projeto in ("alfa", "beta"):
+        sessao = repositorio.dados[projeto]["sessoes"][0]
+        assert sessao["data"] == "2024-01-01T05:00:00"
+        assert sessao["duracao_segundos"] == 3600
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+import pytest
+
+from horas_trabalhadas.historico import RepositorioFragmentado, RepositorioHistorico
+from horas_trabalhadas.mapa_calor import TotaisDiarios, montar_anos
+
+
+def sessao(data, segundos):
+    return {"data": data, "duracao_segundos": segundos}
+
+
+def normalizados(anos):
+    return {ano: pytest.approx(list(dias)) for ano, dias in anos.items() if any(dias)}
+
+
+def conferir(totais, repositorio):
+    for projeto in repositorio.dados:
+        reconstruido = montar_anos(repositorio.dados[projeto])
+        assert {a: list(d) for a, d in totais.anos_do_projeto(projeto).items() if any(d)} == normalizados(reconstruido)
+
+
+def alterar(repositorio):
+    repositorio.adicionar_sessoes("alfa", [
+        sessao("2024-03-01T22:00:00", 4 * 3600),  # cruza a meia-noite
+        sessao("2024-12-31T23:30:00", 3600),  # cruza a virada do ano
+    ])
+    repositorio.adicionar_sessao("beta", sessao("2024-03-02T10:00:00", 1800))
+    repositorio.substituir_sessao("alfa", 0, sessao("2024-01-05T23:00:00", 2 * 3600))
+    atual = repositorio.dados["alfa"]["sessoes"][1]
+    repositorio.atualizar_sessao("alfa", atual, dict(atual, duracao_segundos=30 * 3600))
+    repositorio.remover_sessao("beta", 0)
+
+
+def test_incremental_igual_a_remontar():
+    repositorio = RepositorioHistorico("inexistente.json")
+    repositorio.adicionar_sessoes("alfa", [sessao("2024-01-02T09:00:00", 3600), sessao("2024-02-10T20:00:00", 7200)])
+    repositorio.adicionar_sessao("beta", sessao("2024-01-03T09:00:00", 600))
+    totais = TotaisDiarios(repositorio)
+    conferir(totais, repositorio)
+    montagens = totais.montagens
+
+    alterar(repositorio)
+
+    conferir(totais, repositorio)
+    assert totais.montagens == montagens
+    assert totais.segundos_entre(date(2024, 3, 1), date(2024, 3, 2)) == 4 * 3600 + 1800
+    assert totais.segundos_entre(date(2025, 1, 1), date(2025, 1, 1)) == 1800
+
+
+def test_incremental_com_projetos_sob_demanda(tmp_path):
+    gravado = RepositorioFragmentado(str(tmp_path))
+    gravado.carregar()
+    gravado.adicionar_sessoes("alfa", [sessao("2024-01-02T09:00:00", 3600), sessao("2024-02-10T20:00:00", 7200)])
+    gravado.adicionar_sessao("beta", sessao("2024-01-03T09:00:00", 600))
+    gravado.adicionar_sessao("gama", sessao("2020-01-03T09:00:00", 600))
+    gravado.salvar()
+
+    repositorio = RepositorioFragmentado(str(tmp_path))
+    repositorio.carregar()
+    totais = TotaisDiarios(repositorio)
+    # "alfa" é lido e montado antes das alterações; "beta" e "gama" ficam sem arrays.
+    totais.anos_do_projeto("alfa")
+    montagens = totais.montagens
+
+    alterar(repositorio)
+
+    assert totais.montagens == montagens
+    assert repositorio.dados.carregados() == ["alfa", "beta"]
+    conferir(totais, repositorio)
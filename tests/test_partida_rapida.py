@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from horas_trabalhadas import historico, partida_rapida
+from horas_trabalhadas.historico import RepositorioHistorico, assinatura_arquivo
+from horas_trabalhadas.mapa_calor import TotaisDiarios
+
+
+def sessao(data, segundos):
+    return {"data": data, "duracao_segundos": segundos}
+
+
+@pytest.fixture
+def arquivo(tmp_path, monkeypatch):
+    """Histórico gravado com o instantâneo (e os totais diários) ao lado."""
+    monkeypatch.setenv(partida_rapida.VARIAVEL_PARTIDA_RAPIDA, "1")
+    arquivo = str(tmp_path / "historico_horas.json")
+    repositorio = RepositorioHistorico(arquivo)
+    repositorio.carregar()
+    repositorio.adicionar_sessoes("alfa", [sessao("2024-01-02T09:00:00", 3600), sessao("2024-01-03T23:00:00", 7200)])
+    TotaisDiarios(repositorio).anos_do_projeto("alfa")
+    repositorio.salvar()
+    assert repositorio.instantaneo.esperar(5)
+    return arquivo
+
+
+@pytest.fixture
+def leituras_json(monkeypatch):
+    """Conta as vezes em que o JSON do histórico foi decodificado."""
+    contador = []
+    original = historico.decodificar_json
+
+    def decodificar(conteudo, caminho, projeto=None):
+        contador.append(caminho)
+        return original(conteudo, caminho, projeto)
+
+    monkeypatch.setattr(historico, "decodificar_json", decodificar)
+    return contador
+
+
+def abrir(arquivo):
+    repositorio = RepositorioHistorico(arquivo)
+    repositorio.carregar()
+    repositorio.instantaneo.esperar(5)
+    return repositorio
+
+
+def test_instantaneo_valido_evita_o_json(arquivo, leituras_json):
+    repositorio = abrir(arquivo)
+    assert leituras_json == []
+    assert repositorio.dados["alfa"]["total_segundos"] == 3600 + 7200
+    totais = TotaisDiarios(repositorio)
+    assert totais.anos_do_projeto("alfa")[2024][3] == 3600
+    assert totais.montagens == 0
+
+
+def test_arquivo_alterado_depois_do_instantaneo(arquivo, leituras_json, monkeypatch):
+    # Outro processo grava o histórico sem refazer o instantâneo.
+    monkeypatch.setenv(partida_rapida.VARIAVEL_PARTIDA_RAPIDA, "0")
+    outro = RepositorioHistorico(arquivo)
+    outro.carregar()
+    outro.adicionar_sessao("beta", sessao("2024-01-04T09:00:00", 600))
+    outro.salvar()
+    monkeypatch.setenv(partida_rapida.VARIAVEL_PARTIDA_RAPIDA, "1")
+    del leituras_json[:]
+
+    repositorio = abrir(arquivo)
+    assert leituras_json == [arquivo]
+    assert "beta" in repositorio.dados
+    # O instantâneo é refeito para o arquivo atual.
+    del leituras_json[:]
+    assert "beta" in abrir(arquivo).dados
+    assert leituras_json == []
+
+
+def test_mesma_assinatura_com_outro_sha256_e_ignorada(arquivo):
+    assinatura = assinatura_arquivo(arquivo)
+    assert partida_rapida.ler_instantaneo(arquivo, assinatura, "0" * 64) is None
+    assert partida_rapida.ler_instantaneo(arquivo, (assinatura[0] + 1, assinatura[1]), None) is None
+
+
+def test_outra_versao_do_python_e_ignorada(arquivo, leituras_json, monkeypatch):
+    compatibilidade = partida_rapida._compatibilidade()
+    monkeypatch.setattr(partida_rapida, "_compatibilidade", lambda: compatibilidade[:2] + [[2, 7]])
+    repositorio = abrir(arquivo)
+    assert leituras_json == [arquivo]
+    assert repositorio.dados["alfa"]["total_segundos"] == 3600 + 7200
+
+
+def test_instantaneo_truncado_e_ignorado(arquivo, leituras_json):
+    caminho = partida_rapida.caminho_instantaneo(arquivo)
+    with open(caminho, "r+b") as f:
+        f.truncate(os.path.getsize(caminho) // 2)
+    assert abrir(arquivo).dados["alfa"]["total_segundos"] == 3600 + 7200
+    assert leituras_json == [arquivo]
+
+
+def test_totais_do_instantaneo_descartados_se_a_geracao_mudou(arquivo):
+    repositorio = abrir(arquivo)
+    repositorio.adicionar_sessao("alfa", sessao("2024-01-03T10:00:00", 1800))
+    totais = TotaisDiarios(repositorio)
+    assert totais.anos_do_projeto("alfa")[2024][2] == 3600 + 1800
+    assert totais.montagens == 1
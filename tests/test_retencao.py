@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import copy
+import os
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from horas_trabalhadas import agregacao
+from horas_trabalhadas.agregacao import agregar
+from horas_trabalhadas.historico import (
+    CHAVE_AGREGADOS,
+    RepositorioHistorico,
+    iterar_sessoes_periodo,
+    verificar_totais,
+)
+from horas_trabalhadas.mapa_calor import TotaisDiarios
+from horas_trabalhadas.retencao import (
+    NOME_ARQUIVO_MORTO,
+    compactar_historico,
+    data_corte,
+    iterar_arquivadas,
+)
+
+AGORA = datetime(2024, 4, 1, 12, 0)
+PERIODO = (datetime(2024, 1, 1), datetime(2024, 3, 31, 23, 59, 59))
+
+
+@pytest.fixture
+def repositorio(tmp_path):
+    aleatorio = random.Random(7)
+    repositorio = RepositorioHistorico(str(tmp_path / "historico_horas.json"))
+    repositorio.carregar()
+    for projeto in ("alfa", "beta"):
+        sessoes = []
+        for _ in range(150):
+            dia = date(2024, 1, 1) + timedelta(days=aleatorio.randrange(91))
+            entrada = datetime.combine(dia, datetime.min.time()) + timedelta(hours=aleatorio.randrange(8, 20))
+            sessoes.append({"data": entrada.isoformat(), "duracao_segundos": float(aleatorio.randrange(60, 4 * 3600))})
+        repositorio.adicionar_sessoes(projeto, sessoes)
+    # Cruzam a meia-noite, a virada da semana (domingo para segunda) e a do mês.
+    repositorio.adicionar_sessoes("alfa", [
+        {"data": "2024-01-10T23:00:00", "duracao_segundos": 7200.0},
+        {"data": "2024-01-07T22:30:00", "duracao_segundos": 5400.0},
+        {"data": "2024-01-31T23:00:00", "duracao_segundos": 7200.0},
+    ])
+    return repositorio
+
+
+def totais(repositorio, agrupamento):
+    return agregar(repositorio.dados, *PERIODO, agrupamento).valores
+
+
+def segundos_periodo(repositorio, inicio, fim):
+    return sum(s["duracao_segundos"] for _, s in iterar_sessoes_periodo(repositorio.dados, inicio, fim))
+
+
+def assert_mesmos_valores(antes, depois):
+    assert antes.keys() == depois.keys()
+    for chave, segundos in antes.items():
+        assert depois[chave] == pytest.approx(segundos)
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_compactacao_mantem_totais_exatos(repositorio, numpy, monkeypatch):
+    if numpy and not agregacao.NUMPY_AVAILABLE:
+        pytest.skip("NumPy não instalado")
+    monkeypatch.setattr(agregacao, "NUMPY_AVAILABLE", numpy)
+    corte = data_corte(45, AGORA)
+    totais_diarios = TotaisDiarios(repositorio)
+    projetos = {p: d["total_segundos"] for p, d in repositorio.dados.items()}
+    por_agrupamento = {a: totais(repositorio, a) for a in ("dia", "semana", "mes", "dia_semana", "projeto")}
+    compactado = segundos_periodo(repositorio, PERIODO[0], corte - timedelta(seconds=1))
+    depois_do_corte = segundos_periodo(repositorio, corte, PERIODO[1])
+    mapa = totais_diarios.segundos_entre(PERIODO[0].date(), PERIODO[1].date())
+
+    assert compactar_historico(repositorio, 45, arquivar=False, agora=AGORA) > 0
+
+    assert {p: d["total_segundos"] for p, d in repositorio.dados.items()} == projetos
+    assert verificar_totais(repositorio.dados) == []
+    for agrupamento, antes in por_agrupamento.items():
+        assert_mesmos_valores(antes, totais(repositorio, agrupamento))
+    assert segundos_periodo(repositorio, PERIODO[0], corte - timedelta(seconds=1)) == pytest.approx(compactado)
+    assert segundos_periodo(repositorio, corte, PERIODO[1]) == pytest.approx(depois_do_corte)
+    assert totais_diarios.segundos_entre(PERIODO[0].date(), PERIODO[1].date()) == pytest.approx(mapa)
+
+
+def test_sessoes_compactadas_vao_para_o_arquivo_morto(repositorio):
+    corte = data_corte(45, AGORA)
+    antigas = copy.deepcopy(repositorio.sessoes_anteriores(corte))
+    total = sum(d["total_segundos"] for d in repositorio.dados.values())
+
+    assert compactar_historico(repositorio, 45, agora=AGORA) == len(antigas)
+    # Uma segunda compactação, com corte posterior, soma aos dias já agregados.
+    mais_antigas = copy.deepcopy(repositorio.sessoes_anteriores(data_corte(20, AGORA)))
+    assert compactar_historico(repositorio, 20, agora=AGORA) == len(mais_antigas)
+
+    caminho = os.path.join(os.path.dirname(repositorio.arquivo), NOME_ARQUIVO_MORTO)
+    assert list(iterar_arquivadas(caminho)) == antigas + mais_antigas
+    assert all(
+        datetime.fromisoformat(s["data"]) >= data_corte(20, AGORA)
+        for d in repositorio.dados.values()
+        for s in d["sessoes"]
+    )
+
+    repositorio.salvar()
+    relido = RepositorioHistorico(repositorio.arquivo)
+    relido.carregar()
+    assert verificar_totais(relido.dados) == []
+    assert sum(d["total_segundos"] for d in relido.dados.values()) == pytest.approx(total)
+    agregadas = sum(q for d in relido.dados.values() for q, _ in d[CHAVE_AGREGADOS].values())
+    assert agregadas == len(antigas) + len(mais_antigas)
+
+
+def test_sessao_que_cruza_o_mes_e_repartida():
+    repositorio = RepositorioHistorico("inexistente.json")
+    repositorio.adicionar_sessao("alfa", {"data": "2024-01-31T23:00:00", "duracao_segundos": 7200.0})
+    repositorio.compactar(datetime(2024, 3, 1))
+    assert repositorio.dados["alfa"][CHAVE_AGREGADOS] == {"2024-01-31": [1, 3600.0], "2024-02-01": [0, 3600.0]}
+    resultado = agregar(repositorio.dados, *PERIODO, "mes").valores
+    assert resultado == {(date(2024, 1, 1), "alfa"): 3600.0, (date(2024, 2, 1), "alfa"): 3600.0}
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from horas_trabalhadas import sincronizacao
+from horas_trabalhadas.historico import RepositorioHistorico
+from horas_trabalhadas.sincronizacao import Sincronizador
+
+
+class Maquina:
+    def __init__(self, diretorio):
+        os.makedirs(diretorio)
+        self.repositorio = RepositorioHistorico(os.path.join(diretorio, "historico_horas.json"))
+        self.repositorio.carregar()
+        self.sincronizador = Sincronizador(self.repositorio, diretorio)
+
+    def sessao(self, projeto="alfa"):
+        return self.repositorio.dados[projeto]["sessoes"][0]
+
+    def editar(self, duracao, projeto="alfa"):
+        sessao = self.sessao(projeto)
+        self.repositorio.atualizar_sessao(projeto, sessao, dict(sessao, duracao_segundos=duracao))
+        self.repositorio.salvar()
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(sincronizacao.time, "time", lambda: agora[0])
+    return agora
+
+
+@pytest.fixture
+def maquinas(tmp_path, relogio):
+    a = Maquina(str(tmp_path / "a"))
+    b = Maquina(str(tmp_path / "b"))
+    a.repositorio.adicionar_sessao("alfa", {"data": "2024-01-02T09:00:00", "duracao_segundos": 3600})
+    a.repositorio.salvar()
+    compartilhado = str(tmp_path / "compartilhado")
+    a.sincronizador.sincronizar(compartilhado)
+    b.sincronizador.sincronizar(compartilhado)
+    return a, b, compartilhado
+
+
+@pytest.mark.parametrize("ordem", ["a_primeiro", "b_primeiro"])
+def test_ultima_escrita_vence_em_qualquer_ordem(maquinas, relogio, ordem):
+    a, b, compartilhado = maquinas
+    assert b.sessao()["id"] == a.sessao()["id"]
+    relogio[0] = 2000.0
+    a.editar(1800)
+    relogio[0] = 3000.0
+    b.editar(600)
+    primeira, segunda = (a, b) if ordem == "a_primeiro" else (b, a)
+    primeira.sincronizador.sincronizar(compartilhado)
+    segunda.sincronizador.sincronizar(compartilhado)
+    primeira.sincronizador.sincronizar(compartilhado)
+    for maquina in (a, b):
+        assert maquina.sessao()["duracao_segundos"] == 600
+        assert maquina.repositorio.dados["alfa"]["total_segundos"] == 600
+
+
+def test_remocao_mais_nova_vence_edicao(maquinas, relogio):
+    a, b, compartilhado = maquinas
+    relogio[0] = 2000.0
+    a.editar(1800)
+    relogio[0] = 3000.0
+    b.repositorio.remover_sessao("alfa", 0)
+    b.repositorio.salvar()
+    a.sincronizador.sincronizar(compartilhado)
+    b.sincronizador.sincronizar(compartilhado)
+    a.sincronizador.sincronizar(compartilhado)
+    assert "alfa" not in a.repositorio.dados
+    assert "alfa" not in b.repositorio.dados
+
+
+def test_estado_guarda_so_posicoes_e_remocoes_recentes(maquinas, relogio):
+    a, b, compartilhado = maquinas
+    relogio[0] = 2000.0
+    a.repositorio.adicionar_sessoes(
+        "beta", [{"data": f"2024-02-{dia:02d}T09:00:00", "duracao_segundos": 60} for dia in range(1, 29)]
+    )
+    removida = a.repositorio.remover_sessao("alfa", 0)["id"]
+    a.repositorio.salvar()
+    a.sincronizador.sincronizar(compartilhado)
+    b.sincronizador.sincronizar(compartilhado)
+
+    for maquina in (a, b):
+        estado = maquina.sincronizador.estado
+        assert set(estado) == {"dispositivo", "seq", "posicoes", "ultimas_seq", "removidas"}
+        assert list(estado["removidas"]) == [removida]
+        assert all(s["versao"] == [2000.0, a.sincronizador.dispositivo]
+                   for s in maquina.repositorio.dados["beta"]["sessoes"])
+
+    # Remoções antigas saem do estado na sincronização seguinte.
+    relogio[0] = 2000.0 + sincronizacao.RETENCAO_REMOCOES_SEG + 1
+    b.sincronizador.sincronizar(compartilhado)
+    assert b.sincronizador.estado["removidas"] == {}
+
+
+def test_alteracoes_invalidas_sao_puladas(maquinas, relogio):
+    a, b, compartilhado = maquinas
+    relogio[0] = 2000.0
+    a.editar(1800)
+    with open(os.path.join(compartilhado, f"{a.sincronizador.dispositivo}.jsonl"), "a", encoding="utf-8") as f:
+        f.write('{"op": "gravar", "projeto": "alfa"}\n')
+        f.write("não é json\n")
+        f.write('{"seq": 99, "op": "gravar", "projeto": "alfa", "id": "x", "ts": 1, "disp": "z", "sessao": {}}\n')
+    a.sincronizador.sincronizar(compartilhado)
+    _, recebidas = b.sincronizador.sincronizar(compartilhado)
+    assert recebidas == 1
+    assert b.sessao()["duracao_segundos"] == 1800
+    assert b.sincronizador.sincronizar(compartilhado) == (0, 0)